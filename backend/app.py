@@ -5,6 +5,7 @@ import os
 import sys
 import logging
 from pathlib import Path
+from typing import Optional
 from dotenv import load_dotenv
 from sqlalchemy import event
 from sqlalchemy.engine import Engine
@@ -25,6 +26,8 @@ from controllers.material_controller import material_bp, material_global_bp
 from controllers.reference_file_controller import reference_file_bp
 from controllers.settings_controller import settings_bp
 from controllers import project_bp, page_bp, template_bp, user_template_bp, export_bp, file_bp
+from services.task_manager import task_manager
+from services.progress_events import install_session_listeners
 
 
 # Enable SQLite WAL mode for all connections
@@ -48,8 +51,13 @@ def set_sqlite_pragma(dbapi_conn, connection_record):
         cursor.close()
 
 
-def create_app():
-    """Application factory"""
+def create_app(task_workers: Optional[int] = None):
+    """
+    Application factory
+
+    Args:
+        task_workers: Size of the background task executor (defaults to the TaskManager's own)
+    """
     app = Flask(__name__)
     
     # Load configuration from Config class
@@ -61,7 +69,8 @@ def create_app():
     os.makedirs(instance_dir, exist_ok=True)
     
     db_path = os.path.join(instance_dir, 'database.db')
-    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+    # DATABASE_URL allows several backend/worker processes to share one queue database
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL') or f'sqlite:///{db_path}'
     
     # Ensure upload folder exists
     project_root = os.path.dirname(backend_dir)
@@ -114,11 +123,29 @@ def create_app():
         # Load settings from database and sync to app.config
         _load_settings_to_config(app)
 
+    # Bind the background task manager (durable queue settings come from app.config)
+    task_manager.init_app(app, max_workers=task_workers)
+
+    # Optionally pre-connect the shared provider clients in the background
+    if app.config.get('PROVIDER_WARMUP_ENABLED'):
+        from services.ai_providers import provider_pool
+        provider_pool.warm_up(app)
+
+    # Publish committed Task/Page changes to SSE subscribers
+    install_session_listeners()
+
     # Health check endpoint
     @app.route('/health')
     def health_check():
         return {'status': 'ok', 'message': 'Banana Slides API is running'}
     
+    # Readiness: 队列饱和时返回 503，供负载均衡摘除流量
+    @app.route('/ready')
+    def readiness_check():
+        from services.admission import admission_controller
+        readiness = admission_controller.readiness()
+        return readiness, 200 if readiness['ready'] else 503
+    
     # Output language endpoint
     @app.route('/api/output-language', methods=['GET'])
     def get_output_language():
@@ -143,6 +170,7 @@ def create_app():
             'description': 'AI-powered PPT generation service',
             'endpoints': {
                 'health': '/health',
+                'ready': '/ready',
                 'api_docs': '/api',
                 'projects': '/api/projects'
             }
@@ -197,11 +225,22 @@ def _load_settings_to_config(app):
         logging.warning(f"Could not load settings from database: {e}")
 
 
-# Create app instance
-app = create_app()
+def __getattr__(name):
+    """
+    Create the module-level ``app`` on first access (``from app import app``, gunicorn ``app:app``),
+    so importing create_app from here (worker.py, migrations, tests) does not build a second app
+    """
+    if name == 'app':
+        global app
+        app = create_app()
+        # The serving process resumes crashed tasks now and re-queues expired leases periodically
+        task_manager.start_recovery()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 if __name__ == '__main__':
+    app = create_app()
     # Run development server
     if os.getenv("IN_DOCKER", "0") == "1":
         port = 5000 # 在 docker 内部部署时始终使用 5000 端口.
@@ -223,6 +262,14 @@ if __name__ == '__main__':
         f"Uploads: {app.config['UPLOAD_FOLDER']}"
     )
     
-    # Enable reloader for hot reload in development
+    # Enable reloader for hot reload in development only
     # Using absolute paths for database, so WSL path issues should not occur
-    app.run(host='0.0.0.0', port=port, debug=debug, use_reloader=True)
+    use_reloader = debug
+    
+    # Resume tasks left behind by a previous run, then keep re-queuing expired leases (only in
+    # the serving process: with the reloader on, the parent process just watches files and
+    # WERKZEUG_RUN_MAIN marks the child)
+    if not use_reloader or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        task_manager.start_recovery()
+    
+    app.run(host='0.0.0.0', port=port, debug=debug, use_reloader=use_reloader)
@@ -69,6 +69,83 @@ class Config:
     MAX_DESCRIPTION_WORKERS = int(os.getenv('MAX_DESCRIPTION_WORKERS', '5'))
     MAX_IMAGE_WORKERS = int(os.getenv('MAX_IMAGE_WORKERS', '8'))
     
+    # 上游 AI 调用的全局并发治理（进程级，所有任务共享，按 provider 格式 + 模型区分）
+    # *_MAX_CONCURRENCY: 同时进行中的请求上限；*_RATE_LIMIT_PER_MIN: 每分钟请求上限（0 表示不限）
+    TEXT_MAX_CONCURRENCY = int(os.getenv('TEXT_MAX_CONCURRENCY', '10'))
+    IMAGE_MAX_CONCURRENCY = int(os.getenv('IMAGE_MAX_CONCURRENCY', '8'))
+    CAPTION_MAX_CONCURRENCY = int(os.getenv('CAPTION_MAX_CONCURRENCY', '8'))
+    TEXT_RATE_LIMIT_PER_MIN = int(os.getenv('TEXT_RATE_LIMIT_PER_MIN', '0'))
+    IMAGE_RATE_LIMIT_PER_MIN = int(os.getenv('IMAGE_RATE_LIMIT_PER_MIN', '0'))
+    CAPTION_RATE_LIMIT_PER_MIN = int(os.getenv('CAPTION_RATE_LIMIT_PER_MIN', '0'))
+    # AIMD 自适应并发：以 *_MAX_CONCURRENCY 为初始窗口，在 [MIN, max(*_MAX_CONCURRENCY, MAX)] 之间
+    # 根据 429/5xx、错误率与 p95 延迟自动调整（健康时向上探测真实配额）
+    ADAPTIVE_CONCURRENCY = os.getenv('ADAPTIVE_CONCURRENCY', 'true').lower() == 'true'
+    ADAPTIVE_CONCURRENCY_MIN = int(os.getenv('ADAPTIVE_CONCURRENCY_MIN', '1'))
+    ADAPTIVE_CONCURRENCY_MAX = int(os.getenv('ADAPTIVE_CONCURRENCY_MAX', '32'))
+    # 任务内的 AI 调用改用 SDK 的 async 客户端，在共享事件循环上执行（不再为每个请求占用一个线程）。
+    # 作用于批量任务（描述、图片、整套生成）；单页生成/编辑/素材任务只有一次调用，仍在任务线程中同步执行
+    ASYNC_PROVIDER_CALLS = os.getenv('ASYNC_PROVIDER_CALLS', 'false').lower() == 'true'
+    
+    # 任务队列配置
+    # inline: Web 进程自己执行任务（默认）；worker: Web 进程只入队，由 worker.py 独立进程消费
+    TASK_QUEUE_MODE = os.getenv('TASK_QUEUE_MODE', 'inline')
+    TASK_LEASE_SECONDS = int(os.getenv('TASK_LEASE_SECONDS', '120'))  # 任务租约时长，超时未续租视为 worker 崩溃
+    TASK_HEARTBEAT_INTERVAL = int(os.getenv('TASK_HEARTBEAT_INTERVAL', '30'))  # 续租间隔
+    TASK_MAX_ATTEMPTS = int(os.getenv('TASK_MAX_ATTEMPTS', '3'))  # 崩溃恢复的最大重试次数
+    # 为 interactive 任务（单页生成/编辑、素材生成）预留的任务线程数，bulk 批量任务不能占用
+    TASK_INTERACTIVE_RESERVED_WORKERS = int(os.getenv('TASK_INTERACTIVE_RESERVED_WORKERS', '1'))
+    # 准入控制：每种任务类型排队（PENDING）数量上限，超出返回 429 + Retry-After
+    # TASK_QUEUE_LIMITS 按类型覆盖，如 "GENERATE_IMAGES=20,EDIT_PAGE_IMAGE=100"；上限为 0 表示不限
+    TASK_QUEUE_LIMITS = os.getenv('TASK_QUEUE_LIMITS', '')
+    TASK_QUEUE_LIMIT_DEFAULT = int(os.getenv('TASK_QUEUE_LIMIT_DEFAULT', '50'))
+    # 尚未观测到实际耗时前，估算等待时间使用的任务耗时（秒）
+    TASK_DURATION_DEFAULT_SECONDS = float(os.getenv('TASK_DURATION_DEFAULT_SECONDS', '60'))
+    # 文本生成响应缓存（相同模型 + prompt + thinking_budget 直接返回）：进程内 LRU 条数，磁盘目录与大小上限（MB）
+    LLM_CACHE_ENABLED = os.getenv('LLM_CACHE_ENABLED', 'true').lower() == 'true'
+    LLM_CACHE_MEMORY_ENTRIES = int(os.getenv('LLM_CACHE_MEMORY_ENTRIES', '256'))
+    LLM_CACHE_DIR = os.getenv('LLM_CACHE_DIR', os.path.join(BASE_DIR, 'instance', 'llm_cache'))
+    LLM_CACHE_DISK_MAX_MB = float(os.getenv('LLM_CACHE_DISK_MAX_MB', '100'))
+    # 参考文件检索：解析时按约 REFERENCE_CHUNK_TOKENS 个 token 分块建立 BM25 索引，每页描述只附带
+    # 最相关的 REFERENCE_TOP_K 个片段（总量不超过 REFERENCE_TOKEN_BUDGET 个 token）；文件总量在预算内时仍整体附带
+    REFERENCE_RETRIEVAL_ENABLED = os.getenv('REFERENCE_RETRIEVAL_ENABLED', 'true').lower() == 'true'
+    REFERENCE_CHUNK_TOKENS = int(os.getenv('REFERENCE_CHUNK_TOKENS', '400'))
+    REFERENCE_TOP_K = int(os.getenv('REFERENCE_TOP_K', '8'))
+    REFERENCE_TOKEN_BUDGET = int(os.getenv('REFERENCE_TOKEN_BUDGET', '3000'))
+    # generate_json 使用 provider 的原生 JSON 输出（Gemini: response_mime_type=application/json）；
+    # 不支持的 provider 仍按普通文本生成，轻微的格式问题都在本地修复
+    LLM_JSON_MODE = os.getenv('LLM_JSON_MODE', 'true').lower() == 'true'
+    # 生成图片结果缓存（相同模型 + prompt + 宽高比 + 分辨率 + 参考图片内容直接返回），默认关闭；磁盘目录与大小上限（MB）
+    IMAGE_CACHE_ENABLED = os.getenv('IMAGE_CACHE_ENABLED', 'false').lower() == 'true'
+    IMAGE_CACHE_DIR = os.getenv('IMAGE_CACHE_DIR', os.path.join(BASE_DIR, 'instance', 'image_cache'))
+    IMAGE_CACHE_MAX_MB = float(os.getenv('IMAGE_CACHE_MAX_MB', '1024'))
+    # 每个任务缓存的已解码参考图片（模板、素材图）张数
+    REF_IMAGE_CACHE_ENTRIES = int(os.getenv('REF_IMAGE_CACHE_ENTRIES', '8'))
+    # 参考图片上传预算：最长边（像素）、单张字节上限、编码格式与质量；可用 _OPENAI/_GEMINI 后缀按 provider 覆盖，
+    # 最长边和字节上限都为 0 时按原图上传；格式留空时 Gemini 用 WEBP、OpenAI 用 JPEG（含透明像素的图片改用 PNG）
+    REF_IMAGE_MAX_EDGE = int(os.getenv('REF_IMAGE_MAX_EDGE', '2048'))
+    REF_IMAGE_MAX_BYTES = int(os.getenv('REF_IMAGE_MAX_BYTES', '1500000'))
+    REF_IMAGE_FORMAT = os.getenv('REF_IMAGE_FORMAT', '')
+    REF_IMAGE_QUALITY = int(os.getenv('REF_IMAGE_QUALITY', '90'))
+    # 远程参考图片（描述中的图片 URL）下载：磁盘缓存目录与上限（MB）、重新验证间隔（秒）、超时、连接池大小与并发数
+    REMOTE_IMAGE_CACHE_DIR = os.getenv('REMOTE_IMAGE_CACHE_DIR', os.path.join(BASE_DIR, 'instance', 'remote_images'))
+    REMOTE_IMAGE_CACHE_MAX_MB = float(os.getenv('REMOTE_IMAGE_CACHE_MAX_MB', '200'))
+    REMOTE_IMAGE_CACHE_TTL = float(os.getenv('REMOTE_IMAGE_CACHE_TTL', '3600'))
+    REMOTE_IMAGE_TIMEOUT = float(os.getenv('REMOTE_IMAGE_TIMEOUT', '30'))
+    REMOTE_IMAGE_POOL_SIZE = int(os.getenv('REMOTE_IMAGE_POOL_SIZE', '16'))
+    REMOTE_IMAGE_FETCH_WORKERS = int(os.getenv('REMOTE_IMAGE_FETCH_WORKERS', '8'))
+    # 启动时在后台为默认模型创建共享 provider 客户端并预先建立连接
+    PROVIDER_WARMUP_ENABLED = os.getenv('PROVIDER_WARMUP_ENABLED', 'false').lower() == 'true'
+    # 批量生成中单页遇到临时性错误（429/5xx/超时）时的重试：最多尝试次数、退避基数与上限（秒，带随机抖动）
+    PAGE_RETRY_MAX_ATTEMPTS = int(os.getenv('PAGE_RETRY_MAX_ATTEMPTS', '3'))
+    PAGE_RETRY_BASE_DELAY = float(os.getenv('PAGE_RETRY_BASE_DELAY', '2.0'))
+    PAGE_RETRY_MAX_DELAY = float(os.getenv('PAGE_RETRY_MAX_DELAY', '30.0'))
+    # 生成任务中页面状态与进度的批量写入间隔（秒），即进度的最大延迟；0 表示每个结果立即提交
+    PROGRESS_FLUSH_INTERVAL = float(os.getenv('PROGRESS_FLUSH_INTERVAL', '1.0'))
+    # SSE 进度推送的心跳间隔（秒）
+    SSE_HEARTBEAT_SECONDS = int(os.getenv('SSE_HEARTBEAT_SECONDS', '15'))
+    # 带 Idempotency-Key 的请求响应（含 task_id）保存时间（秒），期间相同 key 的重试直接重放
+    IDEMPOTENCY_TTL_SECONDS = int(os.getenv('IDEMPOTENCY_TTL_SECONDS', '86400'))
+    
     # 图片生成配置
     DEFAULT_ASPECT_RATIO = "16:9"
     DEFAULT_RESOLUTION = "2K"
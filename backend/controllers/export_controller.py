@@ -4,6 +4,7 @@ Export Controller - handles file export endpoints
 from flask import Blueprint, request, current_app
 from models import db, Project, Page
 from utils import error_response, not_found, bad_request, success_response
+from services.idempotency import idempotent
 from services import ExportService, FileService
 import os
 import io
@@ -12,6 +13,7 @@ export_bp = Blueprint('export', __name__, url_prefix='/api/projects')
 
 
 @export_bp.route('/<project_id>/export/pptx', methods=['GET'])
+@idempotent
 def export_pptx(project_id):
     """
     GET /api/projects/{project_id}/export/pptx?filename=... - Export PPTX
@@ -82,6 +84,7 @@ def export_pptx(project_id):
 
 
 @export_bp.route('/<project_id>/export/pdf', methods=['GET'])
+@idempotent
 def export_pdf(project_id):
     """
     GET /api/projects/{project_id}/export/pdf?filename=... - Export PDF
@@ -152,6 +155,7 @@ def export_pdf(project_id):
 
 
 @export_bp.route('/<project_id>/export/editable-pptx', methods=['GET'])
+@idempotent
 def export_editable_pptx(project_id):
     """
     GET /api/projects/{project_id}/export/editable-pptx?filename=... - Export Editable PPTX
@@ -219,14 +223,14 @@ def export_editable_pptx(project_id):
         aspect_ratio = current_app.config.get('DEFAULT_ASPECT_RATIO', '16:9')
         resolution = current_app.config.get('DEFAULT_RESOLUTION', '2K')
         app = current_app._get_current_object()  # Get actual app object for thread context
+        # 所有线程共用一个 AIService（底层 provider 客户端来自全局连接池）
+        ai_service = AIService()
         
         def generate_single_background(index, original_image_path, aspect_ratio, resolution, app):
             """Generate clean background for a single image (runs in thread pool)"""
             # Use Flask app context in thread
             with app.app_context():
                 logger.info(f"Processing background {index+1}/{len(image_paths)}...")
-                ai_service = AIService()  # Create instance per thread
-                
                 clean_bg_path = ExportService.generate_clean_background(
                     original_image_path=original_image_path,
                     ai_service=ai_service,
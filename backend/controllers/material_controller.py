@@ -3,14 +3,14 @@ Material Controller - handles standalone material image generation
 """
 from flask import Blueprint, request, current_app
 from models import db, Project, Material, Task
-from utils import success_response, error_response, not_found, bad_request
+from utils import success_response, error_response, not_found, bad_request, queue_full_error
+from services.idempotency import idempotent
+from services.admission import admission_controller, QueueFullError
 from services import AIService, FileService
 from services.task_manager import task_manager, generate_material_image_task
 from pathlib import Path
 from werkzeug.utils import secure_filename
 from typing import Optional
-import tempfile
-import shutil
 import time
 
 
@@ -140,6 +140,7 @@ def _save_material_file(file, target_project_id: Optional[str]):
 
 
 @material_bp.route('/<project_id>/materials/generate', methods=['POST'])
+@idempotent
 def generate_material_image(project_id):
     """
     POST /api/projects/{project_id}/materials/generate - Generate a standalone material image
@@ -186,34 +187,20 @@ def generate_material_image(project_id):
             if not project:
                 return not_found('Project')
 
+        # 队列已满时拒绝（429 + Retry-After），在保存上传文件之前检查
+        admission_controller.check('GENERATE_MATERIAL')
+
         # Initialize services
         ai_service = AIService()
         file_service = FileService(current_app.config['UPLOAD_FOLDER'])
 
-        # 创建临时目录保存参考图片（后台任务会清理）
-        temp_dir = Path(tempfile.mkdtemp(dir=current_app.config['UPLOAD_FOLDER']))
-        temp_dir_str = str(temp_dir)
+        # 参考图片保存到共享的上传目录（相对路径，任意 worker 均可读取；任务结束时清理）
+        has_ref_file = bool(ref_file and ref_file.filename)
+        temp_dir, uploaded = file_service.save_task_uploads([ref_file, *extra_files], project_id)
 
         try:
-            ref_path = None
-            # Save main reference image to temp directory if provided
-            if ref_file and ref_file.filename:
-                ref_filename = secure_filename(ref_file.filename or 'ref.png')
-                ref_path = temp_dir / ref_filename
-                ref_file.save(str(ref_path))
-                ref_path_str = str(ref_path)
-            else:
-                ref_path_str = None
-
-            # Save additional reference images to temp directory
-            additional_ref_images = []
-            for extra in extra_files:
-                if not extra or not extra.filename:
-                    continue
-                extra_filename = secure_filename(extra.filename)
-                extra_path = temp_dir / extra_filename
-                extra.save(str(extra_path))
-                additional_ref_images.append(str(extra_path))
+            ref_path_str = uploaded[0] if has_ref_file else None
+            additional_ref_images = uploaded[1:] if has_ref_file else uploaded
 
             # Create async task for material generation
             task = Task(
@@ -226,6 +213,14 @@ def generate_material_image(project_id):
                 'completed': 0,
                 'failed': 0
             })
+            task.set_payload({
+                'prompt': prompt,
+                'ref_image_path': ref_path_str,
+                'additional_ref_images': additional_ref_images if additional_ref_images else None,
+                'aspect_ratio': current_app.config['DEFAULT_ASPECT_RATIO'],
+                'resolution': current_app.config['DEFAULT_RESOLUTION'],
+                'temp_dir': temp_dir
+            })
             db.session.add(task)
             db.session.commit()
 
@@ -244,7 +239,7 @@ def generate_material_image(project_id):
                 additional_ref_images if additional_ref_images else None,
                 current_app.config['DEFAULT_ASPECT_RATIO'],
                 current_app.config['DEFAULT_RESOLUTION'],
-                temp_dir_str,
+                temp_dir,
                 app
             )
 
@@ -255,11 +250,13 @@ def generate_material_image(project_id):
             }, status_code=202)
         
         except Exception as e:
-            # Clean up temp directory on error
-            if temp_dir.exists():
-                shutil.rmtree(temp_dir, ignore_errors=True)
+            # Clean up uploaded files on error
+            file_service.delete_task_uploads(temp_dir)
             raise
 
+    except QueueFullError as e:
+        return queue_full_error(str(e), e.retry_after)
+    
     except Exception as e:
         db.session.rollback()
         return error_response('AI_SERVICE_ERROR', str(e), 503)
@@ -288,6 +285,7 @@ def list_materials(project_id):
 
 
 @material_bp.route('/<project_id>/materials/upload', methods=['POST'])
+@idempotent
 def upload_material(project_id):
     """
     POST /api/projects/{project_id}/materials/upload - Upload a material image
@@ -332,6 +330,7 @@ def list_all_materials():
 
 
 @material_global_bp.route('/upload', methods=['POST'])
+@idempotent
 def upload_material_global():
     """
     POST /api/materials/upload - Upload a material image (global, not bound to a project)
@@ -378,6 +377,7 @@ def delete_material(material_id):
 
 
 @material_global_bp.route('/associate', methods=['POST'])
+@idempotent
 def associate_materials_to_project():
     """
     POST /api/materials/associate - Associate materials to a project by URLs
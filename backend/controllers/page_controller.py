@@ -2,13 +2,16 @@
 Page Controller - handles page-related endpoints
 """
 import logging
-from flask import Blueprint, request, current_app
+from flask import Blueprint, Response, request, current_app, stream_with_context
 from models import db, Project, Page, PageImageVersion, Task
-from utils import success_response, error_response, not_found, bad_request
+from utils import success_response, error_response, not_found, bad_request, queue_full_error
+from services.idempotency import idempotent
+from services.admission import admission_controller, QueueFullError
 from services import AIService, FileService, ProjectContext
 from services.task_manager import task_manager, generate_single_page_image_task, edit_page_image_task
+from services.single_flight import single_flight, compute_fingerprint, file_fingerprint
 from datetime import datetime
-from pathlib import Path
+from textwrap import dedent
 from werkzeug.utils import secure_filename
 import shutil
 import tempfile
@@ -20,6 +23,7 @@ page_bp = Blueprint('pages', __name__, url_prefix='/api/projects')
 
 
 @page_bp.route('/<project_id>/pages', methods=['POST'])
+@idempotent
 def create_page(project_id):
     """
     POST /api/projects/{project_id}/pages - Add new page
@@ -187,7 +191,77 @@ def update_page_description(project_id, page_id):
         return error_response('SERVER_ERROR', str(e), 500)
 
 
+def _prepare_page_description(project_id, page_id, data):
+    """
+    Validate a page description request and build the generation arguments
+    
+    Returns:
+        (error response, None) or (None, (page, ai_service, generation args, generation kwargs))
+    """
+    page = Page.query.get(page_id)
+    
+    if not page or page.project_id != project_id:
+        return not_found('Page'), None
+    
+    project = Project.query.get(project_id)
+    if not project:
+        return not_found('Project'), None
+    
+    force_regenerate = data.get('force_regenerate', False)
+    language = data.get('language', current_app.config.get('OUTPUT_LANGUAGE', 'zh'))
+    
+    # Check if already generated
+    if page.get_description_content() and not force_regenerate:
+        return bad_request("Description already exists. Set force_regenerate=true to regenerate"), None
+    
+    # Get outline content
+    outline_content = page.get_outline_content()
+    if not outline_content:
+        return bad_request("Page must have outline content first"), None
+    
+    # Reconstruct full outline
+    all_pages = Page.query.filter_by(project_id=project_id).order_by(Page.order_index).all()
+    outline = []
+    for p in all_pages:
+        oc = p.get_outline_content()
+        if oc:
+            page_data = oc.copy()
+            if p.part:
+                page_data['part'] = p.part
+            outline.append(page_data)
+    
+    # Initialize AI service
+    ai_service = AIService()
+    
+    # Get reference files content and create project context
+    from controllers.project_controller import _get_project_reference_files_content
+    reference_files_content = _get_project_reference_files_content(project_id)
+    project_context = ProjectContext(project, reference_files_content)
+    
+    page_data = outline_content.copy()
+    if page.part:
+        page_data['part'] = page.part
+    
+    args = (project_context, outline, page_data, page.order_index + 1)
+    # 用户明确要求重新生成时不返回缓存的旧结果
+    kwargs = {'language': language, 'use_cache': not force_regenerate}
+    return None, (page, ai_service, args, kwargs)
+
+
+def _save_page_description(page, desc_text):
+    """Persist a generated description on the page (caller commits)"""
+    desc_content = {
+        "text": desc_text,
+        "generated_at": datetime.utcnow().isoformat()
+    }
+    
+    page.set_description_content(desc_content)
+    page.status = 'DESCRIPTION_GENERATED'
+    page.updated_at = datetime.utcnow()
+
+
 @page_bp.route('/<project_id>/pages/<page_id>/generate/description', methods=['POST'])
+@idempotent
 def generate_page_description(project_id, page_id):
     """
     POST /api/projects/{project_id}/pages/{page_id}/generate/description - Generate single page description
@@ -198,70 +272,16 @@ def generate_page_description(project_id, page_id):
     }
     """
     try:
-        page = Page.query.get(page_id)
-        
-        if not page or page.project_id != project_id:
-            return not_found('Page')
-        
-        project = Project.query.get(project_id)
-        if not project:
-            return not_found('Project')
-        
-        data = request.get_json() or {}
-        force_regenerate = data.get('force_regenerate', False)
-        language = data.get('language', current_app.config.get('OUTPUT_LANGUAGE', 'zh'))
-        
-        # Check if already generated
-        if page.get_description_content() and not force_regenerate:
-            return bad_request("Description already exists. Set force_regenerate=true to regenerate")
-        
-        # Get outline content
-        outline_content = page.get_outline_content()
-        if not outline_content:
-            return bad_request("Page must have outline content first")
-        
-        # Reconstruct full outline
-        all_pages = Page.query.filter_by(project_id=project_id).order_by(Page.order_index).all()
-        outline = []
-        for p in all_pages:
-            oc = p.get_outline_content()
-            if oc:
-                page_data = oc.copy()
-                if p.part:
-                    page_data['part'] = p.part
-                outline.append(page_data)
-        
-        # Initialize AI service
-        ai_service = AIService()
-        
-        # Get reference files content and create project context
-        from controllers.project_controller import _get_project_reference_files_content
-        reference_files_content = _get_project_reference_files_content(project_id)
-        project_context = ProjectContext(project, reference_files_content)
+        error, prepared = _prepare_page_description(project_id, page_id, request.get_json() or {})
+        if error:
+            return error
+        page, ai_service, args, kwargs = prepared
         
         # Generate description
-        page_data = outline_content.copy()
-        if page.part:
-            page_data['part'] = page.part
-        
-        desc_text = ai_service.generate_page_description(
-            project_context,
-            outline,
-            page_data,
-            page.order_index + 1,
-            language=language
-        )
+        desc_text = ai_service.generate_page_description(*args, **kwargs)
         
         # Save description
-        desc_content = {
-            "text": desc_text,
-            "generated_at": datetime.utcnow().isoformat()
-        }
-        
-        page.set_description_content(desc_content)
-        page.status = 'DESCRIPTION_GENERATED'
-        page.updated_at = datetime.utcnow()
-        
+        _save_page_description(page, desc_text)
         db.session.commit()
         
         return success_response(page.to_dict())
@@ -271,7 +291,64 @@ def generate_page_description(project_id, page_id):
         return error_response('AI_SERVICE_ERROR', str(e), 503)
 
 
+@page_bp.route('/<project_id>/pages/<page_id>/generate/description/stream', methods=['POST'])
+def stream_page_description(project_id, page_id):
+    """
+    POST /api/projects/{project_id}/pages/{page_id}/generate/description/stream - Stream a page description
+    
+    Same request body and validation errors as generate/description, but the
+    description is returned as Server-Sent Events while it is generated:
+        delta: {text}     - next chunk of the description
+        done: {page}      - final page (description saved)
+        error: {message}  - generation failed, nothing was saved
+    
+    The description is only saved once the full text has arrived; a client
+    that disconnects early leaves the page unchanged.
+    """
+    try:
+        error, prepared = _prepare_page_description(project_id, page_id, request.get_json() or {})
+    except Exception as e:
+        db.session.rollback()
+        return error_response('AI_SERVICE_ERROR', str(e), 503)
+    if error:
+        return error
+    _, ai_service, args, kwargs = prepared
+    
+    def event(name, data):
+        return f"event: {name}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+    
+    def generate():
+        chunks = []
+        try:
+            for chunk in ai_service.stream_page_description(*args, **kwargs):
+                chunks.append(chunk)
+                yield event('delta', {'text': chunk})
+            
+            page = Page.query.get(page_id)
+            if not page:
+                yield event('error', {'message': 'Page was deleted during generation'})
+                return
+            _save_page_description(page, dedent(''.join(chunks)))
+            db.session.commit()
+            yield event('done', {'page': page.to_dict()})
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"stream_page_description failed: {str(e)}", exc_info=True)
+            yield event('error', {'message': str(e)})
+        finally:
+            db.session.remove()
+    
+    # 释放请求上下文中的数据库会话，生成期间不占用连接；结束时重新查询页面再保存
+    db.session.remove()
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
 @page_bp.route('/<project_id>/pages/<page_id>/generate/image', methods=['POST'])
+@idempotent
 def generate_page_image(project_id, page_id):
     """
     POST /api/projects/{project_id}/pages/{page_id}/generate/image - Generate single page image
@@ -279,7 +356,7 @@ def generate_page_image(project_id, page_id):
     Request body:
     {
         "use_template": true,
-        "force_regenerate": false
+        "force_regenerate": false  # required when the page has an image; bypasses the image result cache
     }
     """
     try:
@@ -394,19 +471,60 @@ def generate_page_image(project_id, page_id):
                 additional_ref_images = image_urls
                 has_material_images = True
         
-        # Create async task for image generation
-        task = Task(
-            project_id=project_id,
+        # 相同输入的生成请求只执行一次：已有进行中的任务时直接返回其 task_id
+        fingerprint = compute_fingerprint(
             task_type='GENERATE_PAGE_IMAGE',
-            status='PENDING'
+            project_id=project_id,
+            page_id=page_id,
+            outline=outline,
+            page_outline=page_data,
+            description=desc_text,
+            template=file_fingerprint(ref_image_path),
+            use_template=use_template,
+            extra_requirements=project.extra_requirements,
+            aspect_ratio=current_app.config['DEFAULT_ASPECT_RATIO'],
+            resolution=current_app.config['DEFAULT_RESOLUTION'],
+            language=language,
+            image_model=ai_service.image_model
         )
-        task.set_progress({
-            'total': 1,
-            'completed': 0,
-            'failed': 0
-        })
-        db.session.add(task)
-        db.session.commit()
+        
+        with single_flight.lock(fingerprint):
+            existing = single_flight.find_inflight_task(project_id, fingerprint)
+            if existing:
+                logger.info(f"Duplicate image request for page {page_id}, attaching to task {existing.id}")
+                return success_response({
+                    'task_id': existing.id,
+                    'page_id': page_id,
+                    'status': existing.status,
+                    'deduplicated': True
+                }, status_code=202)
+            
+            # 队列已满时拒绝（429 + Retry-After）
+            admission_controller.check('GENERATE_PAGE_IMAGE')
+            
+            # Create async task for image generation
+            task = Task(
+                project_id=project_id,
+                task_type='GENERATE_PAGE_IMAGE',
+                status='PENDING',
+                fingerprint=fingerprint
+            )
+            task.set_progress({
+                'total': 1,
+                'completed': 0,
+                'failed': 0
+            })
+            task.set_payload({
+                'page_id': page_id,
+                'use_template': use_template,
+                'aspect_ratio': current_app.config['DEFAULT_ASPECT_RATIO'],
+                'resolution': current_app.config['DEFAULT_RESOLUTION'],
+                'extra_requirements': project.extra_requirements,
+                'language': language,
+                'new_variation': bool(force_regenerate)
+            })
+            db.session.add(task)
+            db.session.commit()
         
         # Get app instance for background task
         app = current_app._get_current_object()
@@ -425,7 +543,8 @@ def generate_page_image(project_id, page_id):
             current_app.config['DEFAULT_RESOLUTION'],
             app,
             project.extra_requirements,
-            language
+            language,
+            new_variation=bool(force_regenerate)
         )
         
         # Return task_id immediately
@@ -435,12 +554,16 @@ def generate_page_image(project_id, page_id):
             'status': 'PENDING'
         }, status_code=202)
     
+    except QueueFullError as e:
+        return queue_full_error(str(e), e.retry_after)
+    
     except Exception as e:
         db.session.rollback()
         return error_response('AI_SERVICE_ERROR', str(e), 503)
 
 
 @page_bp.route('/<project_id>/pages/<page_id>/edit/image', methods=['POST'])
+@idempotent
 def edit_page_image(project_id, page_id):
     """
     POST /api/projects/{project_id}/pages/{page_id}/edit/image - Edit page image
@@ -500,6 +623,9 @@ def edit_page_image(project_id, page_id):
         if not data or 'edit_instruction' not in data:
             return bad_request("edit_instruction is required")
         
+        # 队列已满时拒绝（429 + Retry-After），在保存上传文件之前检查
+        admission_controller.check('EDIT_PAGE_IMAGE')
+        
         # Get current image path
         current_image_path = file_service.get_absolute_path(page.generated_image_path)
         
@@ -546,26 +672,12 @@ def edit_page_image(project_id, page_id):
             if isinstance(desc_image_urls, list):
                 additional_ref_images.extend(desc_image_urls)
         
-        # 3. Save and add uploaded files to a persistent location
+        # 3. Save uploaded files under the project's upload storage (paths relative to the
+        #    upload folder, so any worker sharing it can read them; the task deletes them when done)
         temp_dir = None
+        uploaded_ref_images = []
         if uploaded_files:
-            # Create a temporary directory in the project's upload folder
-            import tempfile
-            import shutil
-            from werkzeug.utils import secure_filename
-            temp_dir = Path(tempfile.mkdtemp(dir=current_app.config['UPLOAD_FOLDER']))
-            try:
-                for uploaded_file in uploaded_files:
-                    if uploaded_file.filename:
-                        # Save to temp directory
-                        temp_path = temp_dir / secure_filename(uploaded_file.filename)
-                        uploaded_file.save(str(temp_path))
-                        additional_ref_images.append(str(temp_path))
-            except Exception as e:
-                # Clean up temp directory on error
-                if temp_dir and temp_dir.exists():
-                    shutil.rmtree(temp_dir)
-                raise e
+            temp_dir, uploaded_ref_images = file_service.save_task_uploads(uploaded_files, project_id)
         
         # Create async task for image editing
         task = Task(
@@ -578,6 +690,16 @@ def edit_page_image(project_id, page_id):
             'completed': 0,
             'failed': 0
         })
+        task.set_payload({
+            'page_id': page_id,
+            'edit_instruction': data['edit_instruction'],
+            'aspect_ratio': current_app.config['DEFAULT_ASPECT_RATIO'],
+            'resolution': current_app.config['DEFAULT_RESOLUTION'],
+            'original_description': original_description,
+            'additional_ref_images': additional_ref_images if additional_ref_images else None,
+            'uploaded_ref_images': uploaded_ref_images if uploaded_ref_images else None,
+            'temp_dir': temp_dir
+        })
         db.session.add(task)
         db.session.commit()
         
@@ -597,8 +719,9 @@ def edit_page_image(project_id, page_id):
             current_app.config['DEFAULT_RESOLUTION'],
             original_description,
             additional_ref_images if additional_ref_images else None,
-            str(temp_dir) if temp_dir else None,
-            app
+            uploaded_ref_images=uploaded_ref_images if uploaded_ref_images else None,
+            temp_dir=temp_dir,
+            app=app
         )
         
         # Return task_id immediately
@@ -608,6 +731,9 @@ def edit_page_image(project_id, page_id):
             'status': 'PENDING'
         }, status_code=202)
     
+    except QueueFullError as e:
+        return queue_full_error(str(e), e.retry_after)
+    
     except Exception as e:
         db.session.rollback()
         return error_response('AI_SERVICE_ERROR', str(e), 503)
@@ -637,6 +763,7 @@ def get_page_image_versions(project_id, page_id):
 
 
 @page_bp.route('/<project_id>/pages/<page_id>/image-versions/<version_id>/set-current', methods=['POST'])
+@idempotent
 def set_current_image_version(project_id, page_id, version_id):
     """
     POST /api/projects/{project_id}/pages/{page_id}/image-versions/{version_id}/set-current
@@ -659,6 +786,8 @@ def set_current_image_version(project_id, page_id, version_id):
         # Set this version as current
         version.is_current = True
         page.generated_image_path = version.image_path
+        # 旧版本图片的生成输入未知，下次批量生成时不跳过该页
+        page.image_fingerprint = None
         page.updated_at = datetime.utcnow()
         
         db.session.commit()
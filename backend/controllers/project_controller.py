@@ -2,12 +2,18 @@
 Project Controller - handles project-related endpoints
 """
 import logging
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
 from werkzeug.exceptions import BadRequest
 from models import db, Project, Page, Task, ReferenceFile
-from utils import success_response, error_response, not_found, bad_request
+from utils import success_response, error_response, not_found, bad_request, queue_full_error
+from services.admission import admission_controller, QueueFullError
+from services.outline_reconciler import reconcile_pages, project_status_after_reconcile
+from services.idempotency import idempotent
+from services.single_flight import single_flight, compute_fingerprint, file_fingerprint, page_image_fingerprint
 from services import AIService, ProjectContext
-from services.task_manager import task_manager, generate_descriptions_task, generate_images_task
+from services.task_manager import (
+    task_manager, generate_descriptions_task, generate_images_task, generate_deck_task
+)
 import json
 import traceback
 from datetime import datetime
@@ -25,7 +31,7 @@ def _get_project_reference_files_content(project_id: str) -> list:
         project_id: Project ID
         
     Returns:
-        List of dicts with 'filename' and 'content' keys
+        List of dicts with 'filename', 'content' and 'chunk_index' (None for files indexed on use) keys
     """
     reference_files = ReferenceFile.query.filter_by(
         project_id=project_id,
@@ -37,7 +43,8 @@ def _get_project_reference_files_content(project_id: str) -> list:
         if ref_file.markdown_content:
             files_content.append({
                 'filename': ref_file.filename,
-                'content': ref_file.markdown_content
+                'content': ref_file.markdown_content,
+                'chunk_index': ref_file.get_chunk_index()
             })
     
     return files_content
@@ -131,6 +138,7 @@ def list_projects():
 
 
 @project_bp.route('', methods=['POST'])
+@idempotent
 def create_project():
     """
     POST /api/projects - Create a new project
@@ -265,6 +273,17 @@ def delete_project(project_id):
         if not project:
             return not_found('Project')
         
+        # 先取消该项目仍在排队/执行的任务，避免继续为将被删除的页面调用 AI
+        from services.task_status_store import ACTIVE_TASK_STATUSES
+        active_task_ids = [
+            task.id for task in Task.query.filter(
+                Task.project_id == project_id,
+                Task.status.in_(ACTIVE_TASK_STATUSES)
+            ).all()
+        ]
+        for task_id in active_task_ids:
+            task_manager.cancel_task(task_id)
+        
         # Delete project files
         from services import FileService
         file_service = FileService(current_app.config['UPLOAD_FOLDER'])
@@ -283,6 +302,7 @@ def delete_project(project_id):
 
 
 @project_bp.route('/<project_id>/generate/outline', methods=['POST'])
+@idempotent
 def generate_outline(project_id):
     """
     POST /api/projects/{project_id}/generate/outline - Generate outline
@@ -293,7 +313,8 @@ def generate_outline(project_id):
     Request body (optional):
     {
         "idea_prompt": "...",  # for idea type
-        "language": "zh"  # output language: zh, en, ja, auto
+        "language": "zh",  # output language: zh, en, ja, auto
+        "force": false  # bypass the response cache (implied when the project already has pages)
     }
     """
     try:
@@ -308,6 +329,8 @@ def generate_outline(project_id):
         # Get request data and language parameter
         data = request.get_json() or {}
         language = data.get('language', current_app.config.get('OUTPUT_LANGUAGE', 'zh'))
+        # 项目已有页面时是“重新生成大纲”，必须得到新的结果而不是缓存的旧大纲
+        use_cache = not (data.get('force') or Page.query.filter_by(project_id=project_id).first())
         
         # Get reference files content and create project context
         reference_files_content = _get_project_reference_files_content(project_id)
@@ -326,7 +349,7 @@ def generate_outline(project_id):
             
             # Create project context and parse outline text into structured format
             project_context = ProjectContext(project, reference_files_content)
-            outline = ai_service.parse_outline_text(project_context, language=language)
+            outline = ai_service.parse_outline_text(project_context, language=language, use_cache=use_cache)
         elif project.creation_type == 'descriptions':
             # 从描述生成：这个类型应该使用专门的端点
             return bad_request("Use /generate/from-description endpoint for descriptions type")
@@ -341,44 +364,28 @@ def generate_outline(project_id):
             
             # Create project context and generate outline from idea
             project_context = ProjectContext(project, reference_files_content)
-            outline = ai_service.generate_outline(project_context, language=language)
+            outline = ai_service.generate_outline(project_context, language=language, use_cache=use_cache)
         
         # Flatten outline to pages
         pages_data = ai_service.flatten_outline(outline)
         
-        # Delete existing pages (using ORM session to trigger cascades)
-        old_pages = Page.query.filter_by(project_id=project_id).all()
-        for old_page in old_pages:
-            db.session.delete(old_page)
-        
-        # Create pages from outline
-        pages_list = []
-        for i, page_data in enumerate(pages_data):
-            page = Page(
-                project_id=project_id,
-                order_index=i,
-                part=page_data.get('part'),
-                status='DRAFT'
-            )
-            page.set_outline_content({
-                'title': page_data.get('title'),
-                'points': page_data.get('points', [])
-            })
-            
-            db.session.add(page)
-            pages_list.append(page)
+        # 与已有页面对比合并：未变化的页面保留描述和图片，只有新增/变化的页面需要重新生成
+        result = reconcile_pages(project_id, pages_data)
+        pages_list = result.pages
         
         # Update project status
-        project.status = 'OUTLINE_GENERATED'
+        project.status = project_status_after_reconcile(pages_list)
         project.updated_at = datetime.utcnow()
         
         db.session.commit()
         
-        logger.info(f"大纲生成完成: 项目 {project_id}, 创建了 {len(pages_list)} 个页面")
+        logger.info(f"大纲生成完成: 项目 {project_id}, {len(pages_list)} 个页面, {result.summary()}")
         
         # Return pages
         return success_response({
-            'pages': [page.to_dict() for page in pages_list]
+            'pages': [page.to_dict() for page in pages_list],
+            'reconciliation': result.summary(),
+            'dirty_page_ids': [page.id for page in result.dirty_pages]
         })
     
     except Exception as e:
@@ -388,6 +395,7 @@ def generate_outline(project_id):
 
 
 @project_bp.route('/<project_id>/generate/from-description', methods=['POST'])
+@idempotent
 def generate_from_description(project_id):
     """
     POST /api/projects/{project_id}/generate/from-description - Generate outline and page descriptions from description text
@@ -505,6 +513,7 @@ def generate_from_description(project_id):
 
 
 @project_bp.route('/<project_id>/generate/descriptions', methods=['POST'])
+@idempotent
 def generate_descriptions(project_id):
     """
     POST /api/projects/{project_id}/generate/descriptions - Generate descriptions
@@ -512,7 +521,8 @@ def generate_descriptions(project_id):
     Request body:
     {
         "max_workers": 5,
-        "language": "zh"  # output language: zh, en, ja, auto
+        "language": "zh",  # output language: zh, en, ja, auto
+        "retry_failed_only": false  # only regenerate pages whose description failed
     }
     """
     try:
@@ -521,7 +531,12 @@ def generate_descriptions(project_id):
         if not project:
             return not_found('Project')
         
-        if project.status not in ['OUTLINE_GENERATED', 'DRAFT', 'DESCRIPTIONS_GENERATED']:
+        data = request.get_json() or {}
+        allowed_statuses = ['OUTLINE_GENERATED', 'DRAFT', 'DESCRIPTIONS_GENERATED']
+        if data.get('retry_failed_only'):
+            # 有页面失败的运行结束后项目停留在 GENERATING_DESCRIPTIONS
+            allowed_statuses.append('GENERATING_DESCRIPTIONS')
+        if project.status not in allowed_statuses:
             return bad_request("Project must have outline generated first")
         
         # IMPORTANT: Expire cached objects to ensure fresh data
@@ -536,11 +551,21 @@ def generate_descriptions(project_id):
         # Reconstruct outline from pages with part structure
         outline = _reconstruct_outline_from_pages(pages)
         
-        data = request.get_json() or {}
         # 从配置中读取默认并发数，如果请求中提供了则使用请求的值
         max_workers = data.get('max_workers', current_app.config.get('MAX_DESCRIPTION_WORKERS', 5))
         language = data.get('language', current_app.config.get('OUTPUT_LANGUAGE', 'zh'))
         
+        # 只重新生成描述失败的页面（图片生成失败的页面已有描述，不在此列）
+        page_ids = None
+        if data.get('retry_failed_only'):
+            page_ids = [p.id for p in pages if p.status == 'FAILED' and not p.description_content]
+            if not page_ids:
+                return bad_request("No failed pages to retry")
+        total_pages = len(page_ids) if page_ids is not None else len(pages)
+        
+        # 队列已满时拒绝（429 + Retry-After），而不是让任务无限期 PENDING
+        admission_controller.check('GENERATE_DESCRIPTIONS')
+        
         # Create task
         task = Task(
             project_id=project_id,
@@ -548,10 +573,16 @@ def generate_descriptions(project_id):
             status='PENDING'
         )
         task.set_progress({
-            'total': len(pages),
+            'total': total_pages,
             'completed': 0,
             'failed': 0
         })
+        # 持久化可序列化的任务参数，重启后或独立 worker 可据此重建任务
+        task.set_payload({
+            'max_workers': max_workers,
+            'language': language,
+            'page_ids': page_ids
+        })
         
         db.session.add(task)
         db.session.commit()
@@ -576,7 +607,8 @@ def generate_descriptions(project_id):
             outline,
             max_workers,
             app,
-            language
+            language,
+            page_ids=page_ids
         )
         
         # Update project status
@@ -586,9 +618,12 @@ def generate_descriptions(project_id):
         return success_response({
             'task_id': task.id,
             'status': 'GENERATING_DESCRIPTIONS',
-            'total_pages': len(pages)
+            'total_pages': total_pages
         }, status_code=202)
     
+    except QueueFullError as e:
+        return queue_full_error(str(e), e.retry_after)
+    
     except Exception as e:
         db.session.rollback()
         logger.error(f"generate_descriptions failed: {str(e)}", exc_info=True)
@@ -596,6 +631,7 @@ def generate_descriptions(project_id):
 
 
 @project_bp.route('/<project_id>/generate/images', methods=['POST'])
+@idempotent
 def generate_images(project_id):
     """
     POST /api/projects/{project_id}/generate/images - Generate images
@@ -604,8 +640,14 @@ def generate_images(project_id):
     {
         "max_workers": 8,
         "use_template": true,
-        "language": "zh"  # output language: zh, en, ja, auto
+        "language": "zh",  # output language: zh, en, ja, auto
+        "retry_failed_only": false,  # only regenerate pages in FAILED status
+        "force": false  # also regenerate pages whose image already matches their inputs
     }
+    
+    Pages whose current image was generated from the same inputs (description,
+    outline, template, extra requirements, language, resolution, model) are skipped.
+    With force, the image result cache is bypassed as well so every page gets a new variation.
     """
     try:
         project = Project.query.get(project_id)
@@ -634,40 +676,237 @@ def generate_images(project_id):
         use_template = data.get('use_template', True)
         language = data.get('language', current_app.config.get('OUTPUT_LANGUAGE', 'zh'))
         
-        # Create task
+        # 只重新生成失败的页面，已成功的页面保持不变
+        page_ids = None
+        if data.get('retry_failed_only'):
+            page_ids = [p.id for p in pages if p.status == 'FAILED']
+            if not page_ids:
+                return bad_request("No failed pages to retry")
+        
+        # Initialize services
+        ai_service = AIService()
+        
+        from services import FileService
+        file_service = FileService(current_app.config['UPLOAD_FOLDER'])
+        template_hash = file_fingerprint(file_service.get_template_path(project_id)) if use_template else None
+        
+        # 增量生成：当前图片的输入指纹与现在一致的页面直接跳过（force 时全部重新生成）
+        skipped_pages = 0
+        force = bool(data.get('force', False))
+        if not force:
+            image_inputs = dict(
+                template_hash=template_hash, extra_requirements=project.extra_requirements,
+                language=language, aspect_ratio=current_app.config['DEFAULT_ASPECT_RATIO'],
+                resolution=current_app.config['DEFAULT_RESOLUTION'], image_model=ai_service.image_model
+            )
+            candidates = [p for p in pages if page_ids is None or p.id in page_ids]
+            stale_ids = [
+                p.id for p in candidates
+                if not (p.generated_image_path and p.status != 'FAILED' and p.image_fingerprint
+                        and p.image_fingerprint == page_image_fingerprint(p, **image_inputs))
+            ]
+            skipped_pages = len(candidates) - len(stale_ids)
+            if not stale_ids:
+                logger.info(f"generate_images: all {skipped_pages} pages of project {project_id} are up to date")
+                return success_response({
+                    'task_id': None,
+                    'status': project.status,
+                    'total_pages': 0,
+                    'skipped_pages': skipped_pages
+                })
+            if skipped_pages:
+                page_ids = stale_ids
+        total_pages = len(page_ids) if page_ids is not None else len(pages)
+        
+        # 相同输入的批量生成请求只执行一次：已有进行中的任务时直接返回其 task_id
+        fingerprint = compute_fingerprint(
+            task_type='GENERATE_IMAGES',
+            project_id=project_id,
+            pages=[(p.id, p.part, p.outline_content, p.description_content) for p in pages],
+            template=template_hash,
+            use_template=use_template,
+            extra_requirements=project.extra_requirements,
+            aspect_ratio=current_app.config['DEFAULT_ASPECT_RATIO'],
+            resolution=current_app.config['DEFAULT_RESOLUTION'],
+            language=language,
+            image_model=ai_service.image_model,
+            page_ids=page_ids
+        )
+        
+        with single_flight.lock(fingerprint):
+            existing = single_flight.find_inflight_task(project_id, fingerprint)
+            if existing:
+                logger.info(f"Duplicate generate_images request for project {project_id}, attaching to task {existing.id}")
+                return success_response({
+                    'task_id': existing.id,
+                    'status': 'GENERATING_IMAGES',
+                    'total_pages': total_pages,
+                    'deduplicated': True
+                }, status_code=202)
+            
+            admission_controller.check('GENERATE_IMAGES')
+            
+            # Create task
+            task = Task(
+                project_id=project_id,
+                task_type='GENERATE_IMAGES',
+                status='PENDING',
+                fingerprint=fingerprint
+            )
+            task.set_progress({
+                'total': total_pages,
+                'completed': 0,
+                'failed': 0
+            })
+            task.set_payload({
+                'use_template': use_template,
+                'max_workers': max_workers,
+                'aspect_ratio': current_app.config['DEFAULT_ASPECT_RATIO'],
+                'resolution': current_app.config['DEFAULT_RESOLUTION'],
+                'extra_requirements': project.extra_requirements,
+                'language': language,
+                'page_ids': page_ids,
+                'new_variation': force
+            })
+            
+            db.session.add(task)
+            db.session.commit()
+        
+        # Get app instance for background task
+        app = current_app._get_current_object()
+        
+        # Submit background task
+        task_manager.submit_task(
+            task.id,
+            generate_images_task,
+            project_id,
+            ai_service,
+            file_service,
+            outline,
+            use_template,
+            max_workers,
+            current_app.config['DEFAULT_ASPECT_RATIO'],
+            current_app.config['DEFAULT_RESOLUTION'],
+            app,
+            project.extra_requirements,
+            language,
+            page_ids=page_ids,
+            new_variation=force
+        )
+        
+        # Update project status
+        project.status = 'GENERATING_IMAGES'
+        db.session.commit()
+        
+        return success_response({
+            'task_id': task.id,
+            'status': 'GENERATING_IMAGES',
+            'total_pages': total_pages,
+            'skipped_pages': skipped_pages
+        }, status_code=202)
+    
+    except QueueFullError as e:
+        return queue_full_error(str(e), e.retry_after)
+    
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"generate_images failed: {str(e)}", exc_info=True)
+        return error_response('SERVER_ERROR', str(e), 500)
+
+
+@project_bp.route('/<project_id>/generate/deck', methods=['POST'])
+@idempotent
+def generate_deck(project_id):
+    """
+    POST /api/projects/{project_id}/generate/deck - Generate descriptions and images in one pipelined task
+    
+    Each page's image generation starts as soon as its description is ready,
+    so the two stages overlap. Task progress reports per-stage counters in
+    progress.stages.descriptions / progress.stages.images.
+    
+    Request body:
+    {
+        "max_description_workers": 5,
+        "max_image_workers": 8,
+        "use_template": true,
+        "language": "zh"  # output language: zh, en, ja, auto
+    }
+    """
+    try:
+        project = Project.query.get(project_id)
+        
+        if not project:
+            return not_found('Project')
+        
+        if project.status not in ['OUTLINE_GENERATED', 'DRAFT', 'DESCRIPTIONS_GENERATED', 'COMPLETED']:
+            return bad_request("Project must have outline generated first")
+        
+        # IMPORTANT: Expire cached objects to ensure fresh data
+        db.session.expire_all()
+        
+        pages = Page.query.filter_by(project_id=project_id).order_by(Page.order_index).all()
+        
+        if not pages:
+            return bad_request("No pages found for project")
+        
+        outline = _reconstruct_outline_from_pages(pages)
+        
+        data = request.get_json() or {}
+        max_description_workers = data.get('max_description_workers', current_app.config.get('MAX_DESCRIPTION_WORKERS', 5))
+        max_image_workers = data.get('max_image_workers', current_app.config.get('MAX_IMAGE_WORKERS', 8))
+        use_template = data.get('use_template', True)
+        language = data.get('language', current_app.config.get('OUTPUT_LANGUAGE', 'zh'))
+        
+        admission_controller.check('GENERATE_DECK')
+        
         task = Task(
             project_id=project_id,
-            task_type='GENERATE_IMAGES',
+            task_type='GENERATE_DECK',
             status='PENDING'
         )
         task.set_progress({
             'total': len(pages),
             'completed': 0,
-            'failed': 0
+            'failed': 0,
+            'stages': {
+                'descriptions': {'total': len(pages), 'completed': 0, 'failed': 0},
+                'images': {'total': len(pages), 'completed': 0, 'failed': 0},
+            }
+        })
+        task.set_payload({
+            'use_template': use_template,
+            'max_description_workers': max_description_workers,
+            'max_image_workers': max_image_workers,
+            'aspect_ratio': current_app.config['DEFAULT_ASPECT_RATIO'],
+            'resolution': current_app.config['DEFAULT_RESOLUTION'],
+            'extra_requirements': project.extra_requirements,
+            'language': language
         })
         
         db.session.add(task)
         db.session.commit()
         
-        # Initialize services
         ai_service = AIService()
         
         from services import FileService
         file_service = FileService(current_app.config['UPLOAD_FOLDER'])
         
-        # Get app instance for background task
+        reference_files_content = _get_project_reference_files_content(project_id)
+        project_context = ProjectContext(project, reference_files_content)
+        
         app = current_app._get_current_object()
         
-        # Submit background task
         task_manager.submit_task(
             task.id,
-            generate_images_task,
+            generate_deck_task,
             project_id,
             ai_service,
+            project_context,
             file_service,
             outline,
             use_template,
-            max_workers,
+            max_description_workers,
+            max_image_workers,
             current_app.config['DEFAULT_ASPECT_RATIO'],
             current_app.config['DEFAULT_RESOLUTION'],
             app,
@@ -675,19 +914,87 @@ def generate_images(project_id):
             language
         )
         
-        # Update project status
-        project.status = 'GENERATING_IMAGES'
+        project.status = 'GENERATING_DESCRIPTIONS'
         db.session.commit()
         
         return success_response({
             'task_id': task.id,
-            'status': 'GENERATING_IMAGES',
+            'status': 'GENERATING_DESCRIPTIONS',
             'total_pages': len(pages)
         }, status_code=202)
     
+    except QueueFullError as e:
+        return queue_full_error(str(e), e.retry_after)
+    
     except Exception as e:
         db.session.rollback()
-        logger.error(f"generate_images failed: {str(e)}", exc_info=True)
+        logger.error(f"generate_deck failed: {str(e)}", exc_info=True)
+        return error_response('SERVER_ERROR', str(e), 500)
+
+
+def _add_queue_info(task_data: dict, task: Task = None) -> dict:
+    """
+    Add scheduling info to a task status dict
+    
+    priority_class: interactive | bulk
+    queue_position: 1-based position among tasks waiting to run (PENDING only, else None)
+    """
+    from services import task_queue
+    from services.task_scheduler import task_class
+    task_data['priority_class'] = task_class(task_data.get('task_type'))
+    position = None
+    if task_data.get('status') == 'PENDING':
+        position = task_manager.queue_position(task_data['task_id'])
+        if position is None and task is not None:
+            # worker 模式下任务在其他进程排队，按共享队列估算位置
+            position = task_queue.queue_position(task)
+    task_data['queue_position'] = position
+    return task_data
+
+
+@project_bp.route('/<project_id>/tasks', methods=['GET'])
+def list_project_tasks(project_id):
+    """
+    GET /api/projects/{project_id}/tasks - List tasks of a project
+    
+    Query params:
+        status: "active" returns every PENDING/PROCESSING/CANCELLING task in one response,
+                served from the in-memory task status store; any other value
+                filters by that exact status (database query)
+        limit: Maximum number of tasks for non-active queries (default 50)
+    """
+    try:
+        from services.task_status_store import task_status_store, ACTIVE_TASK_STATUSES
+        status = request.args.get('status')
+        
+        if status == 'active' and current_app.config.get('TASK_QUEUE_MODE', 'inline') != 'worker':
+            tasks = task_status_store.list_active(project_id)
+            for task in tasks:
+                task.pop('project_id', None)
+                _add_queue_info(task)
+            return success_response({'tasks': tasks})
+        
+        project = Project.query.get(project_id)
+        if not project:
+            return not_found('Project')
+        
+        # worker 模式下任务在其他进程执行，内存中没有它们的状态，回退到数据库
+        query = Task.query.filter_by(project_id=project_id)
+        if status == 'active':
+            query = query.filter(Task.status.in_(ACTIVE_TASK_STATUSES)).order_by(Task.created_at)
+        else:
+            if status:
+                query = query.filter_by(status=status)
+            try:
+                limit = min(int(request.args.get('limit', 50)), 200)
+            except ValueError:
+                return bad_request("limit must be an integer")
+            query = query.order_by(Task.created_at.desc()).limit(limit)
+        
+        return success_response({'tasks': [_add_queue_info(task.to_dict(), task) for task in query.all()]})
+    
+    except Exception as e:
+        logger.error(f"list_project_tasks failed: {str(e)}", exc_info=True)
         return error_response('SERVER_ERROR', str(e), 500)
 
 
@@ -697,19 +1004,106 @@ def get_task_status(project_id, task_id):
     GET /api/projects/{project_id}/tasks/{task_id} - Get task status
     """
     try:
+        # 活跃任务直接从内存中的状态表读取，避免每次轮询都查询数据库
+        # （worker 模式下任务在其他进程执行，内存快照不会更新，只能查库）
+        if current_app.config.get('TASK_QUEUE_MODE', 'inline') != 'worker':
+            from services.task_status_store import task_status_store
+            snapshot = task_status_store.get(task_id)
+            if snapshot and snapshot.pop('project_id') == project_id:
+                return success_response(_add_queue_info(snapshot))
+        
         task = Task.query.get(task_id)
         
         if not task or task.project_id != project_id:
             return not_found('Task')
         
-        return success_response(task.to_dict())
+        return success_response(_add_queue_info(task.to_dict(), task))
     
     except Exception as e:
         logger.error(f"get_task_status failed: {str(e)}", exc_info=True)
         return error_response('SERVER_ERROR', str(e), 500)
 
 
+@project_bp.route('/<project_id>/tasks/<task_id>/cancel', methods=['POST'])
+@idempotent
+def cancel_task(project_id, task_id):
+    """
+    POST /api/projects/{project_id}/tasks/{task_id}/cancel - Cancel a task
+    
+    A queued task is cancelled immediately (status CANCELLED); a running task
+    is marked CANCELLING and stops at its next checkpoint, after which its
+    status becomes CANCELLED. Pages finished before the cancel keep their results.
+    """
+    try:
+        task = Task.query.get(task_id)
+        if not task or task.project_id != project_id:
+            return not_found('Task')
+        
+        status = task_manager.cancel_task(task_id)
+        if status is None:
+            db.session.refresh(task)
+            if task.status not in ('CANCELLING', 'CANCELLED'):
+                return error_response('INVALID_TASK_STATUS',
+                                      f"Task is already {task.status} and cannot be cancelled", 409)
+            status = task.status
+        
+        return success_response({
+            'task_id': task_id,
+            'status': status
+        }, status_code=202)
+    
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"cancel_task failed: {str(e)}", exc_info=True)
+        return error_response('SERVER_ERROR', str(e), 500)
+
+
+@project_bp.route('/<project_id>/events', methods=['GET'])
+def stream_project_events(project_id):
+    """
+    GET /api/projects/{project_id}/events - Server-Sent Events stream of progress
+    
+    Events:
+        task: {task_id, task_type, status, progress, error_message}
+        page: {page_id, status, generated_image_url, updated_at[, description_content]}
+        page_deleted: {page_id}
+    
+    Events are pushed from committed changes in this process, so any number of
+    clients can watch a project without extra database reads. A comment line is
+    sent every SSE_HEARTBEAT_SECONDS to keep proxies from closing the stream.
+    """
+    from services.progress_events import progress_broker
+    import queue
+    
+    project = Project.query.get(project_id)
+    if not project:
+        return not_found('Project')
+    
+    heartbeat = current_app.config.get('SSE_HEARTBEAT_SECONDS', 15)
+    
+    def generate():
+        with progress_broker.subscribe(project_id) as events:
+            yield 'retry: 3000\n\n'
+            while True:
+                try:
+                    message = events.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+                    continue
+                payload = json.dumps(message['data'], ensure_ascii=False)
+                yield f"event: {message['event']}\ndata: {payload}\n\n"
+    
+    # 释放请求上下文中的数据库会话，长连接期间不占用连接
+    db.session.remove()
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
 @project_bp.route('/<project_id>/refine/outline', methods=['POST'])
+@idempotent
 def refine_outline(project_id):
     """
     POST /api/projects/{project_id}/refine/outline - Refine outline based on user requirements
@@ -778,82 +1172,23 @@ def refine_outline(project_id):
         # Flatten outline to pages
         pages_data = ai_service.flatten_outline(refined_outline)
         
-        # 在删除旧页面之前，先保存已有的页面描述（按标题匹配）
-        old_pages = Page.query.filter_by(project_id=project_id).order_by(Page.order_index).all()
-        descriptions_map = {}  # {title: description_content}
-        old_status_map = {}  # {title: status} 用于保留状态
-        
-        for old_page in old_pages:
-            old_outline = old_page.get_outline_content()
-            if old_outline and old_outline.get('title'):
-                title = old_outline.get('title')
-                if old_page.description_content:
-                    descriptions_map[title] = old_page.description_content
-                # 如果旧页面已经有描述，保留状态
-                if old_page.status in ['DESCRIPTION_GENERATED', 'IMAGE_GENERATED']:
-                    old_status_map[title] = old_page.status
-        
-        # Delete existing pages (using ORM session to trigger cascades)
-        for old_page in old_pages:
-            db.session.delete(old_page)
-        
-        # Create pages from refined outline
-        pages_list = []
-        has_descriptions = False
-        preserved_count = 0
-        new_count = 0
-        
-        for i, page_data in enumerate(pages_data):
-            page = Page(
-                project_id=project_id,
-                order_index=i,
-                part=page_data.get('part'),
-                status='DRAFT'
-            )
-            page.set_outline_content({
-                'title': page_data.get('title'),
-                'points': page_data.get('points', [])
-            })
-            
-            # 尝试匹配并恢复已有的描述
-            title = page_data.get('title')
-            if title in descriptions_map:
-                # 恢复描述内容
-                page.description_content = descriptions_map[title]
-                # 恢复状态（如果有）
-                if title in old_status_map:
-                    page.status = old_status_map[title]
-                else:
-                    page.status = 'DESCRIPTION_GENERATED'
-                has_descriptions = True
-                preserved_count += 1
-            else:
-                # 新页面或标题改变的页面，描述为空
-                # 这包括：新增的页面、合并的页面、标题改变的页面
-                page.status = 'DRAFT'
-                new_count += 1
-            
-            db.session.add(page)
-            pages_list.append(page)
-        
-        logger.info(f"描述匹配完成: 保留了 {preserved_count} 个页面的描述, {new_count} 个页面需要重新生成描述")
+        # 与已有页面对比合并：未变化的页面保留描述和图片，只有新增/变化的页面需要重新生成
+        result = reconcile_pages(project_id, pages_data)
+        pages_list = result.pages
         
         # Update project status
-        # 如果所有页面都有描述，保持 DESCRIPTION_GENERATED 状态
-        # 否则降级为 OUTLINE_GENERATED
-        if has_descriptions and all(p.description_content for p in pages_list):
-            project.status = 'DESCRIPTIONS_GENERATED'
-        else:
-            project.status = 'OUTLINE_GENERATED'
+        project.status = project_status_after_reconcile(pages_list)
         project.updated_at = datetime.utcnow()
         
         db.session.commit()
         
-        logger.info(f"大纲修改完成: 项目 {project_id}, 创建了 {len(pages_list)} 个页面")
+        logger.info(f"大纲修改完成: 项目 {project_id}, {len(pages_list)} 个页面, {result.summary()}")
         
         # Return pages
         return success_response({
             'pages': [page.to_dict() for page in pages_list],
+            'reconciliation': result.summary(),
+            'dirty_page_ids': [page.id for page in result.dirty_pages],
             'message': '大纲修改成功'
         })
     
@@ -864,6 +1199,7 @@ def refine_outline(project_id):
 
 
 @project_bp.route('/<project_id>/refine/descriptions', methods=['POST'])
+@idempotent
 def refine_descriptions(project_id):
     """
     POST /api/projects/{project_id}/refine/descriptions - Refine page descriptions based on user requirements
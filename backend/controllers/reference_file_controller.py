@@ -16,6 +16,7 @@ import threading
 from models import db, ReferenceFile, Project
 from utils.response import success_response, error_response, bad_request, not_found
 from services.file_parser_service import FileParserService
+from services.reference_index import index_reference_file
 
 logger = logging.getLogger(__name__)
 
@@ -81,6 +82,11 @@ def _parse_file_async(file_id: str, file_path: str, filename: str, app):
             else:
                 reference_file.parse_status = 'completed'
                 reference_file.markdown_content = markdown_content
+                # 解析时建立分块索引，生成每页描述时只检索相关片段
+                try:
+                    index_reference_file(reference_file)
+                except Exception as e:
+                    logger.warning(f"Failed to index reference file {filename}, it will be indexed on use: {e}")
                 if failed_image_count > 0:
                     logger.warning(f"File parsing completed: {filename}, but {failed_image_count} images failed to generate captions")
                 else:
@@ -331,6 +337,7 @@ def trigger_file_parse(file_id):
             reference_file.error_message = None
             # 清空之前的解析结果，以便重新解析
             reference_file.markdown_content = None
+            reference_file.chunk_index = None
             reference_file.mineru_batch_id = None
             db.session.commit()
         
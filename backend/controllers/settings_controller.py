@@ -200,8 +200,92 @@ def reset_settings():
         )
 
 
+def _concurrency_stats():
+    from services.concurrency_governor import governor
+    return {"limiters": governor.stats()}
+
+
+def _llm_cache_stats():
+    from services.llm_cache import llm_cache
+    return llm_cache.stats()
+
+
+def _json_repair_stats():
+    from utils.json_repair import json_repair_stats
+    return json_repair_stats.stats()
+
+
+def _provider_pool_stats():
+    from services.ai_providers import provider_pool
+    return provider_pool.stats()
+
+
+def _remote_image_stats():
+    from services.image_fetcher import image_fetcher
+    return image_fetcher.stats()
+
+
+def _ref_image_payload_stats():
+    from services.ref_image_cache import payload_metrics
+    return payload_metrics.stats()
+
+
+def _image_cache_stats():
+    from services.image_cache import image_cache
+    return image_cache.stats()
+
+
+# GET /api/settings/<name> 只读运行时统计：name -> (统计函数, 说明)
+_STATS_ENDPOINTS = {
+    # 每个 provider/model 限流器的当前（自适应）并发上限、在途/等待数、p95 延迟与错误计数
+    "concurrency": (_concurrency_stats, "concurrency"),
+    # 文本生成响应缓存的命中/未命中/绕过/写入计数、命中率与各层大小
+    "llm-cache": (_llm_cache_stats, "LLM cache"),
+    # generate_json 响应的解析/修复/失败计数（每次修复即少一次重新生成）
+    "json-repair": (_json_repair_stats, "JSON repair"),
+    # 共享的 provider 客户端（不含凭据）及创建/复用/失效计数
+    "provider-pool": (_provider_pool_stats, "provider pool"),
+    # 远程参考图片的下载/磁盘命中/重新验证/内存命中/失败计数与磁盘占用
+    "remote-images": (_remote_image_stats, "remote image"),
+    # 参考图片上传预算：处理张数、原始与实际上传字节及节省量
+    "ref-images": (_ref_image_payload_stats, "reference image"),
+    # 生成图片结果缓存的命中/未命中/绕过/写入计数、命中率与磁盘占用
+    "image-cache": (_image_cache_stats, "image cache"),
+}
+
+
+def get_component_stats(name: str):
+    """
+    GET /api/settings/<name> - Runtime metrics of one component (see _STATS_ENDPOINTS)
+    """
+    stats_fn, label = _STATS_ENDPOINTS[name]
+    try:
+        return success_response(stats_fn())
+    except Exception as e:
+        logger.error(f"Error getting {label} stats: {str(e)}")
+        return error_response(
+            f"GET_{name.replace('-', '_').upper()}_ERROR",
+            f"Failed to get {label} stats: {str(e)}",
+            500,
+        )
+
+
+for _name in _STATS_ENDPOINTS:
+    settings_bp.add_url_rule(
+        f"/{_name}", endpoint=f"{_name}_stats", view_func=get_component_stats,
+        defaults={"name": _name}, methods=["GET"], strict_slashes=False,
+    )
+
+
+_PROVIDER_CREDENTIAL_KEYS = (
+    "AI_PROVIDER_FORMAT", "GOOGLE_API_BASE", "OPENAI_API_BASE", "GOOGLE_API_KEY", "OPENAI_API_KEY"
+)
+
+
 def _sync_settings_to_config(settings: Settings):
     """Sync settings to Flask app config"""
+    previous_credentials = tuple(current_app.config.get(key) for key in _PROVIDER_CREDENTIAL_KEYS)
+
     # Sync AI provider format (always sync, has default value)
     if settings.ai_provider_format:
         current_app.config["AI_PROVIDER_FORMAT"] = settings.ai_provider_format
@@ -252,3 +336,8 @@ def _sync_settings_to_config(settings: Settings):
     if settings.image_caption_model:
         current_app.config["IMAGE_CAPTION_MODEL"] = settings.image_caption_model
         logger.info(f"Updated IMAGE_CAPTION_MODEL to: {settings.image_caption_model}")
+
+    # 凭据或接口地址变化后，丢弃按旧配置创建的共享 provider 客户端
+    if tuple(current_app.config.get(key) for key in _PROVIDER_CREDENTIAL_KEYS) != previous_credentials:
+        from services.ai_providers import provider_pool
+        provider_pool.invalidate()
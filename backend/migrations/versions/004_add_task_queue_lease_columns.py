@@ -0,0 +1,52 @@
+"""add durable queue lease columns to tasks table
+
+Revision ID: 004_task_lease
+Revises: 38292967f3ca
+Create Date: 2026-10-16 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+
+# revision identifiers, used by Alembic.
+revision = '004_task_lease'
+down_revision = '38292967f3ca'
+branch_labels = None
+depends_on = None
+
+
+def _column_exists(table_name: str, column_name: str) -> bool:
+    """Check if column exists"""
+    bind = op.get_bind()
+    inspector = inspect(bind)
+    columns = [col['name'] for col in inspector.get_columns(table_name)]
+    return column_name in columns
+
+
+def upgrade() -> None:
+    """
+    Add payload / attempts / lease / heartbeat columns to tasks table.
+    
+    Idempotent: checks if column exists before adding.
+    """
+    if not _column_exists('tasks', 'payload'):
+        op.add_column('tasks', sa.Column('payload', sa.Text(), nullable=True))
+    if not _column_exists('tasks', 'attempts'):
+        op.add_column('tasks', sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'))
+    if not _column_exists('tasks', 'lease_owner'):
+        op.add_column('tasks', sa.Column('lease_owner', sa.String(length=100), nullable=True))
+    if not _column_exists('tasks', 'lease_expires_at'):
+        op.add_column('tasks', sa.Column('lease_expires_at', sa.DateTime(), nullable=True))
+    if not _column_exists('tasks', 'heartbeat_at'):
+        op.add_column('tasks', sa.Column('heartbeat_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('tasks') as batch_op:
+        batch_op.drop_column('heartbeat_at')
+        batch_op.drop_column('lease_expires_at')
+        batch_op.drop_column('lease_owner')
+        batch_op.drop_column('attempts')
+        batch_op.drop_column('payload')
@@ -0,0 +1,50 @@
+"""add content fingerprint column to tasks table
+
+Revision ID: 005_task_fingerprint
+Revises: 004_task_lease
+Create Date: 2026-10-16 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+
+# revision identifiers, used by Alembic.
+revision = '005_task_fingerprint'
+down_revision = '004_task_lease'
+branch_labels = None
+depends_on = None
+
+
+def _column_exists(table_name: str, column_name: str) -> bool:
+    """Check if column exists"""
+    bind = op.get_bind()
+    inspector = inspect(bind)
+    columns = [col['name'] for col in inspector.get_columns(table_name)]
+    return column_name in columns
+
+
+def _index_exists(table_name: str, index_name: str) -> bool:
+    """Check if index exists"""
+    bind = op.get_bind()
+    inspector = inspect(bind)
+    return index_name in [idx['name'] for idx in inspector.get_indexes(table_name)]
+
+
+def upgrade() -> None:
+    """
+    Add tasks.fingerprint (single-flight dedup of identical generation requests).
+    
+    Idempotent: checks if column / index exists before adding.
+    """
+    if not _column_exists('tasks', 'fingerprint'):
+        op.add_column('tasks', sa.Column('fingerprint', sa.String(length=64), nullable=True))
+    if not _index_exists('tasks', 'ix_tasks_fingerprint'):
+        op.create_index('ix_tasks_fingerprint', 'tasks', ['fingerprint'])
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('tasks') as batch_op:
+        batch_op.drop_index('ix_tasks_fingerprint')
+        batch_op.drop_column('fingerprint')
@@ -0,0 +1,54 @@
+"""add idempotency_records table
+
+Revision ID: 006_idempotency_records
+Revises: 005_task_fingerprint
+Create Date: 2026-10-16 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+
+# revision identifiers, used by Alembic.
+revision = '006_idempotency_records'
+down_revision = '005_task_fingerprint'
+branch_labels = None
+depends_on = None
+
+
+def _table_exists(table_name: str) -> bool:
+    """Check if table exists"""
+    bind = op.get_bind()
+    inspector = inspect(bind)
+    return table_name in inspector.get_table_names()
+
+
+def upgrade() -> None:
+    """
+    Create idempotency_records (stored responses for Idempotency-Key requests).
+    
+    Idempotent: checks if table exists before creating.
+    """
+    if _table_exists('idempotency_records'):
+        return
+    op.create_table(
+        'idempotency_records',
+        sa.Column('id', sa.String(length=64), nullable=False),
+        sa.Column('idempotency_key', sa.String(length=255), nullable=False),
+        sa.Column('method', sa.String(length=10), nullable=False),
+        sa.Column('path', sa.String(length=500), nullable=False),
+        sa.Column('request_hash', sa.String(length=64), nullable=False),
+        sa.Column('status_code', sa.Integer(), nullable=False),
+        sa.Column('response_body', sa.Text(), nullable=False),
+        sa.Column('task_id', sa.String(length=36), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_idempotency_records_expires_at', 'idempotency_records', ['expires_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_idempotency_records_expires_at', table_name='idempotency_records')
+    op.drop_table('idempotency_records')
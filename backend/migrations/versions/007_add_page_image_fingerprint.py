@@ -0,0 +1,41 @@
+"""add image fingerprint column to pages table
+
+Revision ID: 007_page_image_fingerprint
+Revises: 006_idempotency_records
+Create Date: 2026-10-16 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+
+# revision identifiers, used by Alembic.
+revision = '007_page_image_fingerprint'
+down_revision = '006_idempotency_records'
+branch_labels = None
+depends_on = None
+
+
+def _column_exists(table_name: str, column_name: str) -> bool:
+    """Check if column exists"""
+    bind = op.get_bind()
+    inspector = inspect(bind)
+    columns = [col['name'] for col in inspector.get_columns(table_name)]
+    return column_name in columns
+
+
+def upgrade() -> None:
+    """
+    Add pages.image_fingerprint (inputs the current image was generated from,
+    used to skip unchanged pages in bulk image generation).
+    
+    Idempotent: checks if column exists before adding.
+    """
+    if not _column_exists('pages', 'image_fingerprint'):
+        op.add_column('pages', sa.Column('image_fingerprint', sa.String(length=64), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('pages') as batch_op:
+        batch_op.drop_column('image_fingerprint')
@@ -0,0 +1,42 @@
+"""add chunk index column to reference_files table
+
+Revision ID: 008_reference_chunk_index
+Revises: 007_page_image_fingerprint
+Create Date: 2026-10-16 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+
+# revision identifiers, used by Alembic.
+revision = '008_reference_chunk_index'
+down_revision = '007_page_image_fingerprint'
+branch_labels = None
+depends_on = None
+
+
+def _column_exists(table_name: str, column_name: str) -> bool:
+    """Check if column exists"""
+    bind = op.get_bind()
+    inspector = inspect(bind)
+    columns = [col['name'] for col in inspector.get_columns(table_name)]
+    return column_name in columns
+
+
+def upgrade() -> None:
+    """
+    Add reference_files.chunk_index (JSON chunks and term counts built when a
+    file is parsed, used to send only the relevant parts to each page prompt).
+    Files parsed before this migration are chunked in memory when used.
+    
+    Idempotent: checks if column exists before adding.
+    """
+    if not _column_exists('reference_files', 'chunk_index'):
+        op.add_column('reference_files', sa.Column('chunk_index', sa.Text(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('reference_files') as batch_op:
+        batch_op.drop_column('chunk_index')
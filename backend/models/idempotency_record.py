@@ -0,0 +1,34 @@
+"""
+Idempotency record model - stored responses of requests sent with an Idempotency-Key
+"""
+import json
+from datetime import datetime
+from . import db
+
+
+class IdempotencyRecord(db.Model):
+    """
+    IdempotencyRecord model - replays the original response for retried requests
+    """
+    __tablename__ = 'idempotency_records'
+    
+    id = db.Column(db.String(64), primary_key=True)  # sha256(method + path + Idempotency-Key)
+    idempotency_key = db.Column(db.String(255), nullable=False)
+    method = db.Column(db.String(10), nullable=False)
+    path = db.Column(db.String(500), nullable=False)
+    request_hash = db.Column(db.String(64), nullable=False)  # 请求内容哈希，同一个 key 不能用于不同请求
+    status_code = db.Column(db.Integer, nullable=False)
+    response_body = db.Column(db.Text, nullable=False)  # JSON string
+    task_id = db.Column(db.String(36), nullable=True)  # 响应中的 task_id（如果有）
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    
+    def get_response_body(self):
+        """Parse stored response body"""
+        return json.loads(self.response_body)
+    
+    def is_expired(self, now=None):
+        return (now or datetime.utcnow()) >= self.expires_at
+    
+    def __repr__(self):
+        return f'<IdempotencyRecord {self.method} {self.path} key={self.idempotency_key}>'
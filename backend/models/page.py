@@ -20,6 +20,7 @@ class Page(db.Model):
     outline_content = db.Column(db.Text, nullable=True)  # JSON string
     description_content = db.Column(db.Text, nullable=True)  # JSON string
     generated_image_path = db.Column(db.String(500), nullable=True)
+    image_fingerprint = db.Column(db.String(64), nullable=True)  # 当前图片的生成输入指纹，见 single_flight.page_image_fingerprint
     status = db.Column(db.String(50), nullable=False, default='DRAFT')
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -1,6 +1,7 @@
 """
 Reference File model - stores uploaded reference files and their parsed content
 """
+import json
 import uuid
 from datetime import datetime
 from . import db
@@ -21,6 +22,7 @@ class ReferenceFile(db.Model):
     parse_status = db.Column(db.String(50), nullable=False, default='pending')  # pending|parsing|completed|failed
     markdown_content = db.Column(db.Text, nullable=True)  # Parsed markdown with enhanced image descriptions
     error_message = db.Column(db.Text, nullable=True)  # Error message if parsing failed
+    chunk_index = db.Column(db.Text, nullable=True)  # JSON chunk/term index for per-page retrieval (see services/reference_index.py)
     mineru_batch_id = db.Column(db.String(100), nullable=True)  # Mineru service batch ID
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -57,6 +59,22 @@ class ReferenceFile(db.Model):
         
         return result
     
+    def get_chunk_index(self):
+        """Parse chunk_index from JSON string"""
+        if self.chunk_index:
+            try:
+                return json.loads(self.chunk_index)
+            except json.JSONDecodeError:
+                return None
+        return None
+    
+    def set_chunk_index(self, data):
+        """Set chunk_index as JSON string"""
+        if data:
+            self.chunk_index = json.dumps(data, ensure_ascii=False)
+        else:
+            self.chunk_index = None
+    
     def count_failed_image_captions(self) -> int:
         """
         Count images in markdown that don't have alt text (failed to generate captions)
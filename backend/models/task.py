@@ -15,13 +15,23 @@ class Task(db.Model):
     
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     project_id = db.Column(db.String(36), db.ForeignKey('projects.id'), nullable=False)
-    task_type = db.Column(db.String(50), nullable=False)  # GENERATE_DESCRIPTIONS|GENERATE_IMAGES
+    task_type = db.Column(db.String(50), nullable=False)  # GENERATE_DESCRIPTIONS|GENERATE_IMAGES|GENERATE_DECK
     status = db.Column(db.String(50), nullable=False, default='PENDING')
     progress = db.Column(db.Text, nullable=True)  # JSON string: {"total": 10, "completed": 5, "failed": 0}
     error_message = db.Column(db.Text, nullable=True)
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     completed_at = db.Column(db.DateTime, nullable=True)
     
+    # 持久化队列相关字段（租约 + 心跳，用于多进程/崩溃恢复）
+    payload = db.Column(db.Text, nullable=True)  # JSON string: 可序列化的任务参数，用于重建任务
+    attempts = db.Column(db.Integer, nullable=False, default=0)  # 已被领取执行的次数
+    lease_owner = db.Column(db.String(100), nullable=True)  # 当前持有租约的 worker ID
+    lease_expires_at = db.Column(db.DateTime, nullable=True)  # 租约过期时间，过期后可被重新领取
+    heartbeat_at = db.Column(db.DateTime, nullable=True)  # 最近一次心跳时间
+    
+    # 请求内容指纹（single-flight 去重：相同输入的进行中任务只执行一次）
+    fingerprint = db.Column(db.String(64), nullable=True, index=True)
+    
     # Relationships
     project = db.relationship('Project', back_populates='tasks')
     
@@ -41,6 +51,22 @@ class Task(db.Model):
         else:
             self.progress = None
     
+    def get_payload(self):
+        """Parse payload from JSON string"""
+        if self.payload:
+            try:
+                return json.loads(self.payload)
+            except json.JSONDecodeError:
+                return {}
+        return {}
+    
+    def set_payload(self, data):
+        """Set payload as JSON string"""
+        if data:
+            self.payload = json.dumps(data, ensure_ascii=False)
+        else:
+            self.payload = None
+    
     def update_progress(self, completed=None, failed=None):
         """Update progress incrementally"""
         prog = self.get_progress()
@@ -58,6 +84,7 @@ class Task(db.Model):
             'status': self.status,
             'progress': self.get_progress(),
             'error_message': self.error_message,
+            'attempts': self.attempts or 0,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'completed_at': self.completed_at.isoformat() if self.completed_at else None,
         }
@@ -0,0 +1,97 @@
+"""
+Benchmark: database commits per deck for generate_images_task
+
+Runs generate_images_task against a temporary SQLite database with a mocked
+AI service (random per-page latency) and counts session commits.
+
+    python scripts/benchmark_progress_writes.py --pages 20 --latency 0.5
+
+Modes:
+    legacy     commits the old loop issued (computed): 4 + 3 per page
+    write-through   PROGRESS_FLUSH_INTERVAL=0 (every completion flushed immediately)
+    coalesced  PROGRESS_FLUSH_INTERVAL=<--interval> (default 1.0s)
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from unittest.mock import MagicMock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def run(app, pages: int, latency: float, workers: int, interval: float) -> tuple:
+    from sqlalchemy import event
+    from sqlalchemy.orm import Session
+    from models import db, Project, Page, Task
+    from services.task_manager import generate_images_task
+
+    with app.app_context():
+        project = Project(creation_type='idea', idea_prompt='benchmark', status='DESCRIPTIONS_GENERATED')
+        db.session.add(project)
+        db.session.flush()
+        for i in range(pages):
+            page = Page(project_id=project.id, order_index=i, status='DESCRIPTION_GENERATED')
+            page.set_description_content({'text': f'page {i}'})
+            db.session.add(page)
+        task = Task(project_id=project.id, task_type='GENERATE_IMAGES', status='PENDING')
+        db.session.add(task)
+        db.session.commit()
+        task_id, project_id = task.id, project.id
+
+    def fake_generate_image(*args, **kwargs):
+        time.sleep(random.uniform(latency * 0.5, latency * 1.5))
+        return MagicMock()
+
+    ai_service = MagicMock()
+    ai_service.flatten_outline.return_value = [{'title': f'page {i}'} for i in range(pages)]
+    ai_service.extract_image_urls_from_markdown.return_value = []
+    ai_service.generate_image_prompt.return_value = 'prompt'
+    ai_service.generate_image.side_effect = fake_generate_image
+    file_service = MagicMock()
+    file_service.save_generated_image.side_effect = lambda image, pid, page_id: f'{page_id}.png'
+
+    commits = []
+    listener = lambda session: commits.append(1)
+    event.listen(Session, 'after_commit', listener)
+    app.config['PROGRESS_FLUSH_INTERVAL'] = interval
+    started = time.monotonic()
+    try:
+        generate_images_task(task_id, project_id, ai_service, file_service, [],
+                             use_template=False, max_workers=workers, app=app)
+    finally:
+        event.remove(Session, 'after_commit', listener)
+    return len(commits), time.monotonic() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Count DB commits per deck for generate_images_task')
+    parser.add_argument('--pages', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.5, help='Mean simulated image latency (seconds)')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--interval', type=float, default=1.0, help='PROGRESS_FLUSH_INTERVAL for coalesced mode')
+    args = parser.parse_args()
+
+    temp_dir = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(temp_dir, 'bench.db')}"
+    os.environ.setdefault('GOOGLE_API_KEY', 'benchmark')
+
+    from app import create_app
+    app = create_app()
+    with app.app_context():
+        from models import db
+        db.create_all()
+
+    # 旧循环（按代码计算）：PROCESSING、初始化进度、COMPLETED、项目状态各 1 次，
+    # 另外每页 3 次：工作线程提交 GENERATING，主循环分别提交页面结果和任务进度
+    print(f"{'legacy':<14} commits={3 * args.pages + 4:<5} (4 + 3 per page)")
+    for name, interval in (('write-through', 0.0), ('coalesced', args.interval)):
+        commits, elapsed = run(app, args.pages, args.latency, args.workers, interval)
+        print(f"{name:<14} commits={commits:<5} elapsed={elapsed:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+"""
+Admission Control - per-task-type queue limits, Retry-After estimates and readiness
+
+队列饱和时不再无限接收任务：
+- 每种任务类型排队（PENDING）的数量有上限（TASK_QUEUE_LIMITS / TASK_QUEUE_LIMIT_DEFAULT），
+  超出时接口返回 429，并带上根据实际任务耗时估算的 Retry-After
+- 任务耗时按类型做指数滑动平均（EWMA），由 TaskManager 在任务结束时记录
+- readiness() 汇总队列深度、预计等待时间和任务线程利用率，供 /ready 端点给负载均衡使用
+
+队列深度从 tasks 表统计，因此 inline / worker 两种模式以及多个 Web 进程看到的是同一个队列。
+"""
+import math
+import logging
+import threading
+from typing import Dict, Optional
+
+from flask import current_app
+
+from models import db, Task
+
+logger = logging.getLogger(__name__)
+
+# 耗时 EWMA 的平滑系数
+DURATION_EWMA_ALPHA = 0.2
+
+
+class QueueFullError(Exception):
+    """The queue of a task type is at its limit"""
+
+    def __init__(self, task_type: str, depth: int, limit: int, retry_after: int):
+        super().__init__(f"Task queue for {task_type} is full ({depth}/{limit}), retry in {retry_after}s")
+        self.task_type = task_type
+        self.depth = depth
+        self.limit = limit
+        self.retry_after = retry_after
+
+
+def parse_queue_limits(raw: str) -> Dict[str, int]:
+    """
+    Parse "GENERATE_IMAGES=20,EDIT_PAGE_IMAGE=100" into a dict (invalid items are skipped)
+    """
+    limits = {}
+    for item in (raw or '').split(','):
+        if '=' not in item:
+            continue
+        task_type, _, value = item.partition('=')
+        try:
+            limits[task_type.strip().upper()] = int(value)
+        except ValueError:
+            logger.warning(f"Ignoring invalid TASK_QUEUE_LIMITS item: {item!r}")
+    return limits
+
+
+class AdmissionController:
+    """Queue limits and wait-time estimates shared by all endpoints that create tasks"""
+
+    def __init__(self):
+        self._durations: Dict[str, float] = {}  # task_type -> EWMA seconds
+        self._lock = threading.Lock()
+
+    def record_duration(self, task_type: Optional[str], seconds: float):
+        """Feed the observed run time of a finished task"""
+        if not task_type or seconds < 0:
+            return
+        with self._lock:
+            previous = self._durations.get(task_type)
+            self._durations[task_type] = seconds if previous is None else (
+                DURATION_EWMA_ALPHA * seconds + (1 - DURATION_EWMA_ALPHA) * previous
+            )
+
+    def average_duration(self, task_type: Optional[str]) -> float:
+        """Observed average run time of a task type (configured default until observed)"""
+        with self._lock:
+            duration = self._durations.get(task_type)
+        if duration is None:
+            duration = float(current_app.config.get('TASK_DURATION_DEFAULT_SECONDS', 60))
+        return duration
+
+    def queue_limit(self, task_type: str) -> int:
+        """Max PENDING tasks of a type (0 = unlimited)"""
+        limits = parse_queue_limits(current_app.config.get('TASK_QUEUE_LIMITS', ''))
+        return limits.get(task_type, int(current_app.config.get('TASK_QUEUE_LIMIT_DEFAULT', 50)))
+
+    @staticmethod
+    def queue_depths() -> Dict[str, Dict[str, int]]:
+        """task_type -> {'pending': n, 'processing': n} from the shared tasks table"""
+        rows = db.session.query(Task.task_type, Task.status, db.func.count(Task.id)).filter(
+            Task.status.in_(('PENDING', 'PROCESSING'))
+        ).group_by(Task.task_type, Task.status).all()
+        depths: Dict[str, Dict[str, int]] = {}
+        for task_type, status, count in rows:
+            depths.setdefault(task_type, {'pending': 0, 'processing': 0})[status.lower()] = count
+        return depths
+
+    @staticmethod
+    def _worker_slots() -> int:
+        from .task_manager import task_manager
+        return max(1, task_manager.max_workers)
+
+    def estimated_wait(self, depths: Optional[Dict[str, Dict[str, int]]] = None) -> float:
+        """Seconds until a newly queued task would start: queued work spread over the task threads"""
+        depths = self.queue_depths() if depths is None else depths
+        queued_work = sum(
+            (counts['pending'] + counts['processing'] / 2) * self.average_duration(task_type)
+            for task_type, counts in depths.items()
+        )
+        return queued_work / self._worker_slots()
+
+    def check(self, task_type: str):
+        """
+        Admit a new task of this type or raise QueueFullError
+
+        Call before creating the Task row.
+        """
+        limit = self.queue_limit(task_type)
+        if limit <= 0:
+            return
+        depths = self.queue_depths()
+        pending = depths.get(task_type, {}).get('pending', 0)
+        if pending < limit:
+            return
+        # 至少要等本类型最早排队的任务开始执行，队列才会腾出位置
+        retry_after = max(1, math.ceil(max(
+            self.estimated_wait(depths) / max(1, pending),
+            self.average_duration(task_type) / self._worker_slots()
+        )))
+        logger.warning(f"Rejecting {task_type} task: queue full ({pending}/{limit}), Retry-After {retry_after}s")
+        raise QueueFullError(task_type, pending, limit, retry_after)
+
+    def readiness(self) -> Dict:
+        """Queue depth, estimated wait and worker utilisation; ready=False if any queue is full"""
+        from .task_manager import task_manager
+        depths = self.queue_depths()
+        saturated = []
+        for task_type, counts in depths.items():
+            limit = self.queue_limit(task_type)
+            if limit > 0 and counts['pending'] >= limit:
+                saturated.append(task_type)
+        running = task_manager.running_count()
+        return {
+            'ready': not saturated,
+            'saturated_task_types': sorted(saturated),
+            'queue_depth': sum(counts['pending'] for counts in depths.values()),
+            'processing': sum(counts['processing'] for counts in depths.values()),
+            'queues': {
+                task_type: dict(counts, limit=self.queue_limit(task_type),
+                                avg_duration_seconds=round(self.average_duration(task_type), 1))
+                for task_type, counts in sorted(depths.items())
+            },
+            'estimated_wait_seconds': round(self.estimated_wait(depths), 1),
+            'worker_utilization': round(running / max(1, task_manager.max_workers), 2),
+            'running_tasks': running,
+            'max_workers': task_manager.max_workers,
+            'queue_mode': task_manager.mode,
+        }
+
+
+# Global admission controller instance
+admission_controller = AdmissionController()
@@ -26,13 +26,15 @@ from typing import Tuple, Type
 
 from .text import TextProvider, GenAITextProvider, OpenAITextProvider
 from .image import ImageProvider, GenAIImageProvider, OpenAIImageProvider
+from .provider_pool import ProviderPool, provider_pool
 
 logger = logging.getLogger(__name__)
 
 __all__ = [
     'TextProvider', 'GenAITextProvider', 'OpenAITextProvider',
     'ImageProvider', 'GenAIImageProvider', 'OpenAIImageProvider',
-    'get_text_provider', 'get_image_provider', 'get_provider_format'
+    'get_text_provider', 'get_image_provider', 'get_provider_format',
+    'ProviderPool', 'provider_pool'
 ]
 
 
@@ -139,16 +141,20 @@ def get_text_provider(model: str = "gemini-3-flash-preview") -> TextProvider:
         model: Model name to use
         
     Returns:
-        TextProvider instance (GenAITextProvider or OpenAITextProvider)
+        TextProvider instance (GenAITextProvider or OpenAITextProvider), shared
+        through provider_pool by every caller with the same credentials and model
     """
     provider_format, api_key, api_base = _get_provider_config()
+    key = provider_pool.make_key('text', provider_format, api_base, api_key, model)
     
-    if provider_format == 'openai':
-        logger.info(f"Using OpenAI format for text generation, model: {model}")
-        return OpenAITextProvider(api_key=api_key, api_base=api_base, model=model)
-    else:
+    def create() -> TextProvider:
+        if provider_format == 'openai':
+            logger.info(f"Using OpenAI format for text generation, model: {model}")
+            return OpenAITextProvider(api_key=api_key, api_base=api_base, model=model)
         logger.info(f"Using Gemini format for text generation, model: {model}")
         return GenAITextProvider(api_key=api_key, api_base=api_base, model=model)
+    
+    return provider_pool.get_or_create(key, create)
 
 
 def get_image_provider(model: str = "gemini-3-pro-image-preview") -> ImageProvider:
@@ -159,18 +165,22 @@ def get_image_provider(model: str = "gemini-3-pro-image-preview") -> ImageProvid
         model: Model name to use
         
     Returns:
-        ImageProvider instance (GenAIImageProvider or OpenAIImageProvider)
+        ImageProvider instance (GenAIImageProvider or OpenAIImageProvider), shared
+        through provider_pool by every caller with the same credentials and model
         
     Note:
         OpenAI format does NOT support 4K resolution, only 1K is available.
         If you need higher resolution images, use Gemini format.
     """
     provider_format, api_key, api_base = _get_provider_config()
+    key = provider_pool.make_key('image', provider_format, api_base, api_key, model)
     
-    if provider_format == 'openai':
-        logger.info(f"Using OpenAI format for image generation, model: {model}")
-        logger.warning("OpenAI format only supports 1K resolution, 4K is not available")
-        return OpenAIImageProvider(api_key=api_key, api_base=api_base, model=model)
-    else:
+    def create() -> ImageProvider:
+        if provider_format == 'openai':
+            logger.info(f"Using OpenAI format for image generation, model: {model}")
+            logger.warning("OpenAI format only supports 1K resolution, 4K is not available")
+            return OpenAIImageProvider(api_key=api_key, api_base=api_base, model=model)
         logger.info(f"Using Gemini format for image generation, model: {model}")
         return GenAIImageProvider(api_key=api_key, api_base=api_base, model=model)
+    
+    return provider_pool.get_or_create(key, create)
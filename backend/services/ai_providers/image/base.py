@@ -1,6 +1,7 @@
 """
 Abstract base class for image generation providers
 """
+import asyncio
 from abc import ABC, abstractmethod
 from typing import Optional, List
 from PIL import Image
@@ -30,3 +31,27 @@ class ImageProvider(ABC):
             Generated PIL Image object, or None if failed
         """
         pass
+    
+    async def generate_image_async(
+        self,
+        prompt: str,
+        ref_images: Optional[List[Image.Image]] = None,
+        aspect_ratio: str = "16:9",
+        resolution: str = "2K"
+    ) -> Optional[Image.Image]:
+        """
+        Async variant of generate_image
+        
+        Providers backed by an SDK with an async client override this; the
+        default runs the blocking call in a worker thread.
+        """
+        return await asyncio.to_thread(self.generate_image, prompt, ref_images, aspect_ratio, resolution)
+    
+    def warm_up(self):
+        """
+        Open a connection to the endpoint ahead of the first real request
+        
+        Providers with a pooled SDK client override this with a cheap call;
+        errors are the caller's to log (warm-up is best effort).
+        """
+        pass
@@ -7,6 +7,7 @@ from google import genai
 from google.genai import types
 from PIL import Image
 from .base import ImageProvider
+from ...ref_image_cache import payload_bytes
 
 logger = logging.getLogger(__name__)
 
@@ -29,6 +30,10 @@ class GenAIImageProvider(ImageProvider):
         )
         self.model = model
     
+    def warm_up(self):
+        """Pre-connect the pooled HTTP client with a cheap model listing call"""
+        self.client.models.list(config={'page_size': 1})
+    
     def generate_image(
         self,
         prompt: str,
@@ -49,16 +54,7 @@ class GenAIImageProvider(ImageProvider):
             Generated PIL Image object, or None if failed
         """
         try:
-            # Build contents list with prompt and reference images
-            contents = []
-            
-            # Add reference images first (if any)
-            if ref_images:
-                for ref_img in ref_images:
-                    contents.append(ref_img)
-            
-            # Add text prompt
-            contents.append(prompt)
+            contents = self._build_contents(prompt, ref_images)
             
             logger.debug(f"Calling GenAI API for image generation with {len(ref_images) if ref_images else 0} reference images...")
             logger.debug(f"Config - aspect_ratio: {aspect_ratio}, resolution: {resolution}")
@@ -66,42 +62,89 @@ class GenAIImageProvider(ImageProvider):
             response = self.client.models.generate_content(
                 model=self.model,
                 contents=contents,
-                config=types.GenerateContentConfig(
-                    response_modalities=['TEXT', 'IMAGE'],
-                    image_config=types.ImageConfig(
-                        aspect_ratio=aspect_ratio,
-                        image_size=resolution
-                    ),
-                )
+                config=self._build_config(aspect_ratio, resolution)
             )
             
             logger.debug("GenAI API call completed")
+            return self._extract_image(response)
             
-            # Extract image from response
-            for i, part in enumerate(response.parts):
-                if part.text is not None:
-                    logger.debug(f"Part {i}: TEXT - {part.text[:100] if len(part.text) > 100 else part.text}")
-                else:
-                    try:
-                        logger.debug(f"Part {i}: Attempting to extract image...")
-                        image = part.as_image()
-                        if image:
-                            logger.debug(f"Successfully extracted image from part {i}")
-                            return image
-                    except Exception as e:
-                        logger.debug(f"Part {i}: Failed to extract image - {str(e)}")
-            
-            # No image found in response
-            error_msg = "No image found in API response. "
-            if response.parts:
-                error_msg += f"Response had {len(response.parts)} parts but none contained valid images."
-            else:
-                error_msg += "Response had no parts."
-            
-            raise ValueError(error_msg)
+        except Exception as e:
+            error_detail = f"Error generating image with GenAI: {type(e).__name__}: {str(e)}"
+            logger.error(error_detail, exc_info=True)
+            raise Exception(error_detail) from e
+    
+    async def generate_image_async(
+        self,
+        prompt: str,
+        ref_images: Optional[List[Image.Image]] = None,
+        aspect_ratio: str = "16:9",
+        resolution: str = "2K"
+    ) -> Optional[Image.Image]:
+        """
+        Generate image using the GenAI SDK async client (client.aio)
+        """
+        try:
+            response = await self.client.aio.models.generate_content(
+                model=self.model,
+                contents=self._build_contents(prompt, ref_images),
+                config=self._build_config(aspect_ratio, resolution)
+            )
+            return self._extract_image(response)
             
         except Exception as e:
             error_detail = f"Error generating image with GenAI: {type(e).__name__}: {str(e)}"
             logger.error(error_detail, exc_info=True)
             raise Exception(error_detail) from e
-
+    
+    @staticmethod
+    def _build_contents(prompt: str, ref_images: Optional[List[Image.Image]]) -> list:
+        """
+        Reference images first (if any), then the text prompt
+        
+        Images prepared by AIService (fit_to_budget) are sent as their budgeted bytes
+        instead of letting the SDK re-encode them as lossless PNG.
+        """
+        contents = []
+        for image in ref_images or []:
+            payload = payload_bytes(image)
+            if payload:
+                contents.append(types.Part.from_bytes(data=payload[1], mime_type=payload[0]))
+            else:
+                contents.append(image)
+        contents.append(prompt)
+        return contents
+    
+    @staticmethod
+    def _build_config(aspect_ratio: str, resolution: str) -> types.GenerateContentConfig:
+        return types.GenerateContentConfig(
+            response_modalities=['TEXT', 'IMAGE'],
+            image_config=types.ImageConfig(
+                aspect_ratio=aspect_ratio,
+                image_size=resolution
+            ),
+        )
+    
+    @staticmethod
+    def _extract_image(response) -> Image.Image:
+        """Extract the first image part from a generate_content response"""
+        for i, part in enumerate(response.parts or []):
+            if part.text is not None:
+                logger.debug(f"Part {i}: TEXT - {part.text[:100] if len(part.text) > 100 else part.text}")
+            else:
+                try:
+                    logger.debug(f"Part {i}: Attempting to extract image...")
+                    image = part.as_image()
+                    if image:
+                        logger.debug(f"Successfully extracted image from part {i}")
+                        return image
+                except Exception as e:
+                    logger.debug(f"Part {i}: Failed to extract image - {str(e)}")
+        
+        # No image found in response
+        error_msg = "No image found in API response. "
+        if response.parts:
+            error_msg += f"Response had {len(response.parts)} parts but none contained valid images."
+        else:
+            error_msg += "Response had no parts."
+        
+        raise ValueError(error_msg)
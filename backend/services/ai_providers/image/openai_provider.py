@@ -1,16 +1,18 @@
 """
 OpenAI SDK implementation for image generation
 """
+import asyncio
 import logging
 import base64
 import re
 import requests
 from io import BytesIO
 from typing import Optional, List
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 from PIL import Image
 from .base import ImageProvider
 from config import get_config
+from ...ref_image_cache import encode_image, payload_bytes, upload_format
 
 logger = logging.getLogger(__name__)
 
@@ -34,23 +36,47 @@ class OpenAIImageProvider(ImageProvider):
             max_retries=get_config().OPENAI_MAX_RETRIES  # set max retries from config
         )
         self.model = model
+        self._api_key = api_key
+        self._api_base = api_base
+        self._async_client = None
     
-    def _encode_image_to_base64(self, image: Image.Image) -> str:
+    def _get_async_client(self) -> AsyncOpenAI:
+        """Lazily create the async client (bound to the event loop that first uses it)"""
+        if self._async_client is None:
+            self._async_client = AsyncOpenAI(
+                api_key=self._api_key,
+                base_url=self._api_base,
+                timeout=get_config().OPENAI_TIMEOUT,
+                max_retries=get_config().OPENAI_MAX_RETRIES
+            )
+        return self._async_client
+    
+    def warm_up(self):
+        """Pre-connect the pooled HTTP client with a cheap model listing call"""
+        self.client.with_options(max_retries=0, timeout=10).models.list()
+    
+    def _encode_image_to_data_url(self, image: Image.Image) -> str:
         """
-        Encode PIL Image to base64 string
+        Encode PIL Image to a base64 data URL
+        
+        Images prepared by AIService (fit_to_budget) are sent as their budgeted
+        bytes; other images are encoded as JPEG 95 (PNG if they have transparent
+        pixels). Encodings are memoized per
+        image object, so a template shared by all pages of a task is encoded only once.
         
         Args:
             image: PIL Image object
             
         Returns:
-            Base64 encoded string
+            data:image/...;base64,... URL
         """
-        buffered = BytesIO()
-        # Convert to RGB if necessary (e.g., RGBA images)
-        if image.mode in ('RGBA', 'LA', 'P'):
-            image = image.convert('RGB')
-        image.save(buffered, format="JPEG", quality=95)
-        return base64.b64encode(buffered.getvalue()).decode('utf-8')
+        payload = payload_bytes(image)
+        if payload:
+            mime_type, data = payload
+        else:
+            format = upload_format(image, 'JPEG')
+            mime_type, data = f'image/{format.lower()}', encode_image(image, format, 95)
+        return f"data:{mime_type};base64,{base64.b64encode(data).decode('utf-8')}"
     
     def generate_image(
         self,
@@ -74,150 +100,180 @@ class OpenAIImageProvider(ImageProvider):
             Generated PIL Image object, or None if failed
         """
         try:
-            # Build message content
-            content = []
-            
-            # Add reference images first (if any)
-            if ref_images:
-                for ref_img in ref_images:
-                    base64_image = self._encode_image_to_base64(ref_img)
-                    content.append({
-                        "type": "image_url",
-                        "image_url": {
-                            "url": f"data:image/jpeg;base64,{base64_image}"
-                        }
-                    })
-            
-            # Add text prompt
-            content.append({"type": "text", "text": prompt})
-            
-            logger.debug(f"Calling OpenAI API for image generation with {len(ref_images) if ref_images else 0} reference images...")
-            logger.debug(f"Config - aspect_ratio: {aspect_ratio} (resolution ignored, OpenAI format only supports 1K)")
-            
-            # Note: resolution is not supported in OpenAI format, only aspect_ratio via system message
             response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": f"aspect_ratio={aspect_ratio}"},
-                    {"role": "user", "content": content},
-                ],
-                modalities=["text", "image"]
+                **self._build_request(prompt, ref_images, aspect_ratio, resolution)
             )
-            
             logger.debug("OpenAI API call completed")
+            return self._extract_image(response.choices[0].message)
             
-            # Extract image from response - handle different response formats
-            message = response.choices[0].message
-            
-            # Debug: log available attributes
-            logger.debug(f"Response message attributes: {dir(message)}")
-            
-            # Try multi_mod_content first (custom format from some proxies)
-            if hasattr(message, 'multi_mod_content') and message.multi_mod_content:
-                parts = message.multi_mod_content
-                for part in parts:
-                    if "text" in part:
-                        logger.debug(f"Response text: {part['text'][:100] if len(part['text']) > 100 else part['text']}")
-                    if "inline_data" in part:
-                        image_data = base64.b64decode(part["inline_data"]["data"])
-                        image = Image.open(BytesIO(image_data))
-                        logger.debug(f"Successfully extracted image: {image.size}, {image.mode}")
-                        return image
-            
-            # Try standard OpenAI content format (list of content parts)
-            if hasattr(message, 'content') and message.content:
-                # If content is a list (multimodal response)
-                if isinstance(message.content, list):
-                    for part in message.content:
-                        if isinstance(part, dict):
-                            # Handle image_url type
-                            if part.get('type') == 'image_url':
-                                image_url = part.get('image_url', {}).get('url', '')
-                                if image_url.startswith('data:image'):
-                                    # Extract base64 data from data URL
-                                    base64_data = image_url.split(',', 1)[1]
-                                    image_data = base64.b64decode(base64_data)
-                                    image = Image.open(BytesIO(image_data))
-                                    logger.debug(f"Successfully extracted image from content: {image.size}, {image.mode}")
-                                    return image
-                            # Handle text type
-                            elif part.get('type') == 'text':
-                                text = part.get('text', '')
-                                if text:
-                                    logger.debug(f"Response text: {text[:100] if len(text) > 100 else text}")
-                        elif hasattr(part, 'type'):
-                            # Handle as object with attributes
-                            if part.type == 'image_url':
-                                image_url = getattr(part, 'image_url', {})
-                                if isinstance(image_url, dict):
-                                    url = image_url.get('url', '')
-                                else:
-                                    url = getattr(image_url, 'url', '')
-                                if url.startswith('data:image'):
-                                    base64_data = url.split(',', 1)[1]
-                                    image_data = base64.b64decode(base64_data)
-                                    image = Image.open(BytesIO(image_data))
-                                    logger.debug(f"Successfully extracted image from content object: {image.size}, {image.mode}")
-                                    return image
-                # If content is a string, try to extract image from it
-                elif isinstance(message.content, str):
-                    content_str = message.content
-                    logger.debug(f"Response content (string): {content_str[:200] if len(content_str) > 200 else content_str}")
-                    
-                    # Try to extract Markdown image URL: ![...](url)
-                    markdown_pattern = r'!\[.*?\]\((https?://[^\s\)]+)\)'
-                    markdown_matches = re.findall(markdown_pattern, content_str)
-                    if markdown_matches:
-                        image_url = markdown_matches[0]  # Use the first image URL found
-                        logger.debug(f"Found Markdown image URL: {image_url}")
-                        try:
-                            response = requests.get(image_url, timeout=30, stream=True)
-                            response.raise_for_status()
-                            image = Image.open(BytesIO(response.content))
-                            image.load()  # Ensure image is fully loaded
-                            logger.debug(f"Successfully downloaded image from Markdown URL: {image.size}, {image.mode}")
-                            return image
-                        except Exception as download_error:
-                            logger.warning(f"Failed to download image from Markdown URL: {download_error}")
-                    
-                    # Try to extract plain URL (not in Markdown format)
-                    url_pattern = r'(https?://[^\s\)\]]+\.(?:png|jpg|jpeg|gif|webp|bmp)(?:\?[^\s\)\]]*)?)'
-                    url_matches = re.findall(url_pattern, content_str, re.IGNORECASE)
-                    if url_matches:
-                        image_url = url_matches[0]
-                        logger.debug(f"Found plain image URL: {image_url}")
-                        try:
-                            response = requests.get(image_url, timeout=30, stream=True)
-                            response.raise_for_status()
-                            image = Image.open(BytesIO(response.content))
-                            image.load()
-                            logger.debug(f"Successfully downloaded image from plain URL: {image.size}, {image.mode}")
-                            return image
-                        except Exception as download_error:
-                            logger.warning(f"Failed to download image from plain URL: {download_error}")
-                    
-                    # Try to extract base64 data URL from string
-                    base64_pattern = r'data:image/[^;]+;base64,([A-Za-z0-9+/=]+)'
-                    base64_matches = re.findall(base64_pattern, content_str)
-                    if base64_matches:
-                        base64_data = base64_matches[0]
-                        logger.debug(f"Found base64 image data in string")
-                        try:
-                            image_data = base64.b64decode(base64_data)
-                            image = Image.open(BytesIO(image_data))
-                            logger.debug(f"Successfully extracted base64 image from string: {image.size}, {image.mode}")
-                            return image
-                        except Exception as decode_error:
-                            logger.warning(f"Failed to decode base64 image from string: {decode_error}")
-            
-            # Log raw response for debugging
-            logger.warning(f"Unable to extract image. Raw message type: {type(message)}")
-            logger.warning(f"Message content type: {type(getattr(message, 'content', None))}")
-            logger.warning(f"Message content: {getattr(message, 'content', 'N/A')}")
-            
-            raise ValueError("No valid multimodal response received from OpenAI API")
+        except Exception as e:
+            error_detail = f"Error generating image with OpenAI (model={self.model}): {type(e).__name__}: {str(e)}"
+            logger.error(error_detail, exc_info=True)
+            raise Exception(error_detail) from e
+    
+    async def generate_image_async(
+        self,
+        prompt: str,
+        ref_images: Optional[List[Image.Image]] = None,
+        aspect_ratio: str = "16:9",
+        resolution: str = "2K"
+    ) -> Optional[Image.Image]:
+        """
+        Generate image using the OpenAI SDK async client
+        """
+        try:
+            # 参考图 base64 编码是 CPU 密集操作，放到线程里避免阻塞事件循环
+            request_kwargs = await asyncio.to_thread(
+                self._build_request, prompt, ref_images, aspect_ratio, resolution
+            )
+            response = await self._get_async_client().chat.completions.create(**request_kwargs)
+            logger.debug("OpenAI async API call completed")
+            # 响应里可能只有图片 URL，需要同步下载，同样放到线程里
+            return await asyncio.to_thread(self._extract_image, response.choices[0].message)
             
         except Exception as e:
             error_detail = f"Error generating image with OpenAI (model={self.model}): {type(e).__name__}: {str(e)}"
             logger.error(error_detail, exc_info=True)
             raise Exception(error_detail) from e
+    
+    def _build_request(self, prompt: str, ref_images: Optional[List[Image.Image]],
+                       aspect_ratio: str, resolution: str) -> dict:
+        """Build chat.completions.create kwargs"""
+        # Build message content
+        content = []
+        
+        # Add reference images first (if any)
+        if ref_images:
+            for ref_img in ref_images:
+                content.append({
+                    "type": "image_url",
+                    "image_url": {
+                        "url": self._encode_image_to_data_url(ref_img)
+                    }
+                })
+        
+        # Add text prompt
+        content.append({"type": "text", "text": prompt})
+        
+        logger.debug(f"Calling OpenAI API for image generation with {len(ref_images) if ref_images else 0} reference images...")
+        logger.debug(f"Config - aspect_ratio: {aspect_ratio} (resolution ignored, OpenAI format only supports 1K)")
+        
+        # Note: resolution is not supported in OpenAI format, only aspect_ratio via system message
+        return dict(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": f"aspect_ratio={aspect_ratio}"},
+                {"role": "user", "content": content},
+            ],
+            modalities=["text", "image"]
+        )
+    
+    def _extract_image(self, message) -> Image.Image:
+        """Extract the generated image from a chat completion message - handles different response formats"""
+        # Debug: log available attributes
+        logger.debug(f"Response message attributes: {dir(message)}")
+        
+        # Try multi_mod_content first (custom format from some proxies)
+        if hasattr(message, 'multi_mod_content') and message.multi_mod_content:
+            parts = message.multi_mod_content
+            for part in parts:
+                if "text" in part:
+                    logger.debug(f"Response text: {part['text'][:100] if len(part['text']) > 100 else part['text']}")
+                if "inline_data" in part:
+                    image_data = base64.b64decode(part["inline_data"]["data"])
+                    image = Image.open(BytesIO(image_data))
+                    logger.debug(f"Successfully extracted image: {image.size}, {image.mode}")
+                    return image
+        
+        # Try standard OpenAI content format (list of content parts)
+        if hasattr(message, 'content') and message.content:
+            # If content is a list (multimodal response)
+            if isinstance(message.content, list):
+                for part in message.content:
+                    if isinstance(part, dict):
+                        # Handle image_url type
+                        if part.get('type') == 'image_url':
+                            image_url = part.get('image_url', {}).get('url', '')
+                            if image_url.startswith('data:image'):
+                                # Extract base64 data from data URL
+                                base64_data = image_url.split(',', 1)[1]
+                                image_data = base64.b64decode(base64_data)
+                                image = Image.open(BytesIO(image_data))
+                                logger.debug(f"Successfully extracted image from content: {image.size}, {image.mode}")
+                                return image
+                        # Handle text type
+                        elif part.get('type') == 'text':
+                            text = part.get('text', '')
+                            if text:
+                                logger.debug(f"Response text: {text[:100] if len(text) > 100 else text}")
+                    elif hasattr(part, 'type'):
+                        # Handle as object with attributes
+                        if part.type == 'image_url':
+                            image_url = getattr(part, 'image_url', {})
+                            if isinstance(image_url, dict):
+                                url = image_url.get('url', '')
+                            else:
+                                url = getattr(image_url, 'url', '')
+                            if url.startswith('data:image'):
+                                base64_data = url.split(',', 1)[1]
+                                image_data = base64.b64decode(base64_data)
+                                image = Image.open(BytesIO(image_data))
+                                logger.debug(f"Successfully extracted image from content object: {image.size}, {image.mode}")
+                                return image
+            # If content is a string, try to extract image from it
+            elif isinstance(message.content, str):
+                content_str = message.content
+                logger.debug(f"Response content (string): {content_str[:200] if len(content_str) > 200 else content_str}")
+                
+                # Try to extract Markdown image URL: ![...](url)
+                markdown_pattern = r'!\[.*?\]\((https?://[^\s\)]+)\)'
+                markdown_matches = re.findall(markdown_pattern, content_str)
+                if markdown_matches:
+                    image_url = markdown_matches[0]  # Use the first image URL found
+                    logger.debug(f"Found Markdown image URL: {image_url}")
+                    try:
+                        response = requests.get(image_url, timeout=30, stream=True)
+                        response.raise_for_status()
+                        image = Image.open(BytesIO(response.content))
+                        image.load()  # Ensure image is fully loaded
+                        logger.debug(f"Successfully downloaded image from Markdown URL: {image.size}, {image.mode}")
+                        return image
+                    except Exception as download_error:
+                        logger.warning(f"Failed to download image from Markdown URL: {download_error}")
+                
+                # Try to extract plain URL (not in Markdown format)
+                url_pattern = r'(https?://[^\s\)\]]+\.(?:png|jpg|jpeg|gif|webp|bmp)(?:\?[^\s\)\]]*)?)'
+                url_matches = re.findall(url_pattern, content_str, re.IGNORECASE)
+                if url_matches:
+                    image_url = url_matches[0]
+                    logger.debug(f"Found plain image URL: {image_url}")
+                    try:
+                        response = requests.get(image_url, timeout=30, stream=True)
+                        response.raise_for_status()
+                        image = Image.open(BytesIO(response.content))
+                        image.load()
+                        logger.debug(f"Successfully downloaded image from plain URL: {image.size}, {image.mode}")
+                        return image
+                    except Exception as download_error:
+                        logger.warning(f"Failed to download image from plain URL: {download_error}")
+                
+                # Try to extract base64 data URL from string
+                base64_pattern = r'data:image/[^;]+;base64,([A-Za-z0-9+/=]+)'
+                base64_matches = re.findall(base64_pattern, content_str)
+                if base64_matches:
+                    base64_data = base64_matches[0]
+                    logger.debug(f"Found base64 image data in string")
+                    try:
+                        image_data = base64.b64decode(base64_data)
+                        image = Image.open(BytesIO(image_data))
+                        logger.debug(f"Successfully extracted base64 image from string: {image.size}, {image.mode}")
+                        return image
+                    except Exception as decode_error:
+                        logger.warning(f"Failed to decode base64 image from string: {decode_error}")
+        
+        # Log raw response for debugging
+        logger.warning(f"Unable to extract image. Raw message type: {type(message)}")
+        logger.warning(f"Message content type: {type(getattr(message, 'content', None))}")
+        logger.warning(f"Message content: {getattr(message, 'content', 'N/A')}")
+        
+        raise ValueError("No valid multimodal response received from OpenAI API")
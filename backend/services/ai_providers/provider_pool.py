@@ -0,0 +1,99 @@
+"""
+Provider Pool - process-wide registry of provider instances (and their SDK clients)
+
+以前每个请求（导出时甚至每个线程）都会新建 genai.Client / OpenAI 客户端，
+连接池和 TLS 会话随之丢弃。这里按 (类型, provider 格式, API Base, API Key 摘要, 模型)
+复用同一个 provider 实例：
+- SDK 客户端自带 keep-alive 连接池，复用实例即复用已建立的连接
+- 设置中的 provider 格式 / API Base / API Key 变化时调用 invalidate()，之后的请求使用新客户端；
+  正在进行的请求仍持有旧实例的引用，不受影响
+- 可选的启动预热（PROVIDER_WARMUP_ENABLED）：后台线程为默认模型创建客户端并预先建立连接
+"""
+import hashlib
+import logging
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class ProviderPool:
+    """Thread-safe registry of provider instances keyed by credentials and model"""
+
+    def __init__(self):
+        self._providers: Dict[Tuple, Any] = {}
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(kind: str, provider_format: str, api_base: Optional[str],
+                 api_key: Optional[str], model: str) -> Tuple:
+        """Registry key (only a digest of the API key is kept)"""
+        key_digest = hashlib.sha256((api_key or '').encode('utf-8')).hexdigest()[:16]
+        return kind, provider_format, api_base or '', key_digest, model
+
+    def get_or_create(self, key: Tuple, factory: Callable[[], Any]) -> Any:
+        """Shared provider for key, created with factory() on first use"""
+        with self._lock:
+            provider = self._providers.get(key)
+            if provider is not None:
+                self.reused += 1
+                return provider
+        # 在锁外创建客户端；并发创建时保留先完成的那个
+        provider = factory()
+        with self._lock:
+            existing = self._providers.get(key)
+            if existing is not None:
+                self.reused += 1
+                return existing
+            self._providers[key] = provider
+            self.created += 1
+            logger.info(f"Created shared {key[0]} provider: format={key[1]}, model={key[4]}")
+            return provider
+
+    def invalidate(self):
+        """Drop every cached provider (credentials or endpoint changed)"""
+        with self._lock:
+            dropped = len(self._providers)
+            self._providers.clear()
+            self.invalidations += 1
+        logger.info(f"Provider pool invalidated ({dropped} provider(s) dropped)")
+
+    def warm_up(self, app, text_model: Optional[str] = None, image_model: Optional[str] = None) -> threading.Thread:
+        """
+        Create the default providers and pre-connect them in a background thread
+
+        Args:
+            app: Flask app (credentials are read from its config)
+            text_model: Text model (defaults to app.config['TEXT_MODEL'])
+            image_model: Image model (defaults to app.config['IMAGE_MODEL'])
+        """
+        def run():
+            from . import get_text_provider, get_image_provider
+            with app.app_context():
+                for factory, model in ((get_text_provider, text_model or app.config.get('TEXT_MODEL')),
+                                       (get_image_provider, image_model or app.config.get('IMAGE_MODEL'))):
+                    try:
+                        factory(model=model).warm_up()
+                    except Exception as e:
+                        logger.warning(f"Provider warm-up skipped for {model}: {e}")
+
+        thread = threading.Thread(target=run, name='provider-warmup', daemon=True)
+        thread.start()
+        return thread
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'providers': [{'kind': key[0], 'format': key[1], 'api_base': key[2], 'model': key[4]}
+                              for key in self._providers],
+                'created': self.created,
+                'reused': self.reused,
+                'invalidations': self.invalidations,
+            }
+
+
+# Global provider pool instance
+provider_pool = ProviderPool()
@@ -1,12 +1,17 @@
 """
 Abstract base class for text generation providers
 """
+import asyncio
 from abc import ABC, abstractmethod
+from typing import Iterator
 
 
 class TextProvider(ABC):
     """Abstract base class for text generation"""
     
+    # 是否支持原生 JSON 输出（generate_json_text 约束模型只输出合法 JSON）
+    supports_json_mode = False
+    
     @abstractmethod
     def generate_text(self, prompt: str, thinking_budget: int = 1000) -> str:
         """
@@ -20,3 +25,46 @@ class TextProvider(ABC):
             Generated text content
         """
         pass
+    
+    async def generate_text_async(self, prompt: str, thinking_budget: int = 1000) -> str:
+        """
+        Async variant of generate_text
+        
+        Providers backed by an SDK with an async client override this; the
+        default runs the blocking call in a worker thread.
+        """
+        return await asyncio.to_thread(self.generate_text, prompt, thinking_budget)
+    
+    def stream_text(self, prompt: str, thinking_budget: int = 1000) -> Iterator[str]:
+        """
+        Generate text content as a stream of chunks
+        
+        Providers with a streaming API override this; the default yields the
+        whole generate_text result as a single chunk.
+        
+        Yields:
+            Text chunks in order (concatenated they form the full response)
+        """
+        yield self.generate_text(prompt, thinking_budget)
+    
+    def generate_json_text(self, prompt: str, thinking_budget: int = 1000) -> str:
+        """
+        Generate text that is expected to be a JSON document
+        
+        Providers with a structured-output mode override this (and set
+        supports_json_mode); the default is a plain generate_text call.
+        """
+        return self.generate_text(prompt, thinking_budget)
+    
+    async def generate_json_text_async(self, prompt: str, thinking_budget: int = 1000) -> str:
+        """Async variant of generate_json_text"""
+        return await asyncio.to_thread(self.generate_json_text, prompt, thinking_budget)
+    
+    def warm_up(self):
+        """
+        Open a connection to the endpoint ahead of the first real request
+        
+        Providers with a pooled SDK client override this with a cheap call;
+        errors are the caller's to log (warm-up is best effort).
+        """
+        pass
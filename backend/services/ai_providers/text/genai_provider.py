@@ -2,6 +2,7 @@
 Google GenAI SDK implementation for text generation
 """
 import logging
+from typing import Iterator
 from google import genai
 from google.genai import types
 from .base import TextProvider
@@ -12,6 +13,8 @@ logger = logging.getLogger(__name__)
 class GenAITextProvider(TextProvider):
     """Text generation using Google GenAI SDK"""
     
+    supports_json_mode = True
+    
     def __init__(self, api_key: str, api_base: str = None, model: str = "gemini-3-flash-preview"):
         """
         Initialize GenAI text provider
@@ -27,6 +30,10 @@ class GenAITextProvider(TextProvider):
         )
         self.model = model
     
+    def warm_up(self):
+        """Pre-connect the pooled HTTP client with a cheap model listing call"""
+        self.client.models.list(config={'page_size': 1})
+    
     def generate_text(self, prompt: str, thinking_budget: int = 1000) -> str:
         """
         Generate text using Google GenAI SDK
@@ -41,8 +48,55 @@ class GenAITextProvider(TextProvider):
         response = self.client.models.generate_content(
             model=self.model,
             contents=prompt,
-            config=types.GenerateContentConfig(
-                thinking_config=types.ThinkingConfig(thinking_budget=thinking_budget),
-            ),
+            config=self._build_config(thinking_budget),
+        )
+        return response.text
+    
+    async def generate_text_async(self, prompt: str, thinking_budget: int = 1000) -> str:
+        """
+        Generate text using the GenAI SDK async client (client.aio)
+        """
+        response = await self.client.aio.models.generate_content(
+            model=self.model,
+            contents=prompt,
+            config=self._build_config(thinking_budget),
         )
         return response.text
+    
+    def stream_text(self, prompt: str, thinking_budget: int = 1000) -> Iterator[str]:
+        """Stream text chunks using generate_content_stream"""
+        for chunk in self.client.models.generate_content_stream(
+            model=self.model,
+            contents=prompt,
+            config=self._build_config(thinking_budget),
+        ):
+            if chunk.text:
+                yield chunk.text
+    
+    def generate_json_text(self, prompt: str, thinking_budget: int = 1000) -> str:
+        """
+        Generate a JSON document (response_mime_type=application/json: no code fences
+        or surrounding prose, arrays and objects both allowed)
+        """
+        response = self.client.models.generate_content(
+            model=self.model,
+            contents=prompt,
+            config=self._build_config(thinking_budget, json_mode=True),
+        )
+        return response.text
+    
+    async def generate_json_text_async(self, prompt: str, thinking_budget: int = 1000) -> str:
+        """Async variant of generate_json_text (client.aio)"""
+        response = await self.client.aio.models.generate_content(
+            model=self.model,
+            contents=prompt,
+            config=self._build_config(thinking_budget, json_mode=True),
+        )
+        return response.text
+    
+    @staticmethod
+    def _build_config(thinking_budget: int, json_mode: bool = False) -> types.GenerateContentConfig:
+        return types.GenerateContentConfig(
+            thinking_config=types.ThinkingConfig(thinking_budget=thinking_budget),
+            response_mime_type='application/json' if json_mode else None,
+        )
@@ -2,7 +2,8 @@
 OpenAI SDK implementation for text generation
 """
 import logging
-from openai import OpenAI
+from typing import Iterator
+from openai import OpenAI, AsyncOpenAI
 from .base import TextProvider
 from config import get_config
 
@@ -28,6 +29,24 @@ class OpenAITextProvider(TextProvider):
             max_retries=get_config().OPENAI_MAX_RETRIES  # set max retries from config
         )
         self.model = model
+        self._api_key = api_key
+        self._api_base = api_base
+        self._async_client = None
+    
+    def _get_async_client(self) -> AsyncOpenAI:
+        """Lazily create the async client (bound to the event loop that first uses it)"""
+        if self._async_client is None:
+            self._async_client = AsyncOpenAI(
+                api_key=self._api_key,
+                base_url=self._api_base,
+                timeout=get_config().OPENAI_TIMEOUT,
+                max_retries=get_config().OPENAI_MAX_RETRIES
+            )
+        return self._async_client
+    
+    def warm_up(self):
+        """Pre-connect the pooled HTTP client with a cheap model listing call"""
+        self.client.with_options(max_retries=0, timeout=10).models.list()
     
     def generate_text(self, prompt: str, thinking_budget: int = 1000) -> str:
         """
@@ -47,3 +66,30 @@ class OpenAITextProvider(TextProvider):
             ]
         )
         return response.choices[0].message.content
+    
+    async def generate_text_async(self, prompt: str, thinking_budget: int = 1000) -> str:
+        """
+        Generate text using the OpenAI SDK async client
+        """
+        response = await self._get_async_client().chat.completions.create(
+            model=self.model,
+            messages=[
+                {"role": "user", "content": prompt}
+            ]
+        )
+        return response.choices[0].message.content
+    
+    def stream_text(self, prompt: str, thinking_budget: int = 1000) -> Iterator[str]:
+        """
+        Stream text chunks using the OpenAI SDK (stream=True)
+        """
+        stream = self.client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {"role": "user", "content": prompt}
+            ],
+            stream=True
+        )
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
@@ -1,14 +1,16 @@
 """
 AI Service - handles all AI model interactions
 Based on demo.py and gemini_genai.py
-TODO: use structured output API
+JSON output uses the provider's native JSON mode when supported; small format errors are repaired by parse_json_lenient
 """
 import os
 import json
 import re
+import asyncio
 import logging
-import requests
-from typing import List, Dict, Optional, Union
+import queue
+import threading
+from typing import Iterator, List, Dict, Optional, Union
 from textwrap import dedent
 from PIL import Image
 from tenacity import retry, stop_after_attempt, retry_if_exception_type
@@ -23,8 +25,15 @@ from .prompts import (
     get_outline_refinement_prompt,
     get_descriptions_refinement_prompt
 )
-from .ai_providers import get_text_provider, get_image_provider, TextProvider, ImageProvider
+from .ai_providers import get_text_provider, get_image_provider, get_provider_format, TextProvider, ImageProvider
+from .concurrency_governor import governor
+from .llm_cache import llm_cache
+from .image_cache import image_cache
+from .ref_image_cache import RefImageCache, PayloadBudget, fit_to_budget
+from .image_fetcher import image_fetcher
+from .reference_index import ReferenceIndex, retrieval_settings
 from config import get_config
+from utils.json_repair import parse_json_lenient, json_repair_stats
 
 logger = logging.getLogger(__name__)
 
@@ -53,6 +62,18 @@ class ProjectContext:
             self.creation_type = project_or_dict.get('creation_type', 'idea')
         
         self.reference_files_content = reference_files_content or []
+        self._reference_index = None
+        self._reference_index_lock = threading.Lock()
+    
+    @property
+    def reference_index(self) -> ReferenceIndex:
+        """BM25 index over the reference files, built once and shared by every page of a task"""
+        with self._reference_index_lock:
+            if self._reference_index is None:
+                self._reference_index = ReferenceIndex(
+                    self.reference_files_content, retrieval_settings()['chunk_tokens']
+                )
+            return self._reference_index
     
     def to_dict(self) -> Dict:
         """转换为字典，方便传递"""
@@ -88,13 +109,75 @@ class AIService:
         if has_app_context() and current_app and hasattr(current_app, "config"):
             self.text_model = current_app.config.get("TEXT_MODEL", config.TEXT_MODEL)
             self.image_model = current_app.config.get("IMAGE_MODEL", config.IMAGE_MODEL)
+            ref_image_entries = current_app.config.get("REF_IMAGE_CACHE_ENTRIES", config.REF_IMAGE_CACHE_ENTRIES)
+            json_mode = current_app.config.get("LLM_JSON_MODE", config.LLM_JSON_MODE)
         else:
             self.text_model = config.TEXT_MODEL
             self.image_model = config.IMAGE_MODEL
+            ref_image_entries = config.REF_IMAGE_CACHE_ENTRIES
+            json_mode = config.LLM_JSON_MODE
+        
+        # 一个任务共用一个 AIService：模板等参考图片只解码一次，所有页面复用
+        self.ref_image_cache = RefImageCache(ref_image_entries)
         
         # Use provided providers or create from factory based on AI_PROVIDER_FORMAT (from Flask config or env var)
         self.text_provider = text_provider or get_text_provider(model=self.text_model)
         self.image_provider = image_provider or get_image_provider(model=self.image_model)
+        # 用于全局并发治理的 provider 格式（与 ai_providers 工厂保持一致）
+        self.provider_format = get_provider_format()
+        # generate_json 是否使用 provider 的原生 JSON 输出（只看类属性，测试里的 MagicMock provider 不算支持）
+        self.json_mode = bool(json_mode) and getattr(type(self.text_provider), 'supports_json_mode', False) is True
+        # 参考图片上传前的压缩预算（最长边 / 字节上限 / 格式），可按 provider 格式单独配置
+        self.ref_image_budget = PayloadBudget.for_provider(
+            current_app.config if has_app_context() and current_app else config, self.provider_format
+        )
+    
+    def _text_cache_key(self, prompt: str, thinking_budget: int, json_mode: bool = False) -> str:
+        # 原生 JSON 输出与普通文本输出分开缓存
+        model = f'{self.text_model}:json' if json_mode else self.text_model
+        return llm_cache.make_key(self.provider_format, model, prompt, thinking_budget)
+    
+    def _generate_text(self, prompt: str, thinking_budget: int = 1000, use_cache: bool = True,
+                       json_mode: bool = False) -> str:
+        """
+        调用文本 provider（经过全局并发治理）
+        
+        相同请求优先从响应缓存返回（见 services/llm_cache.py）；use_cache=False 时绕过缓存，
+        但新的响应仍会写入缓存。json_mode=True 时使用 provider 的原生 JSON 输出
+        """
+        key = self._text_cache_key(prompt, thinking_budget, json_mode)
+        if use_cache:
+            cached = llm_cache.get(key)
+            if cached is not None:
+                return cached
+        else:
+            llm_cache.record_bypass()
+        with governor.limit('text', self.provider_format, self.text_model):
+            if json_mode:
+                response_text = self.text_provider.generate_json_text(prompt, thinking_budget=thinking_budget)
+            else:
+                response_text = self.text_provider.generate_text(prompt, thinking_budget=thinking_budget)
+        llm_cache.set(key, response_text)
+        return response_text
+    
+    async def _generate_text_async(self, prompt: str, thinking_budget: int = 1000, use_cache: bool = True,
+                                   json_mode: bool = False) -> str:
+        """_generate_text 的协程版本（provider 的 async 客户端 + 全局并发治理）"""
+        key = self._text_cache_key(prompt, thinking_budget, json_mode)
+        if use_cache:
+            # 磁盘层的读取放到线程里，避免阻塞事件循环
+            cached = await asyncio.to_thread(llm_cache.get, key)
+            if cached is not None:
+                return cached
+        else:
+            llm_cache.record_bypass()
+        async with governor.alimit('text', self.provider_format, self.text_model):
+            if json_mode:
+                response_text = await self.text_provider.generate_json_text_async(prompt, thinking_budget=thinking_budget)
+            else:
+                response_text = await self.text_provider.generate_text_async(prompt, thinking_budget=thinking_budget)
+        await asyncio.to_thread(llm_cache.set, key, response_text)
+        return response_text
     
     @staticmethod
     def extract_image_urls_from_markdown(text: str) -> List[str]:
@@ -157,13 +240,17 @@ class AIService:
         retry=retry_if_exception_type((json.JSONDecodeError, ValueError)),
         reraise=True
     )
-    def generate_json(self, prompt: str, thinking_budget: int = 1000) -> Union[Dict, List]:
+    def generate_json(self, prompt: str, thinking_budget: int = 1000, use_cache: bool = True) -> Union[Dict, List]:
         """
         生成并解析JSON，如果解析失败则重新生成
         
+        支持原生 JSON 输出的 provider 直接约束输出格式；代码块标记、前后说明文字、尾随逗号、
+        被截断的数组等小问题在本地修复（utils/json_repair.py），只有无法修复时才重新生成
+        
         Args:
             prompt: 生成提示词
             thinking_budget: 思考预算
+            use_cache: 是否允许返回缓存的响应
             
         Returns:
             解析后的JSON对象（字典或列表）
@@ -172,16 +259,22 @@ class AIService:
             json.JSONDecodeError: JSON解析失败（重试3次后仍失败）
         """
         # 调用AI生成文本
-        response_text = self.text_provider.generate_text(prompt, thinking_budget=thinking_budget)
-        
-        # 清理响应文本：移除markdown代码块标记和多余空白
-        cleaned_text = response_text.strip().strip("```json").strip("```").strip()
+        response_text = self._generate_text(prompt, thinking_budget=thinking_budget, use_cache=use_cache,
+                                            json_mode=self.json_mode)
         
         try:
-            return json.loads(cleaned_text)
+            result, repaired = parse_json_lenient(response_text)
         except json.JSONDecodeError as e:
-            logger.warning(f"JSON解析失败，将重新生成。原始文本: {cleaned_text[:200]}... 错误: {str(e)}")
+            json_repair_stats.record(None)
+            logger.warning(f"JSON解析失败，将重新生成。原始文本: {response_text[:200]}... 错误: {str(e)}")
+            # 无效响应不能留在缓存里，否则重试会拿到同一个结果
+            llm_cache.invalidate(self._text_cache_key(prompt, thinking_budget, self.json_mode))
             raise
+        
+        json_repair_stats.record(repaired)
+        if repaired:
+            logger.info(f"JSON响应已在本地修复，无需重新生成。原始文本: {response_text[:200]}...")
+        return result
     
     @staticmethod
     def _convert_mineru_path_to_local(mineru_path: str) -> Optional[str]:
@@ -202,7 +295,7 @@ class AIService:
     @staticmethod
     def download_image_from_url(url: str) -> Optional[Image.Image]:
         """
-        从 URL 下载图片并返回 PIL Image 对象
+        从 URL 下载图片并返回 PIL Image 对象（经由共享的 image_fetcher：连接池 + 磁盘缓存）
         
         Args:
             url: 图片 URL
@@ -210,49 +303,40 @@ class AIService:
         Returns:
             PIL Image 对象，如果下载失败则返回 None
         """
-        try:
-            logger.debug(f"Downloading image from URL: {url}")
-            response = requests.get(url, timeout=30, stream=True)
-            response.raise_for_status()
-            
-            # 从响应内容创建 PIL Image
-            image = Image.open(response.raw)
-            # 确保图片被加载
-            image.load()
-            logger.debug(f"Successfully downloaded image: {image.size}, {image.mode}")
-            return image
-        except Exception as e:
-            logger.error(f"Failed to download image from {url}: {str(e)}")
-            return None
+        return image_fetcher.fetch(url)
     
-    def generate_outline(self, project_context: ProjectContext, language: str = None) -> List[Dict]:
+    def generate_outline(self, project_context: ProjectContext, language: str = None,
+                         use_cache: bool = True) -> List[Dict]:
         """
         Generate PPT outline from idea prompt
         Based on demo.py gen_outline()
         
         Args:
             project_context: 项目上下文对象，包含所有原始信息
+            use_cache: False to always call the provider (regenerating an existing outline)
             
         Returns:
             List of outline items (may contain parts with pages or direct pages)
         """
         outline_prompt = get_outline_generation_prompt(project_context, language)
-        outline = self.generate_json(outline_prompt, thinking_budget=1000)
+        outline = self.generate_json(outline_prompt, thinking_budget=1000, use_cache=use_cache)
         return outline
     
-    def parse_outline_text(self, project_context: ProjectContext, language: str = None) -> List[Dict]:
+    def parse_outline_text(self, project_context: ProjectContext, language: str = None,
+                           use_cache: bool = True) -> List[Dict]:
         """
         Parse user-provided outline text into structured outline format
         This method analyzes the text and splits it into pages without modifying the original text
         
         Args:
             project_context: 项目上下文对象，包含所有原始信息
+            use_cache: False to always call the provider (regenerating an existing outline)
         
         Returns:
             List of outline items (may contain parts with pages or direct pages)
         """
         parse_prompt = get_outline_parsing_prompt(project_context, language)
-        outline = self.generate_json(parse_prompt, thinking_budget=1000)
+        outline = self.generate_json(parse_prompt, thinking_budget=1000, use_cache=use_cache)
         return outline
     
     def flatten_outline(self, outline: List[Dict]) -> List[Dict]:
@@ -274,7 +358,8 @@ class AIService:
         return pages
     
     def generate_page_description(self, project_context: ProjectContext, outline: List[Dict], 
-                                 page_outline: Dict, page_index: int, language='zh') -> str:
+                                 page_outline: Dict, page_index: int, language='zh',
+                                 use_cache: bool = True) -> str:
         """
         Generate description for a single page
         Based on demo.py gen_desc() logic
@@ -284,13 +369,96 @@ class AIService:
             outline: Complete outline
             page_outline: Outline for this specific page
             page_index: Page number (1-indexed)
+            use_cache: False to always call the provider (explicit regeneration)
         
         Returns:
             Text description for the page
         """
-        part_info = f"\nThis page belongs to: {page_outline['part']}" if 'part' in page_outline else ""
+        desc_prompt = self._build_page_description_prompt(
+            project_context, outline, page_outline, page_index, language
+        )
+        
+        response_text = self._generate_text(desc_prompt, thinking_budget=1000, use_cache=use_cache)
+        
+        return dedent(response_text)
+    
+    async def generate_page_description_async(self, project_context: ProjectContext, outline: List[Dict],
+                                              page_outline: Dict, page_index: int, language='zh',
+                                              use_cache: bool = True) -> str:
+        """Coroutine variant of generate_page_description"""
+        desc_prompt = self._build_page_description_prompt(
+            project_context, outline, page_outline, page_index, language
+        )
+        response_text = await self._generate_text_async(desc_prompt, thinking_budget=1000, use_cache=use_cache)
+        return dedent(response_text)
+    
+    def stream_page_description(self, project_context: ProjectContext, outline: List[Dict],
+                                page_outline: Dict, page_index: int, language='zh',
+                                use_cache: bool = True) -> Iterator[str]:
+        """
+        Streaming variant of generate_page_description
         
-        desc_prompt = get_page_description_prompt(
+        文本块在 provider 返回时立即产出；完整响应结束后才写入缓存，客户端中途断开时
+        （生成器被关闭）不缓存不完整的结果。缓存命中时整段文本作为一个块返回。
+        
+        Yields:
+            Description text chunks (joined and dedented they equal generate_page_description's result)
+        """
+        desc_prompt = self._build_page_description_prompt(
+            project_context, outline, page_outline, page_index, language
+        )
+        key = self._text_cache_key(desc_prompt, 1000)
+        if use_cache:
+            cached = llm_cache.get(key)
+            if cached is not None:
+                yield cached
+                return
+        else:
+            llm_cache.record_bypass()
+        
+        # provider 流由后台线程读取，只在读取期间占用文本并发槽位：客户端读得慢或中途断开
+        # （GeneratorExit）都不会一直占着槽位，断开后读取线程在下一个块到达时停止并释放
+        limiter = governor.get_limiter('text', self.provider_format, self.text_model)
+        received = queue.Queue()
+        stop = threading.Event()
+        
+        def pump():
+            try:
+                with limiter.slot():
+                    stream = self.text_provider.stream_text(desc_prompt, thinking_budget=1000)
+                    try:
+                        for chunk in stream:
+                            if stop.is_set():
+                                break
+                            received.put(('chunk', chunk))
+                    finally:
+                        close = getattr(stream, 'close', None)
+                        if close:
+                            close()
+                received.put(('done', None))
+            except Exception as e:
+                received.put(('error', e))
+        
+        threading.Thread(target=pump, name='description-stream', daemon=True).start()
+        chunks = []
+        try:
+            while True:
+                kind, value = received.get()
+                if kind == 'error':
+                    raise value
+                if kind == 'done':
+                    break
+                chunks.append(value)
+                yield value
+        finally:
+            stop.set()
+        llm_cache.set(key, ''.join(chunks))
+    
+    @staticmethod
+    def _build_page_description_prompt(project_context: ProjectContext, outline: List[Dict],
+                                       page_outline: Dict, page_index: int, language) -> str:
+        part_info = f"\nThis page belongs to: {page_outline['part']}" if 'part' in page_outline else ""
+        return get_page_description_prompt(
             project_context=project_context,
             outline=outline,
             page_outline=page_outline,
@@ -298,10 +466,6 @@ class AIService:
             part_info=part_info,
             language=language
         )
-        
-        response_text = self.text_provider.generate_text(desc_prompt, thinking_budget=1000)
-        
-        return dedent(response_text)
     
     def generate_outline_text(self, outline: List[Dict]) -> str:
         """
@@ -360,9 +524,18 @@ class AIService:
         
         return prompt
     
+    def _image_cache_key(self, prompt: str, aspect_ratio: str, resolution: str,
+                         ref_images: List[Image.Image]) -> Optional[str]:
+        """Result cache key of an image request (None when the image cache is disabled)"""
+        if not image_cache.is_enabled():
+            return None
+        return image_cache.make_image_key(self.provider_format, self.image_model, prompt,
+                                          aspect_ratio, resolution, ref_images)
+    
     def generate_image(self, prompt: str, ref_image_path: Optional[str] = None, 
                       aspect_ratio: str = "16:9", resolution: str = "2K",
-                      additional_ref_images: Optional[List[Union[str, Image.Image]]] = None) -> Optional[Image.Image]:
+                      additional_ref_images: Optional[List[Union[str, Image.Image]]] = None,
+                      new_variation: bool = False) -> Optional[Image.Image]:
         """
         Generate image using configured image provider
         Based on gemini_genai.py gen_image()
@@ -373,6 +546,7 @@ class AIService:
             aspect_ratio: Image aspect ratio
             resolution: Image resolution (note: OpenAI format only supports 1K)
             additional_ref_images: 额外的参考图片列表，可以是本地路径、URL 或 PIL Image 对象
+            new_variation: 用户要求“换一张”时为 True，跳过图片结果缓存（见 services/image_cache.py）
         
         Returns:
             PIL Image object or None if failed
@@ -386,60 +560,128 @@ class AIService:
                 logger.debug(f"Additional reference images: {len(additional_ref_images)}")
             logger.debug(f"Config - aspect_ratio: {aspect_ratio}, resolution: {resolution}")
 
-            # 构建参考图片列表
-            ref_images = []
-            
-            # 添加主参考图片（如果提供了路径）
-            if ref_image_path:
-                if not os.path.exists(ref_image_path):
-                    raise FileNotFoundError(f"Reference image not found: {ref_image_path}")
-                main_ref_image = Image.open(ref_image_path)
-                ref_images.append(main_ref_image)
+            ref_images = self._load_ref_images(ref_image_path, additional_ref_images)
             
-            # 添加额外的参考图片
-            if additional_ref_images:
-                for ref_img in additional_ref_images:
-                    if isinstance(ref_img, Image.Image):
-                        # 已经是 PIL Image 对象
-                        ref_images.append(ref_img)
-                    elif isinstance(ref_img, str):
-                        # 可能是本地路径或 URL
-                        if os.path.exists(ref_img):
-                            # 本地路径
-                            ref_images.append(Image.open(ref_img))
-                        elif ref_img.startswith('http://') or ref_img.startswith('https://'):
-                            # URL，需要下载
-                            downloaded_img = self.download_image_from_url(ref_img)
-                            if downloaded_img:
-                                ref_images.append(downloaded_img)
-                            else:
-                                logger.warning(f"Failed to download image from URL: {ref_img}, skipping...")
-                        elif ref_img.startswith('/files/mineru/'):
-                            # MinerU 本地文件路径，需要转换为文件系统路径（支持前缀匹配）
-                            local_path = self._convert_mineru_path_to_local(ref_img)
-                            if local_path and os.path.exists(local_path):
-                                ref_images.append(Image.open(local_path))
-                                logger.debug(f"Loaded MinerU image from local path: {local_path}")
-                            else:
-                                logger.warning(f"MinerU image file not found (with prefix matching): {ref_img}, skipping...")
-                        else:
-                            logger.warning(f"Invalid image reference: {ref_img}, skipping...")
+            key = self._image_cache_key(prompt, aspect_ratio, resolution, ref_images)
+            if key and not new_variation:
+                cached = image_cache.get(key)
+                if cached is not None:
+                    logger.debug(f"Image result cache hit: {key[:12]}")
+                    return cached
+            elif key:
+                image_cache.record_bypass()
             
             logger.debug(f"Calling image provider for generation with {len(ref_images)} reference images...")
             
-            # 使用 image_provider 生成图片
-            return self.image_provider.generate_image(
-                prompt=prompt,
-                ref_images=ref_images if ref_images else None,
-                aspect_ratio=aspect_ratio,
-                resolution=resolution
-            )
+            # 使用 image_provider 生成图片（经过全局并发治理）
+            with governor.limit('image', self.provider_format, self.image_model):
+                image = self.image_provider.generate_image(
+                    prompt=prompt,
+                    ref_images=ref_images if ref_images else None,
+                    aspect_ratio=aspect_ratio,
+                    resolution=resolution
+                )
+            if key and image is not None:
+                image_cache.set(key, image)
+            return image
             
         except Exception as e:
             error_detail = f"Error generating image: {type(e).__name__}: {str(e)}"
             logger.error(error_detail, exc_info=True)
             raise Exception(error_detail) from e
     
+    def _load_ref_images(self, ref_image_path: Optional[str] = None,
+                         additional_ref_images: Optional[List[Union[str, Image.Image]]] = None) -> List[Image.Image]:
+        """
+        Load the template image and additional reference images (local paths, URLs,
+        MinerU paths or PIL Images) into a list of PIL Images
+        
+        Local files are decoded through self.ref_image_cache, so every page of a task
+        gets the same (read-only) image object and no file handle is left open.
+        Every image is then fitted to self.ref_image_budget (downscaled/compressed once
+        per image; providers upload the prepared bytes).
+        """
+        ref_images = []
+        
+        # 添加主参考图片（如果提供了路径）
+        if ref_image_path:
+            if not os.path.exists(ref_image_path):
+                raise FileNotFoundError(f"Reference image not found: {ref_image_path}")
+            ref_images.append(self.ref_image_cache.load(ref_image_path))
+        
+        # 添加额外的参考图片
+        if additional_ref_images:
+            # 先并发下载这一页用到的所有远程图片（同一 URL 只下载一次）
+            remote_images = image_fetcher.prefetch([
+                ref_img for ref_img in additional_ref_images
+                if isinstance(ref_img, str) and not os.path.exists(ref_img)
+                and ref_img.startswith(('http://', 'https://'))
+            ])
+            for ref_img in additional_ref_images:
+                if isinstance(ref_img, Image.Image):
+                    # 已经是 PIL Image 对象
+                    ref_images.append(ref_img)
+                elif isinstance(ref_img, str):
+                    # 可能是本地路径或 URL
+                    if os.path.exists(ref_img):
+                        # 本地路径
+                        ref_images.append(self.ref_image_cache.load(ref_img))
+                    elif ref_img.startswith('http://') or ref_img.startswith('https://'):
+                        # URL，已在上面并发下载
+                        downloaded_img = remote_images.get(ref_img)
+                        if downloaded_img:
+                            ref_images.append(downloaded_img)
+                        else:
+                            logger.warning(f"Failed to download image from URL: {ref_img}, skipping...")
+                    elif ref_img.startswith('/files/mineru/'):
+                        # MinerU 本地文件路径，需要转换为文件系统路径（支持前缀匹配）
+                        local_path = self._convert_mineru_path_to_local(ref_img)
+                        if local_path and os.path.exists(local_path):
+                            ref_images.append(self.ref_image_cache.load(local_path))
+                            logger.debug(f"Loaded MinerU image from local path: {local_path}")
+                        else:
+                            logger.warning(f"MinerU image file not found (with prefix matching): {ref_img}, skipping...")
+                    else:
+                        logger.warning(f"Invalid image reference: {ref_img}, skipping...")
+        
+        return [fit_to_budget(image, self.ref_image_budget) for image in ref_images]
+    
+    async def generate_image_async(self, prompt: str, ref_image_path: Optional[str] = None,
+                                   aspect_ratio: str = "16:9", resolution: str = "2K",
+                                   additional_ref_images: Optional[List[Union[str, Image.Image]]] = None,
+                                   new_variation: bool = False) -> Optional[Image.Image]:
+        """
+        Coroutine variant of generate_image
+        
+        Reference images are loaded (and the result cache consulted) in a worker thread
+        (disk / network I/O), then the provider's async client is awaited under the
+        global concurrency governor.
+        """
+        try:
+            ref_images = await asyncio.to_thread(self._load_ref_images, ref_image_path, additional_ref_images)
+            key = await asyncio.to_thread(self._image_cache_key, prompt, aspect_ratio, resolution, ref_images)
+            if key and not new_variation:
+                cached = await asyncio.to_thread(image_cache.get, key)
+                if cached is not None:
+                    logger.debug(f"Image result cache hit: {key[:12]}")
+                    return cached
+            elif key:
+                image_cache.record_bypass()
+            async with governor.alimit('image', self.provider_format, self.image_model):
+                image = await self.image_provider.generate_image_async(
+                    prompt=prompt,
+                    ref_images=ref_images if ref_images else None,
+                    aspect_ratio=aspect_ratio,
+                    resolution=resolution
+                )
+            if key and image is not None:
+                await asyncio.to_thread(image_cache.set, key, image)
+            return image
+        except Exception as e:
+            error_detail = f"Error generating image: {type(e).__name__}: {str(e)}"
+            logger.error(error_detail, exc_info=True)
+            raise Exception(error_detail) from e
+    
     def edit_image(self, prompt: str, current_image_path: str,
                   aspect_ratio: str = "16:9", resolution: str = "2K",
                   original_description: str = None,
@@ -464,7 +706,9 @@ class AIService:
             edit_instruction=prompt,
             original_description=original_description
         )
-        return self.generate_image(edit_instruction, current_image_path, aspect_ratio, resolution, additional_ref_images)
+        # 再次提交同一条编辑指令意味着想要新的结果，不使用图片结果缓存
+        return self.generate_image(edit_instruction, current_image_path, aspect_ratio, resolution,
+                                   additional_ref_images, new_variation=True)
     
     def parse_description_to_outline(self, project_context: ProjectContext, language='zh') -> List[Dict]:
         """
@@ -0,0 +1,70 @@
+"""
+Async Executor - a process-wide asyncio event loop running in one background thread
+
+任务层通过 submit() 把协程（如 AIService.generate_image_async）投递到这个事件循环，
+拿到的是标准的 concurrent.futures.Future，可以直接配合 as_completed() 使用。
+一个循环线程即可同时挂起上百个 30-90 秒的生成请求，而不需要为每个请求占用一个 OS 线程；
+上游真实并发仍由 concurrency_governor 控制。
+"""
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Coroutine, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncExecutor:
+    """Runs coroutines on a dedicated event loop thread"""
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None or self._loop.is_closed():
+                loop = asyncio.new_event_loop()
+                ready = threading.Event()
+
+                def run():
+                    asyncio.set_event_loop(loop)
+                    loop.call_soon(ready.set)
+                    loop.run_forever()
+
+                self._thread = threading.Thread(target=run, name='async-executor', daemon=True)
+                self._thread.start()
+                ready.wait()
+                self._loop = loop
+                logger.info("Async executor event loop started")
+            return self._loop
+
+    def submit(self, coro: Coroutine) -> Future:
+        """
+        Schedule a coroutine on the loop thread
+
+        Returns:
+            concurrent.futures.Future resolved with the coroutine's result
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+
+    def run(self, coro: Coroutine, timeout: Optional[float] = None):
+        """Run a coroutine on the loop thread and block until it finishes"""
+        return self.submit(coro).result(timeout)
+
+    def shutdown(self):
+        """Stop the loop thread (pending coroutines are abandoned)"""
+        with self._lock:
+            loop, self._loop = self._loop, None
+            thread, self._thread = self._thread, None
+        if loop and not loop.is_closed():
+            loop.call_soon_threadsafe(loop.stop)
+            if thread:
+                thread.join(timeout=5)
+            loop.close()
+
+
+# Global async executor instance
+async_executor = AsyncExecutor()
@@ -0,0 +1,501 @@
+"""
+Concurrency Governor - process-wide limits on upstream AI provider calls
+
+每个 (kind, provider_format, model) 对应一个 ProviderLimiter：
+- max-in-flight：同时进行中的请求数上限（所有任务/线程共享）
+- token bucket：每分钟请求数上限（可选，0 表示不限速）
+
+无论同时有多少个项目在生成，对同一 provider/model 的总并发都受这里约束，
+各任务内部的 ThreadPoolExecutor 只决定排队的线程数，不再决定上游并发。
+
+开启 ADAPTIVE_CONCURRENCY 后，max-in-flight 由 AIMDController 动态调整：以 *_MAX_CONCURRENCY
+为初始窗口，延迟与错误率健康时加性增大（最多到 ADAPTIVE_CONCURRENCY_MAX，用于探测真实配额），
+遇到 429/5xx 或 p95 延迟明显上升时乘性减小。
+"""
+import re
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager, asynccontextmanager
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# kind -> (max in-flight config key, rate limit config key)
+_LIMIT_CONFIG_KEYS = {
+    'text': ('TEXT_MAX_CONCURRENCY', 'TEXT_RATE_LIMIT_PER_MIN'),
+    'image': ('IMAGE_MAX_CONCURRENCY', 'IMAGE_RATE_LIMIT_PER_MIN'),
+    'caption': ('CAPTION_MAX_CONCURRENCY', 'CAPTION_RATE_LIMIT_PER_MIN'),
+}
+
+
+def _get_config_value(key: str, default: int) -> int:
+    """Read an integer setting: Flask app.config > Config class > default"""
+    try:
+        from flask import current_app, has_app_context
+        if has_app_context() and key in current_app.config:
+            return int(current_app.config[key])
+    except (ImportError, TypeError, ValueError):
+        pass
+    from config import get_config
+    return int(getattr(get_config(), key, default))
+
+
+class TokenBucket:
+    """Thread-safe token bucket (rate per minute, burst = capacity)"""
+
+    def __init__(self, rate_per_min: float, capacity: Optional[float] = None):
+        self.rate = rate_per_min / 60.0  # tokens per second
+        self.capacity = capacity if capacity else max(1.0, self.rate)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def try_acquire(self) -> float:
+        """Take a token if available; returns 0, or the seconds to wait before retrying"""
+        with self.lock:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        """Block until a token is available"""
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        """Wait (without blocking the event loop) until a token is available"""
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+
+# 异常类型名（SDK 未带状态码时）
+_THROTTLED_ERROR_TYPES = {'RateLimitError', 'ResourceExhausted', 'TooManyRequests'}
+_SERVER_ERROR_TYPES = {'InternalServerError', 'ServerError', 'ServiceUnavailable'}
+
+# 只认状态码所在的位置，避免 "max 1500 tokens" 这类文本被误判：
+# - "status 503" / "status_code=429" / "HTTP 502" / "HTTP/1.1 504" / "error code: 500"
+# - 消息（或包装后的 ": " 之后）以 "503 UNAVAILABLE" / "429 Too Many Requests" 这类状态码 + 状态名开头
+_STATUS_PATTERNS = (
+    re.compile(r'\b(?:status(?:[ _]?code)?|http(?:/\d(?:\.\d)?)?|error[ _]code)\W{0,3}(\d{3})\b', re.IGNORECASE),
+    re.compile(r'(?:^|:\s*)(\d{3})\s+(?:[A-Z][A-Z_]{3,}\b|Too Many Requests|Internal Server Error|Bad Gateway'
+               r'|Service Unavailable|Gateway Time-?out)'),
+)
+
+
+def _status_of(error: BaseException) -> Optional[int]:
+    """HTTP status carried by an SDK exception (status_code / code / status / response.status_code)"""
+    for candidate in (getattr(error, 'status_code', None), getattr(error, 'code', None),
+                      getattr(error, 'status', None),
+                      getattr(getattr(error, 'response', None), 'status_code', None)):
+        if isinstance(candidate, int) and not isinstance(candidate, bool):
+            return candidate
+    return None
+
+
+def _classify_status(status: int) -> Optional[str]:
+    if status == 429:
+        return 'throttled'
+    if 500 <= status < 600:
+        return 'server'
+    return None
+
+
+def classify_provider_error(error: BaseException) -> Optional[str]:
+    """
+    Classify an exception raised by a provider call
+
+    Providers wrap SDK errors (``raise Exception(...) from e``), so the whole
+    cause chain is inspected for HTTP status codes and SDK exception types first;
+    the message text is only used as a fallback, with anchored status patterns.
+
+    Returns:
+        'throttled' for 429 / quota errors, 'server' for 5xx, None otherwise
+    """
+    chain = []
+    current = error
+    while current is not None and all(current is not seen for seen in chain):
+        chain.append(current)
+        current = current.__cause__ or current.__context__
+
+    for current in chain:
+        status = _status_of(current)
+        if status is not None:
+            kind = _classify_status(status)
+            if kind:
+                return kind
+        type_names = {cls.__name__ for cls in type(current).__mro__}
+        if type_names & _THROTTLED_ERROR_TYPES:
+            return 'throttled'
+        if type_names & _SERVER_ERROR_TYPES:
+            return 'server'
+
+    for current in chain:
+        message = str(current)
+        if 'RESOURCE_EXHAUSTED' in message or 'rate limit' in message.lower():
+            return 'throttled'
+        if re.search(r'\b(?:UNAVAILABLE|INTERNAL)\b', message):
+            return 'server'
+        for pattern in _STATUS_PATTERNS:
+            for match in pattern.finditer(message):
+                kind = _classify_status(int(match.group(1)))
+                if kind:
+                    return kind
+    return None
+
+
+class AIMDController:
+    """
+    Additive-increase / multiplicative-decrease window for one limiter
+
+    - success with healthy latency and error rate <= max_error_rate:
+      window += increase / window (≈ +increase per full window)
+    - 429 / 5xx: window *= decrease_factor (at most once per cooldown period)
+    - p95 latency above latency_tolerance x baseline p95: window *= latency_decrease_factor
+      (only once min_latency_samples successes have been seen)
+
+    The baseline is an EWMA of the p95 (weight baseline_alpha per sample), so it
+    follows a lasting change in the latency mix instead of sticking to the
+    lowest p95 ever seen; a single slow call cannot keep cutting the window.
+    """
+
+    def __init__(self, initial: int, min_limit: int = 1, max_limit: int = 32,
+                 increase: float = 1.0, decrease_factor: float = 0.5,
+                 latency_decrease_factor: float = 0.8, latency_tolerance: float = 1.5,
+                 sample_size: int = 50, cooldown_seconds: float = 5.0,
+                 min_latency_samples: int = 20, baseline_alpha: float = 0.05,
+                 max_error_rate: float = 0.05):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.window = float(min(max(initial, self.min_limit), self.max_limit))
+        self.increase = increase
+        self.decrease_factor = decrease_factor
+        self.latency_decrease_factor = latency_decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.cooldown_seconds = cooldown_seconds
+        self.min_latency_samples = max(5, min(min_latency_samples, sample_size))
+        self.baseline_alpha = baseline_alpha
+        self.max_error_rate = max_error_rate
+        self.latencies = deque(maxlen=sample_size)
+        self.outcomes = deque(maxlen=sample_size)  # True = error
+        self.baseline_p95 = None
+        self.last_decrease_at = 0.0
+        self.throttled_count = 0
+        self.server_error_count = 0
+
+    def p95(self) -> Optional[float]:
+        if len(self.latencies) < 5:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return sum(1 for failed in self.outcomes if failed) / len(self.outcomes)
+
+    def _decrease(self, factor: float):
+        now = time.monotonic()
+        if now - self.last_decrease_at < self.cooldown_seconds:
+            return
+        self.last_decrease_at = now
+        self.window = max(self.min_limit, self.window * factor)
+
+    def record(self, latency: float, error_kind: Optional[str]) -> int:
+        """
+        Feed one call outcome into the controller
+
+        Args:
+            latency: Call duration in seconds
+            error_kind: None for success, 'throttled' / 'server' / 'other' for failures
+
+        Returns:
+            New integer window
+        """
+        self.outcomes.append(error_kind is not None)
+        if error_kind in ('throttled', 'server'):
+            if error_kind == 'throttled':
+                self.throttled_count += 1
+            else:
+                self.server_error_count += 1
+            self._decrease(self.decrease_factor)
+            return int(self.window)
+
+        if error_kind is None:
+            self.latencies.append(latency)
+            p95 = self.p95()
+            if p95 is not None and len(self.latencies) >= self.min_latency_samples:
+                if self.baseline_p95 is None:
+                    self.baseline_p95 = p95
+                degraded = p95 > self.baseline_p95 * self.latency_tolerance
+                # 基线随 p95 缓慢移动（上升和下降都会跟随），持续变慢后不再一直缩小窗口
+                self.baseline_p95 += self.baseline_alpha * (p95 - self.baseline_p95)
+                if degraded:
+                    self._decrease(self.latency_decrease_factor)
+                    return int(self.window)
+            # 近期仍有失败（如超时、连接错误）时保持窗口，不继续向上探测
+            if self.error_rate() <= self.max_error_rate:
+                self.window = min(self.max_limit, self.window + self.increase / self.window)
+        return int(self.window)
+
+    def stats(self) -> Dict:
+        p95 = self.p95()
+        return {
+            'window': round(self.window, 2),
+            'min_limit': self.min_limit,
+            'max_limit': self.max_limit,
+            'p95_latency': round(p95, 3) if p95 is not None else None,
+            'baseline_p95_latency': round(self.baseline_p95, 3) if self.baseline_p95 is not None else None,
+            'error_rate': round(self.error_rate(), 3),
+            'throttled_count': self.throttled_count,
+            'server_error_count': self.server_error_count,
+        }
+
+
+def _resolve_waiter(waiter: 'asyncio.Future'):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class ProviderLimiter:
+    """Max-in-flight limiter (resizable) combined with an optional token bucket"""
+
+    def __init__(self, key: Tuple[str, str, str], max_in_flight: int, rate_per_min: int = 0,
+                 adaptive: Optional[AIMDController] = None):
+        self.key = key
+        self.limit = max(1, max_in_flight)
+        self.in_flight = 0
+        self.waiting = 0
+        self.total_calls = 0
+        self.condition = threading.Condition()
+        # 协程等待者：(事件循环, future)，释放槽位时在其所属循环上唤醒
+        self._async_waiters: deque = deque()
+        self.bucket = TokenBucket(rate_per_min, capacity=self.limit) if rate_per_min > 0 else None
+        self.adaptive = adaptive
+        if adaptive:
+            self.limit = int(adaptive.window)
+
+    def set_limit(self, limit: int):
+        """Change the in-flight limit; waiters are woken up if it grew"""
+        with self.condition:
+            self.limit = max(1, int(limit))
+            self.condition.notify_all()
+            self._wake_async_waiters(all_waiters=True)
+
+    def acquire(self):
+        with self.condition:
+            self.waiting += 1
+            try:
+                while self.in_flight >= self.limit:
+                    self.condition.wait()
+                self.in_flight += 1
+                self.total_calls += 1
+            finally:
+                self.waiting -= 1
+        if self.bucket:
+            self.bucket.acquire()
+
+    def try_acquire(self) -> bool:
+        """Take a slot without waiting; returns False if the limiter is full"""
+        with self.condition:
+            if self.in_flight >= self.limit:
+                return False
+            self.in_flight += 1
+            self.total_calls += 1
+            return True
+
+    def _wake_async_waiters(self, all_waiters: bool = False):
+        """Resolve waiting coroutines' futures on their own loops (caller holds the condition)"""
+        while self._async_waiters:
+            loop, waiter = self._async_waiters.popleft()
+            try:
+                loop.call_soon_threadsafe(_resolve_waiter, waiter)
+            except RuntimeError:
+                continue  # 循环已关闭，等待者随之消失
+            if not all_waiters:
+                return
+
+    async def acquire_async(self):
+        """
+        Event-loop friendly acquire: a waiting coroutine parks on a future that
+        release()/set_limit() resolve, so one loop thread can keep many calls
+        waiting for slots without blocking or polling
+        """
+        loop = asyncio.get_running_loop()
+        with self.condition:
+            self.waiting += 1
+        try:
+            while True:
+                with self.condition:
+                    if self.in_flight < self.limit:
+                        self.in_flight += 1
+                        self.total_calls += 1
+                        break
+                    waiter = loop.create_future()
+                    self._async_waiters.append((loop, waiter))
+                try:
+                    await waiter
+                except asyncio.CancelledError:
+                    with self.condition:
+                        try:
+                            self._async_waiters.remove((loop, waiter))
+                        except ValueError:
+                            # 已被唤醒但不再需要槽位：把唤醒让给下一个等待者
+                            self.condition.notify()
+                            self._wake_async_waiters()
+                    raise
+        finally:
+            with self.condition:
+                self.waiting -= 1
+        if self.bucket:
+            await self.bucket.acquire_async()
+
+    def release(self, latency: Optional[float] = None, error: Optional[BaseException] = None):
+        """
+        Free the slot; with an adaptive controller the outcome also moves the window
+
+        Args:
+            latency: Call duration in seconds (None skips adaptive accounting)
+            error: Exception raised by the call, if any
+        """
+        with self.condition:
+            self.in_flight -= 1
+            if self.adaptive and latency is not None:
+                error_kind = None
+                if error is not None:
+                    error_kind = classify_provider_error(error) or 'other'
+                new_limit = self.adaptive.record(latency, error_kind)
+                if new_limit != self.limit:
+                    logger.info(f"Adaptive limit for {self.key}: {self.limit} -> {new_limit}")
+                    self.limit = new_limit
+                self.condition.notify_all()
+                self._wake_async_waiters(all_waiters=True)
+            else:
+                # 同步与协程等待者各唤醒一个，抢不到槽位的一方重新等待
+                self.condition.notify()
+                self._wake_async_waiters()
+
+    @contextmanager
+    def slot(self):
+        """Hold one slot for the duration of the block; its outcome feeds the adaptive window"""
+        self.acquire()
+        started = time.monotonic()
+        try:
+            yield self
+        except BaseException as e:
+            self.release(time.monotonic() - started, e)
+            raise
+        else:
+            self.release(time.monotonic() - started)
+
+    def stats(self) -> Dict:
+        with self.condition:
+            data = {
+                'kind': self.key[0],
+                'provider_format': self.key[1],
+                'model': self.key[2],
+                'limit': self.limit,
+                'in_flight': self.in_flight,
+                'waiting': self.waiting,
+                'total_calls': self.total_calls,
+                'adaptive': self.adaptive is not None,
+            }
+            if self.adaptive:
+                data.update(self.adaptive.stats())
+            return data
+
+
+class ConcurrencyGovernor:
+    """Registry of per-provider limiters shared by the whole process"""
+
+    def __init__(self):
+        self._limiters: Dict[Tuple[str, str, str], ProviderLimiter] = {}
+        self._lock = threading.Lock()
+
+    def get_limiter(self, kind: str, provider_format: str, model: str) -> ProviderLimiter:
+        """Get (or lazily create from config) the limiter for a provider/model"""
+        key = (kind, (provider_format or 'gemini').lower(), model or '')
+        with self._lock:
+            limiter = self._limiters.get(key)
+            if limiter is None:
+                concurrency_key, rate_key = _LIMIT_CONFIG_KEYS.get(kind, _LIMIT_CONFIG_KEYS['text'])
+                max_in_flight = _get_config_value(concurrency_key, 8)
+                adaptive = None
+                if _get_config_value('ADAPTIVE_CONCURRENCY', 1):
+                    # 从手工配置的 *_MAX_CONCURRENCY 起步，健康时可向上探测到 ADAPTIVE_CONCURRENCY_MAX
+                    adaptive = AIMDController(
+                        initial=max_in_flight,
+                        min_limit=_get_config_value('ADAPTIVE_CONCURRENCY_MIN', 1),
+                        max_limit=max(max_in_flight, _get_config_value('ADAPTIVE_CONCURRENCY_MAX', 32))
+                    )
+                limiter = ProviderLimiter(
+                    key,
+                    max_in_flight=max_in_flight,
+                    rate_per_min=_get_config_value(rate_key, 0),
+                    adaptive=adaptive
+                )
+                self._limiters[key] = limiter
+                logger.info(f"Created provider limiter {key}: max_in_flight={limiter.limit}")
+            return limiter
+
+    @contextmanager
+    def limit(self, kind: str, provider_format: str, model: str):
+        """
+        Hold one upstream slot for the duration of the block
+
+        Usage:
+            with governor.limit('image', 'gemini', model):
+                provider.generate_image(...)
+        """
+        with self.get_limiter(kind, provider_format, model).slot() as limiter:
+            yield limiter
+
+    @asynccontextmanager
+    async def alimit(self, kind: str, provider_format: str, model: str):
+        """
+        Async variant of limit() for coroutine-based provider calls
+
+        Usage:
+            async with governor.alimit('image', 'gemini', model):
+                await provider.generate_image_async(...)
+        """
+        limiter = self.get_limiter(kind, provider_format, model)
+        await limiter.acquire_async()
+        started = time.monotonic()
+        try:
+            yield limiter
+        except BaseException as e:
+            limiter.release(time.monotonic() - started, e)
+            raise
+        else:
+            limiter.release(time.monotonic() - started)
+
+    def stats(self) -> list:
+        """Snapshot of every limiter (for metrics/debugging)"""
+        with self._lock:
+            limiters = list(self._limiters.values())
+        return [limiter.stats() for limiter in limiters]
+
+    def reset(self):
+        """Drop all limiters so they are re-created from the current config"""
+        with self._lock:
+            self._limiters.clear()
+
+
+# Global governor instance
+governor = ConcurrencyGovernor()
@@ -627,10 +627,11 @@ class FileParserService:
         try:
             # Load image based on URL type
             if image_url.startswith('http://') or image_url.startswith('https://'):
-                # Download from HTTP(S) URL
-                response = requests.get(image_url, timeout=30)
-                response.raise_for_status()
-                image = Image.open(io.BytesIO(response.content))
+                # Download from HTTP(S) URL (shared session + disk cache)
+                from services.image_fetcher import image_fetcher
+                image = image_fetcher.fetch(image_url)
+                if image is None:
+                    return ""
             elif image_url.startswith('/files/mineru/'):
                 # Local MinerU extracted file with prefix matching support
                 from utils.path_utils import find_mineru_file_with_prefix
@@ -651,54 +652,70 @@ class FileParserService:
             # Generate caption based on provider format
             prompt = "请用一句简短的中文描述这张图片的主要内容。只返回描述文字，不要其他解释。"
             
-            if self._provider_format == 'openai':
-                # Use OpenAI SDK format
-                client = self._get_openai_client()
-                if not client:
-                    logger.warning("OpenAI client not initialized, skipping caption generation")
-                    return ""
-                
-                # Encode image to base64
-                buffered = io.BytesIO()
-                if image.mode in ('RGBA', 'LA', 'P'):
-                    image = image.convert('RGB')
-                image.save(buffered, format="JPEG", quality=95)
-                base64_image = base64.b64encode(buffered.getvalue()).decode('utf-8')
-                
-                response = client.chat.completions.create(
-                    model=self.image_caption_model,
-                    messages=[
-                        {
-                            "role": "user",
-                            "content": [
-                                {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}},
-                                {"type": "text", "text": prompt}
-                            ]
-                        }
-                    ],
-                    temperature=0.3
-                )
-                caption = response.choices[0].message.content.strip()
-            else:
-                # Use Gemini SDK format (default)
-                from google.genai import types
-                client = self._get_gemini_client()
-                if not client:
-                    logger.warning("Gemini client not initialized, skipping caption generation")
-                    return ""
-                
-                result = client.models.generate_content(
-                    model=self.image_caption_model,
-                    contents=[image, prompt],
-                    config=types.GenerateContentConfig(
-                        temperature=0.3,  # Lower temperature for more consistent captions
-                    )
-                )
-                caption = result.text.strip()
-            
-            return caption
+            # 所有 caption 调用经过全局并发治理，与其他项目的生成任务共享上游配额
+            from services.concurrency_governor import governor
+            with governor.limit('caption', self._provider_format, self.image_caption_model):
+                return self._call_caption_model(image, prompt)
             
         except Exception as e:
             logger.warning(f"Failed to generate caption for {image_url}: {str(e)}")
             return ""  # Return empty string on failure
+    
+    def _call_caption_model(self, image: Image.Image, prompt: str) -> str:
+        """
+        Call the configured caption model for a loaded image
+        
+        Args:
+            image: PIL Image object
+            prompt: Caption prompt
+            
+        Returns:
+            Generated caption (empty if no client is available)
+        """
+        if self._provider_format == 'openai':
+            # Use OpenAI SDK format
+            client = self._get_openai_client()
+            if not client:
+                logger.warning("OpenAI client not initialized, skipping caption generation")
+                return ""
+            
+            # Encode image to base64
+            buffered = io.BytesIO()
+            if image.mode in ('RGBA', 'LA', 'P'):
+                image = image.convert('RGB')
+            image.save(buffered, format="JPEG", quality=95)
+            base64_image = base64.b64encode(buffered.getvalue()).decode('utf-8')
+            
+            response = client.chat.completions.create(
+                model=self.image_caption_model,
+                messages=[
+                    {
+                        "role": "user",
+                        "content": [
+                            {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}},
+                            {"type": "text", "text": prompt}
+                        ]
+                    }
+                ],
+                temperature=0.3
+            )
+            caption = response.choices[0].message.content.strip()
+        else:
+            # Use Gemini SDK format (default)
+            from google.genai import types
+            client = self._get_gemini_client()
+            if not client:
+                logger.warning("Gemini client not initialized, skipping caption generation")
+                return ""
+            
+            result = client.models.generate_content(
+                model=self.image_caption_model,
+                contents=[image, prompt],
+                config=types.GenerateContentConfig(
+                    temperature=0.3,  # Lower temperature for more consistent captions
+                )
+            )
+            caption = result.text.strip()
+        
+        return caption
 
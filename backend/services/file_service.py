@@ -248,6 +248,56 @@ class FileService:
         
         return True
     
+    def save_task_uploads(self, files, project_id: Optional[str]) -> tuple:
+        """
+        Save files uploaded with a queued task under the shared upload storage
+        
+        The files stay until the task reaches a terminal state, so a re-queued
+        attempt or a worker on another machine sharing the upload folder can read them.
+        
+        Args:
+            files: FileStorage objects from Flask request (empty ones are skipped)
+            project_id: Project ID (None for global materials)
+        
+        Returns:
+            Tuple of (relative directory, list of relative file paths)
+        """
+        base_dir = self.upload_folder if project_id is None else self._get_project_dir(project_id)
+        upload_dir = base_dir / "task_uploads" / uuid.uuid4().hex
+        upload_dir.mkdir(parents=True)
+        saved = []
+        try:
+            for index, file in enumerate(files):
+                if not file or not file.filename:
+                    continue
+                # 前缀序号，避免同名文件互相覆盖
+                filepath = upload_dir / f"{index}_{secure_filename(file.filename)}"
+                file.save(str(filepath))
+                saved.append(filepath.relative_to(self.upload_folder).as_posix())
+        except Exception:
+            self.delete_task_uploads(upload_dir.relative_to(self.upload_folder).as_posix())
+            raise
+        return upload_dir.relative_to(self.upload_folder).as_posix(), saved
+    
+    def delete_task_uploads(self, upload_dir: Optional[str]) -> bool:
+        """
+        Delete a task upload directory
+        
+        Args:
+            upload_dir: Directory relative to the upload folder (absolute paths of older tasks also work)
+        
+        Returns:
+            True if deleted
+        """
+        import shutil
+        if not upload_dir:
+            return False
+        dirpath = Path(self.get_absolute_path(upload_dir))
+        if dirpath.is_dir():
+            shutil.rmtree(dirpath, ignore_errors=True)
+            return True
+        return False
+    
     def file_exists(self, relative_path: str) -> bool:
         """Check if file exists"""
         filepath = self.upload_folder / relative_path.replace('\\', '/')
@@ -0,0 +1,120 @@
+"""
+Idempotency - honour the Idempotency-Key header on generation and export endpoints
+
+客户端或负载均衡/代理在网络抖动时会自动重试长请求。带 Idempotency-Key 的请求第一次
+成功（2xx）后，响应（含 task_id）保存到 idempotency_records 表，在 IDEMPOTENCY_TTL_SECONDS
+内用相同 key 重试同一请求会直接重放保存的响应，不会再次触发 AI 调用或重新构建 PPTX。
+- 同一个 key 用于内容不同的请求时返回 422
+- 同一进程内的并发重试按 key 串行执行：后到的请求等待第一个完成后直接重放
+- 失败的响应（4xx/5xx）不保存，允许客户端用同一个 key 重试
+"""
+import json
+import hashlib
+import logging
+from datetime import datetime, timedelta
+from functools import wraps
+
+from flask import current_app, jsonify, request
+
+from models import db, IdempotencyRecord
+from utils import error_response
+from .single_flight import single_flight
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+
+
+def _record_id(key: str) -> str:
+    scope = f"{request.method}\n{request.path}\n{key}"
+    return hashlib.sha256(scope.encode('utf-8')).hexdigest()
+
+
+def _request_hash() -> str:
+    digest = hashlib.sha256()
+    digest.update(request.query_string)
+    digest.update(b'\n')
+    digest.update(request.get_data(cache=True) or b'')
+    return digest.hexdigest()
+
+
+def _replay(record: IdempotencyRecord):
+    response = jsonify(record.get_response_body())
+    response.status_code = record.status_code
+    response.headers[REPLAYED_HEADER] = 'true'
+    return response
+
+
+def _find_record(record_id: str):
+    record = IdempotencyRecord.query.get(record_id)
+    if record and record.is_expired():
+        db.session.delete(record)
+        db.session.commit()
+        return None
+    return record
+
+
+def _store(record_id: str, key: str, request_hash: str, response):
+    """Persist a successful JSON response; storage failures never fail the request"""
+    body = response.get_json(silent=True)
+    if body is None:
+        return
+    data = body.get('data') if isinstance(body, dict) else None
+    task_id = data.get('task_id') if isinstance(data, dict) else None
+    now = datetime.utcnow()
+    ttl = current_app.config.get('IDEMPOTENCY_TTL_SECONDS', 86400)
+    try:
+        # 顺带清理已过期的记录
+        IdempotencyRecord.query.filter(IdempotencyRecord.expires_at <= now).delete(synchronize_session=False)
+        db.session.merge(IdempotencyRecord(
+            id=record_id,
+            idempotency_key=key,
+            method=request.method,
+            path=request.path,
+            request_hash=request_hash,
+            status_code=response.status_code,
+            response_body=json.dumps(body, ensure_ascii=False),
+            task_id=task_id,
+            created_at=now,
+            expires_at=now + timedelta(seconds=ttl)
+        ))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.warning(f"Failed to store idempotency record for {request.method} {request.path}: {e}")
+
+
+def idempotent(view):
+    """
+    Decorator: replay the stored response when a request is retried with the same Idempotency-Key
+
+    Requests without the header are handled normally.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = (request.headers.get(IDEMPOTENCY_HEADER) or '').strip()
+        if not key:
+            return view(*args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return error_response('INVALID_IDEMPOTENCY_KEY',
+                                  f"{IDEMPOTENCY_HEADER} must be at most {MAX_KEY_LENGTH} characters", 400)
+
+        record_id = _record_id(key)
+        request_hash = _request_hash()
+        with single_flight.lock(f"idempotency:{record_id}"):
+            record = _find_record(record_id)
+            if record:
+                if record.request_hash != request_hash:
+                    return error_response('IDEMPOTENCY_KEY_REUSED',
+                                          f"{IDEMPOTENCY_HEADER} was already used for a different request", 422)
+                logger.info(f"Replaying stored response for {request.method} {request.path} (key={key})")
+                return _replay(record)
+
+            response = current_app.make_response(view(*args, **kwargs))
+            if 200 <= response.status_code < 300:
+                _store(record_id, key, request_hash, response)
+            return response
+
+    return wrapper
@@ -0,0 +1,72 @@
+"""
+Image Result Cache - generated images keyed by prompt and reference-image content
+
+图片生成是最贵的调用。开启 IMAGE_CACHE_ENABLED 后，输入完全相同的生成请求
+（崩溃后重跑整套、复制项目后重新生成）直接返回本地保存的结果：
+- 缓存键为 sha256(provider 格式 + 模型 + prompt + 宽高比 + 分辨率 + 每张参考图片的像素哈希)，
+  参考图片按解码后的像素计算哈希（每个图片对象只算一次），与文件路径/来源（本地、URL、MinerU）无关
+- 结果以 PNG 保存在 IMAGE_CACHE_DIR，总大小超过 IMAGE_CACHE_MAX_MB 时按最近使用时间淘汰
+- 用户明确要求“换一张”（new variation）时绕过查找，新结果覆盖缓存
+"""
+import io
+import json
+import hashlib
+import logging
+from typing import List, Optional, Tuple
+
+from PIL import Image
+
+from .llm_cache import CacheTier, DiskTier, LLMResponseCache
+from .ref_image_cache import image_content_hash
+
+logger = logging.getLogger(__name__)
+
+
+class ImageDiskTier(DiskTier):
+    """DiskTier storing PIL images as PNG files"""
+
+    suffix = '.png'
+
+    def encode(self, value: Image.Image) -> bytes:
+        buffer = io.BytesIO()
+        value.save(buffer, format='PNG')
+        return buffer.getvalue()
+
+    def decode(self, data: bytes) -> Image.Image:
+        image = Image.open(io.BytesIO(data))
+        image.load()
+        return image
+
+
+class ImageResultCache(LLMResponseCache):
+    """Disk cache of generated images (disabled unless IMAGE_CACHE_ENABLED)"""
+
+    def _build_tiers(self, setting) -> Tuple[bool, List[CacheTier]]:
+        # 图片较大，不做进程内缓存，只用磁盘层
+        enabled = bool(setting('IMAGE_CACHE_ENABLED', False))
+        disk_dir = setting('IMAGE_CACHE_DIR', '')
+        if not (enabled and disk_dir):
+            return False, []
+        try:
+            return True, [ImageDiskTier(disk_dir, int(float(setting('IMAGE_CACHE_MAX_MB', 1024)) * 1024 * 1024))]
+        except OSError as e:
+            logger.warning(f"Image result cache disabled ({disk_dir}): {e}")
+            return False, []
+
+    def is_enabled(self) -> bool:
+        self._ensure_configured()
+        return self.enabled
+
+    @staticmethod
+    def make_image_key(provider_format: str, model: str, prompt: str, aspect_ratio: str,
+                       resolution: str, ref_images: Optional[List[Image.Image]]) -> str:
+        """Content address of an image generation request"""
+        canonical = json.dumps([
+            provider_format, model, aspect_ratio, resolution, prompt,
+            [image_content_hash(image) for image in (ref_images or [])]
+        ], ensure_ascii=False)
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+# Global image result cache instance
+image_cache = ImageResultCache()
@@ -0,0 +1,222 @@
+"""
+Remote Image Fetcher - pooled, cached and parallel downloads of remote reference images
+
+页面描述里的 Markdown 图片 URL 以前在每页的 generate_image 中用裸 requests.get 串行下载，
+同一张图片每页、每次重新生成都要再下载一遍。这里：
+- 所有下载共用一个 requests.Session（带 keep-alive 连接池）
+- 下载结果（原始字节 + ETag/Last-Modified）按 URL 保存在磁盘（REMOTE_IMAGE_CACHE_DIR），
+  总大小超过上限时按最近使用时间淘汰；超过 REMOTE_IMAGE_CACHE_TTL 秒的条目用条件请求
+  （If-None-Match / If-Modified-Since）重新验证，304 时直接使用本地副本
+- 解码后的图片在进程内保留少量最近使用的条目，同一张图片所有页面共用一个对象
+- prefetch() 并发下载一页（或整套）用到的全部 URL；同一 URL 被多个线程同时请求时只下载一次
+"""
+import io
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from PIL import Image
+
+from .llm_cache import DiskTier
+from .ref_image_cache import set_source_size
+
+logger = logging.getLogger(__name__)
+
+
+class FetchedImageTier(DiskTier):
+    """DiskTier storing (metadata, raw bytes) pairs: one JSON header line followed by the body"""
+
+    suffix = '.bin'
+
+    def encode(self, value: Tuple[Dict, bytes]) -> bytes:
+        meta, body = value
+        return json.dumps(meta).encode('utf-8') + b'\n' + body
+
+    def decode(self, data: bytes) -> Tuple[Dict, bytes]:
+        header, body = data.split(b'\n', 1)
+        return json.loads(header.decode('utf-8')), body
+
+
+class RemoteImageFetcher:
+    """Downloads remote images through a pooled session and a disk cache"""
+
+    def __init__(self):
+        self._session: Optional[requests.Session] = None
+        self._tier: Optional[FetchedImageTier] = None
+        self._configured = False
+        self._lock = threading.Lock()
+        self._fetching: Dict[str, threading.Lock] = {}
+        # url -> (fetched_at, 内容摘要, 解码后的图片)
+        self._decoded: 'OrderedDict[str, Tuple[float, str, Image.Image]]' = OrderedDict()
+        self.timeout = 30
+        self.ttl = 3600
+        self.max_workers = 8
+        self.max_decoded = 16
+        self._counters = {'downloads': 0, 'disk_hits': 0, 'revalidated': 0, 'memory_hits': 0, 'failures': 0}
+
+    def configure(self, cache_dir: Optional[str] = None, max_bytes: int = 200 * 1024 * 1024,
+                  ttl: float = 3600, timeout: float = 30, pool_size: int = 16, max_workers: int = 8,
+                  max_decoded: int = 16):
+        """Set up the session and the disk cache (e.g. in tests); cache_dir=None disables the disk cache"""
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        tier = None
+        if cache_dir:
+            try:
+                tier = FetchedImageTier(cache_dir, max_bytes)
+            except OSError as e:
+                logger.warning(f"Remote image disk cache disabled ({cache_dir}): {e}")
+        with self._lock:
+            self._session = session
+            self._tier = tier
+            self._decoded.clear()
+            self.ttl = float(ttl)
+            self.timeout = float(timeout)
+            self.max_workers = max(1, int(max_workers))
+            self.max_decoded = max(1, int(max_decoded))
+            self._configured = True
+
+    def _ensure_configured(self):
+        if self._configured:
+            return
+        from config import get_config
+        config = get_config()
+        try:
+            from flask import current_app, has_app_context
+            if has_app_context():
+                config = current_app.config
+        except ImportError:
+            pass
+
+        def setting(key, default):
+            return config.get(key, default) if isinstance(config, dict) else getattr(config, key, default)
+
+        self.configure(
+            cache_dir=setting('REMOTE_IMAGE_CACHE_DIR', ''),
+            max_bytes=int(float(setting('REMOTE_IMAGE_CACHE_MAX_MB', 200)) * 1024 * 1024),
+            ttl=setting('REMOTE_IMAGE_CACHE_TTL', 3600),
+            timeout=setting('REMOTE_IMAGE_TIMEOUT', 30),
+            pool_size=setting('REMOTE_IMAGE_POOL_SIZE', 16),
+            max_workers=setting('REMOTE_IMAGE_FETCH_WORKERS', 8),
+        )
+
+    def _count(self, name: str):
+        with self._lock:
+            self._counters[name] += 1
+
+    @staticmethod
+    def _key(url: str) -> str:
+        return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+    def _fetch_entry(self, url: str) -> Tuple[Dict, bytes]:
+        """(metadata, body) of url from the disk cache, revalidated or downloaded as needed"""
+        key = self._key(url)
+        cached = self._tier.get(key) if self._tier else None
+        if cached is not None and time.time() - cached[0].get('fetched_at', 0) < self.ttl:
+            self._count('disk_hits')
+            return cached
+
+        headers = {}
+        if cached is not None:
+            if cached[0].get('etag'):
+                headers['If-None-Match'] = cached[0]['etag']
+            if cached[0].get('last_modified'):
+                headers['If-Modified-Since'] = cached[0]['last_modified']
+        response = self._session.get(url, timeout=self.timeout, headers=headers)
+        if cached is not None and response.status_code == 304:
+            meta = dict(cached[0], fetched_at=time.time())
+            self._count('revalidated')
+        else:
+            response.raise_for_status()
+            meta = {
+                'url': url,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'fetched_at': time.time(),
+            }
+            cached = (meta, response.content)
+            self._count('downloads')
+        if self._tier:
+            self._tier.set(key, (meta, cached[1]))
+        return meta, cached[1]
+
+    def fetch_bytes(self, url: str) -> Optional[bytes]:
+        """Raw bytes of a remote image, or None if it cannot be downloaded"""
+        self._ensure_configured()
+        try:
+            return self._fetch_entry(url)[1]
+        except Exception as e:
+            self._count('failures')
+            logger.error(f"Failed to download image from {url}: {str(e)}")
+            return None
+
+    def fetch(self, url: str) -> Optional[Image.Image]:
+        """
+        Decoded remote image (shared, treat as read-only), or None if it cannot be downloaded or decoded
+        """
+        self._ensure_configured()
+        with self._lock:
+            loading = self._fetching.setdefault(url, threading.Lock())
+        # 同一 URL 只由一个线程下载/解码，其余线程等待后命中进程内缓存
+        with loading:
+            try:
+                with self._lock:
+                    entry = self._decoded.get(url)
+                    if entry is not None and time.time() - entry[0] < self.ttl:
+                        self._decoded.move_to_end(url)
+                        self._counters['memory_hits'] += 1
+                        return entry[2]
+                meta, body = self._fetch_entry(url)
+                digest = hashlib.sha256(body).hexdigest()
+                if entry is not None and entry[1] == digest:
+                    image = entry[2]  # 重新验证后内容未变，继续使用同一个图片对象
+                else:
+                    image = Image.open(io.BytesIO(body))
+                    image.load()
+                    set_source_size(image, len(body))
+                    logger.debug(f"Fetched image {url}: {image.size}, {image.mode}")
+                with self._lock:
+                    self._decoded[url] = (meta['fetched_at'], digest, image)
+                    self._decoded.move_to_end(url)
+                    while len(self._decoded) > self.max_decoded:
+                        self._decoded.popitem(last=False)
+                return image
+            except Exception as e:
+                self._count('failures')
+                logger.error(f"Failed to download image from {url}: {str(e)}")
+                return None
+            finally:
+                with self._lock:
+                    self._fetching.pop(url, None)
+
+    def prefetch(self, urls: Iterable[str]) -> Dict[str, Optional[Image.Image]]:
+        """Fetch several URLs concurrently; returns url -> image (None for failures)"""
+        unique = list(dict.fromkeys(urls))
+        if not unique:
+            return {}
+        self._ensure_configured()
+        if len(unique) == 1:
+            return {unique[0]: self.fetch(unique[0])}
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(unique)),
+                                thread_name_prefix='image-fetch') as executor:
+            return dict(zip(unique, executor.map(self.fetch, unique)))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counters = dict(self._counters)
+            decoded = len(self._decoded)
+        return dict(counters, decoded_entries=decoded,
+                    disk=self._tier.stats() if self._tier else None)
+
+
+# Global remote image fetcher instance
+image_fetcher = RemoteImageFetcher()
@@ -0,0 +1,319 @@
+"""
+LLM Response Cache - content-addressed cache for text generation responses
+
+相同的文本生成请求（同一大纲重新解析、客户端超时后重试、重放的修改请求）不再重复调用上游：
+- 缓存键为 sha256(provider 格式 + 模型 + prompt + thinking_budget)，只缓存成功的响应
+- 两级缓存：进程内 LRU（毫秒级命中） + 磁盘目录（重启后、多个进程之间共享），
+  磁盘总大小超过上限时按最近使用时间淘汰
+- 每次调用可以绕过缓存（如用户明确要求“重新生成”），命中/未命中/绕过等计数见 stats()
+- 缓存层可插拔：实现 CacheTier 接口即可加入其他存储（如 Redis）
+
+配置项：LLM_CACHE_ENABLED / LLM_CACHE_MEMORY_ENTRIES / LLM_CACHE_DIR / LLM_CACHE_DISK_MAX_MB
+"""
+import os
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class CacheTier:
+    """One storage tier of the cache"""
+
+    name = 'tier'
+
+    def get(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: str):
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def stats(self) -> Dict:
+        return {}
+
+
+class MemoryLRUTier(CacheTier):
+    """In-process LRU of the most recent responses"""
+
+    name = 'memory'
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max(1, int(max_entries))
+        self._entries: 'OrderedDict[str, str]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'entries': len(self._entries), 'max_entries': self.max_entries, 'evictions': self.evictions}
+
+
+class DiskTier(CacheTier):
+    """
+    One JSON file per response under a directory, evicted least-recently-used
+    (by mtime, refreshed on every hit) once the total size exceeds max_bytes
+    """
+
+    name = 'disk'
+    suffix = '.json'
+
+    def __init__(self, directory: str, max_bytes: int = 100 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max(0, int(max_bytes))
+        self._lock = threading.Lock()
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+        self._size = sum(os.path.getsize(path) for path in self._files())
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f'{key}{self.suffix}')
+
+    def _files(self) -> List[str]:
+        files = []
+        for root, _, names in os.walk(self.directory):
+            files.extend(os.path.join(root, name) for name in names if name.endswith(self.suffix))
+        return files
+
+    def encode(self, value) -> bytes:
+        """Serialize a value to the bytes stored on disk (subclasses store other value types)"""
+        return json.dumps({'value': value, 'created_at': time.time()}, ensure_ascii=False).encode('utf-8')
+
+    def decode(self, data: bytes):
+        return json.loads(data.decode('utf-8')).get('value')
+
+    def get(self, key: str):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = self.decode(f.read())
+            os.utime(path)
+            return value
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Dropping unreadable cache entry {path}: {e}")
+            self.delete(key)
+            return None
+
+    def set(self, key: str, value):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = self.encode(value)
+        # 先写临时文件再替换，并发读取不会看到写了一半的文件
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        with self._lock:
+            previous = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(tmp_path, path)
+            self._size += len(data) - previous
+            if self.max_bytes and self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Remove least recently used files until the total size is 90% of the limit (lock held)"""
+        entries = []
+        for path in self._files():
+            try:
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+            except OSError:
+                continue
+        self._size = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        for _, size, path in sorted(entries):
+            if self._size <= target:
+                break
+            try:
+                os.remove(path)
+                self._size -= size
+                self.evictions += 1
+            except OSError:
+                continue
+
+    def delete(self, key: str):
+        path = self._path(key)
+        with self._lock:
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+                self._size -= size
+            except OSError:
+                pass
+
+    def clear(self):
+        with self._lock:
+            for path in self._files():
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            self._size = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'bytes': self._size, 'max_bytes': self.max_bytes, 'evictions': self.evictions}
+
+
+class LLMResponseCache:
+    """Multi-tier response cache; lower tiers are promoted into upper ones on a hit"""
+
+    def __init__(self, tiers: Optional[List[CacheTier]] = None, enabled: bool = True):
+        self.tiers: Optional[List[CacheTier]] = tiers
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'bypassed': 0, 'writes': 0}
+        self._tier_hits: Dict[str, int] = {}
+
+    def configure(self, tiers: List[CacheTier], enabled: bool = True):
+        """Replace the tiers (e.g. in tests or after a settings change)"""
+        with self._lock:
+            self.tiers = tiers
+            self.enabled = enabled
+
+    def _ensure_configured(self):
+        """Build the default tiers from the config on first use"""
+        if self.tiers is not None:
+            return
+        from config import get_config
+        config = get_config()
+        try:
+            from flask import current_app, has_app_context
+            if has_app_context():
+                config = current_app.config
+        except ImportError:
+            pass
+
+        def setting(key, default):
+            return config.get(key, default) if isinstance(config, dict) else getattr(config, key, default)
+
+        enabled, tiers = self._build_tiers(setting)
+        with self._lock:
+            if self.tiers is None:
+                self.tiers = tiers
+                self.enabled = enabled
+
+    def _build_tiers(self, setting: Callable[[str, object], object]) -> Tuple[bool, List[CacheTier]]:
+        """Default (enabled, tiers) from the config; setting(key, default) reads one config value"""
+        enabled = bool(setting('LLM_CACHE_ENABLED', True))
+        tiers: List[CacheTier] = [MemoryLRUTier(setting('LLM_CACHE_MEMORY_ENTRIES', 256))]
+        disk_dir = setting('LLM_CACHE_DIR', '')
+        if enabled and disk_dir:
+            try:
+                tiers.append(DiskTier(disk_dir, int(float(setting('LLM_CACHE_DISK_MAX_MB', 100)) * 1024 * 1024)))
+            except OSError as e:
+                logger.warning(f"LLM disk cache disabled ({disk_dir}): {e}")
+        return enabled, tiers
+
+    @staticmethod
+    def make_key(provider_format: str, model: str, prompt: str, thinking_budget: int) -> str:
+        """Content address of a text generation request"""
+        canonical = json.dumps([provider_format, model, thinking_budget, prompt], ensure_ascii=False)
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    def _count(self, name: str, tier: Optional[str] = None):
+        with self._lock:
+            self._counters[name] += 1
+            if tier:
+                self._tier_hits[tier] = self._tier_hits.get(tier, 0) + 1
+
+    def get(self, key: str) -> Optional[str]:
+        """Cached response or None (promotes disk hits into memory)"""
+        self._ensure_configured()
+        if not self.enabled:
+            return None
+        for index, tier in enumerate(self.tiers):
+            try:
+                value = tier.get(key)
+            except Exception as e:
+                logger.warning(f"LLM cache tier {tier.name} get failed: {e}")
+                continue
+            if value is not None:
+                for upper in self.tiers[:index]:
+                    upper.set(key, value)
+                self._count('hits', tier.name)
+                return value
+        self._count('misses')
+        return None
+
+    def set(self, key: str, value: str):
+        """Store a successful response in every tier"""
+        self._ensure_configured()
+        if not self.enabled or not value:
+            return
+        for tier in self.tiers:
+            try:
+                tier.set(key, value)
+            except Exception as e:
+                logger.warning(f"LLM cache tier {tier.name} set failed: {e}")
+        self._count('writes')
+
+    def invalidate(self, key: str):
+        """Drop a response (e.g. one that turned out not to be valid JSON)"""
+        self._ensure_configured()
+        for tier in self.tiers:
+            try:
+                tier.delete(key)
+            except Exception as e:
+                logger.warning(f"LLM cache tier {tier.name} delete failed: {e}")
+
+    def record_bypass(self):
+        self._count('bypassed')
+
+    def clear(self):
+        self._ensure_configured()
+        for tier in self.tiers:
+            tier.clear()
+
+    def stats(self) -> Dict:
+        """Hit/miss counters and per-tier sizes"""
+        self._ensure_configured()
+        with self._lock:
+            counters = dict(self._counters)
+            tier_hits = dict(self._tier_hits)
+        lookups = counters['hits'] + counters['misses']
+        return dict(
+            counters,
+            enabled=self.enabled,
+            hit_rate=round(counters['hits'] / lookups, 3) if lookups else 0.0,
+            tiers=[dict(tier.stats(), name=tier.name, hits=tier_hits.get(tier.name, 0)) for tier in self.tiers],
+        )
+
+
+# Global LLM response cache instance
+llm_cache = LLMResponseCache()
@@ -0,0 +1,164 @@
+"""
+Outline Reconciler - apply a new outline to existing pages by diffing instead of delete-and-recreate
+
+生成/修改大纲后不再删除全部页面重建：新大纲的每一页按标题、要点相似度和相对位置
+匹配到已有页面（贪心取最高分，每个旧页面最多匹配一次）：
+- 标题和要点都没有变化的页面保留描述、图片和历史版本，只更新顺序（和章节名）
+- 匹配到但内容有变化的页面保留页面记录与历史图片版本，清空描述并回到 DRAFT（需重新生成）
+- 没有匹配的新条目创建新页面，没有被匹配的旧页面删除
+"""
+import logging
+import re
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional
+
+from models import db, Page
+
+logger = logging.getLogger(__name__)
+
+# 综合得分权重：标题 / 要点 / 相对位置
+TITLE_WEIGHT = 0.6
+POINTS_WEIGHT = 0.3
+POSITION_WEIGHT = 0.1
+# 低于此得分的组合不视为同一页面
+MATCH_THRESHOLD = 0.55
+
+
+def _normalize(text: Optional[str]) -> str:
+    return re.sub(r'\s+', ' ', (text or '')).strip().lower()
+
+
+def _similarity(a: str, b: str) -> float:
+    if a == b:
+        return 1.0
+    if not a or not b:
+        return 0.0
+    return SequenceMatcher(None, a, b).ratio()
+
+
+def _outline_key(title: Optional[str], points: Optional[List]) -> tuple:
+    return _normalize(title), tuple(_normalize(str(p)) for p in (points or []))
+
+
+class ReconcileResult:
+    """Pages after reconciliation plus what happened to each of them"""
+
+    def __init__(self):
+        self.pages: List[Page] = []  # 按新大纲顺序
+        self.unchanged: List[Page] = []
+        self.changed: List[Page] = []
+        self.added: List[Page] = []
+        self.removed = 0
+
+    @property
+    def dirty_pages(self) -> List[Page]:
+        """New or changed pages, which need their description (and image) regenerated"""
+        return self.changed + self.added
+
+    def summary(self) -> Dict[str, int]:
+        return {
+            'unchanged': len(self.unchanged),
+            'changed': len(self.changed),
+            'added': len(self.added),
+            'removed': self.removed,
+        }
+
+
+def match_pages(old_pages: List[Page], pages_data: List[Dict]) -> Dict[int, Page]:
+    """
+    Match new outline entries to existing pages
+
+    Args:
+        old_pages: Existing pages in their current order
+        pages_data: Flattened new outline ({'title', 'points', 'part'})
+
+    Returns:
+        Dict of new entry index -> matched old page
+    """
+    old_keys = [
+        _outline_key((page.get_outline_content() or {}).get('title'),
+                     (page.get_outline_content() or {}).get('points'))
+        for page in old_pages
+    ]
+    new_keys = [_outline_key(data.get('title'), data.get('points')) for data in pages_data]
+    old_span = max(1, len(old_pages) - 1)
+    new_span = max(1, len(pages_data) - 1)
+
+    candidates = []
+    for i, (new_title, new_points) in enumerate(new_keys):
+        for j, (old_title, old_points) in enumerate(old_keys):
+            title_score = _similarity(new_title, old_title)
+            points_score = _similarity('\n'.join(new_points), '\n'.join(old_points))
+            position_score = 1.0 - abs(i / new_span - j / old_span)
+            score = (TITLE_WEIGHT * title_score + POINTS_WEIGHT * points_score
+                     + POSITION_WEIGHT * position_score)
+            if score >= MATCH_THRESHOLD:
+                # 完全相同的页面优先匹配，避免被位置更近的相似页面抢走
+                exact = new_keys[i] == old_keys[j]
+                candidates.append((exact, score, -abs(i - j), i, j))
+
+    matches: Dict[int, Page] = {}
+    used_old = set()
+    for _, _, _, i, j in sorted(candidates, reverse=True):
+        if i in matches or j in used_old:
+            continue
+        matches[i] = old_pages[j]
+        used_old.add(j)
+    return matches
+
+
+def reconcile_pages(project_id: str, pages_data: List[Dict]) -> ReconcileResult:
+    """
+    Apply a flattened outline to the project's pages (changes are added to the session, not committed)
+
+    Args:
+        project_id: Project ID
+        pages_data: Flattened outline entries ({'title', 'points', 'part'})
+    """
+    old_pages = Page.query.filter_by(project_id=project_id).order_by(Page.order_index).all()
+    matches = match_pages(old_pages, pages_data)
+    result = ReconcileResult()
+
+    for i, page_data in enumerate(pages_data):
+        title = page_data.get('title')
+        points = page_data.get('points', [])
+        page = matches.get(i)
+
+        if page is None:
+            page = Page(project_id=project_id, order_index=i, part=page_data.get('part'), status='DRAFT')
+            page.set_outline_content({'title': title, 'points': points})
+            db.session.add(page)
+            result.added.append(page)
+        else:
+            old_outline = page.get_outline_content() or {}
+            unchanged = _outline_key(title, points) == _outline_key(old_outline.get('title'), old_outline.get('points'))
+            page.order_index = i
+            page.part = page_data.get('part')
+            if unchanged:
+                result.unchanged.append(page)
+            else:
+                page.set_outline_content(dict(old_outline, title=title, points=points))
+                # 大纲变化后旧描述不再适用；历史图片版本保留，新图片由指纹判断需要重新生成
+                page.description_content = None
+                page.status = 'DRAFT'
+                result.changed.append(page)
+        result.pages.append(page)
+
+    matched_ids = {page.id for page in matches.values()}
+    for old_page in old_pages:
+        if old_page.id not in matched_ids:
+            # Delete via ORM session to trigger cascades (image versions)
+            db.session.delete(old_page)
+            result.removed += 1
+
+    logger.info(f"Reconciled outline of project {project_id}: {result.summary()}")
+    return result
+
+
+def project_status_after_reconcile(pages: List[Page]) -> str:
+    """Project status matching the reconciled pages"""
+    if pages and all(page.description_content for page in pages):
+        if all(page.generated_image_path and page.status == 'COMPLETED' for page in pages):
+            return 'COMPLETED'
+        return 'DESCRIPTIONS_GENERATED'
+    return 'OUTLINE_GENERATED'
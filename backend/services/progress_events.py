@@ -0,0 +1,167 @@
+"""
+Progress Events - in-process pub/sub of task progress and page changes per project
+
+提交（commit）成功后，本次事务中变化的 Task / Page 字段会作为增量事件发布给订阅了该项目的
+所有客户端（SSE 端点 /api/projects/<id>/events），Task 的变化同时同步到 task_status_store。
+执行中的进度更新只写内存，由 task_status_store 直接发布。事件直接来自会话中已修改的对象，
+因此任意多个客户端观察同一项目都不会产生额外的数据库读取。
+
+注意：事件只在当前进程内广播；TASK_QUEUE_MODE=worker 时任务在独立进程执行，
+Web 进程只能看到自身提交产生的事件，客户端仍需回退到轮询。
+"""
+import queue
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# 单个订阅者缓存的最大事件数，消费过慢时丢弃最旧的事件
+SUBSCRIBER_QUEUE_SIZE = 256
+
+_TASK_FIELDS = ('status', 'progress', 'error_message')
+_PAGE_FIELDS = ('status', 'generated_image_path', 'description_content')
+
+
+class ProgressBroker:
+    """Fan-out of progress events to per-project subscriber queues"""
+
+    def __init__(self):
+        self._subscribers: Dict[str, List[queue.Queue]] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def subscribe(self, project_id: str):
+        """
+        Subscribe to a project's events for the duration of the block
+
+        Usage:
+            with progress_broker.subscribe(project_id) as events:
+                event = events.get(timeout=15)
+        """
+        events = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.setdefault(project_id, []).append(events)
+        try:
+            yield events
+        finally:
+            with self._lock:
+                subscribers = self._subscribers.get(project_id, [])
+                if events in subscribers:
+                    subscribers.remove(events)
+                if not subscribers:
+                    self._subscribers.pop(project_id, None)
+
+    def subscriber_count(self, project_id: Optional[str] = None) -> int:
+        with self._lock:
+            if project_id is not None:
+                return len(self._subscribers.get(project_id, []))
+            return sum(len(subs) for subs in self._subscribers.values())
+
+    def publish(self, project_id: str, event_type: str, data: Dict[str, Any]):
+        """Deliver an event to every subscriber of the project (never blocks)"""
+        with self._lock:
+            subscribers = list(self._subscribers.get(project_id, []))
+        for events in subscribers:
+            message = {'event': event_type, 'data': data}
+            try:
+                events.put_nowait(message)
+            except queue.Full:
+                try:
+                    events.get_nowait()
+                except queue.Empty:
+                    pass
+                try:
+                    events.put_nowait(message)
+                except queue.Full:
+                    pass
+
+
+# Global broker instance
+progress_broker = ProgressBroker()
+
+
+def _changed_fields(obj, fields) -> List[str]:
+    state = inspect(obj)
+    return [name for name in fields if state.attrs[name].history.has_changes()]
+
+
+def _page_event(page, changed: List[str]) -> Dict[str, Any]:
+    data = page.to_dict()
+    delta = {
+        'page_id': data['page_id'],
+        'status': data['status'],
+        'generated_image_url': data['generated_image_url'],
+        'updated_at': data['updated_at'],
+    }
+    if 'description_content' in changed:
+        delta['description_content'] = data['description_content']
+    return delta
+
+
+def _collect_events(session, flush_context):
+    """after_flush: remember Task/Page deltas of this transaction"""
+    from models import Task, Page
+
+    has_subscribers = progress_broker.subscriber_count() > 0
+    pending = session.info.setdefault('progress_events', [])
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Task):
+            # 任务变化总是收集：提交后还要同步到内存中的任务状态表
+            if obj in session.new or _changed_fields(obj, _TASK_FIELDS):
+                pending.append((obj.project_id, 'task', obj.to_dict()))
+        elif isinstance(obj, Page) and has_subscribers:
+            changed = _changed_fields(obj, _PAGE_FIELDS)
+            if obj in session.new or changed:
+                pending.append((obj.project_id, 'page', _page_event(obj, changed)))
+    for obj in session.deleted:
+        if isinstance(obj, Task):
+            # 删除的任务（如随项目级联删除）要从内存状态表中移除
+            pending.append((obj.project_id, 'task_deleted', {'task_id': obj.id}))
+        elif isinstance(obj, Page) and has_subscribers:
+            pending.append((obj.project_id, 'page_deleted', {'page_id': obj.id}))
+
+
+def publish_task_snapshot(project_id: str, snapshot: Dict[str, Any]):
+    """Sync one committed task state (Task.to_dict()) to the status store and SSE subscribers"""
+    from services.task_status_store import task_status_store
+
+    task_status_store.put(project_id, snapshot)
+    data = {key: snapshot.get(key) for key in ('task_id', 'task_type', 'status', 'progress', 'error_message')}
+    progress_broker.publish(project_id, 'task', data)
+
+
+def _publish_events(session):
+    """after_commit: sync the task status store and publish what the transaction changed"""
+    from services.task_status_store import task_status_store
+
+    pending = session.info.pop('progress_events', None)
+    for project_id, event_type, data in pending or []:
+        if event_type == 'task':
+            publish_task_snapshot(project_id, data)
+        elif event_type == 'task_deleted':
+            task_status_store.remove(data['task_id'])
+        else:
+            progress_broker.publish(project_id, event_type, data)
+
+
+def _discard_events(session):
+    session.info.pop('progress_events', None)
+
+
+_listeners_installed = False
+
+
+def install_session_listeners():
+    """Register the session hooks once per process"""
+    global _listeners_installed
+    if _listeners_installed:
+        return
+    event.listen(Session, 'after_flush', _collect_events)
+    event.listen(Session, 'after_commit', _publish_events)
+    event.listen(Session, 'after_soft_rollback', lambda session, previous_transaction: _discard_events(session))
+    _listeners_installed = True
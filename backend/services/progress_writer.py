@@ -0,0 +1,166 @@
+"""
+Progress Writer - coalesced (write-behind) page status and task progress updates
+
+生成任务的每个页面完成时不再各自 commit：页面字段和任务进度先记在内存里，
+由任务主线程按 flush_interval 周期性地用一个事务批量写入数据库。
+- 任意线程都可以调用 update_page / set_progress（线程安全）
+- 只有持有数据库会话的任务线程调用 flush / maybe_flush
+- flush_interval 即数据最大陈旧时间；设为 0 时每次 maybe_flush 都立即写入（等价于逐条提交）
+- 任务进度实时写入 task_status_store（内存），数据库中的进度只在 flush(final=True)
+  即状态切换前写入；persist_progress=True（worker 模式，Web 进程看不到 worker 的内存）时每次 flush 都写入
+"""
+import time
+import logging
+import threading
+from typing import Any, Dict, Optional
+from models import db, Task, Page
+from .task_status_store import task_status_store
+
+logger = logging.getLogger(__name__)
+
+
+class ProgressWriter:
+    """Buffers page/task updates of one task and flushes them in a single transaction"""
+
+    def __init__(self, task_id: str, flush_interval: float = 1.0, persist_progress: bool = True):
+        self.task_id = task_id
+        self.flush_interval = max(0.0, float(flush_interval))
+        self.persist_progress = persist_progress
+        self.commit_count = 0
+        self._pending_pages: Dict[str, Dict[str, Any]] = {}
+        self._pending_progress: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    @classmethod
+    def for_app(cls, task_id: str, app) -> 'ProgressWriter':
+        """Create a writer using the app's PROGRESS_FLUSH_INTERVAL / TASK_QUEUE_MODE settings"""
+        return cls(
+            task_id,
+            app.config.get('PROGRESS_FLUSH_INTERVAL', 1.0),
+            persist_progress=app.config.get('TASK_QUEUE_MODE', 'inline') == 'worker'
+        )
+
+    def update_page(self, page_id: str, **fields):
+        """
+        Queue page field updates (later calls override earlier ones)
+
+        Args:
+            page_id: Page ID
+            **fields: status / generated_image_path / description_content (dict)
+        """
+        with self._lock:
+            self._pending_pages.setdefault(page_id, {}).update(fields)
+
+    def set_progress(self, progress: Dict[str, Any]):
+        """Queue the full task progress dict (same shape as Task.get_progress())"""
+        with self._lock:
+            self._pending_progress = dict(progress)
+        task_status_store.update_progress(self.task_id, progress)
+
+    def update_progress(self, completed: Optional[int] = None, failed: Optional[int] = None, **fields):
+        """
+        Queue an incremental progress update, like Task.update_progress
+
+        Extra keyword fields (e.g. stages) are merged into the progress dict,
+        keeping per-page state written by update_page_progress.
+        """
+        with self._lock:
+            progress = self._pending_progress
+            if progress is None:
+                progress = task_status_store.get_progress(self.task_id)
+            if progress is None:
+                task = Task.query.get(self.task_id)
+                progress = task.get_progress() if task else {}
+            if completed is not None:
+                progress['completed'] = completed
+            if failed is not None:
+                progress['failed'] = failed
+            progress.update(fields)
+            self._pending_progress = progress
+        task_status_store.update_progress(self.task_id, progress)
+
+    def update_page_progress(self, page_id: str, stage: Optional[str] = None, **fields):
+        """
+        Record per-page state in progress['pages'][page_id] (merged into earlier fields)
+
+        Args:
+            page_id: Page ID
+            stage: For multi-stage tasks, nest the fields under progress['pages'][page_id][stage]
+            **fields: e.g. status ('retrying' / 'completed' / 'failed'), attempts, error
+        """
+        with self._lock:
+            progress = self._pending_progress
+            if progress is None:
+                progress = task_status_store.get_progress(self.task_id)
+            if progress is None:
+                task = Task.query.get(self.task_id)
+                progress = task.get_progress() if task else {}
+            pages = dict(progress.get('pages') or {})
+            entry = dict(pages.get(page_id) or {})
+            if stage:
+                entry[stage] = dict(entry.get(stage) or {}, **fields)
+            else:
+                entry.update(fields)
+            pages[page_id] = entry
+            progress['pages'] = pages
+            self._pending_progress = progress
+            snapshot = dict(progress)
+        task_status_store.update_progress(self.task_id, snapshot)
+
+    def has_pending(self) -> bool:
+        with self._lock:
+            return bool(self._pending_pages) or self._pending_progress is not None
+
+    def maybe_flush(self) -> bool:
+        """Flush if the staleness window has elapsed; returns True if a flush happened"""
+        if time.monotonic() - self._last_flush < self.flush_interval:
+            return False
+        return self.flush()
+
+    def flush(self, final: bool = False) -> bool:
+        """
+        Write pending updates in one transaction
+
+        Args:
+            final: Also persist the task progress (call before the task changes status)
+        """
+        with self._lock:
+            pages, self._pending_pages = self._pending_pages, {}
+            progress = self._pending_progress
+            if final or self.persist_progress:
+                self._pending_progress = None
+            else:
+                # 进度只保存在内存中，等到最终 flush 再写库
+                progress = None
+        self._last_flush = time.monotonic()
+
+        if not pages and progress is None:
+            return False
+
+        try:
+            if pages:
+                for page in Page.query.filter(Page.id.in_(list(pages.keys()))).all():
+                    for field, value in pages[page.id].items():
+                        if field == 'description_content':
+                            page.set_description_content(value)
+                        else:
+                            setattr(page, field, value)
+            if progress is not None:
+                task = Task.query.get(self.task_id)
+                if task:
+                    task.set_progress(progress)
+            db.session.commit()
+            self.commit_count += 1
+            return True
+        except Exception:
+            db.session.rollback()
+            # 写入失败时把更新放回队列，下次 flush 重试（新的更新优先）
+            with self._lock:
+                for page_id, fields in pages.items():
+                    merged = dict(fields)
+                    merged.update(self._pending_pages.get(page_id, {}))
+                    self._pending_pages[page_id] = merged
+                if self._pending_progress is None:
+                    self._pending_progress = progress
+            raise
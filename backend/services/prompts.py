@@ -106,6 +106,57 @@ def _format_reference_files_xml(reference_files_content: Optional[List[Dict[str,
     return '\n'.join(xml_parts)
 
 
+def _format_relevant_reference_xml(project_context: 'ProjectContext', page_outline: dict) -> str:
+    """
+    Format only the reference file chunks relevant to one page as XML
+
+    The top REFERENCE_TOP_K chunks by BM25 score against the page title, part and
+    points are included, up to REFERENCE_TOKEN_BUDGET tokens. When retrieval is
+    disabled or all files fit in the budget, the full files are inlined as before.
+
+    Args:
+        project_context: Project context with the reference files
+        page_outline: Outline of the page ({'title', 'points', 'part'})
+
+    Returns:
+        Formatted XML string
+    """
+    from services.reference_index import retrieval_settings
+
+    if not project_context.reference_files_content:
+        return ""
+    settings = retrieval_settings()
+    reference_index = project_context.reference_index
+    if not settings['enabled'] or reference_index.total_tokens <= settings['token_budget']:
+        return _format_reference_files_xml(project_context.reference_files_content)
+
+    points = page_outline.get('points') or []
+    query = '\n'.join([page_outline.get('part') or '', page_outline.get('title') or '']
+                      + [str(point) for point in points])
+    selected = reference_index.select(query, settings['top_k'], settings['token_budget'])
+    logger.debug(f"[reference retrieval] {len(selected)}/{len(reference_index.chunks)} chunks "
+                 f"for page {page_outline.get('title', '')!r}")
+    if not selected:
+        return ""
+
+    xml_parts = ['<uploaded_files note="excerpts relevant to this page">']
+    current_file = None
+    for filename, _, chunk in selected:
+        if filename != current_file:
+            if current_file is not None:
+                xml_parts.append('  </file>')
+            xml_parts.append(f'  <file name="{filename}">')
+            current_file = filename
+        xml_parts.append(f'    <excerpt section="{chunk["heading"]}">')
+        xml_parts.append(chunk['text'])
+        xml_parts.append('    </excerpt>')
+    xml_parts.append('  </file>')
+    xml_parts.append('</uploaded_files>')
+    xml_parts.append('')  # Empty line after XML
+
+    return '\n'.join(xml_parts)
+
+
 def get_outline_generation_prompt(project_context: 'ProjectContext', language: str = None) -> str:
     """
     生成 PPT 大纲的 prompt
@@ -238,7 +289,8 @@ def get_page_description_prompt(project_context: 'ProjectContext', outline: list
     Returns:
         格式化后的 prompt 字符串
     """
-    files_xml = _format_reference_files_xml(project_context.reference_files_content)
+    # 只附带与本页相关的参考文件片段（见 services/reference_index.py）
+    files_xml = _format_relevant_reference_xml(project_context, page_outline)
     # 根据项目类型选择最相关的原始输入
     if project_context.creation_type == 'idea' and project_context.idea_prompt:
         original_input = project_context.idea_prompt
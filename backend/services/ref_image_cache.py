@@ -0,0 +1,341 @@
+"""
+Reference Image Cache - decode each reference image once per task and reuse it for every page
+
+整套生成时每一页都会用到同一张模板图：以前每页都 Image.open 一次（文件句柄不关闭），
+OpenAI 格式的 provider 还会每页重新编码成 JPEG/base64。这里：
+- RefImageCache 按 (真实路径, mtime, 文件大小) 缓存解码后的图片（LRU，条数有上限），
+  读取时用 with 打开文件并 load()，文件句柄在返回前确定关闭；同一路径被多个线程同时请求时只解码一次
+- 派生数据（像素哈希、缩小后的副本、provider 需要的编码字节）按图片对象记忆，
+  图片对象被回收时一起释放；只用于不会被原地修改的参考图片
+- 上传前按 provider 的 PayloadBudget（最长边、字节上限、格式）压缩参考图片：
+  fit_to_budget() 返回附带上传字节的副本，provider 直接上传这些字节，节省的字节数见 payload_metrics；
+  含透明像素的图片不会编码成 JPEG（改用 PNG），模板的透明背景得以保留
+"""
+import io
+import os
+import hashlib
+import logging
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# id(image) -> 该图片对象的派生数据；图片被回收时由 weakref.finalize 删除，id 不会被误复用
+_memos: Dict[int, Dict[str, Any]] = {}
+_memos_lock = threading.Lock()
+
+
+def _memo_slot(image: Image.Image) -> Dict[str, Any]:
+    key = id(image)
+    with _memos_lock:
+        slot = _memos.get(key)
+        if slot is None:
+            # 可重入：派生值的计算可能依赖同一图片的其他派生值
+            slot = {'lock': threading.RLock(), 'values': {}}
+            _memos[key] = slot
+            weakref.finalize(image, _memos.pop, key, None)
+        return slot
+
+
+def image_memo(image: Image.Image, name: str, compute: Callable[[], Any]) -> Any:
+    """
+    Compute a value derived from an image once per image object
+
+    Args:
+        image: Reference image (must not be modified in place afterwards)
+        name: Name of the derived value (e.g. 'jpeg:95')
+        compute: Called at most once per (image, name), also across threads
+    """
+    slot = _memo_slot(image)
+    with slot['lock']:
+        values = slot['values']
+        if name not in values:
+            values[name] = compute()
+        return values[name]
+
+
+def image_content_hash(image: Image.Image) -> str:
+    """Hash of an image's decoded pixels (same picture from any source -> same hash)"""
+    def compute():
+        digest = hashlib.sha256()
+        digest.update(f'{image.mode}:{image.size[0]}x{image.size[1]}:'.encode('utf-8'))
+        digest.update(image.tobytes())
+        return digest.hexdigest()
+    return image_memo(image, 'sha256', compute)
+
+
+def has_transparency(image: Image.Image) -> bool:
+    """Whether an image has at least one non-opaque pixel (memoized per image)"""
+    def compute():
+        if image.mode in ('RGBA', 'LA', 'PA'):
+            alpha = image.getchannel('A')
+        elif 'transparency' in image.info:
+            alpha = image.convert('RGBA').getchannel('A')
+        else:
+            return False
+        return alpha.getextrema()[0] < 255
+    return image_memo(image, 'transparency', compute)
+
+
+def upload_format(image: Image.Image, format: str) -> str:
+    """Format an image is uploaded in: JPEG cannot carry alpha, so transparent images fall back to PNG"""
+    format = format.upper()
+    if format == 'JPEG' and has_transparency(image):
+        return 'PNG'
+    return format
+
+
+def source_size(image: Image.Image) -> Optional[int]:
+    """Size in bytes of the file/response an image was decoded from, if known"""
+    slot = _memo_slot(image)
+    with slot['lock']:
+        return slot['values'].get('source_bytes')
+
+
+def set_source_size(image: Image.Image, size: int):
+    """Remember the encoded size an image was decoded from (used by payload_metrics)"""
+    image_memo(image, 'source_bytes', lambda: size)
+
+
+def _encode(image: Image.Image, format: str, quality: int) -> bytes:
+    source = image
+    if format.upper() == 'JPEG' and source.mode not in ('RGB', 'L'):
+        source = source.convert('RGB')
+    buffer = io.BytesIO()
+    source.save(buffer, format=format, quality=quality)
+    return buffer.getvalue()
+
+
+def encode_image(image: Image.Image, format: str = 'JPEG', quality: int = 95) -> bytes:
+    """Encoded bytes of an image as sent to a provider (JPEG drops the alpha channel)"""
+    return image_memo(image, f'{format.upper()}:{quality}', lambda: _encode(image, format, quality))
+
+
+def downscaled(image: Image.Image, max_side: int) -> Image.Image:
+    """Copy whose longer side is at most max_side (the image itself if it is already small enough)"""
+    if not max_side or max(image.size) <= max_side:
+        return image
+
+    def compute():
+        copy = image.copy()
+        copy.thumbnail((max_side, max_side), Image.LANCZOS)
+        return copy
+    return image_memo(image, f'max_side:{max_side}', compute)
+
+
+class RefImageCache:
+    """Bounded LRU of decoded reference images, shared by the page workers of one task"""
+
+    def __init__(self, max_entries: int = 8):
+        self.max_entries = max(1, int(max_entries))
+        self._entries: 'OrderedDict[Tuple, Image.Image]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading: Dict[Tuple, threading.Lock] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(path: str) -> Tuple:
+        real_path = os.path.realpath(path)
+        stat = os.stat(real_path)
+        return real_path, stat.st_mtime_ns, stat.st_size
+
+    def load(self, path: str) -> Image.Image:
+        """
+        Decoded image of a local file (cached until the file changes)
+
+        Raises:
+            FileNotFoundError if the file does not exist
+        """
+        key = self._key(path)
+        with self._lock:
+            image = self._entries.get(key)
+            if image is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return image
+            loading = self._loading.setdefault(key, threading.Lock())
+
+        # 同一文件只由一个线程解码，其余线程等待后直接命中
+        with loading:
+            try:
+                with self._lock:
+                    image = self._entries.get(key)
+                    if image is not None:
+                        self._entries.move_to_end(key)
+                        self.hits += 1
+                        return image
+                with open(key[0], 'rb') as f:
+                    image = Image.open(f)
+                    image.load()
+                set_source_size(image, key[2])
+                with self._lock:
+                    self.misses += 1
+                    self._entries[key] = image
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+                logger.debug(f"Decoded reference image {path}: {image.size}, {image.mode}")
+                return image
+            finally:
+                with self._lock:
+                    self._loading.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'entries': len(self._entries), 'max_entries': self.max_entries,
+                    'hits': self.hits, 'misses': self.misses}
+
+
+# 压缩上传时的下限：JPEG/WebP 质量与最长边
+MIN_QUALITY = 50
+MIN_EDGE = 512
+
+
+# 未配置 REF_IMAGE_FORMAT 时各 provider 的默认上传格式：GenAI 接受 WebP（有损压缩且保留透明通道），
+# OpenAI 兼容接口保持 JPEG（透明图片会改用 PNG，见 upload_format）
+DEFAULT_UPLOAD_FORMATS = {'gemini': 'WEBP', 'openai': 'JPEG'}
+
+
+class PayloadBudget:
+    """Upload budget of reference images for one provider"""
+
+    def __init__(self, max_edge: int = 2048, max_bytes: int = 1500000, format: str = 'JPEG', quality: int = 90):
+        self.max_edge = max(0, int(max_edge))
+        self.max_bytes = max(0, int(max_bytes))
+        self.format = (format or 'JPEG').upper()
+        self.quality = int(quality)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.max_edge or self.max_bytes)
+
+    @property
+    def mime_type(self) -> str:
+        return f'image/{self.format.lower()}'
+
+    @property
+    def name(self) -> str:
+        return f'budget:{self.format}:{self.quality}:{self.max_edge}:{self.max_bytes}'
+
+    @classmethod
+    def for_provider(cls, config, provider_format: str) -> 'PayloadBudget':
+        """
+        Budget from REF_IMAGE_MAX_EDGE / REF_IMAGE_MAX_BYTES / REF_IMAGE_FORMAT / REF_IMAGE_QUALITY,
+        each overridable per provider format with a suffix (e.g. REF_IMAGE_MAX_EDGE_OPENAI=1536
+        in app.config or the environment); max_edge = max_bytes = 0 disables the budget.
+        An empty format uses the provider's default (DEFAULT_UPLOAD_FORMATS)
+
+        Args:
+            config: app.config or the Config class
+            provider_format: 'gemini' or 'openai'
+        """
+        def setting(key, default):
+            get = config.get if isinstance(config, dict) else lambda k, d=None: getattr(config, k, d)
+            override_key = f'{key}_{provider_format.upper()}'
+            value = get(override_key, None)
+            if value in (None, ''):
+                value = os.getenv(override_key)
+            return value if value not in (None, '') else get(key, default)
+
+        return cls(
+            max_edge=setting('REF_IMAGE_MAX_EDGE', 2048),
+            max_bytes=setting('REF_IMAGE_MAX_BYTES', 1500000),
+            format=setting('REF_IMAGE_FORMAT', '') or DEFAULT_UPLOAD_FORMATS.get(provider_format, 'JPEG'),
+            quality=setting('REF_IMAGE_QUALITY', 90),
+        )
+
+
+class PayloadMetrics:
+    """
+    Encoded size of reference images as loaded (file / download) vs. what was uploaded
+
+    Images of unknown source size (PIL images passed in directly) count their upload
+    size on both sides, so they never show up as savings.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.images = 0
+            self.downscaled = 0
+            self.original_bytes = 0
+            self.payload_bytes = 0
+
+    def record(self, original_bytes: int, payload_bytes: int, downscaled: bool):
+        with self._lock:
+            self.images += 1
+            self.downscaled += int(downscaled)
+            self.original_bytes += original_bytes
+            self.payload_bytes += payload_bytes
+
+    def stats(self) -> Dict:
+        with self._lock:
+            saved = self.original_bytes - self.payload_bytes
+            return {
+                'images': self.images,
+                'downscaled': self.downscaled,
+                'original_bytes': self.original_bytes,
+                'payload_bytes': self.payload_bytes,
+                'saved_bytes': saved,
+                'saved_ratio': round(saved / self.original_bytes, 3) if self.original_bytes else 0.0,
+            }
+
+
+payload_metrics = PayloadMetrics()
+
+
+def fit_to_budget(image: Image.Image, budget: PayloadBudget) -> Image.Image:
+    """
+    Reference image prepared for upload under a budget (memoized per image and budget)
+
+    The longer side is capped at max_edge; if the encoding is still above max_bytes,
+    the quality and then the size are lowered step by step (down to MIN_QUALITY / MIN_EDGE).
+    Images with transparent pixels keep their alpha channel (see upload_format()).
+    The returned copy carries its upload bytes (see payload_bytes()).
+
+    Returns:
+        The prepared copy, or the image itself when the budget is disabled
+    """
+    if not budget.enabled:
+        return image
+
+    def compute():
+        format = upload_format(image, budget.format)
+        candidate = downscaled(image, budget.max_edge)
+        quality = budget.quality
+        data = _encode(candidate, format, quality)
+        while budget.max_bytes and len(data) > budget.max_bytes:
+            if format in ('JPEG', 'WEBP') and quality > MIN_QUALITY:
+                quality = max(MIN_QUALITY, quality - 10)
+            elif max(candidate.size) > MIN_EDGE:
+                candidate = downscaled(candidate, max(MIN_EDGE, int(max(candidate.size) * 0.75)))
+            else:
+                break
+            data = _encode(candidate, format, quality)
+
+        # 每个预算一份副本：缩小后的图片按尺寸记忆、可能被其他预算共用，上传字节不能挂在共用对象上
+        prepared = candidate.copy()
+        image_memo(prepared, 'payload', lambda: (f'image/{format.lower()}', data))
+        # 原始大小取自加载时的文件/下载字节数，不为统计再编码一次原图
+        payload_metrics.record(source_size(image) or len(data), len(data), prepared.size != image.size)
+        return prepared
+
+    return image_memo(image, budget.name, compute)
+
+
+def payload_bytes(image: Image.Image) -> Optional[Tuple[str, bytes]]:
+    """(mime type, bytes) prepared by fit_to_budget, or None for images sent as they are"""
+    slot = _memo_slot(image)
+    with slot['lock']:
+        return slot['values'].get('payload')
@@ -0,0 +1,231 @@
+"""
+Reference Index - chunk parsed reference files and retrieve the parts relevant to one page
+
+以前每一页的描述 prompt 都内联全部参考文件的 markdown，一份 200 页的 PDF 每套 PPT 要发送 N+1 次。这里：
+- 文件解析完成时 build_index() 按段落切块（每块约 REFERENCE_CHUNK_TOKENS 个 token，块内保留所在标题），
+  并预先统计每块的词频，结果以 JSON 保存在 reference_files.chunk_index
+- ReferenceIndex 合并一个项目所有文件的块，用 BM25 按页面标题与要点检索，
+  select() 返回得分最高的 top_k 块中放得进 token 预算的部分（按原文顺序）
+- 分词：英文/数字按单词，中日韩文字按相邻两字（bigram），不依赖分词库
+"""
+import re
+import math
+import logging
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 1
+
+# BM25 参数
+K1 = 1.5
+B = 0.75
+
+_TOKEN_PATTERN = re.compile(r'[a-z0-9]+|[\u3040-\u30ff\u3400-\u9fff\uac00-\ud7af]+')
+_CJK_PATTERN = re.compile(r'[\u3040-\u30ff\u3400-\u9fff\uac00-\ud7af]')
+_HEADING_PATTERN = re.compile(r'^\s{0,3}#{1,6}\s+(.*)$')
+_STOPWORDS = frozenset(
+    'a an and are as at be by for from has have in is it its of on or that the this to was were will with'.split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Index terms of a text (lowercased words, CJK character bigrams)"""
+    terms = []
+    for match in _TOKEN_PATTERN.findall((text or '').lower()):
+        if match[0].isascii():
+            if match not in _STOPWORDS:
+                terms.append(match)
+        elif len(match) == 1:
+            terms.append(match)
+        else:
+            terms.extend(match[i:i + 2] for i in range(len(match) - 1))
+    return terms
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough LLM token count (one per CJK character, ~4/3 per English word)"""
+    if not text:
+        return 0
+    cjk = len(_CJK_PATTERN.findall(text))
+    words = len(re.findall(r'[A-Za-z0-9]+', text))
+    return cjk + math.ceil(words * 4 / 3)
+
+
+def _split_oversized(block: str, chunk_tokens: int) -> List[str]:
+    """Split a block larger than one chunk by lines, then by characters"""
+    pieces, current = [], []
+    for line in block.split('\n'):
+        if estimate_tokens(line) > chunk_tokens:
+            step = max(1, chunk_tokens)
+            pieces.extend(line[i:i + step] for i in range(0, len(line), step))
+            continue
+        if current and estimate_tokens('\n'.join(current + [line])) > chunk_tokens:
+            pieces.append('\n'.join(current))
+            current = []
+        current.append(line)
+    if current:
+        pieces.append('\n'.join(current))
+    return pieces
+
+
+def chunk_markdown(markdown: str, chunk_tokens: int = 400) -> List[Dict]:
+    """
+    Split markdown into chunks of about chunk_tokens tokens along paragraph boundaries
+
+    Returns:
+        List of {'heading': nearest heading above the chunk, 'text': chunk text}
+    """
+    chunks: List[Dict] = []
+    heading = ''
+    current: List[str] = []
+    current_tokens = 0
+
+    def flush():
+        nonlocal current, current_tokens
+        if current:
+            chunks.append({'heading': heading, 'text': '\n\n'.join(current)})
+        current, current_tokens = [], 0
+
+    for block in re.split(r'\n\s*\n', markdown or ''):
+        block = block.strip()
+        if not block:
+            continue
+        match = _HEADING_PATTERN.match(block.split('\n', 1)[0])
+        if match:
+            # 新的章节从新块开始
+            flush()
+            heading = match.group(1).strip()
+        for piece in (_split_oversized(block, chunk_tokens) if estimate_tokens(block) > chunk_tokens else [block]):
+            tokens = estimate_tokens(piece)
+            if current and current_tokens + tokens > chunk_tokens:
+                flush()
+            current.append(piece)
+            current_tokens += tokens
+    flush()
+    return chunks
+
+
+def build_index(markdown: str, chunk_tokens: int = 400) -> Dict:
+    """
+    Chunk a parsed reference file and count the terms of every chunk (stored as JSON)
+
+    Args:
+        markdown: Parsed markdown content
+        chunk_tokens: Target chunk size in tokens
+    """
+    chunks = []
+    for chunk in chunk_markdown(markdown, chunk_tokens):
+        terms = Counter(tokenize(f"{chunk['heading']}\n{chunk['text']}"))
+        chunks.append(dict(chunk, terms=dict(terms), length=sum(terms.values()),
+                           tokens=estimate_tokens(chunk['text'])))
+    return {'version': INDEX_VERSION, 'chunk_tokens': chunk_tokens, 'chunks': chunks}
+
+
+def retrieval_settings() -> Dict:
+    """REFERENCE_* retrieval settings from app.config (or the Config defaults outside a request)"""
+    from config import get_config
+    config = get_config()
+    try:
+        from flask import current_app, has_app_context
+        if has_app_context():
+            config = current_app.config
+    except ImportError:
+        pass
+
+    def setting(key, default):
+        return config.get(key, default) if isinstance(config, dict) else getattr(config, key, default)
+
+    return {
+        'enabled': bool(setting('REFERENCE_RETRIEVAL_ENABLED', True)),
+        'chunk_tokens': int(setting('REFERENCE_CHUNK_TOKENS', 400)),
+        'top_k': int(setting('REFERENCE_TOP_K', 8)),
+        'token_budget': int(setting('REFERENCE_TOKEN_BUDGET', 3000)),
+    }
+
+
+class ReferenceIndex:
+    """BM25 index over the chunks of all reference files of a project"""
+
+    def __init__(self, files: Iterable[Dict], chunk_tokens: int = 400):
+        """
+        Args:
+            files: Dicts with 'filename', 'content' and optionally 'chunk_index' (from build_index);
+                files without a usable stored index are chunked in memory
+            chunk_tokens: Chunk size for files that have to be indexed here
+        """
+        self.chunks: List[Tuple[str, int, Dict]] = []  # (filename, 在文件中的位置, chunk)
+        self.total_tokens = 0
+        for file_info in files:
+            index = file_info.get('chunk_index')
+            if not index or index.get('version') != INDEX_VERSION:
+                index = build_index(file_info.get('content', ''), chunk_tokens)
+            for position, chunk in enumerate(index['chunks']):
+                self.chunks.append((file_info.get('filename', 'unknown'), position, chunk))
+                self.total_tokens += chunk['tokens']
+        self.document_frequency: Counter = Counter()
+        for _, _, chunk in self.chunks:
+            self.document_frequency.update(chunk['terms'].keys())
+        lengths = [chunk['length'] for _, _, chunk in self.chunks]
+        self.average_length = (sum(lengths) / len(lengths)) if lengths else 0.0
+
+    def score(self, query_terms: List[str], chunk: Dict) -> float:
+        """BM25 score of one chunk"""
+        total = len(self.chunks)
+        length_norm = 1 - B + B * chunk['length'] / (self.average_length or 1)
+        score = 0.0
+        for term in set(query_terms):
+            frequency = chunk['terms'].get(term)
+            if not frequency:
+                continue
+            df = self.document_frequency[term]
+            idf = math.log(1 + (total - df + 0.5) / (df + 0.5))
+            score += idf * frequency * (K1 + 1) / (frequency + K1 * length_norm)
+        return score
+
+    def search(self, query: str, top_k: int = 8) -> List[Tuple[float, str, int, Dict]]:
+        """Top-k chunks for a query as (score, filename, position, chunk), best first; zero scores are dropped"""
+        query_terms = tokenize(query)
+        if not query_terms:
+            return []
+        scored = []
+        for filename, position, chunk in self.chunks:
+            score = self.score(query_terms, chunk)
+            if score > 0:
+                scored.append((score, filename, position, chunk))
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return scored[:top_k]
+
+    def select(self, query: str, top_k: int = 8, token_budget: int = 3000) -> List[Tuple[str, int, Dict]]:
+        """
+        Most relevant chunks that fit the token budget, in document order
+        (the leading chunks when nothing matches the query)
+
+        Returns:
+            List of (filename, position, chunk)
+        """
+        candidates = [(filename, position, chunk) for _, filename, position, chunk in self.search(query, top_k)]
+        if not candidates:
+            candidates = self.chunks[:top_k]
+        selected, used = [], 0
+        for filename, position, chunk in candidates:
+            if used + chunk['tokens'] > token_budget:
+                continue
+            selected.append((filename, position, chunk))
+            used += chunk['tokens']
+        order = {filename: i for i, (filename, _, _) in reversed(list(enumerate(self.chunks)))}
+        selected.sort(key=lambda item: (order[item[0]], item[1]))
+        return selected
+
+
+def index_reference_file(reference_file, chunk_tokens: Optional[int] = None):
+    """Build and store the chunk index of a parsed reference file (caller commits)"""
+    if chunk_tokens is None:
+        chunk_tokens = retrieval_settings()['chunk_tokens']
+    if not reference_file.markdown_content:
+        reference_file.set_chunk_index(None)
+        return
+    index = build_index(reference_file.markdown_content, chunk_tokens)
+    reference_file.set_chunk_index(index)
+    logger.info(f"Indexed reference file {reference_file.filename}: {len(index['chunks'])} chunks")
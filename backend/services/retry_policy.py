@@ -0,0 +1,133 @@
+"""
+Retry Policy - per-page retries with jittered exponential backoff
+
+批量生成任务中单个页面遇到临时性错误（429 限流、5xx、超时/连接中断）时，
+在页面级别自动重试，而不是直接计入 failed 让用户重跑整套：
+- 第 n 次重试前等待 random(0, min(max_delay, base_delay * 2^(n-1)))（full jitter），
+  避免大量页面在同一时刻一起重试，再次触发限流
+- 非临时性错误（参数错误、内容为空等）不重试
+- 等待期间收到取消信号会立即结束等待，下一次尝试在检查点抛出 TaskCancelledError
+"""
+import time
+import random
+import asyncio
+import logging
+import threading
+from typing import Any, Awaitable, Callable, Optional
+
+from .concurrency_governor import classify_provider_error
+
+logger = logging.getLogger(__name__)
+
+# on_retry(attempt, error, delay)：attempt 为刚失败的尝试序号（从 1 开始）
+RetryCallback = Callable[[int, BaseException, float], None]
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """Whether a failed provider call is worth retrying (throttling, 5xx, timeouts, dropped connections)"""
+    if classify_provider_error(error) is not None:
+        return True
+    current = error
+    seen = set()
+    while current is not None and id(current) not in seen:
+        seen.add(id(current))
+        if isinstance(current, (TimeoutError, ConnectionError)):
+            return True
+        current = current.__cause__ or current.__context__
+    message = str(error).lower()
+    return any(hint in message for hint in ('timed out', 'timeout', 'connection reset', 'connection aborted'))
+
+
+class RetryPolicy:
+    """Retry settings of one task, shared by all its page workers"""
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 2.0, max_delay: float = 30.0):
+        self.max_attempts = max(1, int(max_attempts))
+        self.base_delay = max(0.0, float(base_delay))
+        self.max_delay = max(0.0, float(max_delay))
+
+    @classmethod
+    def for_app(cls, app) -> 'RetryPolicy':
+        """Create a policy from PAGE_RETRY_MAX_ATTEMPTS / PAGE_RETRY_BASE_DELAY / PAGE_RETRY_MAX_DELAY"""
+        return cls(
+            app.config.get('PAGE_RETRY_MAX_ATTEMPTS', 3),
+            app.config.get('PAGE_RETRY_BASE_DELAY', 2.0),
+            app.config.get('PAGE_RETRY_MAX_DELAY', 30.0)
+        )
+
+    def backoff_delay(self, attempt: int) -> float:
+        """Seconds to wait after the given failed attempt (1-based), with full jitter"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+
+    def _should_retry(self, attempt: int, error: BaseException) -> bool:
+        return attempt < self.max_attempts and is_transient_error(error)
+
+    def call(self, func: Callable[[], Any], cancel_event: Optional[threading.Event] = None,
+             on_retry: Optional[RetryCallback] = None) -> Any:
+        """
+        Call func() until it succeeds, a non-transient error occurs or attempts run out
+
+        Args:
+            func: The page operation; should check cancel_event itself at its start
+            cancel_event: Cancel flag of the owning task; interrupts the backoff wait
+            on_retry: Called before each backoff wait
+
+        Returns:
+            func's result (the last error is re-raised)
+        """
+        attempt = 1
+        while True:
+            try:
+                return func()
+            except Exception as e:
+                if not self._should_retry(attempt, e):
+                    raise
+                delay = self.backoff_delay(attempt)
+                logger.warning(f"Transient error (attempt {attempt}/{self.max_attempts}), retrying in {delay:.1f}s: {e}")
+                if on_retry:
+                    on_retry(attempt, e, delay)
+                if cancel_event is not None:
+                    cancel_event.wait(delay)
+                else:
+                    time.sleep(delay)
+                attempt += 1
+
+    async def call_async(self, factory: Callable[[], Awaitable[Any]],
+                         cancel_event: Optional[threading.Event] = None,
+                         on_retry: Optional[RetryCallback] = None) -> Any:
+        """
+        Coroutine variant of call(); factory() must return a fresh awaitable per attempt
+
+        The backoff wait ends early once cancel_event is set (checked every
+        CANCEL_CHECK_INTERVAL seconds, the event is a threading.Event).
+        """
+        attempt = 1
+        while True:
+            try:
+                return await factory()
+            except Exception as e:
+                if not self._should_retry(attempt, e):
+                    raise
+                delay = self.backoff_delay(attempt)
+                logger.warning(f"Transient error (attempt {attempt}/{self.max_attempts}), retrying in {delay:.1f}s: {e}")
+                if on_retry:
+                    on_retry(attempt, e, delay)
+                await _sleep_unless_cancelled(delay, cancel_event)
+                attempt += 1
+
+
+# 协程等待退避时检查取消标志的间隔（threading.Event 无法直接 await）
+CANCEL_CHECK_INTERVAL = 0.2
+
+
+async def _sleep_unless_cancelled(delay: float, cancel_event: Optional[threading.Event]):
+    """asyncio.sleep(delay) that returns as soon as cancel_event is set"""
+    if cancel_event is None:
+        await asyncio.sleep(delay)
+        return
+    deadline = time.monotonic() + delay
+    while not cancel_event.is_set():
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        await asyncio.sleep(min(remaining, CANCEL_CHECK_INTERVAL))
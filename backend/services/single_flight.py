@@ -0,0 +1,129 @@
+"""
+Single Flight - deduplicate identical in-flight generation requests
+
+生成请求按“内容指纹”去重：项目、页面、prompt 输入（大纲/描述/额外要求/语言）、
+模板图片哈希、分辨率、宽高比等输入完全相同，且已有 PENDING/PROCESSING 的任务时，
+新请求直接返回已有任务的 task_id，不再发起新的 provider 调用。
+
+指纹保存在 tasks.fingerprint 列上，因此重启或多个 Web 进程之间同样生效；
+同一进程内的并发请求（双击、代理重试）由按指纹加锁保证“检查 + 创建”的原子性。
+"""
+import os
+import json
+import hashlib
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Optional, Tuple
+
+from models import Task
+
+# 处于这些状态的任务可以被重复请求复用
+_INFLIGHT_STATUSES = ('PENDING', 'PROCESSING')
+
+_file_hash_cache: Dict[str, Tuple[float, int, str]] = {}
+_file_hash_lock = threading.Lock()
+
+
+def compute_fingerprint(**parts: Any) -> str:
+    """
+    Stable SHA-256 fingerprint of the request inputs
+
+    Args:
+        **parts: JSON-serializable inputs (order-independent)
+    """
+    canonical = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def file_fingerprint(path: Optional[str]) -> Optional[str]:
+    """
+    Content hash of a file (e.g. the project template), cached by (mtime, size)
+
+    Returns:
+        Hex digest, or None if the path is empty / missing
+    """
+    if not path or not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    with _file_hash_lock:
+        cached = _file_hash_cache.get(path)
+        if cached and cached[0] == stat.st_mtime and cached[1] == stat.st_size:
+            return cached[2]
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    result = digest.hexdigest()
+
+    with _file_hash_lock:
+        _file_hash_cache[path] = (stat.st_mtime, stat.st_size, result)
+    return result
+
+
+def page_image_fingerprint(page, template_hash: Optional[str], extra_requirements: Optional[str],
+                           language: Optional[str], aspect_ratio: str, resolution: str,
+                           image_model: Optional[str], desc_text: Optional[str] = None) -> str:
+    """
+    Fingerprint of the inputs that determine a page's image
+
+    Stored in pages.image_fingerprint when the image is generated; bulk generation
+    skips pages whose current image was produced from the same inputs.
+
+    Args:
+        page: Page (outline and part are read from it)
+        template_hash: file_fingerprint of the template, None without template
+        desc_text: Description text, defaults to the page's current description
+    """
+    if desc_text is None:
+        from .task_manager import _get_description_text
+        desc_text = _get_description_text(page.get_description_content() or {})
+    return compute_fingerprint(
+        description=desc_text,
+        outline=page.get_outline_content(),
+        part=page.part,
+        template=template_hash,
+        extra_requirements=extra_requirements,
+        language=language,
+        aspect_ratio=aspect_ratio,
+        resolution=resolution,
+        image_model=image_model
+    )
+
+
+class SingleFlight:
+    """Per-fingerprint locks making "find in-flight task, else create one" atomic"""
+
+    def __init__(self):
+        self._locks: Dict[str, threading.Lock] = {}
+        self._refs: Dict[str, int] = {}
+        self._guard = threading.Lock()
+
+    @contextmanager
+    def lock(self, fingerprint: str):
+        with self._guard:
+            lock = self._locks.setdefault(fingerprint, threading.Lock())
+            self._refs[fingerprint] = self._refs.get(fingerprint, 0) + 1
+        lock.acquire()
+        try:
+            yield
+        finally:
+            lock.release()
+            with self._guard:
+                self._refs[fingerprint] -= 1
+                if not self._refs[fingerprint]:
+                    self._refs.pop(fingerprint, None)
+                    self._locks.pop(fingerprint, None)
+
+    @staticmethod
+    def find_inflight_task(project_id: str, fingerprint: str) -> Optional[Task]:
+        """Return the PENDING/PROCESSING task created for the same inputs, if any"""
+        return Task.query.filter(
+            Task.project_id == project_id,
+            Task.fingerprint == fingerprint,
+            Task.status.in_(_INFLIGHT_STATUSES)
+        ).order_by(Task.created_at.desc()).first()
+
+
+# Global single-flight instance
+single_flight = SingleFlight()
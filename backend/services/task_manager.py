@@ -1,61 +1,674 @@
 """
 Task Manager - handles background tasks using ThreadPoolExecutor
-No need for Celery or Redis, uses in-memory task tracking
+No need for Celery or Redis: the tasks table doubles as a durable, lease-based queue
+(see services/task_queue.py), so tasks survive restarts and can be drained by
+standalone workers (see worker.py)
 """
+import os
+import socket
+import uuid
+import time
+import asyncio
 import logging
 import threading
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import Callable, List, Dict, Any
-from datetime import datetime
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, List, Dict, Optional
+from datetime import datetime, timedelta
 from models import db, Task, Page, Material
 from pathlib import Path
+from . import task_queue
+from .async_executor import async_executor
+from .progress_writer import ProgressWriter
+from .retry_policy import RetryPolicy
+from .single_flight import file_fingerprint, page_image_fingerprint
+from .task_scheduler import FairScheduler, QueuedTask, INTERACTIVE, BULK, INTERACTIVE_TASK_TYPES
 
 logger = logging.getLogger(__name__)
 
 
 class TaskManager:
-    """Simple task manager using ThreadPoolExecutor"""
+    """
+    Task manager using ThreadPoolExecutor on top of a durable lease-based queue
+
+    Modes:
+        inline: the web process runs submitted tasks itself (default, same as before)
+        worker: the web process only enqueues, standalone workers (worker.py) claim and run
+    
+    Scheduling (see services/task_scheduler.py): interactive tasks are dispatched
+    before bulk ones, bulk tasks never occupy the threads reserved for interactive
+    work, and tasks of the same class share the threads fairly across projects.
+    """
     
     def __init__(self, max_workers: int = 4):
         """Initialize task manager"""
+        self.max_workers = max_workers
         self.executor = ThreadPoolExecutor(max_workers=max_workers)
-        self.active_tasks = {}  # task_id -> Future
+        self.active_tasks = {}  # task_id -> Future（排队中或执行中）
+        self.scheduler = FairScheduler()
+        self.running = {INTERACTIVE: 0, BULK: 0}  # 各优先级正在执行的任务数
+        self.reserved_interactive_workers = 1
+        self.cancel_events = {}  # task_id -> threading.Event（取消信号，任务在检查点读取）
         self.lock = threading.Lock()
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.app = None
+        self.mode = 'inline'
+        self.lease_seconds = 120
+        self.heartbeat_interval = 30
+        self.max_attempts = 3
+        self._stop_event = threading.Event()
+        self._heartbeat_thread = None
+        self._recovery_pid = None  # 负责崩溃恢复的进程（每个进程最多启动一次）
+    
+    def init_app(self, app, max_workers: Optional[int] = None):
+        """
+        Bind to a Flask app and read queue settings from its config
+        
+        Args:
+            app: Flask app instance
+            max_workers: Optional new executor size (only before any task was submitted)
+        """
+        self.app = app
+        if max_workers and max_workers != self.max_workers:
+            self.executor.shutdown(wait=False)
+            self.max_workers = max_workers
+            self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.mode = str(app.config.get('TASK_QUEUE_MODE', 'inline')).lower()
+        self.lease_seconds = int(app.config.get('TASK_LEASE_SECONDS', 120))
+        self.heartbeat_interval = int(app.config.get('TASK_HEARTBEAT_INTERVAL', 30))
+        self.max_attempts = int(app.config.get('TASK_MAX_ATTEMPTS', 3))
+        self.reserved_interactive_workers = int(app.config.get('TASK_INTERACTIVE_RESERVED_WORKERS', 1))
     
     def submit_task(self, task_id: str, func: Callable, *args, **kwargs):
-        """Submit a background task"""
-        future = self.executor.submit(func, task_id, *args, **kwargs)
+        """
+        Submit a background task
         
+        The Task row must already be committed (with its payload) by the caller.
+        In worker mode the task is left PENDING for a standalone worker to claim.
+        """
+        if self.mode == 'worker':
+            logger.info(f"Task {task_id} enqueued for standalone workers")
+            return
+        self._start_task(task_id, func, args, kwargs, claimed=False)
+    
+    def _start_task(self, task_id: str, func: Callable, args: tuple, kwargs: dict, claimed: bool):
+        """Queue a task in the scheduler; it runs (holding its lease) once a thread is free"""
+        task_type, project_id, cost = self._describe_task(task_id)
+        future = Future()
         with self.lock:
+            self.cancel_events[task_id] = threading.Event()
             self.active_tasks[task_id] = future
         
-        # Add callback to clean up when done
+        # Add callback to clean up when done (also fires when cancelled while queued)
         future.add_done_callback(lambda f: self._cleanup_task(task_id))
+        self.scheduler.push(task_id, project_id, task_type, cost,
+                            payload=(future, func, args, kwargs, claimed))
+        self._dispatch()
+        self._ensure_heartbeat()
+    
+    def _describe_task(self, task_id: str) -> tuple:
+        """(task_type, project_id, cost) used for scheduling; cost is the page count"""
+        if self.app is None:
+            return None, None, 1
+        try:
+            with self.app.app_context():
+                task = Task.query.get(task_id)
+                if not task:
+                    return None, None, 1
+                total = (task.get_progress() or {}).get('total') or 1
+                return task.task_type, task.project_id, total
+        except Exception as e:
+            logger.warning(f"Cannot load task {task_id} for scheduling: {e}")
+            return None, None, 1
+    
+    def _bulk_capacity(self) -> int:
+        """Threads bulk tasks may use (the rest are kept for interactive tasks)"""
+        return max(1, self.max_workers - self.reserved_interactive_workers)
+    
+    def _dispatch(self):
+        """Hand queued tasks to free threads: interactive first, bulk up to its capacity"""
+        while True:
+            with self.lock:
+                if self.running[INTERACTIVE] + self.running[BULK] >= self.max_workers:
+                    return
+                classes = (INTERACTIVE, BULK) if self.running[BULK] < self._bulk_capacity() else (INTERACTIVE,)
+                entry = self.scheduler.pop(classes)
+                if entry is None:
+                    return
+                future = entry.payload[0]
+                if not future.set_running_or_notify_cancel():
+                    continue
+                self.running[entry.task_class] += 1
+            self.executor.submit(self._run_entry, entry)
+    
+    def _run_entry(self, entry: QueuedTask):
+        """Executor thread: run a dispatched task and free its slot afterwards"""
+        future, func, args, kwargs, claimed = entry.payload
+        started = time.monotonic()
+        try:
+            future.set_result(self._run_with_lease(entry.task_id, func, args, kwargs, claimed))
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            # 实际耗时用于估算排队等待时间（429 的 Retry-After 与 /ready）
+            from .admission import admission_controller
+            admission_controller.record_duration(entry.task_type, time.monotonic() - started)
+            with self.lock:
+                self.running[entry.task_class] -= 1
+            self._dispatch()
+    
+    def running_count(self) -> int:
+        """Number of tasks currently executing in this process"""
+        with self.lock:
+            return self.running[INTERACTIVE] + self.running[BULK]
+    
+    def queue_position(self, task_id: str) -> Optional[int]:
+        """1-based position of a task waiting for a thread in this process, None if not queued"""
+        return self.scheduler.position(task_id)
+    
+    def _run_with_lease(self, task_id: str, func: Callable, args: tuple, kwargs: dict, claimed: bool):
+        """Claim (if needed), run, and release the task lease"""
+        if self.app is None:
+            # Not bound to an app (e.g. ad-hoc usage): run without a lease
+            return func(task_id, *args, **kwargs)
+        
+        if not claimed:
+            with self.app.app_context():
+                if not task_queue.claim_task(task_id, self.worker_id, self.lease_seconds):
+                    logger.info(f"Task {task_id} is leased by another worker, skipping")
+                    return None
+        try:
+            return func(task_id, *args, **kwargs)
+        finally:
+            try:
+                with self.app.app_context():
+                    task_queue.release_task(task_id, self.worker_id)
+            except Exception as e:
+                logger.warning(f"Failed to release lease for task {task_id}: {e}")
     
     def _cleanup_task(self, task_id: str):
         """Clean up completed task"""
         with self.lock:
             if task_id in self.active_tasks:
                 del self.active_tasks[task_id]
+            self.cancel_events.pop(task_id, None)
+        self.scheduler.remove(task_id)
     
     def is_task_active(self, task_id: str) -> bool:
         """Check if task is still running"""
         with self.lock:
             return task_id in self.active_tasks
     
+    def cancel_task(self, task_id: str) -> Optional[str]:
+        """
+        Request cancellation of a task (requires app context)
+        
+        Queued tasks are cancelled right away; a running task is marked CANCELLING
+        and stops at its next checkpoint: not-yet-started page calls are dropped,
+        in-flight coroutines are interrupted and late results are not saved.
+        Tasks running in another worker process see the request on their next heartbeat.
+        
+        Returns:
+            New status ('CANCELLED' / 'CANCELLING'), or None if the task is not active
+        """
+        status = task_queue.request_cancellation(task_id)
+        if status == 'CANCELLED':
+            with self.lock:
+                future = self.active_tasks.get(task_id)
+            if future:
+                future.cancel()
+        elif status == task_queue.CANCELLING_STATUS:
+            self._signal_cancel(task_id)
+        return status
+    
+    def _signal_cancel(self, task_id: str):
+        """Set the cancel flag of a task running in this process"""
+        with self.lock:
+            event = self.cancel_events.get(task_id)
+        if event:
+            event.set()
+    
+    def cancel_event(self, task_id: str) -> threading.Event:
+        """
+        Cancel flag of a task running in this process
+        
+        Page workers keep a reference to the event, so results arriving after the
+        task itself has finished still see the cancellation. Tasks not started by
+        this manager get a flag that is never set.
+        """
+        with self.lock:
+            return self.cancel_events.get(task_id) or threading.Event()
+    
+    def is_cancelled(self, task_id: str) -> bool:
+        """Whether cancellation of a locally running task was requested"""
+        with self.lock:
+            event = self.cancel_events.get(task_id)
+        return bool(event and event.is_set())
+    
+    def _ensure_heartbeat(self):
+        """Start the lease heartbeat thread on first use"""
+        if self.app is None:
+            return
+        with self.lock:
+            if self._heartbeat_thread and self._heartbeat_thread.is_alive():
+                return
+            self._heartbeat_thread = threading.Thread(
+                target=self._heartbeat_loop, name='task-heartbeat', daemon=True
+            )
+            self._heartbeat_thread.start()
+    
+    def start_recovery(self):
+        """
+        Inline mode: resume tasks left behind by a crashed process and keep doing so
+        periodically from the heartbeat thread (expired leases are re-queued and run here)
+        
+        Only the first call in a process has an effect; in worker mode the
+        standalone workers recover tasks instead.
+        """
+        if self.app is None:
+            raise RuntimeError("TaskManager.init_app() must be called before start_recovery()")
+        if self.mode == 'worker':
+            return
+        with self.lock:
+            if self._recovery_pid == os.getpid():
+                return
+            self._recovery_pid = os.getpid()
+        self._ensure_heartbeat()
+    
+    def _heartbeat_loop(self):
+        """Periodically renew the leases of all locally running tasks (and recover orphaned ones)"""
+        last_recovery = None
+        while True:
+            if self._recovery_pid == os.getpid() and (
+                    last_recovery is None or time.monotonic() - last_recovery > self.lease_seconds / 2):
+                try:
+                    # 启动时恢复全部 PENDING 任务；之后只接手排队超过一个租约周期仍无人领取的任务
+                    self.recover_tasks(min_age_seconds=self.lease_seconds if last_recovery else None)
+                except Exception as e:
+                    logger.warning(f"Task recovery failed: {e}")
+                last_recovery = time.monotonic()
+            
+            if self._stop_event.wait(self.heartbeat_interval):
+                return
+            with self.lock:
+                task_ids = list(self.active_tasks.keys())
+            if not task_ids:
+                continue
+            try:
+                with self.app.app_context():
+                    task_queue.renew_leases(task_ids, self.worker_id, self.lease_seconds)
+                    # 其他进程（Web 进程）发起的取消只能通过数据库状态感知
+                    for task_id in task_queue.cancelling_task_ids(task_ids):
+                        self._signal_cancel(task_id)
+            except Exception as e:
+                logger.warning(f"Task lease heartbeat failed: {e}")
+    
+    def recover_tasks(self, min_age_seconds: Optional[int] = None) -> int:
+        """
+        Crash recovery: re-queue expired leases and, in inline mode, claim and run
+        every PENDING task not already queued in this process
+        
+        Args:
+            min_age_seconds: Only resume tasks created at least this long ago, so tasks
+                that another process has just submitted are left to it
+        
+        Returns:
+            Number of tasks resumed locally
+        """
+        if self.app is None:
+            raise RuntimeError("TaskManager.init_app() must be called before recover_tasks()")
+        
+        with self.app.app_context():
+            task_queue.recover_expired_tasks(self.max_attempts)
+            if self.mode == 'worker':
+                return 0
+            
+            created_before = None
+            if min_age_seconds:
+                created_before = datetime.utcnow() - timedelta(seconds=min_age_seconds)
+            resumed = 0
+            while True:
+                with self.lock:
+                    local_ids = list(self.active_tasks.keys())
+                task_id = task_queue.claim_next_task(self.worker_id, self.lease_seconds,
+                                                     exclude_ids=local_ids, created_before=created_before)
+                if not task_id:
+                    break
+                if self._resume_claimed_task(task_id):
+                    resumed += 1
+        
+        if resumed:
+            logger.info(f"Resumed {resumed} queued task(s) after restart")
+        return resumed
+    
+    def _resume_claimed_task(self, task_id: str) -> bool:
+        """Rebuild a claimed task from its payload and run it (requires app context)"""
+        task = Task.query.get(task_id)
+        try:
+            func, kwargs = build_task_call(task, self.app)
+        except Exception as e:
+            logger.error(f"Cannot rebuild task {task_id}: {e}", exc_info=True)
+            task.status = 'FAILED'
+            task.error_message = f"Cannot resume task: {e}"
+            task.completed_at = datetime.utcnow()
+            task.lease_owner = None
+            task.lease_expires_at = None
+            db.session.commit()
+            return False
+        
+        self._start_task(task_id, func, (), kwargs, claimed=True)
+        return True
+    
+    def run_worker(self, poll_interval: float = 2.0):
+        """
+        Standalone worker loop: keep claiming tasks from the shared queue until stopped
+        
+        At most max_workers tasks run concurrently in this process.
+        """
+        if self.app is None:
+            raise RuntimeError("TaskManager.init_app() must be called before run_worker()")
+        
+        logger.info(f"Worker {self.worker_id} started (concurrency={self.max_workers})")
+        last_recovery = 0.0
+        while not self._stop_event.is_set():
+            try:
+                with self.app.app_context():
+                    # Periodically re-queue leases abandoned by crashed workers
+                    if time.monotonic() - last_recovery > self.lease_seconds / 2:
+                        task_queue.recover_expired_tasks(self.max_attempts)
+                        last_recovery = time.monotonic()
+                    
+                    with self.lock:
+                        has_capacity = len(self.active_tasks) < self.max_workers
+                        bulk_full = self.running[BULK] >= self._bulk_capacity()
+                    
+                    task_id = None
+                    if has_capacity:
+                        # bulk 占满可用线程后只领取 interactive 任务
+                        task_id = task_queue.claim_next_task(
+                            self.worker_id, self.lease_seconds,
+                            task_types=INTERACTIVE_TASK_TYPES if bulk_full else None
+                        )
+                        if task_id:
+                            self._resume_claimed_task(task_id)
+                    db.session.remove()
+            except Exception as e:
+                logger.error(f"Worker loop error: {e}", exc_info=True)
+                task_id = None
+            
+            if not task_id:
+                self._stop_event.wait(poll_interval)
+        
+        logger.info(f"Worker {self.worker_id} stopping, waiting for running tasks...")
+    
+    def stop(self):
+        """Ask the worker loop and heartbeat thread to stop"""
+        self._stop_event.set()
+    
     def shutdown(self):
         """Shutdown the executor"""
+        self.stop()
         self.executor.shutdown(wait=True)
+        async_executor.shutdown()
 
 
 # Global task manager instance
 task_manager = TaskManager(max_workers=4)
 
 
+def _get_description_text(desc_content: Dict) -> str:
+    """获取描述文本（可能是 text 字段或 text_content 数组）"""
+    desc_text = desc_content.get('text', '')
+    if not desc_text and desc_content.get('text_content'):
+        # 如果 text 字段不存在，尝试从 text_content 数组获取
+        text_content = desc_content.get('text_content', [])
+        if isinstance(text_content, list):
+            desc_text = '\n'.join(text_content)
+        else:
+            desc_text = str(text_content)
+    return desc_text
+
+
+def _build_page_image_prompt(ai_service, page_id: str, outline: List[Dict], page_data: Dict,
+                             page_index: int, desc_text: str,
+                             extra_requirements: str = None, language: str = None) -> tuple:
+    """
+    Build the image prompt of one page and collect the material images
+    referenced in its description
+    
+    Returns:
+        Tuple of (prompt, additional_ref_images or None)
+    """
+    # 从当前页面的描述内容中提取图片 URL
+    page_additional_ref_images = []
+    has_material_images = False
+    
+    # 从描述文本中提取图片
+    if desc_text:
+        image_urls = ai_service.extract_image_urls_from_markdown(desc_text)
+        if image_urls:
+            logger.info(f"Found {len(image_urls)} image(s) in page {page_id} description")
+            page_additional_ref_images = image_urls
+            has_material_images = True
+    
+    # Generate image prompt
+    prompt = ai_service.generate_image_prompt(
+        outline, page_data, desc_text, page_index,
+        has_material_images=has_material_images,
+        extra_requirements=extra_requirements,
+        language=language
+    )
+    logger.debug(f"Generated image prompt for page {page_id}")
+    return prompt, (page_additional_ref_images or None)
+
+
+def _generate_page_image(ai_service, file_service, project_id: str, page_id: str,
+                         outline: List[Dict], page_data: Dict, page_index: int, total_pages: int,
+                         desc_text: str, ref_image_path: Optional[str],
+                         aspect_ratio: str, resolution: str,
+                         extra_requirements: str = None, language: str = None,
+                         cancel_event: Optional[threading.Event] = None,
+                         new_variation: bool = False) -> str:
+    """
+    Generate and save the image of one page from its description (shared by
+    generate_images_task and generate_deck_task)
+    
+    Args:
+        cancel_event: Cancel flag of the owning task; the image is not saved if it was set meanwhile
+        new_variation: Bypass the image result cache (the user asked for a different image)
+    
+    Returns:
+        Relative path of the saved image
+    """
+    prompt, additional_ref_images = _build_page_image_prompt(
+        ai_service, page_id, outline, page_data, page_index, desc_text,
+        extra_requirements, language
+    )
+    
+    # Generate image
+    logger.info(f"🎨 Calling AI service to generate image for page {page_index}/{total_pages}...")
+    image = ai_service.generate_image(
+        prompt, ref_image_path, aspect_ratio, resolution,
+        additional_ref_images=additional_ref_images, new_variation=new_variation
+    )
+    logger.info(f"✅ Image generated successfully for page {page_index}")
+    
+    if not image:
+        raise ValueError("Failed to generate image")
+    
+    # 任务已取消时迟到的结果不再保存
+    _raise_if_cancelled(cancel_event)
+    
+    # Save image
+    return file_service.save_generated_image(image, project_id, page_id)
+
+
+async def _generate_page_image_async(ai_service, file_service, project_id: str, page_id: str,
+                                     outline: List[Dict], page_data: Dict, page_index: int, total_pages: int,
+                                     desc_text: str, ref_image_path: Optional[str],
+                                     aspect_ratio: str, resolution: str,
+                                     extra_requirements: str = None, language: str = None,
+                                     cancel_event: Optional[threading.Event] = None,
+                                     new_variation: bool = False) -> str:
+    """Coroutine variant of _generate_page_image (runs on async_executor's loop)"""
+    prompt, additional_ref_images = _build_page_image_prompt(
+        ai_service, page_id, outline, page_data, page_index, desc_text,
+        extra_requirements, language
+    )
+    
+    logger.info(f"🎨 Calling AI service (async) to generate image for page {page_index}/{total_pages}...")
+    image = await ai_service.generate_image_async(
+        prompt, ref_image_path, aspect_ratio, resolution,
+        additional_ref_images=additional_ref_images, new_variation=new_variation
+    )
+    logger.info(f"✅ Image generated successfully for page {page_index}")
+    
+    if not image:
+        raise ValueError("Failed to generate image")
+    
+    _raise_if_cancelled(cancel_event)
+    
+    # 编码和写盘放到线程里，避免阻塞事件循环
+    return await asyncio.to_thread(file_service.save_generated_image, image, project_id, page_id)
+
+
+def _use_async_provider_calls(app) -> bool:
+    """ASYNC_PROVIDER_CALLS 开启时，任务内的 AI 调用以协程形式跑在 async_executor 的事件循环上"""
+    return bool(app.config.get('ASYNC_PROVIDER_CALLS', False))
+
+
+# 等待页面结果时检查取消信号的最长间隔（秒）
+CANCEL_POLL_INTERVAL = 1.0
+
+
+class TaskCancelledError(Exception):
+    """Raised at a task checkpoint once cancellation of the task was requested"""
+
+
+def _raise_if_cancelled(cancel_event: Optional[threading.Event]):
+    if cancel_event is not None and cancel_event.is_set():
+        raise TaskCancelledError()
+
+
+def _start_processing(task: Task):
+    """Move the task to PROCESSING, unless it was cancelled before it started"""
+    if task.status == task_queue.CANCELLING_STATUS or task_manager.is_cancelled(task.id):
+        raise TaskCancelledError(task.id)
+    task.status = 'PROCESSING'
+    db.session.commit()
+
+
+def _cancel_futures(futures):
+    """
+    Cancel page futures: calls that have not started are dropped, coroutines
+    are interrupted (releasing their concurrency slots right away)
+    """
+    for future in futures:
+        future.cancel()
+
+
+def _settled_page_status(page: Page) -> str:
+    """Status a page falls back to when its generation was interrupted"""
+    if page.generated_image_path:
+        return 'COMPLETED'
+    if page.description_content:
+        return 'DESCRIPTION_GENERATED'
+    return 'DRAFT'
+
+
+def _finish_cancelled_task(task_id: str, project_id: Optional[str] = None,
+                           page_ids: Optional[List[str]] = None, writer=None):
+    """
+    Close a cancelled task: keep the results that already arrived, reset the
+    pages this run left GENERATING and mark the task CANCELLED
+    
+    Args:
+        project_id: Reset GENERATING pages of the whole project (batch tasks)
+        page_ids: Reset only these pages (single-page tasks)
+        writer: ProgressWriter whose buffered results are flushed first
+    """
+    db.session.rollback()
+    if writer is not None:
+        writer.flush(final=True)
+    if project_id or page_ids:
+        query = Page.query.filter(Page.status == 'GENERATING')
+        query = query.filter_by(project_id=project_id) if project_id else query.filter(Page.id.in_(page_ids))
+        for page in query.all():
+            page.status = _settled_page_status(page)
+    task = Task.query.get(task_id)
+    if task:
+        db.session.refresh(task)
+        task.status = 'CANCELLED'
+        task.completed_at = datetime.utcnow()
+    db.session.commit()
+    logger.info(f"Task {task_id} CANCELLED")
+
+
+def _run_page_with_retry(retry_policy: RetryPolicy, writer: ProgressWriter, page_id: str,
+                         func: Callable, cancel_event: Optional[threading.Event] = None,
+                         stage: Optional[str] = None):
+    """
+    Run one page operation with per-page retries on transient provider errors,
+    tracking its attempts in progress['pages'][page_id] (or ...[page_id][stage]
+    when a task runs several stages per page)
+    
+    Returns:
+        func's result (the last error is re-raised)
+    """
+    attempts = 0
+    
+    def attempt():
+        nonlocal attempts
+        attempts += 1
+        _raise_if_cancelled(cancel_event)
+        return func()
+    
+    def on_retry(attempt_no, error, delay):
+        writer.update_page_progress(page_id, stage=stage, status='retrying', attempts=attempt_no,
+                                    error=str(error), retry_in=round(delay, 1))
+    
+    try:
+        result = retry_policy.call(attempt, cancel_event, on_retry=on_retry)
+    except TaskCancelledError:
+        raise
+    except Exception as e:
+        writer.update_page_progress(page_id, stage=stage, status='failed', attempts=attempts, error=str(e))
+        raise
+    writer.update_page_progress(page_id, stage=stage, status='completed', attempts=attempts, error=None)
+    return result
+
+
+async def _run_page_with_retry_async(retry_policy: RetryPolicy, writer: ProgressWriter, page_id: str,
+                                     factory: Callable, cancel_event: Optional[threading.Event] = None,
+                                     stage: Optional[str] = None):
+    """Coroutine variant of _run_page_with_retry; factory() returns a fresh coroutine per attempt"""
+    attempts = 0
+    
+    def attempt():
+        nonlocal attempts
+        attempts += 1
+        _raise_if_cancelled(cancel_event)
+        return factory()
+    
+    def on_retry(attempt_no, error, delay):
+        writer.update_page_progress(page_id, stage=stage, status='retrying', attempts=attempt_no,
+                                    error=str(error), retry_in=round(delay, 1))
+    
+    try:
+        result = await retry_policy.call_async(attempt, cancel_event, on_retry=on_retry)
+    except TaskCancelledError:
+        raise
+    except Exception as e:
+        writer.update_page_progress(page_id, stage=stage, status='failed', attempts=attempts, error=str(e))
+        raise
+    writer.update_page_progress(page_id, stage=stage, status='completed', attempts=attempts, error=None)
+    return result
+
+
 def generate_descriptions_task(task_id: str, project_id: str, ai_service, 
                                project_context, outline: List[Dict], 
                                max_workers: int = 5, app=None,
-                               language: str = None):
+                               language: str = None,
+                               page_ids: Optional[List[str]] = None):
     """
     Background task for generating page descriptions
     Based on demo.py gen_desc() with parallel processing
@@ -71,10 +684,13 @@ def generate_descriptions_task(task_id: str, project_id: str, ai_service,
         max_workers: Maximum number of parallel workers
         app: Flask app instance
         language: Output language (zh, en, ja, auto)
+        page_ids: Only generate these pages (retry_failed_only); None = all pages
     """
     if app is None:
         raise ValueError("Flask app instance must be provided")
     
+    writer = None
+    
     # 在整个任务中保持应用上下文
     with app.app_context():
         try:
@@ -84,8 +700,8 @@ def generate_descriptions_task(task_id: str, project_id: str, ai_service,
                 logger.error(f"Task {task_id} not found")
                 return
             
-            task.status = 'PROCESSING'
-            db.session.commit()
+            _start_processing(task)
+            cancel_event = task_manager.cancel_event(task_id)
             logger.info(f"Task {task_id} status updated to PROCESSING")
             
             # Flatten outline to get pages
@@ -97,9 +713,15 @@ def generate_descriptions_task(task_id: str, project_id: str, ai_service,
             if len(pages) != len(pages_data):
                 raise ValueError("Page count mismatch")
             
+            # 页码按整套大纲计算；只重试失败页时跳过其余页面
+            targets = [
+                (i, page, page_data) for i, (page, page_data) in enumerate(zip(pages, pages_data), 1)
+                if page_ids is None or page.id in page_ids
+            ]
+            
             # Initialize progress
             task.set_progress({
-                "total": len(pages),
+                "total": len(targets),
                 "completed": 0,
                 "failed": 0
             })
@@ -108,18 +730,25 @@ def generate_descriptions_task(task_id: str, project_id: str, ai_service,
             # Generate descriptions in parallel
             completed = 0
             failed = 0
+            writer = ProgressWriter.for_app(task_id, app)
+            retry_policy = RetryPolicy.for_app(app)
             
-            def generate_single_desc(page_id, page_outline, page_index):
+            def generate_single_desc(page_id, page_outline, page_index, use_cache=True):
                 """
                 Generate description for a single page
                 注意：只传递 page_id（字符串），不传递 ORM 对象，避免跨线程会话问题
+                use_cache=False 用于已有描述的页面（重新生成必须得到新的结果）
                 """
                 # 关键修复：在子线程中也需要应用上下文
                 with app.app_context():
                     try:
-                        desc_text = ai_service.generate_page_description(
-                            project_context, outline, page_outline, page_index,
-                            language=language
+                        desc_text = _run_page_with_retry(
+                            retry_policy, writer, page_id,
+                            lambda: ai_service.generate_page_description(
+                                project_context, outline, page_outline, page_index,
+                                language=language, use_cache=use_cache
+                            ),
+                            cancel_event
                         )
                         
                         # Parse description into structured format
@@ -136,39 +765,76 @@ def generate_descriptions_task(task_id: str, project_id: str, ai_service,
                         logger.error(f"Failed to generate description for page {page_id}: {error_detail}")
                         return (page_id, None, str(e))
             
-            # Use ThreadPoolExecutor for parallel generation
+            async def generate_single_desc_async(page_id, page_outline, page_index, semaphore, use_cache=True):
+                """协程版本：不占用线程，结果格式与 generate_single_desc 相同"""
+                async with semaphore:
+                    try:
+                        desc_text = await _run_page_with_retry_async(
+                            retry_policy, writer, page_id,
+                            lambda: ai_service.generate_page_description_async(
+                                project_context, outline, page_outline, page_index,
+                                language=language, use_cache=use_cache
+                            ),
+                            cancel_event
+                        )
+                        return (page_id, {
+                            "text": desc_text,
+                            "generated_at": datetime.utcnow().isoformat()
+                        }, None)
+                    except Exception as e:
+                        logger.error(f"Failed to generate description for page {page_id}: {e}", exc_info=True)
+                        return (page_id, None, str(e))
+            
+            # Use ThreadPoolExecutor for parallel generation (only for the sync provider path)
             # 关键：提前提取 page.id，不要传递 ORM 对象到子线程
-            with ThreadPoolExecutor(max_workers=max_workers) as executor:
-                futures = [
-                    executor.submit(generate_single_desc, page.id, page_data, i)
-                    for i, (page, page_data) in enumerate(zip(pages, pages_data), 1)
-                ]
+            executor = None
+            try:
+                if _use_async_provider_calls(app):
+                    semaphore = asyncio.Semaphore(max_workers)
+                    futures = [
+                        async_executor.submit(generate_single_desc_async(
+                            page.id, page_data, i, semaphore, use_cache=not page.get_description_content()
+                        ))
+                        for i, page, page_data in targets
+                    ]
+                else:
+                    executor = ThreadPoolExecutor(max_workers=max_workers)
+                    futures = [
+                        executor.submit(generate_single_desc, page.id, page_data, i,
+                                        use_cache=not page.get_description_content())
+                        for i, page, page_data in targets
+                    ]
                 
                 # Process results as they complete
-                for future in as_completed(futures):
-                    page_id, desc_content, error = future.result()
-                    
-                    db.session.expire_all()
-                    
-                    # Update page in database
-                    page = Page.query.get(page_id)
-                    if page:
+                # 页面结果与任务进度由 writer 合并，按 PROGRESS_FLUSH_INTERVAL 批量提交
+                pending = set(futures)
+                while pending:
+                    done, pending = wait(pending, timeout=writer.flush_interval or CANCEL_POLL_INTERVAL,
+                                         return_when=FIRST_COMPLETED)
+                    if cancel_event.is_set():
+                        _cancel_futures(pending)
+                        raise TaskCancelledError(task_id)
+                    for future in done:
+                        page_id, desc_content, error = future.result()
                         if error:
-                            page.status = 'FAILED'
+                            writer.update_page(page_id, status='FAILED')
                             failed += 1
                         else:
-                            page.set_description_content(desc_content)
-                            page.status = 'DESCRIPTION_GENERATED'
+                            writer.update_page(page_id, description_content=desc_content,
+                                               status='DESCRIPTION_GENERATED')
                             completed += 1
-                        
-                        db.session.commit()
-                    
-                    # Update task progress
-                    task = Task.query.get(task_id)
-                    if task:
-                        task.update_progress(completed=completed, failed=failed)
-                        db.session.commit()
-                        logger.info(f"Description Progress: {completed}/{len(pages)} pages completed")
+                    if done:
+                        writer.update_progress(completed=completed, failed=failed)
+                        logger.info(f"Description Progress: {completed}/{len(targets)} pages completed")
+                    writer.maybe_flush()
+            finally:
+                # 取消时不等待仍在执行的调用（其结果会被丢弃），任务立即结束并释放租约
+                if executor is not None:
+                    cancelled = cancel_event.is_set()
+                    executor.shutdown(wait=not cancelled, cancel_futures=cancelled)
+            
+            writer.flush(final=True)
+            logger.debug(f"Task {task_id}: {writer.commit_count} progress commits")
             
             # Mark task as completed
             task = Task.query.get(task_id)
@@ -186,6 +852,9 @@ def generate_descriptions_task(task_id: str, project_id: str, ai_service,
                 db.session.commit()
                 logger.info(f"Project {project_id} status updated to DESCRIPTIONS_GENERATED")
         
+        except TaskCancelledError:
+            _finish_cancelled_task(task_id, writer=writer)
+        
         except Exception as e:
             # Mark task as failed
             task = Task.query.get(task_id)
@@ -201,7 +870,9 @@ def generate_images_task(task_id: str, project_id: str, ai_service, file_service
                         max_workers: int = 8, aspect_ratio: str = "16:9",
                         resolution: str = "2K", app=None,
                         extra_requirements: str = None,
-                        language: str = None):
+                        language: str = None,
+                        page_ids: Optional[List[str]] = None,
+                        new_variation: bool = False):
     """
     Background task for generating page images
     Based on demo.py gen_images_parallel()
@@ -210,10 +881,14 @@ def generate_images_task(task_id: str, project_id: str, ai_service, file_service
     
     Args:
         language: Output language (zh, en, ja, auto)
+        page_ids: Only generate these pages (retry_failed_only); None = all pages
+        new_variation: Bypass the image result cache (force regeneration)
     """
     if app is None:
         raise ValueError("Flask app instance must be provided")
     
+    writer = None
+    
     with app.app_context():
         try:
             # Update task status to PROCESSING
@@ -221,8 +896,8 @@ def generate_images_task(task_id: str, project_id: str, ai_service, file_service
             if not task:
                 return
             
-            task.status = 'PROCESSING'
-            db.session.commit()
+            _start_processing(task)
+            cancel_event = task_manager.cancel_event(task_id)
             
             # Get all pages for this project
             pages = Page.query.filter_by(project_id=project_id).order_by(Page.order_index).all()
@@ -235,9 +910,15 @@ def generate_images_task(task_id: str, project_id: str, ai_service, file_service
                 if not ref_image_path:
                     raise ValueError("No template image found for project")
             
+            # 页码按整套大纲计算；只重试失败页时跳过其余页面
+            targets = [
+                (i, page, page_data) for i, (page, page_data) in enumerate(zip(pages, pages_data), 1)
+                if page_ids is None or page.id in page_ids
+            ]
+            
             # Initialize progress
             task.set_progress({
-                "total": len(pages),
+                "total": len(targets),
                 "completed": 0,
                 "failed": 0
             })
@@ -246,6 +927,37 @@ def generate_images_task(task_id: str, project_id: str, ai_service, file_service
             # Generate images in parallel
             completed = 0
             failed = 0
+            writer = ProgressWriter.for_app(task_id, app)
+            retry_policy = RetryPolicy.for_app(app)
+            
+            # 每页图片的输入指纹，与图片路径一起写入，供之后的增量生成跳过未变化的页面
+            image_inputs = dict(
+                template_hash=file_fingerprint(ref_image_path), extra_requirements=extra_requirements,
+                language=language, aspect_ratio=aspect_ratio, resolution=resolution,
+                image_model=getattr(ai_service, 'image_model', None)
+            )
+            fingerprints = {}
+            
+            def prepare_page(page_id):
+                """Mark the page GENERATING and return its description text"""
+                with app.app_context():
+                    # Get page from database in this thread
+                    page_obj = Page.query.get(page_id)
+                    if not page_obj:
+                        raise ValueError(f"Page {page_id} not found")
+                    
+                    # Update page status (写入由任务线程批量提交)
+                    writer.update_page(page_id, status='GENERATING')
+                    
+                    # Get description content
+                    desc_content = page_obj.get_description_content()
+                    if not desc_content:
+                        raise ValueError("No description content for page")
+                    
+                    desc_text = _get_description_text(desc_content)
+                    logger.debug(f"Got description text for page {page_id}: {desc_text[:100]}...")
+                    fingerprints[page_id] = page_image_fingerprint(page_obj, desc_text=desc_text, **image_inputs)
+                    return desc_text
             
             def generate_single_image(page_id, page_data, page_index):
                 """
@@ -256,68 +968,18 @@ def generate_images_task(task_id: str, project_id: str, ai_service, file_service
                 with app.app_context():
                     try:
                         logger.debug(f"Starting image generation for page {page_id}, index {page_index}")
-                        # Get page from database in this thread
-                        page_obj = Page.query.get(page_id)
-                        if not page_obj:
-                            raise ValueError(f"Page {page_id} not found")
-                        
-                        # Update page status
-                        page_obj.status = 'GENERATING'
-                        db.session.commit()
-                        logger.debug(f"Page {page_id} status updated to GENERATING")
-                        
-                        # Get description content
-                        desc_content = page_obj.get_description_content()
-                        if not desc_content:
-                            raise ValueError("No description content for page")
-                        
-                        # 获取描述文本（可能是 text 字段或 text_content 数组）
-                        desc_text = desc_content.get('text', '')
-                        if not desc_text and desc_content.get('text_content'):
-                            # 如果 text 字段不存在，尝试从 text_content 数组获取
-                            text_content = desc_content.get('text_content', [])
-                            if isinstance(text_content, list):
-                                desc_text = '\n'.join(text_content)
-                            else:
-                                desc_text = str(text_content)
-                        
-                        logger.debug(f"Got description text for page {page_id}: {desc_text[:100]}...")
-                        
-                        # 从当前页面的描述内容中提取图片 URL
-                        page_additional_ref_images = []
-                        has_material_images = False
+                        _raise_if_cancelled(cancel_event)
+                        desc_text = prepare_page(page_id)
                         
-                        # 从描述文本中提取图片
-                        if desc_text:
-                            image_urls = ai_service.extract_image_urls_from_markdown(desc_text)
-                            if image_urls:
-                                logger.info(f"Found {len(image_urls)} image(s) in page {page_id} description")
-                                page_additional_ref_images = image_urls
-                                has_material_images = True
-                        
-                        # Generate image prompt
-                        prompt = ai_service.generate_image_prompt(
-                            outline, page_data, desc_text, page_index,
-                            has_material_images=has_material_images,
-                            extra_requirements=extra_requirements,
-                            language=language
-                        )
-                        logger.debug(f"Generated image prompt for page {page_id}")
-                        
-                        # Generate image
-                        logger.info(f"🎨 Calling AI service to generate image for page {page_index}/{len(pages)}...")
-                        image = ai_service.generate_image(
-                            prompt, ref_image_path, aspect_ratio, resolution,
-                            additional_ref_images=page_additional_ref_images if page_additional_ref_images else None
-                        )
-                        logger.info(f"✅ Image generated successfully for page {page_index}")
-                        
-                        if not image:
-                            raise ValueError("Failed to generate image")
-                        
-                        # Save image
-                        image_path = file_service.save_generated_image(
-                            image, project_id, page_id
+                        image_path = _run_page_with_retry(
+                            retry_policy, writer, page_id,
+                            lambda: _generate_page_image(
+                                ai_service, file_service, project_id, page_id, outline, page_data,
+                                page_index, len(pages), desc_text, ref_image_path,
+                                aspect_ratio, resolution, extra_requirements, language,
+                                cancel_event=cancel_event, new_variation=new_variation
+                            ),
+                            cancel_event
                         )
                         
                         return (page_id, image_path, None)
@@ -328,40 +990,73 @@ def generate_images_task(task_id: str, project_id: str, ai_service, file_service
                         logger.error(f"Failed to generate image for page {page_id}: {error_detail}")
                         return (page_id, None, str(e))
             
-            # Use ThreadPoolExecutor for parallel generation
+            async def generate_single_image_async(page_id, page_data, page_index, semaphore):
+                """协程版本：等待上游响应期间不占用线程，结果格式与 generate_single_image 相同"""
+                async with semaphore:
+                    try:
+                        desc_text = await asyncio.to_thread(prepare_page, page_id)
+                        image_path = await _run_page_with_retry_async(
+                            retry_policy, writer, page_id,
+                            lambda: _generate_page_image_async(
+                                ai_service, file_service, project_id, page_id, outline, page_data,
+                                page_index, len(pages), desc_text, ref_image_path,
+                                aspect_ratio, resolution, extra_requirements, language,
+                                cancel_event=cancel_event, new_variation=new_variation
+                            ),
+                            cancel_event
+                        )
+                        return (page_id, image_path, None)
+                    except Exception as e:
+                        logger.error(f"Failed to generate image for page {page_id}: {e}", exc_info=True)
+                        return (page_id, None, str(e))
+            
+            # Use ThreadPoolExecutor for parallel generation (only for the sync provider path)
             # 关键：提前提取 page.id，不要传递 ORM 对象到子线程
-            with ThreadPoolExecutor(max_workers=max_workers) as executor:
-                futures = [
-                    executor.submit(generate_single_image, page.id, page_data, i)
-                    for i, (page, page_data) in enumerate(zip(pages, pages_data), 1)
-                ]
+            executor = None
+            try:
+                if _use_async_provider_calls(app):
+                    semaphore = asyncio.Semaphore(max_workers)
+                    futures = [
+                        async_executor.submit(generate_single_image_async(page.id, page_data, i, semaphore))
+                        for i, page, page_data in targets
+                    ]
+                else:
+                    executor = ThreadPoolExecutor(max_workers=max_workers)
+                    futures = [
+                        executor.submit(generate_single_image, page.id, page_data, i)
+                        for i, page, page_data in targets
+                    ]
                 
                 # Process results as they complete
-                for future in as_completed(futures):
-                    page_id, image_path, error = future.result()
-                    
-                    
-                    db.session.expire_all()
-                    
-                    # Update page in database
-                    page = Page.query.get(page_id)
-                    if page:
+                # 页面结果与任务进度由 writer 合并，按 PROGRESS_FLUSH_INTERVAL 批量提交
+                pending = set(futures)
+                while pending:
+                    done, pending = wait(pending, timeout=writer.flush_interval or CANCEL_POLL_INTERVAL,
+                                         return_when=FIRST_COMPLETED)
+                    if cancel_event.is_set():
+                        _cancel_futures(pending)
+                        raise TaskCancelledError(task_id)
+                    for future in done:
+                        page_id, image_path, error = future.result()
                         if error:
-                            page.status = 'FAILED'
+                            writer.update_page(page_id, status='FAILED')
                             failed += 1
                         else:
-                            page.generated_image_path = image_path
-                            page.status = 'COMPLETED'
+                            writer.update_page(page_id, generated_image_path=image_path,
+                                               image_fingerprint=fingerprints.get(page_id), status='COMPLETED')
                             completed += 1
-                        
-                        db.session.commit()
-                    
-                    # Update task progress
-                    task = Task.query.get(task_id)
-                    if task:
-                        task.update_progress(completed=completed, failed=failed)
-                        db.session.commit()
-                        logger.info(f"Image Progress: {completed}/{len(pages)} pages completed")
+                    if done:
+                        writer.update_progress(completed=completed, failed=failed)
+                        logger.info(f"Image Progress: {completed}/{len(targets)} pages completed")
+                    writer.maybe_flush()
+            finally:
+                # 取消时不等待仍在执行的调用（其结果会被丢弃），任务立即结束并释放租约
+                if executor is not None:
+                    cancelled = cancel_event.is_set()
+                    executor.shutdown(wait=not cancelled, cancel_futures=cancelled)
+            
+            writer.flush(final=True)
+            logger.debug(f"Task {task_id}: {writer.commit_count} progress commits")
             
             # Mark task as completed
             task = Task.query.get(task_id)
@@ -379,6 +1074,9 @@ def generate_images_task(task_id: str, project_id: str, ai_service, file_service
                 db.session.commit()
                 logger.info(f"Project {project_id} status updated to COMPLETED")
         
+        except TaskCancelledError:
+            _finish_cancelled_task(task_id, project_id=project_id, writer=writer)
+        
         except Exception as e:
             # Mark task as failed
             task = Task.query.get(task_id)
@@ -389,16 +1087,296 @@ def generate_images_task(task_id: str, project_id: str, ai_service, file_service
                 db.session.commit()
 
 
+def generate_deck_task(task_id: str, project_id: str, ai_service, project_context,
+                       file_service, outline: List[Dict], use_template: bool = True,
+                       max_description_workers: int = 5, max_image_workers: int = 8,
+                       aspect_ratio: str = "16:9", resolution: str = "2K", app=None,
+                       extra_requirements: str = None, language: str = None):
+    """
+    Background task for pipelined deck generation (descriptions -> images)
+    
+    Each page is queued for image generation as soon as its description arrives,
+    so the two stages overlap instead of running back to back. Progress holds
+    per-stage counters: progress['stages']['descriptions' | 'images'], and per-page
+    retry state is kept per stage in progress['pages'][page_id]['descriptions' | 'images'].
+    
+    Note: app instance MUST be passed from the request context
+    """
+    if app is None:
+        raise ValueError("Flask app instance must be provided")
+    
+    writer = None
+    
+    with app.app_context():
+        try:
+            task = Task.query.get(task_id)
+            if not task:
+                return
+            
+            _start_processing(task)
+            cancel_event = task_manager.cancel_event(task_id)
+            
+            pages_data = ai_service.flatten_outline(outline)
+            pages = Page.query.filter_by(project_id=project_id).order_by(Page.order_index).all()
+            
+            if len(pages) != len(pages_data):
+                raise ValueError("Page count mismatch")
+            
+            ref_image_path = None
+            if use_template:
+                ref_image_path = file_service.get_template_path(project_id)
+                if not ref_image_path:
+                    raise ValueError("No template image found for project")
+            
+            total = len(pages)
+            stages = {
+                'descriptions': {'total': total, 'completed': 0, 'failed': 0},
+                'images': {'total': total, 'completed': 0, 'failed': 0},
+            }
+            
+            writer = ProgressWriter.for_app(task_id, app)
+            retry_policy = RetryPolicy.for_app(app)
+            
+            def save_progress():
+                # completed/failed 以最终产物（图片）为准，兼容只读取这两个字段的前端；
+                # 增量合并，保留 _run_page_with_retry 写入的 progress['pages']
+                writer.update_progress(
+                    completed=stages['images']['completed'],
+                    failed=stages['descriptions']['failed'] + stages['images']['failed'],
+                    total=total,
+                    stages={name: dict(counts) for name, counts in stages.items()},
+                )
+            
+            save_progress()
+            writer.flush()
+            
+            def generate_single_desc(page_id, page_outline, page_index, use_cache=True):
+                with app.app_context():
+                    try:
+                        desc_text = _run_page_with_retry(
+                            retry_policy, writer, page_id,
+                            lambda: ai_service.generate_page_description(
+                                project_context, outline, page_outline, page_index,
+                                language=language, use_cache=use_cache
+                            ),
+                            cancel_event, stage='descriptions'
+                        )
+                        desc_content = {
+                            "text": desc_text,
+                            "generated_at": datetime.utcnow().isoformat()
+                        }
+                        return (page_id, desc_content, None)
+                    except Exception as e:
+                        import traceback
+                        logger.error(f"Failed to generate description for page {page_id}: {traceback.format_exc()}")
+                        return (page_id, None, str(e))
+            
+            def generate_single_image(page_id, page_data, page_index, desc_text):
+                with app.app_context():
+                    try:
+                        image_path = _run_page_with_retry(
+                            retry_policy, writer, page_id,
+                            lambda: _generate_page_image(
+                                ai_service, file_service, project_id, page_id, outline, page_data,
+                                page_index, total, desc_text, ref_image_path,
+                                aspect_ratio, resolution, extra_requirements, language,
+                                cancel_event=cancel_event
+                            ),
+                            cancel_event, stage='images'
+                        )
+                        return (page_id, image_path, None)
+                    except Exception as e:
+                        import traceback
+                        logger.error(f"Failed to generate image for page {page_id}: {traceback.format_exc()}")
+                        return (page_id, None, str(e))
+            
+            async def generate_single_desc_async(page_id, page_outline, page_index, use_cache=True):
+                """协程版本：不占用线程，结果格式与 generate_single_desc 相同"""
+                async with desc_semaphore:
+                    try:
+                        desc_text = await _run_page_with_retry_async(
+                            retry_policy, writer, page_id,
+                            lambda: ai_service.generate_page_description_async(
+                                project_context, outline, page_outline, page_index,
+                                language=language, use_cache=use_cache
+                            ),
+                            cancel_event, stage='descriptions'
+                        )
+                        return (page_id, {
+                            "text": desc_text,
+                            "generated_at": datetime.utcnow().isoformat()
+                        }, None)
+                    except Exception as e:
+                        logger.error(f"Failed to generate description for page {page_id}: {e}", exc_info=True)
+                        return (page_id, None, str(e))
+            
+            async def generate_single_image_async(page_id, page_data, page_index, desc_text):
+                """协程版本：不占用线程，结果格式与 generate_single_image 相同"""
+                async with image_semaphore:
+                    try:
+                        image_path = await _run_page_with_retry_async(
+                            retry_policy, writer, page_id,
+                            lambda: _generate_page_image_async(
+                                ai_service, file_service, project_id, page_id, outline, page_data,
+                                page_index, total, desc_text, ref_image_path,
+                                aspect_ratio, resolution, extra_requirements, language,
+                                cancel_event=cancel_event
+                            ),
+                            cancel_event, stage='images'
+                        )
+                        return (page_id, image_path, None)
+                    except Exception as e:
+                        logger.error(f"Failed to generate image for page {page_id}: {e}", exc_info=True)
+                        return (page_id, None, str(e))
+            
+            page_meta = {
+                page.id: (page_data, index)
+                for index, (page, page_data) in enumerate(zip(pages, pages_data), 1)
+            }
+            page_by_id = {page.id: page for page in pages}
+            image_inputs = dict(
+                template_hash=file_fingerprint(ref_image_path), extra_requirements=extra_requirements,
+                language=language, aspect_ratio=aspect_ratio, resolution=resolution,
+                image_model=getattr(ai_service, 'image_model', None)
+            )
+            fingerprints = {}
+            
+            # 两个阶段各自限制并发：描述完成的页面立即进入图片阶段。
+            # ASYNC_PROVIDER_CALLS 开启时两个阶段都以协程跑在 async_executor 上，否则各用一个线程池
+            desc_executor = image_executor = None
+            if _use_async_provider_calls(app):
+                desc_semaphore = asyncio.Semaphore(max_description_workers)
+                image_semaphore = asyncio.Semaphore(max_image_workers)
+                
+                def submit_desc(page_id, page_data, index, use_cache):
+                    return async_executor.submit(generate_single_desc_async(page_id, page_data, index,
+                                                                            use_cache=use_cache))
+                
+                def submit_image(page_id, page_data, index, desc_text):
+                    return async_executor.submit(generate_single_image_async(page_id, page_data, index, desc_text))
+            else:
+                desc_executor = ThreadPoolExecutor(max_workers=max_description_workers)
+                image_executor = ThreadPoolExecutor(max_workers=max_image_workers)
+                
+                def submit_desc(page_id, page_data, index, use_cache):
+                    return desc_executor.submit(generate_single_desc, page_id, page_data, index,
+                                                use_cache=use_cache)
+                
+                def submit_image(page_id, page_data, index, desc_text):
+                    return image_executor.submit(generate_single_image, page_id, page_data, index, desc_text)
+            try:
+                stage_of = {}
+                images_started = False
+                for page in pages:
+                    page_data, index = page_meta[page.id]
+                    # 已有描述的页面是重新生成，不返回缓存的旧结果
+                    future = submit_desc(page.id, page_data, index, use_cache=not page.get_description_content())
+                    stage_of[future] = 'descriptions'
+                
+                pending = set(stage_of)
+                while pending:
+                    done, pending = wait(pending, timeout=writer.flush_interval or CANCEL_POLL_INTERVAL,
+                                         return_when=FIRST_COMPLETED)
+                    if cancel_event.is_set():
+                        _cancel_futures(pending)
+                        raise TaskCancelledError(task_id)
+                    
+                    for future in done:
+                        stage = stage_of.pop(future)
+                        page_id, result, error = future.result()
+                        
+                        if stage == 'descriptions':
+                            if error:
+                                stages['descriptions']['failed'] += 1
+                                writer.update_page(page_id, status='FAILED')
+                                continue
+                            stages['descriptions']['completed'] += 1
+                            writer.update_page(page_id, description_content=result, status='GENERATING')
+                            if not images_started:
+                                # 第一页进入图片阶段时切换项目状态
+                                from models import Project
+                                project = Project.query.get(project_id)
+                                if project:
+                                    project.status = 'GENERATING_IMAGES'
+                                    db.session.commit()
+                                images_started = True
+                            page_data, index = page_meta[page_id]
+                            desc_text = _get_description_text(result)
+                            fingerprints[page_id] = page_image_fingerprint(
+                                page_by_id[page_id], desc_text=desc_text, **image_inputs
+                            )
+                            image_future = submit_image(page_id, page_data, index, desc_text)
+                            stage_of[image_future] = 'images'
+                            pending.add(image_future)
+                        else:
+                            if error:
+                                stages['images']['failed'] += 1
+                                writer.update_page(page_id, status='FAILED')
+                            else:
+                                stages['images']['completed'] += 1
+                                writer.update_page(page_id, generated_image_path=result,
+                                                   image_fingerprint=fingerprints.get(page_id), status='COMPLETED')
+                    
+                    if done:
+                        save_progress()
+                        logger.info(
+                            f"Deck Progress: descriptions {stages['descriptions']['completed']}/{total}, "
+                            f"images {stages['images']['completed']}/{total}"
+                        )
+                    writer.maybe_flush()
+            finally:
+                # 取消时不等待仍在执行的调用（其结果会被丢弃），任务立即结束并释放租约
+                cancelled = cancel_event.is_set()
+                for executor in (desc_executor, image_executor):
+                    if executor is not None:
+                        executor.shutdown(wait=not cancelled, cancel_futures=cancelled)
+            
+            writer.flush(final=True)
+            
+            failed = stages['descriptions']['failed'] + stages['images']['failed']
+            
+            task = Task.query.get(task_id)
+            if task:
+                task.status = 'COMPLETED'
+                task.completed_at = datetime.utcnow()
+                db.session.commit()
+                logger.info(f"Task {task_id} COMPLETED - {stages['images']['completed']} slides generated, {failed} failed")
+            
+            from models import Project
+            project = Project.query.get(project_id)
+            if project:
+                if failed == 0:
+                    project.status = 'COMPLETED'
+                elif stages['descriptions']['failed'] == 0:
+                    project.status = 'DESCRIPTIONS_GENERATED'
+                db.session.commit()
+        
+        except TaskCancelledError:
+            _finish_cancelled_task(task_id, project_id=project_id, writer=writer)
+        
+        except Exception as e:
+            task = Task.query.get(task_id)
+            if task:
+                task.status = 'FAILED'
+                task.error_message = str(e)
+                task.completed_at = datetime.utcnow()
+                db.session.commit()
+
+
 def generate_single_page_image_task(task_id: str, project_id: str, page_id: str, 
                                     ai_service, file_service, outline: List[Dict],
                                     use_template: bool = True, aspect_ratio: str = "16:9",
                                     resolution: str = "2K", app=None,
                                     extra_requirements: str = None,
-                                    language: str = None):
+                                    language: str = None,
+                                    new_variation: bool = False):
     """
     Background task for generating a single page image
     
     Note: app instance MUST be passed from the request context
+    
+    Args:
+        new_variation: Bypass the image result cache (the user asked to regenerate)
     """
     if app is None:
         raise ValueError("Flask app instance must be provided")
@@ -410,8 +1388,8 @@ def generate_single_page_image_task(task_id: str, project_id: str, page_id: str,
             if not task:
                 return
             
-            task.status = 'PROCESSING'
-            db.session.commit()
+            _start_processing(task)
+            cancel_event = task_manager.cancel_event(task_id)
             
             # Get page from database
             page = Page.query.get(page_id)
@@ -470,12 +1448,16 @@ def generate_single_page_image_task(task_id: str, project_id: str, page_id: str,
             logger.info(f"🎨 Generating image for page {page_id}...")
             image = ai_service.generate_image(
                 prompt, ref_image_path, aspect_ratio, resolution,
-                additional_ref_images=additional_ref_images if additional_ref_images else None
+                additional_ref_images=additional_ref_images if additional_ref_images else None,
+                new_variation=new_variation
             )
             
             if not image:
                 raise ValueError("Failed to generate image")
             
+            # 任务已取消时迟到的结果不再保存
+            _raise_if_cancelled(cancel_event)
+            
             # Calculate next version number
             from models import PageImageVersion
             existing_versions = PageImageVersion.query.filter_by(page_id=page_id).all()
@@ -502,6 +1484,10 @@ def generate_single_page_image_task(task_id: str, project_id: str, page_id: str,
             
             # Update page with current image path
             page.generated_image_path = image_path
+            page.image_fingerprint = page_image_fingerprint(
+                page, file_fingerprint(ref_image_path), extra_requirements, language,
+                aspect_ratio, resolution, getattr(ai_service, 'image_model', None), desc_text=desc_text
+            )
             page.status = 'COMPLETED'
             page.updated_at = datetime.utcnow()
             
@@ -517,6 +1503,9 @@ def generate_single_page_image_task(task_id: str, project_id: str, page_id: str,
             
             logger.info(f"✅ Task {task_id} COMPLETED - Page {page_id} image generated")
         
+        except TaskCancelledError:
+            _finish_cancelled_task(task_id, page_ids=[page_id])
+        
         except Exception as e:
             import traceback
             error_detail = traceback.format_exc()
@@ -542,10 +1531,15 @@ def edit_page_image_task(task_id: str, project_id: str, page_id: str,
                          aspect_ratio: str = "16:9", resolution: str = "2K",
                          original_description: str = None,
                          additional_ref_images: List[str] = None,
+                         uploaded_ref_images: List[str] = None,
                          temp_dir: str = None, app=None):
     """
     Background task for editing a page image
     
+    uploaded_ref_images and temp_dir are relative to the upload folder; they are
+    removed once the task reaches a terminal state (not before, so a re-queued
+    attempt still finds them).
+    
     Note: app instance MUST be passed from the request context
     """
     if app is None:
@@ -558,8 +1552,8 @@ def edit_page_image_task(task_id: str, project_id: str, page_id: str,
             if not task:
                 return
             
-            task.status = 'PROCESSING'
-            db.session.commit()
+            _start_processing(task)
+            cancel_event = task_manager.cancel_event(task_id)
             
             # Get page from database
             page = Page.query.get(page_id)
@@ -576,29 +1570,26 @@ def edit_page_image_task(task_id: str, project_id: str, page_id: str,
             # Get current image path
             current_image_path = file_service.get_absolute_path(page.generated_image_path)
             
+            ref_images = list(additional_ref_images or [])
+            ref_images.extend(file_service.get_absolute_path(path) for path in uploaded_ref_images or [])
+            
             # Edit image
             logger.info(f"🎨 Editing image for page {page_id}...")
-            try:
-                image = ai_service.edit_image(
-                    edit_instruction,
-                    current_image_path,
-                    aspect_ratio,
-                    resolution,
-                    original_description=original_description,
-                    additional_ref_images=additional_ref_images if additional_ref_images else None
-                )
-            finally:
-                # Clean up temp directory if created
-                if temp_dir:
-                    import shutil
-                    from pathlib import Path
-                    temp_path = Path(temp_dir)
-                    if temp_path.exists():
-                        shutil.rmtree(temp_dir)
+            image = ai_service.edit_image(
+                edit_instruction,
+                current_image_path,
+                aspect_ratio,
+                resolution,
+                original_description=original_description,
+                additional_ref_images=ref_images if ref_images else None
+            )
             
             if not image:
                 raise ValueError("Failed to edit image")
             
+            # 任务已取消时迟到的结果不再保存
+            _raise_if_cancelled(cancel_event)
+            
             # Calculate next version number
             from models import PageImageVersion
             existing_versions = PageImageVersion.query.filter_by(page_id=page_id).all()
@@ -637,22 +1628,19 @@ def edit_page_image_task(task_id: str, project_id: str, page_id: str,
                 "failed": 0
             })
             db.session.commit()
+            file_service.delete_task_uploads(temp_dir)
             
             logger.info(f"✅ Task {task_id} COMPLETED - Page {page_id} image edited")
         
+        except TaskCancelledError:
+            _finish_cancelled_task(task_id, page_ids=[page_id])
+            file_service.delete_task_uploads(temp_dir)
+
         except Exception as e:
             import traceback
             error_detail = traceback.format_exc()
             logger.error(f"Task {task_id} FAILED: {error_detail}")
             
-            # Clean up temp directory on error
-            if temp_dir:
-                import shutil
-                from pathlib import Path
-                temp_path = Path(temp_dir)
-                if temp_path.exists():
-                    shutil.rmtree(temp_dir)
-            
             # Mark task as failed
             task = Task.query.get(task_id)
             if task:
@@ -666,6 +1654,7 @@ def edit_page_image_task(task_id: str, project_id: str, page_id: str,
             if page:
                 page.status = 'FAILED'
                 db.session.commit()
+            file_service.delete_task_uploads(temp_dir)
 
 
 def generate_material_image_task(task_id: str, project_id: str, prompt: str,
@@ -679,6 +1668,9 @@ def generate_material_image_task(task_id: str, project_id: str, prompt: str,
     Background task for generating a material image
     复用核心的generate_image逻辑，但保存到Material表而不是Page表
     
+    Uploaded reference images (ref_image_path / additional_ref_images) and temp_dir
+    are relative to the upload folder and removed once the task reaches a terminal state.
+    
     Note: app instance MUST be passed from the request context
     project_id can be None for global materials (but Task model requires a project_id,
     so we use a special value 'global' for task tracking)
@@ -693,22 +1685,29 @@ def generate_material_image_task(task_id: str, project_id: str, prompt: str,
             if not task:
                 return
             
-            task.status = 'PROCESSING'
-            db.session.commit()
+            _start_processing(task)
+            cancel_event = task_manager.cancel_event(task_id)
             
             # Generate image (复用核心逻辑)
             logger.info(f"🎨 Generating material image with prompt: {prompt[:100]}...")
             image = ai_service.generate_image(
                 prompt=prompt,
-                ref_image_path=ref_image_path,
+                ref_image_path=file_service.get_absolute_path(ref_image_path) if ref_image_path else None,
                 aspect_ratio=aspect_ratio,
                 resolution=resolution,
-                additional_ref_images=additional_ref_images or None,
+                additional_ref_images=[
+                    file_service.get_absolute_path(path) for path in additional_ref_images or []
+                ] or None,
+                # 每次点击“生成素材”都应得到新图片，不使用图片结果缓存
+                new_variation=True,
             )
             
             if not image:
                 raise ValueError("Failed to generate image")
             
+            # 任务已取消时迟到的结果不再保存
+            _raise_if_cancelled(cancel_event)
+            
             # 处理project_id：如果为'global'或None，转换为None
             actual_project_id = None if (project_id == 'global' or project_id is None) else project_id
             
@@ -743,6 +1742,9 @@ def generate_material_image_task(task_id: str, project_id: str, prompt: str,
             
             logger.info(f"✅ Task {task_id} COMPLETED - Material {material.id} generated")
         
+        except TaskCancelledError:
+            _finish_cancelled_task(task_id)
+        
         except Exception as e:
             import traceback
             error_detail = traceback.format_exc()
@@ -757,9 +1759,97 @@ def generate_material_image_task(task_id: str, project_id: str, prompt: str,
                 db.session.commit()
         
         finally:
-            # Clean up temp directory
-            if temp_dir:
-                import shutil
-                temp_path = Path(temp_dir)
-                if temp_path.exists():
-                    shutil.rmtree(temp_dir, ignore_errors=True)
+            # 任务已进入终态（完成 / 取消 / 失败），清理上传的参考图片
+            file_service.delete_task_uploads(temp_dir)
+
+
+def build_task_call(task: Task, app) -> tuple:
+    """
+    Rebuild a queued task from its persisted payload
+    
+    The payload only holds JSON-serializable arguments; services, the project
+    context and the outline are reconstructed from the database here, so a task
+    can be resumed by any process (after a restart, or by a standalone worker).
+    Requires an app context.
+    
+    Returns:
+        Tuple of (task_func, kwargs) - call as task_func(task.id, **kwargs)
+    """
+    from models import Project
+    from services.ai_service import AIService, ProjectContext
+    from services.file_service import FileService
+    from controllers.project_controller import (
+        _get_project_reference_files_content, _reconstruct_outline_from_pages
+    )
+    
+    payload = task.get_payload()
+    task_type = task.task_type
+    kwargs = dict(payload)
+    kwargs['app'] = app
+    
+    def load_outline(project_id):
+        pages = Page.query.filter_by(project_id=project_id).order_by(Page.order_index).all()
+        return _reconstruct_outline_from_pages(pages)
+    
+    if task_type == 'GENERATE_DESCRIPTIONS':
+        project = Project.query.get(task.project_id)
+        if not project:
+            raise ValueError(f"Project {task.project_id} not found")
+        kwargs.update(
+            project_id=task.project_id,
+            ai_service=AIService(),
+            project_context=ProjectContext(project, _get_project_reference_files_content(task.project_id)),
+            outline=load_outline(task.project_id),
+        )
+        return generate_descriptions_task, kwargs
+    
+    file_service = FileService(app.config['UPLOAD_FOLDER'])
+    
+    if task_type == 'GENERATE_IMAGES':
+        kwargs.update(
+            project_id=task.project_id,
+            ai_service=AIService(),
+            file_service=file_service,
+            outline=load_outline(task.project_id),
+        )
+        return generate_images_task, kwargs
+    
+    if task_type == 'GENERATE_DECK':
+        project = Project.query.get(task.project_id)
+        if not project:
+            raise ValueError(f"Project {task.project_id} not found")
+        kwargs.update(
+            project_id=task.project_id,
+            ai_service=AIService(),
+            project_context=ProjectContext(project, _get_project_reference_files_content(task.project_id)),
+            file_service=file_service,
+            outline=load_outline(task.project_id),
+        )
+        return generate_deck_task, kwargs
+    
+    if task_type == 'GENERATE_PAGE_IMAGE':
+        kwargs.update(
+            project_id=task.project_id,
+            ai_service=AIService(),
+            file_service=file_service,
+            outline=load_outline(task.project_id),
+        )
+        return generate_single_page_image_task, kwargs
+    
+    if task_type == 'EDIT_PAGE_IMAGE':
+        kwargs.update(
+            project_id=task.project_id,
+            ai_service=AIService(),
+            file_service=file_service,
+        )
+        return edit_page_image_task, kwargs
+    
+    if task_type == 'GENERATE_MATERIAL':
+        kwargs.update(
+            project_id=task.project_id,
+            ai_service=AIService(),
+            file_service=file_service,
+        )
+        return generate_material_image_task, kwargs
+    
+    raise ValueError(f"Unknown task type: {task_type}")
@@ -0,0 +1,283 @@
+"""
+Task Queue - durable, lease-based task queue backed by the tasks table
+
+每个 Task 行同时就是一条队列消息：
+- 领取（claim）时通过条件 UPDATE 原子地写入 lease_owner / lease_expires_at，
+  只有 rowcount == 1 的 worker 才算领取成功，因此多个进程/机器可以安全地消费同一个队列
+- 执行期间 worker 周期性续租（heartbeat）
+- worker 崩溃后租约自然过期，recover_expired_tasks() 会把任务重新放回 PENDING
+- 取消（request_cancellation）：尚未被领取的任务直接变为 CANCELLED，执行中的任务标记为
+  CANCELLING，由执行它的 worker 在下一个检查点停止并写入 CANCELLED
+"""
+import logging
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional, Tuple
+from models import db, Task
+from .task_scheduler import INTERACTIVE_TASK_TYPES
+
+logger = logging.getLogger(__name__)
+
+# 仍在队列中 / 执行中的任务状态
+ACTIVE_STATUSES = ('PENDING', 'PROCESSING')
+# 已请求取消、等待执行中的 worker 停止
+CANCELLING_STATUS = 'CANCELLING'
+
+
+def _discard_task_uploads(task: Task) -> None:
+    """Remove files uploaded with a task that reached a terminal state without running"""
+    upload_dir = task.get_payload().get('temp_dir')
+    if upload_dir:
+        from flask import current_app
+        from .file_service import FileService
+        FileService(current_app.config['UPLOAD_FOLDER']).delete_task_uploads(upload_dir)
+
+
+def _claimable_filter(now: datetime):
+    """Tasks that nobody currently holds a valid lease for"""
+    return db.or_(Task.lease_owner.is_(None), Task.lease_expires_at < now)
+
+
+def claim_task(task_id: str, worker_id: str, lease_seconds: int) -> bool:
+    """
+    Atomically claim a specific task
+
+    Args:
+        task_id: Task ID
+        worker_id: ID of the claiming worker
+        lease_seconds: Lease duration in seconds
+
+    Returns:
+        True if this worker now owns the lease
+    """
+    now = datetime.utcnow()
+    updated = Task.query.filter(
+        Task.id == task_id,
+        Task.status.in_(ACTIVE_STATUSES),
+        _claimable_filter(now)
+    ).update({
+        'lease_owner': worker_id,
+        'lease_expires_at': now + timedelta(seconds=lease_seconds),
+        'heartbeat_at': now,
+        'attempts': Task.attempts + 1,
+    }, synchronize_session=False)
+    db.session.commit()
+    return updated == 1
+
+
+def _priority_rank():
+    """SQL expression: 0 for interactive task types, 1 for bulk ones"""
+    return db.case((Task.task_type.in_(list(INTERACTIVE_TASK_TYPES)), 0), else_=1)
+
+
+def claim_next_task(worker_id: str, lease_seconds: int,
+                    task_types: Optional[Iterable[str]] = None,
+                    exclude_ids: Optional[Iterable[str]] = None,
+                    created_before: Optional[datetime] = None) -> Optional[str]:
+    """
+    Atomically claim the next PENDING task
+
+    Interactive tasks come before bulk ones; within a class, projects with
+    fewer tasks already PROCESSING go first, then the oldest task.
+    Candidates are read first, then claimed one by one with a conditional
+    UPDATE; losing a race simply moves on to the next candidate.
+
+    Args:
+        worker_id: ID of the claiming worker
+        lease_seconds: Lease duration in seconds
+        task_types: Optional whitelist of task types this worker handles
+        exclude_ids: Task IDs to skip (e.g. already queued in this process)
+        created_before: Only consider tasks created before this time
+
+    Returns:
+        Claimed task ID, or None if the queue is empty
+    """
+    now = datetime.utcnow()
+    query = Task.query.with_entities(Task.id, Task.project_id, _priority_rank().label('rank')).filter(
+        Task.status == 'PENDING',
+        _claimable_filter(now)
+    )
+    if task_types:
+        query = query.filter(Task.task_type.in_(list(task_types)))
+    if exclude_ids:
+        query = query.filter(Task.id.notin_(list(exclude_ids)))
+    if created_before is not None:
+        query = query.filter(Task.created_at < created_before)
+    rows = query.order_by(_priority_rank(), Task.created_at).limit(10).all()
+    if not rows:
+        return None
+
+    # 同一优先级内按项目公平：正在执行的任务越少的项目越先领取
+    running = dict(
+        db.session.query(Task.project_id, db.func.count(Task.id)).filter(
+            Task.status == 'PROCESSING',
+            Task.project_id.in_({row.project_id for row in rows})
+        ).group_by(Task.project_id).all()
+    )
+    ordered = sorted(enumerate(rows), key=lambda item: (item[1].rank, running.get(item[1].project_id, 0), item[0]))
+    candidates = [row.id for _, row in ordered]
+
+    for task_id in candidates:
+        if claim_task(task_id, worker_id, lease_seconds):
+            return task_id
+    return None
+
+
+def queue_position(task: Task) -> Optional[int]:
+    """
+    1-based position of a PENDING task in the shared queue (class, then age)
+
+    Used when tasks run in standalone workers and the in-process scheduler
+    does not know them.
+    """
+    if task.status != 'PENDING':
+        return None
+    rank = 0 if task.task_type in INTERACTIVE_TASK_TYPES else 1
+    ahead = Task.query.filter(
+        Task.status == 'PENDING',
+        Task.id != task.id,
+        db.or_(
+            _priority_rank() < rank,
+            db.and_(_priority_rank() == rank, Task.created_at <= task.created_at)
+        )
+    ).count()
+    return ahead + 1
+
+
+def renew_leases(task_ids: List[str], worker_id: str, lease_seconds: int) -> int:
+    """
+    Heartbeat: extend the leases this worker still owns
+
+    Returns:
+        Number of leases renewed
+    """
+    if not task_ids:
+        return 0
+    now = datetime.utcnow()
+    updated = Task.query.filter(
+        Task.id.in_(task_ids),
+        Task.lease_owner == worker_id
+    ).update({
+        'lease_expires_at': now + timedelta(seconds=lease_seconds),
+        'heartbeat_at': now,
+    }, synchronize_session=False)
+    db.session.commit()
+    return updated
+
+
+def release_task(task_id: str, worker_id: str) -> None:
+    """Release the lease held by this worker (task finished or gave up)"""
+    Task.query.filter(
+        Task.id == task_id,
+        Task.lease_owner == worker_id
+    ).update({
+        'lease_owner': None,
+        'lease_expires_at': None,
+    }, synchronize_session=False)
+    db.session.commit()
+
+
+def request_cancellation(task_id: str) -> Optional[str]:
+    """
+    Request cancellation of a task
+
+    Both transitions are conditional UPDATEs, so they cannot race with a
+    worker claiming the task.
+
+    Returns:
+        'CANCELLED' if the task was still queued (nobody will run it),
+        'CANCELLING' if a worker holds it and has to stop cooperatively,
+        None if the task does not exist or is not active anymore
+    """
+    now = datetime.utcnow()
+    # 尚未被任何 worker 领取：直接取消
+    updated = Task.query.filter(
+        Task.id == task_id,
+        Task.status == 'PENDING',
+        _claimable_filter(now)
+    ).update({
+        'status': 'CANCELLED',
+        'completed_at': now,
+    }, synchronize_session=False)
+    new_status = 'CANCELLED'
+    if not updated:
+        updated = Task.query.filter(
+            Task.id == task_id,
+            Task.status.in_(ACTIVE_STATUSES)
+        ).update({'status': CANCELLING_STATUS}, synchronize_session=False)
+        new_status = CANCELLING_STATUS
+    db.session.commit()
+    if not updated:
+        return None
+
+    # 条件 UPDATE 不经过 ORM 会话钩子，手动同步内存状态表并推送事件
+    from .progress_events import publish_task_snapshot
+    task = Task.query.get(task_id)
+    if task:
+        db.session.refresh(task)
+        publish_task_snapshot(task.project_id, task.to_dict())
+        if new_status == 'CANCELLED':
+            _discard_task_uploads(task)
+    logger.info(f"Task {task_id} cancellation requested -> {new_status}")
+    return new_status
+
+
+def cancelling_task_ids(task_ids: List[str]) -> List[str]:
+    """Subset of task_ids whose cancellation was requested (used by worker heartbeats)"""
+    if not task_ids:
+        return []
+    rows = Task.query.with_entities(Task.id).filter(
+        Task.id.in_(task_ids),
+        Task.status == CANCELLING_STATUS
+    ).all()
+    return [row.id for row in rows]
+
+
+def recover_expired_tasks(max_attempts: int) -> Tuple[int, int]:
+    """
+    Crash recovery: re-queue tasks whose lease has expired
+
+    - PENDING/PROCESSING tasks with an expired lease go back to PENDING
+    - PROCESSING tasks without any lease (left by a process that predates
+      the queue or died before claiming) are treated the same way
+    - Tasks that already used up max_attempts are marked FAILED
+    - CANCELLING tasks whose worker is gone are closed as CANCELLED
+    - Files uploaded with tasks closed here are removed
+
+    Returns:
+        Tuple of (requeued_count, failed_count)
+    """
+    now = datetime.utcnow()
+    orphaned = Task.query.filter(
+        Task.status.in_(ACTIVE_STATUSES + (CANCELLING_STATUS,)),
+        db.or_(
+            db.and_(Task.lease_owner.isnot(None), Task.lease_expires_at < now),
+            db.and_(Task.lease_owner.is_(None), Task.status.in_(('PROCESSING', CANCELLING_STATUS)))
+        )
+    ).all()
+
+    requeued = 0
+    failed = 0
+    finished = []
+    for task in orphaned:
+        task.lease_owner = None
+        task.lease_expires_at = None
+        if task.status == CANCELLING_STATUS:
+            task.status = 'CANCELLED'
+            task.completed_at = now
+            finished.append(task)
+        elif (task.attempts or 0) >= max_attempts:
+            task.status = 'FAILED'
+            task.error_message = f"Task lease expired after {task.attempts} attempts"
+            task.completed_at = now
+            failed += 1
+            finished.append(task)
+        else:
+            task.status = 'PENDING'
+            requeued += 1
+    db.session.commit()
+    for task in finished:
+        _discard_task_uploads(task)
+
+    if requeued or failed:
+        logger.warning(f"Recovered expired tasks: {requeued} re-queued, {failed} failed")
+    return requeued, failed
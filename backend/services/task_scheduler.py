@@ -0,0 +1,133 @@
+"""
+Task Scheduler - priority classes with weighted fair share across projects
+
+任务分为两个优先级：
+- interactive：单页图片生成/编辑、素材生成（用户在界面上等待结果）
+- bulk：整套描述/图片/流水线生成等批量任务（包括以后新增的导出类任务）
+
+interactive 总是优先派发，并且 TaskManager 为它预留线程（bulk 不能占满所有线程）。
+同一优先级内按项目做加权公平排队（WFQ）：每个任务按其工作量（页数）计算虚拟完成时间，
+同一项目连续提交的任务依次排在后面，因此一个项目的 60 页批量任务不会让其他项目一直等待。
+"""
+import heapq
+import itertools
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+INTERACTIVE = 'interactive'
+BULK = 'bulk'
+# 派发顺序：前面的类别总是优先
+CLASS_ORDER = (INTERACTIVE, BULK)
+
+INTERACTIVE_TASK_TYPES = frozenset({'GENERATE_PAGE_IMAGE', 'EDIT_PAGE_IMAGE', 'GENERATE_MATERIAL'})
+
+
+def task_class(task_type: Optional[str]) -> str:
+    """Priority class of a task type"""
+    return INTERACTIVE if task_type in INTERACTIVE_TASK_TYPES else BULK
+
+
+class QueuedTask:
+    """A task waiting in the scheduler"""
+
+    __slots__ = ('task_id', 'project_id', 'task_type', 'task_class', 'cost',
+                 'start_tag', 'finish_tag', 'seq', 'payload', 'removed')
+
+    def __init__(self, task_id: str, project_id: Optional[str], task_type: Optional[str],
+                 cost: float, payload: Any = None):
+        self.task_id = task_id
+        self.project_id = project_id
+        self.task_type = task_type
+        self.task_class = task_class(task_type)
+        self.cost = cost
+        self.start_tag = 0.0
+        self.finish_tag = 0.0
+        self.seq = 0
+        self.payload = payload
+        self.removed = False
+
+    def sort_key(self) -> Tuple[int, float, int]:
+        return CLASS_ORDER.index(self.task_class), self.finish_tag, self.seq
+
+
+class FairScheduler:
+    """Thread-safe multi-class WFQ queue of tasks waiting for a worker thread"""
+
+    def __init__(self):
+        self._heaps: Dict[str, List[Tuple[float, int, QueuedTask]]] = {cls: [] for cls in CLASS_ORDER}
+        self._virtual_time: Dict[str, float] = {cls: 0.0 for cls in CLASS_ORDER}
+        self._last_finish: Dict[str, Dict[Optional[str], float]] = {cls: {} for cls in CLASS_ORDER}
+        self._entries: Dict[str, QueuedTask] = {}
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def push(self, task_id: str, project_id: Optional[str], task_type: Optional[str],
+             cost: float = 1.0, payload: Any = None) -> QueuedTask:
+        """
+        Queue a task
+
+        Args:
+            cost: Amount of work (e.g. page count); larger tasks advance their
+                  project's virtual clock further
+            payload: Opaque data returned with the entry by pop()
+        """
+        entry = QueuedTask(task_id, project_id, task_type, max(1.0, float(cost)), payload)
+        with self._lock:
+            cls = entry.task_class
+            # 项目的下一个任务从“当前虚拟时间”和“该项目上一个任务的完成时间”中较晚者开始
+            entry.start_tag = max(self._virtual_time[cls], self._last_finish[cls].get(project_id, 0.0))
+            entry.finish_tag = entry.start_tag + entry.cost
+            entry.seq = next(self._seq)
+            self._last_finish[cls][project_id] = entry.finish_tag
+            self._entries[task_id] = entry
+            heapq.heappush(self._heaps[cls], (entry.finish_tag, entry.seq, entry))
+        return entry
+
+    def pop(self, classes: Tuple[str, ...] = CLASS_ORDER) -> Optional[QueuedTask]:
+        """Take the next task of the highest-priority non-empty class among `classes`"""
+        with self._lock:
+            for cls in CLASS_ORDER:
+                if cls not in classes:
+                    continue
+                heap = self._heaps[cls]
+                while heap:
+                    _, _, entry = heapq.heappop(heap)
+                    if entry.removed:
+                        continue
+                    self._entries.pop(entry.task_id, None)
+                    self._virtual_time[cls] = max(self._virtual_time[cls], entry.start_tag)
+                    if not heap:
+                        # 队列清空后重置时钟，避免空闲项目积累的“信用”无限增长
+                        self._last_finish[cls].clear()
+                    return entry
+        return None
+
+    def remove(self, task_id: str) -> bool:
+        """Drop a queued task (e.g. cancelled before it started)"""
+        with self._lock:
+            entry = self._entries.pop(task_id, None)
+            if entry is None:
+                return False
+            entry.removed = True
+            return True
+
+    def position(self, task_id: str) -> Optional[int]:
+        """1-based dispatch position of a queued task, None if it is not queued"""
+        with self._lock:
+            entry = self._entries.get(task_id)
+            if entry is None:
+                return None
+            key = entry.sort_key()
+            return 1 + sum(1 for other in self._entries.values() if other.sort_key() < key)
+
+    def pending_count(self, cls: Optional[str] = None) -> int:
+        with self._lock:
+            return sum(1 for entry in self._entries.values() if cls is None or entry.task_class == cls)
+
+    def stats(self) -> Dict[str, int]:
+        """Number of queued tasks per class"""
+        with self._lock:
+            counts = {cls: 0 for cls in CLASS_ORDER}
+            for entry in self._entries.values():
+                counts[entry.task_class] += 1
+            return counts
@@ -0,0 +1,93 @@
+"""
+Task Status Store - in-process hot copy of every active task's status/progress
+
+- 已提交的 Task 变化（创建、状态切换）由 progress_events 的会话钩子同步到这里
+- 任务执行中的进度更新（ProgressWriter）只写内存，数据库只在状态切换时写入
+- 状态查询接口优先从这里读取，避免每次轮询都查询 SQLite
+
+快照格式与 Task.to_dict() 相同，另外带 project_id 用于按项目筛选。
+"""
+import copy
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 视为“活跃”的任务状态，其余状态（COMPLETED/FAILED/CANCELLED 等）从内存中移除
+ACTIVE_TASK_STATUSES = ('PENDING', 'PROCESSING', 'CANCELLING')
+
+
+class TaskStatusStore:
+    """Thread-safe map of task_id -> Task.to_dict() snapshot for active tasks"""
+
+    def __init__(self):
+        self._tasks: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def put(self, project_id: str, snapshot: Dict[str, Any]):
+        """Record a committed task state; terminal states drop the entry"""
+        task_id = snapshot['task_id']
+        with self._lock:
+            if snapshot.get('status') in ACTIVE_TASK_STATUSES:
+                entry = dict(snapshot)
+                entry['project_id'] = project_id
+                self._tasks[task_id] = entry
+            else:
+                self._tasks.pop(task_id, None)
+
+    def update_progress(self, task_id: str, progress: Dict[str, Any]) -> bool:
+        """
+        Update the live progress of an active task and push it to SSE subscribers
+
+        Returns:
+            False if the task is not tracked in memory
+        """
+        with self._lock:
+            entry = self._tasks.get(task_id)
+            if entry is None:
+                return False
+            entry['progress'] = copy.deepcopy(progress)
+            project_id = entry['project_id']
+            event = {
+                'task_id': task_id,
+                'task_type': entry.get('task_type'),
+                'status': entry.get('status'),
+                'progress': entry['progress'],
+                'error_message': entry.get('error_message'),
+            }
+
+        from services.progress_events import progress_broker
+        progress_broker.publish(project_id, 'task', event)
+        return True
+
+    def remove(self, task_id: str):
+        """Forget a task (e.g. deleted together with its project)"""
+        with self._lock:
+            self._tasks.pop(task_id, None)
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """Snapshot of one task (Task.to_dict() shape), or None if not active in memory"""
+        with self._lock:
+            entry = self._tasks.get(task_id)
+            return copy.deepcopy(entry) if entry else None
+
+    def get_progress(self, task_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._tasks.get(task_id)
+            return copy.deepcopy(entry['progress']) if entry and entry.get('progress') is not None else None
+
+    def list_active(self, project_id: str) -> List[Dict[str, Any]]:
+        """All active tasks of a project, oldest first"""
+        with self._lock:
+            tasks = [copy.deepcopy(entry) for entry in self._tasks.values()
+                     if entry['project_id'] == project_id]
+        return sorted(tasks, key=lambda t: t.get('created_at') or '')
+
+    def clear(self):
+        with self._lock:
+            self._tasks.clear()
+
+
+# Global store instance
+task_status_store = TaskStatusStore()
@@ -100,6 +100,45 @@ def sample_project(client):
     return data['data'] if data.get('success') else None
 
 
+@pytest.fixture
+def make_project(client):
+    """
+    创建带页面（及可选任务）的项目，直接写数据库
+
+    返回工厂函数 make_project(page_statuses, ...) -> (project_id, page_ids, task_id)，
+    未指定 task_type 时 task_id 为 None
+    """
+    from models import db, Project, Page, Task
+
+    def factory(page_statuses, project_status='DRAFT', task_type=None, task_status='PENDING',
+                descriptions=False, images=False):
+        project = Project(creation_type='idea', idea_prompt='测试', status=project_status)
+        db.session.add(project)
+        db.session.flush()
+        page_ids = []
+        for i, status in enumerate(page_statuses):
+            page = Page(project_id=project.id, order_index=i, status=status)
+            page.set_outline_content({'title': f'第{i + 1}页', 'points': ['要点']})
+            if descriptions:
+                page.set_description_content({'text': f'描述{i + 1}'})
+            if images:
+                page.generated_image_path = f'{project.id}/pages/{i}.png'
+            db.session.add(page)
+            db.session.flush()
+            page_ids.append(page.id)
+        task_id = None
+        if task_type:
+            task = Task(project_id=project.id, task_type=task_type, status=task_status)
+            task.set_progress({'total': len(page_statuses), 'completed': 0, 'failed': 0})
+            db.session.add(task)
+            db.session.flush()
+            task_id = task.id
+        db.session.commit()
+        return project.id, page_ids, task_id
+
+    return factory
+
+
 @pytest.fixture
 def mock_ai_service():
     """Mock AI服务，避免真实API调用（使用标准库unittest.mock）"""
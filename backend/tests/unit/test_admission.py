@@ -0,0 +1,93 @@
+"""
+任务准入控制单元测试（队列上限 / Retry-After / readiness）
+"""
+
+import pytest
+
+
+@pytest.fixture
+def queue_limits(app):
+    """临时修改队列上限，测试结束后恢复"""
+    saved = {key: app.config.get(key) for key in ('TASK_QUEUE_LIMITS', 'TASK_QUEUE_LIMIT_DEFAULT')}
+
+    def set_limits(limits='', default=50):
+        app.config['TASK_QUEUE_LIMITS'] = limits
+        app.config['TASK_QUEUE_LIMIT_DEFAULT'] = default
+
+    yield set_limits
+    app.config.update(saved)
+
+
+class TestQueueLimits:
+    """队列上限测试"""
+
+    def test_parse_queue_limits(self):
+        """解析逐类型的上限配置，跳过无效项"""
+        from services.admission import parse_queue_limits
+        assert parse_queue_limits('generate_images=20, EDIT_PAGE_IMAGE=100,bad,X=y') == {
+            'GENERATE_IMAGES': 20, 'EDIT_PAGE_IMAGE': 100
+        }
+
+    def test_full_queue_returns_429_with_retry_after(self, client, queue_limits, make_project):
+        """排队任务达到上限时返回 429 和 Retry-After，且不创建新任务"""
+        from models import Task
+        queue_limits('GENERATE_DESCRIPTIONS=1', default=0)
+        project_id, _, _ = make_project(['DRAFT'], task_type='GENERATE_DESCRIPTIONS')
+        before = Task.query.filter_by(task_type='GENERATE_DESCRIPTIONS').count()
+
+        response = client.post(f'/api/projects/{project_id}/generate/descriptions', json={})
+
+        assert response.status_code == 429
+        assert int(response.headers['Retry-After']) >= 1
+        assert response.get_json()['error']['code'] == 'QUEUE_FULL'
+        assert Task.query.filter_by(task_type='GENERATE_DESCRIPTIONS').count() == before
+
+    def test_unlimited_queue_admits(self, client, queue_limits, make_project):
+        """上限为 0 表示不限制"""
+        from services.admission import admission_controller
+        queue_limits('', default=0)
+        make_project(['DRAFT'], task_type='GENERATE_DESCRIPTIONS')
+
+        admission_controller.check('GENERATE_DESCRIPTIONS')
+
+
+class TestDurationEstimates:
+    """耗时估算测试"""
+
+    def test_duration_ewma(self, app):
+        """首次记录直接采用，之后按 EWMA 平滑"""
+        from services.admission import AdmissionController, DURATION_EWMA_ALPHA
+        controller = AdmissionController()
+        with app.app_context():
+            assert controller.average_duration('GENERATE_IMAGES') == app.config['TASK_DURATION_DEFAULT_SECONDS']
+            controller.record_duration('GENERATE_IMAGES', 100)
+            controller.record_duration('GENERATE_IMAGES', 200)
+            expected = DURATION_EWMA_ALPHA * 200 + (1 - DURATION_EWMA_ALPHA) * 100
+            assert controller.average_duration('GENERATE_IMAGES') == pytest.approx(expected)
+
+
+class TestReadiness:
+    """readiness 端点测试"""
+
+    def test_ready_when_queues_have_room(self, client, queue_limits, make_project):
+        """队列未满时返回 200 和队列深度"""
+        queue_limits('', default=0)
+        make_project(['DRAFT'], task_type='GENERATE_DESCRIPTIONS')
+
+        response = client.get('/ready')
+
+        data = response.get_json()
+        assert response.status_code == 200
+        assert data['ready'] is True
+        assert data['queue_depth'] >= 1
+        assert 'estimated_wait_seconds' in data and 'worker_utilization' in data
+
+    def test_not_ready_when_queue_saturated(self, client, queue_limits, make_project):
+        """任一队列饱和时返回 503"""
+        queue_limits('GENERATE_DESCRIPTIONS=1', default=0)
+        make_project(['DRAFT'], task_type='GENERATE_DESCRIPTIONS')
+
+        response = client.get('/ready')
+
+        assert response.status_code == 503
+        assert 'GENERATE_DESCRIPTIONS' in response.get_json()['saturated_task_types']
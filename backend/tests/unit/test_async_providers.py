@@ -0,0 +1,134 @@
+"""
+异步 provider 接口与事件循环执行器单元测试
+"""
+
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+from services.async_executor import AsyncExecutor
+from services.concurrency_governor import ConcurrencyGovernor, ProviderLimiter
+
+
+class TestAsyncExecutor:
+    """事件循环执行器测试"""
+
+    def test_many_coroutines_on_one_loop(self):
+        """单个循环线程即可同时挂起大量协程"""
+        executor = AsyncExecutor()
+        running = 0
+        peak = 0
+
+        async def call():
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.05)
+            running -= 1
+            return 1
+
+        try:
+            futures = [executor.submit(call()) for _ in range(200)]
+            assert sum(f.result(5) for f in futures) == 200
+            assert peak == 200
+        finally:
+            executor.shutdown()
+
+
+class TestAsyncLimiter:
+    """协程版并发治理测试"""
+
+    def test_async_limit_respects_max_in_flight(self):
+        """alimit 下同时进行中的协程数不超过上限"""
+        governor = ConcurrencyGovernor()
+        governor._limiters[('image', 'gemini', 'm')] = ProviderLimiter(('image', 'gemini', 'm'), max_in_flight=3)
+        peak = []
+
+        async def call():
+            async with governor.alimit('image', 'gemini', 'm') as limiter:
+                peak.append(limiter.in_flight)
+                await asyncio.sleep(0.01)
+
+        async def main():
+            await asyncio.gather(*(call() for _ in range(20)))
+
+        asyncio.run(main())
+        assert max(peak) <= 3
+        assert governor.get_limiter('image', 'gemini', 'm').in_flight == 0
+
+    def test_release_wakes_waiting_coroutine(self):
+        """其他线程释放槽位后，等待中的协程立即被唤醒（不轮询）；被取消的等待者不占用唤醒"""
+        import threading
+        import time
+        limiter = ProviderLimiter(('image', 'gemini', 'm'), max_in_flight=1)
+        limiter.acquire()
+        released_at = []
+
+        def release_later():
+            time.sleep(0.8)
+            released_at.append(time.monotonic())
+            limiter.release()
+
+        async def main():
+            cancelled = asyncio.ensure_future(limiter.acquire_async())
+            await asyncio.sleep(0.01)
+            cancelled.cancel()
+            threading.Thread(target=release_later).start()
+            await limiter.acquire_async()
+            return time.monotonic()
+
+        acquired_at = asyncio.run(main())
+        assert acquired_at - released_at[0] < 0.1
+        assert limiter.in_flight == 1 and limiter.waiting == 0
+        assert not limiter._async_waiters
+
+    def test_default_async_variant_uses_sync_call(self):
+        """未覆盖 async 方法的 provider 回退到线程执行同步调用"""
+        from services.ai_providers import TextProvider
+
+        class EchoProvider(TextProvider):
+            def generate_text(self, prompt, thinking_budget=1000):
+                return prompt.upper()
+
+        assert asyncio.run(EchoProvider().generate_text_async('hi')) == 'HI'
+
+
+class TestAsyncImageTask:
+    """任务层异步执行测试"""
+
+    def test_generate_images_task_async_mode(self, client, app):
+        """ASYNC_PROVIDER_CALLS 开启时通过事件循环生成图片"""
+        from models import db, Project, Page, Task
+        from services.task_manager import generate_images_task
+
+        project = Project(creation_type='idea', idea_prompt='测试', status='DESCRIPTIONS_GENERATED')
+        db.session.add(project)
+        db.session.flush()
+        for i in range(3):
+            page = Page(project_id=project.id, order_index=i, status='DESCRIPTION_GENERATED')
+            page.set_description_content({'text': f'描述{i}'})
+            db.session.add(page)
+        task = Task(project_id=project.id, task_type='GENERATE_IMAGES', status='PENDING')
+        db.session.add(task)
+        db.session.commit()
+
+        ai_service = MagicMock()
+        ai_service.flatten_outline.return_value = [{'title': f'第{i}页'} for i in range(3)]
+        ai_service.extract_image_urls_from_markdown.return_value = []
+        ai_service.generate_image_prompt.return_value = 'prompt'
+        ai_service.generate_image_async = AsyncMock(return_value=MagicMock())
+        file_service = MagicMock()
+        file_service.save_generated_image.side_effect = lambda image, project_id, page_id: f'{page_id}.png'
+
+        app.config['ASYNC_PROVIDER_CALLS'] = True
+        try:
+            generate_images_task(task.id, project.id, ai_service, file_service, [],
+                                 use_template=False, app=app)
+        finally:
+            app.config['ASYNC_PROVIDER_CALLS'] = False
+
+        db.session.expire_all()
+        task = Task.query.get(task.id)
+        assert task.status == 'COMPLETED'
+        assert task.get_progress()['completed'] == 3
+        assert ai_service.generate_image_async.await_count == 3
+        ai_service.generate_image.assert_not_called()
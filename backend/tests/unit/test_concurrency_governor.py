@@ -0,0 +1,199 @@
+"""
+全局并发治理单元测试
+"""
+
+import threading
+import time
+
+from services.concurrency_governor import (
+    AIMDController, ConcurrencyGovernor, ProviderLimiter, classify_provider_error
+)
+
+
+class TestProviderLimiter:
+    """单个 provider 限流器测试"""
+
+    def test_in_flight_never_exceeds_limit(self):
+        """多线程并发调用时，同时进行中的请求数不超过上限"""
+        limiter = ProviderLimiter(('image', 'gemini', 'm'), max_in_flight=3)
+        peak = []
+        lock = threading.Lock()
+
+        def call():
+            limiter.acquire()
+            try:
+                with lock:
+                    peak.append(limiter.in_flight)
+                time.sleep(0.02)
+            finally:
+                limiter.release()
+
+        threads = [threading.Thread(target=call) for _ in range(12)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert max(peak) <= 3
+        assert limiter.total_calls == 12
+        assert limiter.in_flight == 0
+
+    def test_set_limit_wakes_waiters(self):
+        """调大上限后等待中的调用会被唤醒"""
+        limiter = ProviderLimiter(('text', 'gemini', 'm'), max_in_flight=1)
+        limiter.acquire()
+        acquired = threading.Event()
+
+        def waiter():
+            limiter.acquire()
+            acquired.set()
+
+        threading.Thread(target=waiter, daemon=True).start()
+        assert not acquired.wait(0.05)
+
+        limiter.set_limit(2)
+        assert acquired.wait(1)
+
+
+class TestConcurrencyGovernor:
+    """治理器注册表测试"""
+
+    def test_limiters_are_shared_per_key(self):
+        """同一 provider/model 共享同一个限流器，不同模型互相独立"""
+        governor = ConcurrencyGovernor()
+
+        a = governor.get_limiter('image', 'gemini', 'model-a')
+        b = governor.get_limiter('image', 'GEMINI', 'model-a')
+        c = governor.get_limiter('image', 'gemini', 'model-b')
+
+        assert a is b
+        assert a is not c
+
+    def test_limit_context_releases_on_error(self):
+        """调用抛出异常时也会释放占用的并发槽位"""
+        governor = ConcurrencyGovernor()
+        try:
+            with governor.limit('text', 'openai', 'm'):
+                raise RuntimeError("boom")
+        except RuntimeError:
+            pass
+
+        assert governor.get_limiter('text', 'openai', 'm').in_flight == 0
+
+
+class TestAdaptiveConcurrency:
+    """AIMD 自适应并发测试"""
+
+    def test_additive_increase_when_healthy(self):
+        """延迟稳定且无错误时窗口逐步增大，但不超过上限"""
+        controller = AIMDController(initial=2, max_limit=4)
+        for _ in range(100):
+            controller.record(0.1, None)
+
+        assert controller.window == 4
+
+    def test_multiplicative_decrease_on_throttle(self):
+        """429 时窗口减半，冷却期内的连续 429 只减一次"""
+        controller = AIMDController(initial=8, cooldown_seconds=60)
+        controller.record(0.1, 'throttled')
+        controller.record(0.1, 'throttled')
+
+        assert controller.window == 4
+        assert controller.throttled_count == 2
+
+    def test_decrease_on_rising_p95(self):
+        """p95 延迟明显高于基线时窗口缩小"""
+        controller = AIMDController(initial=8, cooldown_seconds=0)
+        for _ in range(20):
+            controller.record(0.1, None)
+        before = controller.window
+        for _ in range(10):
+            controller.record(1.0, None)
+
+        assert controller.window < before
+
+    def test_single_outlier_does_not_cut_window(self):
+        """样本不足时或偶发的一次慢调用不会缩小窗口"""
+        controller = AIMDController(initial=8, cooldown_seconds=0)
+        controller.record(5.0, None)
+        for _ in range(30):
+            controller.record(0.1, None)
+
+        assert controller.window >= 8
+
+    def test_baseline_follows_lasting_latency_change(self):
+        """延迟持续变高后基线随之上升，窗口不会一路缩小到下限"""
+        controller = AIMDController(initial=8, cooldown_seconds=0)
+        for _ in range(20):
+            controller.record(0.1, None)
+        for _ in range(300):
+            controller.record(1.0, None)
+
+        assert controller.baseline_p95 > 0.5
+        assert controller.window > controller.min_limit
+
+    def test_classify_wrapped_provider_error(self):
+        """provider 包装后的异常仍能识别出 429 / 5xx"""
+        class ApiError(Exception):
+            code = 429
+
+        try:
+            try:
+                raise ApiError("quota")
+            except ApiError as e:
+                raise Exception("Error generating image") from e
+        except Exception as wrapped:
+            assert classify_provider_error(wrapped) == 'throttled'
+
+        assert classify_provider_error(Exception("503 UNAVAILABLE")) == 'server'
+        assert classify_provider_error(ValueError("bad prompt")) is None
+
+    def test_classify_ignores_numbers_in_text(self):
+        """消息里的普通数字（token 数、请求 ID）不会被当成状态码"""
+        assert classify_provider_error(ValueError("prompt exceeds max 1500 tokens")) is None
+        assert classify_provider_error(ValueError("request req-503-abc rejected: invalid image")) is None
+        assert classify_provider_error(Exception("HTTP 502 Bad Gateway")) == 'server'
+
+    def test_no_increase_while_errors_persist(self):
+        """近期错误率偏高时（非 429/5xx 的失败）窗口不再增大"""
+        controller = AIMDController(initial=4, max_limit=16)
+        for _ in range(10):
+            controller.record(0.1, 'other')
+        for _ in range(20):
+            controller.record(0.1, None)
+
+        assert controller.window == 4
+
+    def test_window_probes_above_provider_max(self, app):
+        """自适应窗口从 *_MAX_CONCURRENCY 起步，健康时可增大到 ADAPTIVE_CONCURRENCY_MAX"""
+        saved = {key: app.config.get(key) for key in ('IMAGE_MAX_CONCURRENCY', 'ADAPTIVE_CONCURRENCY_MAX')}
+        with app.app_context():
+            app.config['IMAGE_MAX_CONCURRENCY'] = 3
+            app.config['ADAPTIVE_CONCURRENCY_MAX'] = 5
+            try:
+                limiter = ConcurrencyGovernor().get_limiter('image', 'gemini', 'cap-test')
+            finally:
+                app.config.update(saved)
+        assert limiter.limit == 3
+        for _ in range(100):
+            limiter.acquire()
+            limiter.release(0.1)
+
+        assert limiter.limit == 5
+
+    def test_limiter_window_follows_errors(self):
+        """限流器的 limit 随调用结果自适应变化"""
+        limiter = ProviderLimiter(('image', 'gemini', 'm'), max_in_flight=8,
+                                  adaptive=AIMDController(initial=8))
+        limiter.acquire()
+        limiter.release(0.5, Exception("429 Too Many Requests"))
+
+        assert limiter.limit == 4
+        assert limiter.stats()['throttled_count'] == 1
+
+    def test_concurrency_endpoint(self, client):
+        """并发窗口可通过 API 查询"""
+        response = client.get('/api/settings/concurrency')
+
+        assert response.status_code == 200
+        assert 'limiters' in response.get_json()['data']
@@ -0,0 +1,157 @@
+"""
+流水线式整套生成（描述 -> 图片）单元测试
+"""
+
+import threading
+from unittest.mock import MagicMock
+
+
+def _mock_services(count):
+    ai_service = MagicMock()
+    ai_service.flatten_outline.return_value = [{'title': f'第{i + 1}页'} for i in range(count)]
+    ai_service.generate_page_description.side_effect = lambda ctx, outline, page, index, language=None, use_cache=True: f'描述{index}'
+    ai_service.extract_image_urls_from_markdown.return_value = []
+    ai_service.generate_image_prompt.return_value = 'prompt'
+    ai_service.generate_image.return_value = MagicMock()
+    file_service = MagicMock()
+    file_service.save_generated_image.side_effect = lambda image, project_id, page_id: f'{page_id}.png'
+    return ai_service, file_service
+
+
+class TestGenerateDeckTask:
+    """generate_deck_task 测试"""
+
+    def test_all_pages_get_description_and_image(self, client, app, make_project):
+        """每页都依次生成描述和图片，并记录分阶段进度"""
+        from models import Page, Project, Task
+        from services.task_manager import generate_deck_task
+        project_id, _, task_id = make_project(['DRAFT'] * 3, 'OUTLINE_GENERATED', task_type='GENERATE_DECK')
+        ai_service, file_service = _mock_services(3)
+
+        generate_deck_task(task_id, project_id, ai_service, MagicMock(), file_service, [],
+                           use_template=False, app=app)
+
+        task = Task.query.get(task_id)
+        progress = task.get_progress()
+        assert task.status == 'COMPLETED'
+        assert progress['completed'] == 3
+        assert progress['stages']['descriptions']['completed'] == 3
+        assert progress['stages']['images']['completed'] == 3
+        pages = Page.query.filter_by(project_id=project_id).all()
+        assert all(p.status == 'COMPLETED' and p.generated_image_path for p in pages)
+        assert Project.query.get(project_id).status == 'COMPLETED'
+
+    def test_images_start_before_all_descriptions_finish(self, client, app, make_project):
+        """首页描述完成后即开始生成图片，不等待其余页面的描述"""
+        from models import Task
+        from services.task_manager import generate_deck_task
+        project_id, _, task_id = make_project(['DRAFT'] * 2, 'OUTLINE_GENERATED', task_type='GENERATE_DECK')
+        ai_service, file_service = _mock_services(2)
+        first_image_started = threading.Event()
+
+        def describe(ctx, outline, page, index, language=None, use_cache=True):
+            if index == 2:
+                # 第二页的描述要等到第一页的图片开始生成后才返回
+                assert first_image_started.wait(5)
+            return f'描述{index}'
+
+        def render(*args, **kwargs):
+            first_image_started.set()
+            return MagicMock()
+
+        ai_service.generate_page_description.side_effect = describe
+        ai_service.generate_image.side_effect = render
+
+        generate_deck_task(task_id, project_id, ai_service, MagicMock(), file_service, [],
+                           use_template=False, app=app)
+
+        assert Task.query.get(task_id).get_progress()['stages']['images']['completed'] == 2
+
+    def test_failed_description_skips_image(self, client, app, make_project):
+        """描述失败的页面不会进入图片阶段"""
+        from models import Task
+        from services.task_manager import generate_deck_task
+        project_id, _, task_id = make_project(['DRAFT'] * 2, 'OUTLINE_GENERATED', task_type='GENERATE_DECK')
+        ai_service, file_service = _mock_services(2)
+
+        def describe(ctx, outline, page, index, language=None, use_cache=True):
+            if index == 1:
+                raise RuntimeError('boom')
+            return '描述'
+
+        ai_service.generate_page_description.side_effect = describe
+
+        generate_deck_task(task_id, project_id, ai_service, MagicMock(), file_service, [],
+                           use_template=False, app=app)
+
+        stages = Task.query.get(task_id).get_progress()['stages']
+        assert stages['descriptions'] == {'total': 2, 'completed': 1, 'failed': 1}
+        assert stages['images']['completed'] == 1
+        assert ai_service.generate_image.call_count == 1
+
+    def test_transient_errors_are_retried_per_page(self, client, app, make_project):
+        """两个阶段遇到 503 都按页重试；图片阶段开始后项目状态切换为 GENERATING_IMAGES"""
+        from models import Project, Task
+        from services.task_manager import generate_deck_task
+        project_id, _, task_id = make_project(['DRAFT'], 'OUTLINE_GENERATED', task_type='GENERATE_DECK')
+        ai_service, file_service = _mock_services(1)
+        describe_errors = [RuntimeError('503 UNAVAILABLE')]
+        render_errors = [RuntimeError('503 UNAVAILABLE')]
+        statuses = []
+
+        def describe(ctx, outline, page, index, language=None, use_cache=True):
+            if describe_errors:
+                raise describe_errors.pop()
+            return '描述'
+
+        def render(*args, **kwargs):
+            statuses.append(Project.query.get(project_id).status)
+            if render_errors:
+                raise render_errors.pop()
+            return MagicMock()
+
+        ai_service.generate_page_description.side_effect = describe
+        ai_service.generate_image.side_effect = render
+
+        app.config['PAGE_RETRY_BASE_DELAY'] = 0
+        try:
+            generate_deck_task(task_id, project_id, ai_service, MagicMock(), file_service, [],
+                               use_template=False, app=app)
+        finally:
+            app.config['PAGE_RETRY_BASE_DELAY'] = 2.0
+
+        progress = Task.query.get(task_id).get_progress()
+        assert progress['stages']['descriptions'] == {'total': 1, 'completed': 1, 'failed': 0}
+        assert progress['stages']['images']['completed'] == 1
+        assert ai_service.generate_page_description.call_count == 2
+        assert ai_service.generate_image.call_count == 2
+        page_progress = list(progress['pages'].values())[0]
+        assert page_progress['descriptions']['attempts'] == 2
+        assert page_progress['images'] == {'status': 'completed', 'attempts': 2, 'error': None, 'retry_in': 0.0}
+        assert statuses[0] == 'GENERATING_IMAGES'
+        assert Project.query.get(project_id).status == 'COMPLETED'
+
+    def test_async_mode_runs_both_stages_on_event_loop(self, client, app, make_project):
+        """ASYNC_PROVIDER_CALLS 开启时两个阶段都通过事件循环调用，不使用同步方法"""
+        from unittest.mock import AsyncMock
+        from models import Project, Task
+        from services.task_manager import generate_deck_task
+        project_id, _, task_id = make_project(['DRAFT'] * 3, 'OUTLINE_GENERATED', task_type='GENERATE_DECK')
+        ai_service, file_service = _mock_services(3)
+        ai_service.generate_page_description_async = AsyncMock(return_value='描述')
+        ai_service.generate_image_async = AsyncMock(return_value=MagicMock())
+
+        app.config['ASYNC_PROVIDER_CALLS'] = True
+        try:
+            generate_deck_task(task_id, project_id, ai_service, MagicMock(), file_service, [],
+                               use_template=False, app=app)
+        finally:
+            app.config['ASYNC_PROVIDER_CALLS'] = False
+
+        stages = Task.query.get(task_id).get_progress()['stages']
+        assert stages['descriptions']['completed'] == 3 and stages['images']['completed'] == 3
+        assert ai_service.generate_page_description_async.await_count == 3
+        assert ai_service.generate_image_async.await_count == 3
+        ai_service.generate_page_description.assert_not_called()
+        ai_service.generate_image.assert_not_called()
+        assert Project.query.get(project_id).status == 'COMPLETED'
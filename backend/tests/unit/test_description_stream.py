@@ -0,0 +1,128 @@
+"""
+单页描述流式生成（SSE）单元测试
+"""
+import json
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+
+def _create_page():
+    from models import db, Project, Page
+    project = Project(creation_type='idea', idea_prompt='测试', status='OUTLINE_GENERATED')
+    db.session.add(project)
+    db.session.flush()
+    page = Page(project_id=project.id, order_index=0, status='DRAFT')
+    page.set_outline_content({'title': '第一页', 'points': ['要点']})
+    db.session.add(page)
+    db.session.commit()
+    return project.id, page.id
+
+
+def _events(response):
+    events = []
+    for block in response.get_data(as_text=True).strip().split('\n\n'):
+        lines = dict(line.split(': ', 1) for line in block.split('\n'))
+        events.append((lines['event'], json.loads(lines['data'])))
+    return events
+
+
+@pytest.fixture
+def streaming_service(app):
+    """AIService whose text provider streams fixed chunks, with its own response cache"""
+    from services.ai_service import AIService
+    from services.llm_cache import llm_cache, MemoryLRUTier
+    saved = (llm_cache.tiers, llm_cache.enabled, dict(llm_cache._counters))
+    llm_cache.configure([MemoryLRUTier(16)])
+    text_provider = MagicMock()
+    with app.app_context():
+        ai_service = AIService(text_provider=text_provider, image_provider=MagicMock())
+    with patch('controllers.page_controller.AIService', return_value=ai_service):
+        yield text_provider
+    llm_cache.tiers, llm_cache.enabled, llm_cache._counters = saved
+
+
+class TestStreamPageDescription:
+    """POST .../generate/description/stream 测试"""
+
+    def test_chunks_are_streamed_and_saved(self, client, streaming_service):
+        """文本块按顺序作为 delta 事件返回，完整文本最后保存到页面"""
+        from models import Page
+        streaming_service.stream_text.return_value = iter(['页面标题：', '流式', '描述'])
+        project_id, page_id = _create_page()
+
+        response = client.post(f'/api/projects/{project_id}/pages/{page_id}/generate/description/stream',
+                               json={'force_regenerate': True})
+
+        assert response.mimetype == 'text/event-stream'
+        events = _events(response)
+        assert [data['text'] for name, data in events if name == 'delta'] == ['页面标题：', '流式', '描述']
+        assert events[-1][0] == 'done'
+        assert events[-1][1]['page']['status'] == 'DESCRIPTION_GENERATED'
+        assert Page.query.get(page_id).get_description_content()['text'] == '页面标题：流式描述'
+
+    def test_provider_error_is_reported_and_nothing_saved(self, client, streaming_service):
+        """生成中途失败时返回 error 事件，页面保持不变"""
+        from models import Page
+
+        def broken_stream(prompt, thinking_budget=1000):
+            yield '部分'
+            raise RuntimeError('provider unavailable')
+
+        streaming_service.stream_text.side_effect = broken_stream
+        project_id, page_id = _create_page()
+
+        response = client.post(f'/api/projects/{project_id}/pages/{page_id}/generate/description/stream',
+                               json={'force_regenerate': True})
+
+        events = _events(response)
+        assert events[-1] == ('error', {'message': 'provider unavailable'})
+        assert Page.query.get(page_id).get_description_content() is None
+
+    def test_existing_description_requires_force(self, client, streaming_service):
+        """已有描述且未要求重新生成时直接返回 400，不开始流式响应"""
+        from models import db, Page
+        project_id, page_id = _create_page()
+        page = Page.query.get(page_id)
+        page.set_description_content({'text': '旧描述'})
+        db.session.commit()
+
+        response = client.post(f'/api/projects/{project_id}/pages/{page_id}/generate/description/stream', json={})
+
+        assert response.status_code == 400
+        streaming_service.stream_text.assert_not_called()
+
+
+class TestStreamConcurrencySlot:
+    """流式生成的文本并发槽位测试"""
+
+    def test_slot_released_without_waiting_for_the_reader(self, app, streaming_service):
+        """provider 流读完即释放槽位，不等待客户端读取；客户端中途断开时读取线程停止"""
+        import threading
+        import time
+        from controllers import page_controller
+        from services.concurrency_governor import governor
+        release_rest = threading.Event()
+
+        def stream_text(prompt, thinking_budget=1000):
+            yield '第一块'
+            release_rest.wait(5)
+            yield '第二块'
+            yield '第三块'
+
+        streaming_service.stream_text.side_effect = stream_text
+        ai_service = page_controller.AIService()
+        with app.app_context():
+            limiter = governor.get_limiter('text', ai_service.provider_format, ai_service.text_model)
+            with patch.object(ai_service, '_build_page_description_prompt', return_value='prompt'):
+                chunks = ai_service.stream_page_description(None, [], {}, 1, use_cache=False)
+                assert next(chunks) == '第一块'
+                assert limiter.in_flight == 1
+                # 客户端断开：生成器被关闭，provider 的下一个块到达后读取线程停止并释放槽位
+                chunks.close()
+                release_rest.set()
+                deadline = time.monotonic() + 2
+                while limiter.in_flight and time.monotonic() < deadline:
+                    time.sleep(0.01)
+
+        assert limiter.in_flight == 0
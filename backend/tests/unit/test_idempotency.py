@@ -0,0 +1,85 @@
+"""
+Idempotency-Key 请求重放单元测试
+"""
+from unittest.mock import patch
+
+
+class TestIdempotencyKey:
+    """幂等键测试"""
+
+    def test_retry_replays_stored_response(self, client):
+        """相同 key 的重试直接重放第一次的响应，不再执行接口"""
+        headers = {'Idempotency-Key': 'create-project-1'}
+        body = {'creation_type': 'idea', 'idea_prompt': '幂等测试'}
+
+        first = client.post('/api/projects', json=body, headers=headers)
+        second = client.post('/api/projects', json=body, headers=headers)
+
+        assert first.status_code == 201
+        assert second.status_code == 201
+        assert second.headers.get('Idempotent-Replayed') == 'true'
+        assert second.get_json()['data']['project_id'] == first.get_json()['data']['project_id']
+
+        from models import Project
+        assert Project.query.filter_by(idea_prompt='幂等测试').count() == 1
+
+    def test_generation_retry_does_not_submit_again(self, client):
+        """生成接口重试返回同一个 task_id，不会重复提交任务（即使第一个任务已结束）"""
+        from models import db, Project, Page, Task
+        project = Project(creation_type='idea', idea_prompt='测试', status='DESCRIPTIONS_GENERATED')
+        db.session.add(project)
+        db.session.flush()
+        page = Page(project_id=project.id, order_index=0, status='DESCRIPTION_GENERATED')
+        page.set_outline_content({'title': '第一页', 'points': ['要点']})
+        page.set_description_content({'text': '页面描述'})
+        db.session.add(page)
+        db.session.commit()
+        url = f'/api/projects/{project.id}/generate/images'
+        headers = {'Idempotency-Key': 'generate-images-1'}
+
+        with patch('controllers.project_controller.task_manager.submit_task') as submit:
+            first = client.post(url, json={'use_template': False}, headers=headers)
+            # 任务结束后 single-flight 不再复用它，只有幂等键能避免重复提交
+            task = Task.query.get(first.get_json()['data']['task_id'])
+            task.status = 'COMPLETED'
+            db.session.commit()
+            second = client.post(url, json={'use_template': False}, headers=headers)
+
+        assert first.status_code == second.status_code == 202
+        assert second.headers.get('Idempotent-Replayed') == 'true'
+        assert second.get_json()['data']['task_id'] == task.id
+        assert submit.call_count == 1
+
+    def test_key_reused_for_different_request(self, client):
+        """同一个 key 用于不同请求内容时返回 422"""
+        headers = {'Idempotency-Key': 'create-project-2'}
+        client.post('/api/projects', json={'creation_type': 'idea', 'idea_prompt': 'A'}, headers=headers)
+        response = client.post('/api/projects', json={'creation_type': 'idea', 'idea_prompt': 'B'}, headers=headers)
+
+        assert response.status_code == 422
+        assert response.get_json()['error']['code'] == 'IDEMPOTENCY_KEY_REUSED'
+
+    def test_error_responses_are_not_stored(self, client):
+        """失败的响应不保存，相同 key 可以重新执行"""
+        headers = {'Idempotency-Key': 'missing-project'}
+        first = client.post('/api/projects/not-exist/generate/images', json={}, headers=headers)
+        second = client.post('/api/projects/not-exist/generate/images', json={}, headers=headers)
+
+        assert first.status_code == 404
+        assert 'Idempotent-Replayed' not in second.headers
+
+    def test_expired_record_is_not_replayed(self, client, app):
+        """过期的记录不会被重放"""
+        from datetime import datetime, timedelta
+        from models import db, IdempotencyRecord
+        headers = {'Idempotency-Key': 'create-project-3'}
+        body = {'creation_type': 'idea', 'idea_prompt': '过期测试'}
+
+        first = client.post('/api/projects', json=body, headers=headers)
+        record = IdempotencyRecord.query.filter_by(idempotency_key='create-project-3').first()
+        record.expires_at = datetime.utcnow() - timedelta(seconds=1)
+        db.session.commit()
+        second = client.post('/api/projects', json=body, headers=headers)
+
+        assert 'Idempotent-Replayed' not in second.headers
+        assert second.get_json()['data']['project_id'] != first.get_json()['data']['project_id']
@@ -0,0 +1,112 @@
+"""
+生成图片结果缓存单元测试
+"""
+from unittest.mock import MagicMock
+
+import pytest
+from PIL import Image
+
+
+@pytest.fixture
+def fresh_image_cache(tmp_path):
+    """启用独立目录的图片缓存，测试结束后恢复全局实例"""
+    from services.image_cache import image_cache, ImageDiskTier
+    saved = (image_cache.tiers, image_cache.enabled, dict(image_cache._counters))
+    image_cache.configure([ImageDiskTier(str(tmp_path / 'image_cache'))])
+    yield image_cache
+    image_cache.tiers, image_cache.enabled, image_cache._counters = saved
+
+
+def _ai_service(app):
+    from services.ai_service import AIService
+    image_provider = MagicMock()
+    image_provider.generate_image.side_effect = lambda **kwargs: Image.new('RGB', (8, 8), 'red')
+    with app.app_context():
+        return AIService(text_provider=MagicMock(), image_provider=image_provider), image_provider
+
+
+class TestImageCacheKey:
+    """缓存键测试"""
+
+    def test_key_depends_on_reference_image_content(self):
+        """参考图片按像素内容计算哈希：内容相同键相同，内容不同键不同"""
+        from services.image_cache import ImageResultCache
+        make_key = ImageResultCache.make_image_key
+        red, same_red = Image.new('RGB', (4, 4), 'red'), Image.new('RGB', (4, 4), 'red')
+        blue = Image.new('RGB', (4, 4), 'blue')
+
+        key = make_key('gemini', 'model', 'prompt', '16:9', '2K', [red])
+        assert key == make_key('gemini', 'model', 'prompt', '16:9', '2K', [same_red])
+        assert key != make_key('gemini', 'model', 'prompt', '16:9', '2K', [blue])
+        assert key != make_key('gemini', 'model', 'prompt', '16:9', '1K', [red])
+        assert key != make_key('gemini', 'model', 'prompt', '16:9', '2K', [])
+
+
+class TestImageDiskTier:
+    """磁盘层测试"""
+
+    def test_round_trip_as_png(self, tmp_path):
+        """图片以 PNG 保存，读取后像素不变"""
+        from services.image_cache import ImageDiskTier
+        tier = ImageDiskTier(str(tmp_path))
+        image = Image.new('RGB', (6, 4), (10, 20, 30))
+
+        tier.set('abkey', image)
+        loaded = tier.get('abkey')
+
+        assert tier._path('abkey').endswith('.png')
+        assert loaded.size == (6, 4) and loaded.getpixel((0, 0)) == (10, 20, 30)
+
+
+class TestGenerateImageCache:
+    """AIService.generate_image 缓存测试"""
+
+    def test_identical_request_is_served_from_cache(self, app, fresh_image_cache):
+        """相同 prompt 与参考图片的第二次请求不再调用 provider"""
+        ai_service, image_provider = _ai_service(app)
+        ref = Image.new('RGB', (4, 4), 'white')
+
+        first = ai_service.generate_image('第1页', additional_ref_images=[ref])
+        second = ai_service.generate_image('第1页', additional_ref_images=[ref.copy()])
+
+        assert image_provider.generate_image.call_count == 1
+        assert second.getpixel((0, 0)) == first.getpixel((0, 0))
+        assert fresh_image_cache.stats()['hits'] == 1
+
+    def test_new_variation_bypasses_cache(self, app, fresh_image_cache):
+        """new_variation=True 时跳过查找并重新生成"""
+        ai_service, image_provider = _ai_service(app)
+
+        ai_service.generate_image('第1页')
+        ai_service.generate_image('第1页', new_variation=True)
+
+        assert image_provider.generate_image.call_count == 2
+        assert fresh_image_cache.stats()['bypassed'] == 1
+
+    def test_disabled_by_default(self, app):
+        """默认配置下图片缓存关闭"""
+        from services.image_cache import ImageResultCache
+        cache = ImageResultCache()
+        with app.app_context():
+            assert cache.is_enabled() is False
+
+    def test_stats_endpoint(self, client, fresh_image_cache):
+        """统计接口返回计数与磁盘用量"""
+        response = client.get('/api/settings/image-cache')
+
+        assert response.status_code == 200
+        data = response.get_json()['data']
+        assert data['enabled'] is True
+        assert data['tiers'][0]['name'] == 'disk'
+
+    def test_edit_image_always_regenerates(self, app, fresh_image_cache, tmp_path):
+        """同一条编辑指令再次提交时重新生成，不返回缓存结果"""
+        ai_service, image_provider = _ai_service(app)
+        current = str(tmp_path / 'page.png')
+        Image.new('RGB', (4, 4), 'white').save(current)
+
+        ai_service.edit_image('把背景改成蓝色', current)
+        ai_service.edit_image('把背景改成蓝色', current)
+
+        assert image_provider.generate_image.call_count == 2
+        assert fresh_image_cache.stats()['hits'] == 0
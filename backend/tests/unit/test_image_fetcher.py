@@ -0,0 +1,129 @@
+"""
+远程参考图片下载（连接池 + 磁盘缓存 + 并发预取）单元测试
+"""
+import io
+import threading
+from unittest.mock import MagicMock, patch
+
+import pytest
+from PIL import Image
+
+
+def _png_bytes(color='red'):
+    buffer = io.BytesIO()
+    Image.new('RGB', (4, 4), color).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def _response(status_code=200, content=b'', etag=None):
+    response = MagicMock(status_code=status_code, content=content, headers={'ETag': etag} if etag else {})
+    if status_code >= 400:
+        response.raise_for_status.side_effect = Exception(f'HTTP {status_code}')
+    return response
+
+
+@pytest.fixture
+def fetcher(tmp_path):
+    from services.image_fetcher import RemoteImageFetcher
+    fetcher = RemoteImageFetcher()
+    fetcher.configure(cache_dir=str(tmp_path / 'remote_images'), ttl=3600)
+    fetcher._session = MagicMock()
+    return fetcher
+
+
+class TestRemoteImageFetcher:
+    """RemoteImageFetcher 测试"""
+
+    def test_repeated_fetch_downloads_once(self, fetcher):
+        """同一 URL 多次请求只下载一次，返回同一个图片对象"""
+        fetcher._session.get.return_value = _response(content=_png_bytes(), etag='"v1"')
+
+        first = fetcher.fetch('https://example.com/a.png')
+        second = fetcher.fetch('https://example.com/a.png')
+
+        assert first is second
+        assert fetcher._session.get.call_count == 1
+        assert fetcher.stats()['memory_hits'] == 1
+
+    def test_disk_cache_survives_restart(self, fetcher, tmp_path):
+        """新的 fetcher（进程重启）直接读取磁盘缓存"""
+        from services.image_fetcher import RemoteImageFetcher
+        fetcher._session.get.return_value = _response(content=_png_bytes(), etag='"v1"')
+        fetcher.fetch('https://example.com/a.png')
+
+        restarted = RemoteImageFetcher()
+        restarted.configure(cache_dir=str(tmp_path / 'remote_images'))
+        restarted._session = MagicMock()
+
+        assert restarted.fetch('https://example.com/a.png').size == (4, 4)
+        restarted._session.get.assert_not_called()
+        assert restarted.stats()['disk_hits'] == 1
+
+    def test_stale_entry_is_revalidated_with_etag(self, fetcher):
+        """超过 TTL 的条目带 If-None-Match 重新验证，304 时使用本地副本"""
+        fetcher._session.get.return_value = _response(content=_png_bytes(), etag='"v1"')
+        first = fetcher.fetch('https://example.com/a.png')
+        fetcher.ttl = 0
+        fetcher._session.get.return_value = _response(status_code=304)
+
+        second = fetcher.fetch('https://example.com/a.png')
+
+        assert fetcher._session.get.call_args.kwargs['headers'] == {'If-None-Match': '"v1"'}
+        assert second is first
+        assert fetcher.stats()['revalidated'] == 1
+
+    def test_failure_returns_none(self, fetcher):
+        """下载失败返回 None 并计数"""
+        fetcher._session.get.return_value = _response(status_code=404)
+
+        assert fetcher.fetch('https://example.com/missing.png') is None
+        assert fetcher.stats()['failures'] == 1
+
+    def test_prefetch_runs_concurrently(self, fetcher):
+        """prefetch 并发下载不同 URL，重复 URL 只下载一次"""
+        barrier = threading.Barrier(2, timeout=5)
+
+        def get(url, **kwargs):
+            barrier.wait()  # 两个请求必须同时在途才能通过
+            return _response(content=_png_bytes())
+
+        fetcher._session.get.side_effect = get
+        urls = ['https://example.com/a.png', 'https://example.com/b.png', 'https://example.com/a.png']
+
+        images = fetcher.prefetch(urls)
+
+        assert set(images) == {'https://example.com/a.png', 'https://example.com/b.png'}
+        assert all(image is not None for image in images.values())
+        assert fetcher._session.get.call_count == 2
+
+
+class TestRefImageLoading:
+    """AIService 与文件解析复用 fetcher 测试"""
+
+    def test_page_urls_are_prefetched(self, app, fetcher):
+        """一页的远程参考图片在调用 provider 之前全部预取"""
+        from services.ai_service import AIService
+        with app.app_context():
+            ai_service = AIService(text_provider=MagicMock(), image_provider=MagicMock())
+        urls = ['https://example.com/a.png', 'https://example.com/b.png']
+
+        with patch('services.ai_service.image_fetcher', fetcher), \
+                patch.object(fetcher, 'prefetch', wraps=fetcher.prefetch) as prefetch:
+            fetcher._session.get.return_value = _response(content=_png_bytes())
+            ref_images = ai_service._load_ref_images(None, urls)
+
+        assert len(ref_images) == 2
+        assert list(prefetch.call_args.args[0]) == urls
+
+    def test_caption_uses_shared_fetcher(self, fetcher):
+        """图片描述生成通过共享 fetcher 下载图片"""
+        from services.file_parser_service import FileParserService
+        service = FileParserService.__new__(FileParserService)
+        service._provider_format = 'gemini'
+        service.image_caption_model = 'caption-model'
+        fetcher._session.get.return_value = _response(content=_png_bytes())
+
+        with patch('services.image_fetcher.image_fetcher', fetcher), \
+                patch.object(FileParserService, '_call_caption_model', return_value='一张红色图片'):
+            assert service._generate_single_caption('https://example.com/a.png') == '一张红色图片'
+        assert fetcher._session.get.call_count == 1
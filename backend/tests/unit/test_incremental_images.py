@@ -0,0 +1,99 @@
+"""
+按页面输入指纹增量生成图片单元测试
+"""
+from unittest.mock import MagicMock, patch
+
+
+def _stamp_fingerprints(app, page_ids):
+    """按接口使用的输入为页面写入指纹，相当于这些图片刚刚生成过"""
+    from models import db, Page
+    from services import AIService
+    from services.single_flight import page_image_fingerprint
+    for page_id in page_ids:
+        page = Page.query.get(page_id)
+        page.image_fingerprint = page_image_fingerprint(
+            page, None, None, app.config['OUTPUT_LANGUAGE'], app.config['DEFAULT_ASPECT_RATIO'],
+            app.config['DEFAULT_RESOLUTION'], AIService().image_model
+        )
+    db.session.commit()
+
+
+class TestIncrementalGenerateImages:
+    """批量生成接口增量测试"""
+
+    def test_only_changed_pages_are_regenerated(self, client, app, make_project):
+        """只有描述变化的页面进入任务，其余页面跳过"""
+        from models import db, Page
+        project_id, page_ids, _ = make_project(['COMPLETED'] * 3, 'COMPLETED', descriptions=True, images=True)
+        _stamp_fingerprints(app, page_ids)
+        Page.query.get(page_ids[1]).set_description_content({'text': '修改后的描述'})
+        db.session.commit()
+
+        with patch('controllers.project_controller.task_manager.submit_task') as submit:
+            response = client.post(f'/api/projects/{project_id}/generate/images',
+                                   json={'use_template': False})
+
+        data = response.get_json()['data']
+        assert response.status_code == 202
+        assert (data['total_pages'], data['skipped_pages']) == (1, 2)
+        assert submit.call_args.kwargs['page_ids'] == [page_ids[1]]
+
+    def test_up_to_date_project_creates_no_task(self, client, app, make_project):
+        """所有页面都是最新时不创建任务"""
+        from models import Task
+        project_id, page_ids, _ = make_project(['COMPLETED'] * 2, 'COMPLETED', descriptions=True, images=True)
+        _stamp_fingerprints(app, page_ids)
+
+        with patch('controllers.project_controller.task_manager.submit_task') as submit:
+            response = client.post(f'/api/projects/{project_id}/generate/images',
+                                   json={'use_template': False})
+
+        data = response.get_json()['data']
+        assert response.status_code == 200
+        assert data['task_id'] is None and data['skipped_pages'] == 2
+        assert submit.call_count == 0
+        assert Task.query.filter_by(project_id=project_id).count() == 0
+
+    def test_force_regenerates_all_pages(self, client, app, make_project):
+        """force 时忽略指纹，全部重新生成"""
+        project_id, page_ids, _ = make_project(['COMPLETED'] * 2, 'COMPLETED', descriptions=True, images=True)
+        _stamp_fingerprints(app, page_ids)
+
+        with patch('controllers.project_controller.task_manager.submit_task') as submit:
+            response = client.post(f'/api/projects/{project_id}/generate/images',
+                                   json={'use_template': False, 'force': True})
+
+        assert response.get_json()['data']['total_pages'] == 2
+        assert submit.call_args.kwargs['page_ids'] is None
+
+
+class TestFingerprintRecording:
+    """生成任务写入指纹测试"""
+
+    def test_images_task_stores_page_fingerprints(self, client, app, make_project):
+        """图片生成成功后页面保存对应的输入指纹"""
+        from models import db, Page, Task
+        from services.single_flight import page_image_fingerprint
+        from services.task_manager import generate_images_task
+        project_id, page_ids, _ = make_project(['COMPLETED'] * 2, 'COMPLETED', descriptions=True, images=True)
+        task = Task(project_id=project_id, task_type='GENERATE_IMAGES', status='PENDING')
+        db.session.add(task)
+        db.session.commit()
+
+        ai_service = MagicMock()
+        ai_service.image_model = 'image-model'
+        ai_service.flatten_outline.return_value = [{'title': '第1页'}, {'title': '第2页'}]
+        ai_service.extract_image_urls_from_markdown.return_value = []
+        ai_service.generate_image_prompt.return_value = 'prompt'
+        file_service = MagicMock()
+        file_service.save_generated_image.side_effect = lambda image, pid, page_id: f'{page_id}.png'
+
+        generate_images_task(task.id, project_id, ai_service, file_service, [],
+                             use_template=False, aspect_ratio='16:9', resolution='2K',
+                             app=app, language='zh')
+
+        db.session.expire_all()
+        page = Page.query.get(page_ids[0])
+        assert page.image_fingerprint == page_image_fingerprint(
+            page, None, None, 'zh', '16:9', '2K', 'image-model'
+        )
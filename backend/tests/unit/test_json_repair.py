@@ -0,0 +1,108 @@
+"""
+JSON 响应本地修复与原生 JSON 输出单元测试
+"""
+import json
+from unittest.mock import MagicMock
+
+import pytest
+
+
+@pytest.fixture
+def fresh_state():
+    """独立的内存缓存与修复统计，测试结束后恢复全局实例"""
+    from services.llm_cache import llm_cache, MemoryLRUTier
+    from utils.json_repair import json_repair_stats
+    saved = (llm_cache.tiers, llm_cache.enabled, dict(llm_cache._counters))
+    llm_cache.configure([MemoryLRUTier(16)])
+    json_repair_stats.reset()
+    yield json_repair_stats
+    llm_cache.tiers, llm_cache.enabled, llm_cache._counters = saved
+    json_repair_stats.reset()
+
+
+def _ai_service(app, responses, text_provider=None):
+    from services.ai_service import AIService
+    text_provider = text_provider or MagicMock()
+    text_provider.generate_text.side_effect = responses
+    with app.app_context():
+        return AIService(text_provider=text_provider, image_provider=MagicMock()), text_provider
+
+
+class TestParseJsonLenient:
+    """parse_json_lenient 测试"""
+
+    def test_valid_json_is_not_marked_repaired(self):
+        """合法 JSON（含代码块标记）直接解析"""
+        from utils.json_repair import parse_json_lenient
+        assert parse_json_lenient('```json\n[{"title": "封面"}]\n```') == ([{'title': '封面'}], False)
+
+    def test_prose_comments_and_trailing_commas(self):
+        """去掉前后说明文字、注释与尾随逗号，字符串内容保持不变"""
+        from utils.json_repair import parse_json_lenient
+        text = '以下是大纲：\n{"pages": [\n  {"title": "a, // b",}, // 第一页\n  {"title": "c"},\n],}\n希望有帮助'
+
+        result, repaired = parse_json_lenient(text)
+
+        assert repaired is True
+        assert result == {'pages': [{'title': 'a, // b'}, {'title': 'c'}]}
+
+    def test_truncated_array_keeps_complete_elements(self):
+        """输出被截断时保留已完整的元素"""
+        from utils.json_repair import parse_json_lenient
+        text = '[{"title": "一", "points": ["a", "b"]}, {"title": "二", "points": ["c", "d'
+
+        result, repaired = parse_json_lenient(text)
+
+        assert repaired is True
+        assert result == [{'title': '一', 'points': ['a', 'b']}, {'title': '二', 'points': ['c']}]
+
+    def test_unsalvageable_text_raises(self):
+        """完全不含 JSON 的文本抛出 JSONDecodeError"""
+        from utils.json_repair import parse_json_lenient
+        with pytest.raises(json.JSONDecodeError):
+            parse_json_lenient('抱歉，我无法完成这个请求。')
+
+
+class TestGenerateJson:
+    """AIService.generate_json 测试"""
+
+    def test_repair_avoids_regeneration(self, app, fresh_state):
+        """可修复的响应只调用一次模型，并计入省下的重试次数"""
+        ai_service, provider = _ai_service(app, ['```json\n[{"title": "封面"},]\n```'])
+
+        assert ai_service.generate_json('json-repair-avoid') == [{'title': '封面'}]
+        assert provider.generate_text.call_count == 1
+        assert fresh_state.stats()['retries_avoided'] == 1
+
+    def test_unsalvageable_response_is_regenerated(self, app, fresh_state):
+        """无法修复的响应仍会重新生成，且不会留在缓存里"""
+        ai_service, provider = _ai_service(app, ['无法生成', '{"ok": true}'])
+
+        assert ai_service.generate_json('json-repair-retry') == {'ok': True}
+        assert provider.generate_text.call_count == 2
+        stats = fresh_state.stats()
+        assert stats['failed'] == 1 and stats['parsed'] == 1
+
+    def test_native_json_mode_is_used_when_supported(self, app, fresh_state):
+        """provider 支持原生 JSON 输出时调用 generate_json_text"""
+        from services.ai_providers.text.base import TextProvider
+
+        class JsonProvider(TextProvider):
+            supports_json_mode = True
+            generate_text = MagicMock()
+            generate_json_text = MagicMock(return_value='[1, 2]')
+
+        ai_service, provider = _ai_service(app, [], text_provider=JsonProvider())
+
+        assert ai_service.generate_json('json-repair-native') == [1, 2]
+        provider.generate_json_text.assert_called_once()
+        provider.generate_text.assert_not_called()
+
+    def test_stats_endpoint(self, client, fresh_state):
+        """GET /api/settings/json-repair 返回解析统计"""
+        fresh_state.record(True)
+
+        response = client.get('/api/settings/json-repair')
+
+        assert response.status_code == 200
+        assert response.get_json()['data']['repaired'] == 1
@@ -0,0 +1,155 @@
+"""
+文本生成响应缓存单元测试
+"""
+import os
+from unittest.mock import MagicMock
+
+import pytest
+
+
+@pytest.fixture
+def fresh_cache(tmp_path):
+    """使用独立的内存 + 磁盘缓存，测试结束后恢复全局实例"""
+    from services.llm_cache import llm_cache, MemoryLRUTier, DiskTier
+    saved = (llm_cache.tiers, llm_cache.enabled, dict(llm_cache._counters))
+    llm_cache.configure([MemoryLRUTier(16), DiskTier(str(tmp_path / 'llm_cache'))])
+    yield llm_cache
+    llm_cache.tiers, llm_cache.enabled, llm_cache._counters = saved
+
+
+def _ai_service(app, responses):
+    from services.ai_service import AIService
+    text_provider = MagicMock()
+    text_provider.generate_text.side_effect = responses
+    with app.app_context():
+        return AIService(text_provider=text_provider, image_provider=MagicMock()), text_provider
+
+
+class TestCacheTiers:
+    """缓存层测试"""
+
+    def test_memory_lru_evicts_least_recent(self):
+        """超过条数上限时淘汰最久未使用的条目"""
+        from services.llm_cache import MemoryLRUTier
+        tier = MemoryLRUTier(max_entries=2)
+        tier.set('a', '1')
+        tier.set('b', '2')
+        tier.get('a')
+        tier.set('c', '3')
+
+        assert tier.get('b') is None
+        assert tier.get('a') == '1' and tier.get('c') == '3'
+        assert tier.stats()['evictions'] == 1
+
+    def test_disk_tier_evicts_by_size(self, tmp_path):
+        """磁盘总大小超过上限时删除最久未使用的文件"""
+        from services.llm_cache import DiskTier
+        tier = DiskTier(str(tmp_path), max_bytes=600)
+        for i in range(5):
+            tier.set(f'{i:02d}key', 'x' * 100)
+            old = 1_000_000 + i
+            os.utime(tier._path(f'{i:02d}key'), (old, old))
+
+        tier.set('05key', 'x' * 100)
+
+        assert tier.stats()['bytes'] <= 600
+        assert tier.get('00key') is None
+        assert tier.get('05key') == 'x' * 100
+
+    def test_disk_hit_is_promoted_to_memory(self, fresh_cache):
+        """磁盘命中后写入内存层，并计入命中统计"""
+        fresh_cache.tiers[1].set('k', 'value')
+
+        assert fresh_cache.get('k') == 'value'
+        assert fresh_cache.tiers[0].get('k') == 'value'
+        stats = fresh_cache.stats()
+        assert stats['hits'] == 1
+        assert [tier['hits'] for tier in stats['tiers']] == [0, 1]
+
+
+class TestAIServiceCaching:
+    """AIService 文本生成缓存测试"""
+
+    def test_identical_prompt_is_served_from_cache(self, app, fresh_cache):
+        """相同 prompt 第二次不再调用 provider；绕过缓存时总是调用"""
+        ai_service, provider = _ai_service(app, ['first', 'second'])
+
+        assert ai_service._generate_text('prompt') == 'first'
+        assert ai_service._generate_text('prompt') == 'first'
+        assert provider.generate_text.call_count == 1
+
+        assert ai_service._generate_text('prompt', use_cache=False) == 'second'
+        assert provider.generate_text.call_count == 2
+        assert fresh_cache.stats()['bypassed'] == 1
+
+    def test_thinking_budget_is_part_of_key(self, app, fresh_cache):
+        """thinking_budget 不同视为不同请求"""
+        ai_service, provider = _ai_service(app, ['a', 'b'])
+
+        ai_service._generate_text('prompt', thinking_budget=1000)
+        assert ai_service._generate_text('prompt', thinking_budget=0) == 'b'
+        assert provider.generate_text.call_count == 2
+
+    def test_invalid_json_is_not_cached(self, app, fresh_cache):
+        """无法解析的 JSON 响应会从缓存中移除，重试时重新调用 provider"""
+        ai_service, provider = _ai_service(app, ['not json', '[{"title": "第一页"}]'])
+
+        assert ai_service.generate_json('outline prompt') == [{'title': '第一页'}]
+        assert provider.generate_text.call_count == 2
+        assert ai_service.generate_json('outline prompt') == [{'title': '第一页'}]
+        assert provider.generate_text.call_count == 2
+
+    def test_json_mode_is_part_of_key(self, app, fresh_cache):
+        """原生 JSON 请求与普通文本请求不共用缓存条目"""
+        ai_service, provider = _ai_service(app, ['text', '[1]'])
+        provider.generate_json_text.side_effect = ['[1]']
+
+        ai_service._generate_text('prompt')
+        assert ai_service._generate_text('prompt', json_mode=True) == '[1]'
+        assert provider.generate_json_text.call_count == 1
+
+
+class TestExplicitRegeneration:
+    """显式重新生成时绕过缓存"""
+
+    def test_regenerate_outline_bypasses_cache(self, client, app, fresh_cache):
+        """项目已有页面时重新生成大纲得到新的结果"""
+        from unittest.mock import patch
+        from models import db, Project
+        ai_service, provider = _ai_service(app, ['[{"title": "旧大纲"}]', '[{"title": "新大纲"}]'])
+        project = Project(creation_type='idea', idea_prompt='缓存测试', status='DRAFT')
+        db.session.add(project)
+        db.session.commit()
+
+        with patch('controllers.project_controller.AIService', return_value=ai_service):
+            first = client.post(f'/api/projects/{project.id}/generate/outline', json={})
+            second = client.post(f'/api/projects/{project.id}/generate/outline', json={})
+
+        assert first.get_json()['data']['pages'][0]['outline_content']['title'] == '旧大纲'
+        assert second.get_json()['data']['pages'][0]['outline_content']['title'] == '新大纲'
+        assert provider.generate_text.call_count == 2
+
+    def test_bulk_descriptions_bypass_cache_for_existing_pages(self, client, app):
+        """批量生成描述时，已有描述的页面不使用缓存"""
+        from models import db, Project, Page, Task
+        from services.task_manager import generate_descriptions_task
+        project = Project(creation_type='idea', idea_prompt='缓存测试', status='DESCRIPTIONS_GENERATED')
+        db.session.add(project)
+        db.session.flush()
+        for i, description in enumerate([{'text': '旧描述'}, None]):
+            page = Page(project_id=project.id, order_index=i, status='DRAFT')
+            page.set_outline_content({'title': f'第{i + 1}页', 'points': []})
+            page.set_description_content(description)
+            db.session.add(page)
+        task = Task(project_id=project.id, task_type='GENERATE_DESCRIPTIONS', status='PENDING')
+        db.session.add(task)
+        db.session.commit()
+        ai_service = MagicMock()
+        ai_service.flatten_outline.return_value = [{'title': '第1页'}, {'title': '第2页'}]
+        ai_service.generate_page_description.return_value = '新描述'
+
+        generate_descriptions_task(task.id, project.id, ai_service, MagicMock(), [], app=app)
+
+        use_cache = {call.args[3]: call.kwargs['use_cache']
+                     for call in ai_service.generate_page_description.call_args_list}
+        assert use_cache == {1: False, 2: True}
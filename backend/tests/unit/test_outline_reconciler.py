@@ -0,0 +1,104 @@
+"""
+大纲对比合并（reconcile）单元测试
+"""
+from unittest.mock import patch
+
+
+def _create_project_with_pages(outlines):
+    from models import db, Project, Page
+    project = Project(creation_type='idea', idea_prompt='测试', status='COMPLETED')
+    db.session.add(project)
+    db.session.flush()
+    page_ids = []
+    for i, (title, points) in enumerate(outlines):
+        page = Page(project_id=project.id, order_index=i, status='COMPLETED',
+                    generated_image_path=f'{project.id}/pages/{i}.png')
+        page.set_outline_content({'title': title, 'points': points})
+        page.set_description_content({'text': f'{title}的描述'})
+        db.session.add(page)
+        db.session.flush()
+        page_ids.append(page.id)
+    db.session.commit()
+    return project.id, page_ids
+
+
+OUTLINE = [
+    ('人工智能简介', ['定义', '发展历史']),
+    ('机器学习', ['监督学习', '无监督学习']),
+    ('深度学习', ['神经网络', '卷积网络']),
+]
+
+
+class TestMatchPages:
+    """页面匹配测试"""
+
+    def test_reordered_pages_keep_identity(self, client):
+        """调整顺序后页面仍匹配到原来的记录"""
+        from models import Page
+        from services.outline_reconciler import match_pages
+        project_id, page_ids = _create_project_with_pages(OUTLINE)
+        old_pages = Page.query.filter_by(project_id=project_id).order_by(Page.order_index).all()
+
+        new_data = [{'title': t, 'points': p} for t, p in reversed(OUTLINE)]
+        matches = match_pages(old_pages, new_data)
+
+        assert [matches[i].id for i in range(3)] == list(reversed(page_ids))
+
+    def test_unrelated_entry_is_not_matched(self, client):
+        """内容完全不同的新条目不会匹配旧页面"""
+        from models import Page
+        from services.outline_reconciler import match_pages
+        project_id, _ = _create_project_with_pages(OUTLINE[:1])
+        old_pages = Page.query.filter_by(project_id=project_id).all()
+
+        assert match_pages(old_pages, [{'title': '总结与展望', 'points': ['未来趋势']}]) == {}
+
+
+class TestReconcilePages:
+    """页面合并测试"""
+
+    def test_unchanged_pages_keep_descriptions_and_images(self, client):
+        """未变化的页面保留描述和图片，变化/新增页面为 DRAFT，删除的页面被移除"""
+        from models import db, Page
+        from services.outline_reconciler import reconcile_pages
+        project_id, page_ids = _create_project_with_pages(OUTLINE)
+
+        result = reconcile_pages(project_id, [
+            {'title': '人工智能简介', 'points': ['定义', '发展历史']},
+            {'title': '机器学习', 'points': ['监督学习', '无监督学习', '强化学习']},
+            {'title': '总结', 'points': ['回顾']},
+        ])
+        db.session.commit()
+
+        assert result.summary() == {'unchanged': 1, 'changed': 1, 'added': 1, 'removed': 1}
+        kept = Page.query.get(page_ids[0])
+        assert kept.status == 'COMPLETED' and kept.description_content and kept.generated_image_path
+        changed = Page.query.get(page_ids[1])
+        assert changed.status == 'DRAFT' and changed.description_content is None
+        assert changed.get_outline_content()['points'][-1] == '强化学习'
+        assert Page.query.get(page_ids[2]) is None
+        assert [p.id for p in result.dirty_pages] == [page_ids[1], result.added[0].id]
+
+
+class TestRefineOutlineEndpoint:
+    """refine_outline 接口测试"""
+
+    def test_refine_keeps_untouched_pages(self, client):
+        """在末尾加一页时，原有页面的 ID、描述和图片不变"""
+        from models import Project, Page
+        project_id, page_ids = _create_project_with_pages(OUTLINE)
+        refined = [{'title': t, 'points': p} for t, p in OUTLINE] + [{'title': '总结', 'points': ['回顾']}]
+
+        with patch('controllers.project_controller.AIService') as ai_service:
+            ai_service.return_value.refine_outline.return_value = refined
+            ai_service.return_value.flatten_outline.return_value = refined
+            response = client.post(f'/api/projects/{project_id}/refine/outline',
+                                   json={'user_requirement': '增加一页总结'})
+
+        data = response.get_json()['data']
+        assert response.status_code == 200
+        assert [p['page_id'] for p in data['pages'][:3]] == page_ids
+        assert data['reconciliation'] == {'unchanged': 3, 'changed': 0, 'added': 1, 'removed': 0}
+        assert data['dirty_page_ids'] == [data['pages'][3]['page_id']]
+        assert all(Page.query.get(pid).generated_image_path for pid in page_ids)
+        assert Project.query.get(project_id).status == 'OUTLINE_GENERATED'
@@ -0,0 +1,165 @@
+"""
+单页重试（抖动指数退避）与只重试失败页单元测试
+"""
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+
+class ServerError(Exception):
+    status_code = 503
+
+
+class TestRetryPolicy:
+    """RetryPolicy 测试"""
+
+    def test_transient_error_is_retried(self):
+        """临时性错误重试后成功，并回调每次重试"""
+        from services.retry_policy import RetryPolicy
+        policy = RetryPolicy(max_attempts=3, base_delay=0)
+        func = MagicMock(side_effect=[ServerError('503 UNAVAILABLE'), TimeoutError(), 'ok'])
+        retries = []
+
+        assert policy.call(func, on_retry=lambda attempt, error, delay: retries.append(attempt)) == 'ok'
+        assert func.call_count == 3
+        assert retries == [1, 2]
+
+    def test_permanent_error_is_not_retried(self):
+        """非临时性错误直接抛出"""
+        from services.retry_policy import RetryPolicy
+        policy = RetryPolicy(max_attempts=3, base_delay=0)
+        func = MagicMock(side_effect=ValueError('No description content for page'))
+
+        with pytest.raises(ValueError):
+            policy.call(func)
+        assert func.call_count == 1
+
+    def test_attempts_are_bounded(self):
+        """用完尝试次数后抛出最后一次错误"""
+        from services.retry_policy import RetryPolicy
+        policy = RetryPolicy(max_attempts=2, base_delay=0)
+        func = MagicMock(side_effect=ServerError('boom'))
+
+        with pytest.raises(ServerError):
+            policy.call(func)
+        assert func.call_count == 2
+
+    def test_backoff_is_jittered_and_capped(self):
+        """退避时间在 [0, min(max_delay, base * 2^(n-1))] 内"""
+        from services.retry_policy import RetryPolicy
+        policy = RetryPolicy(base_delay=2, max_delay=5)
+        assert all(0 <= policy.backoff_delay(1) <= 2 for _ in range(50))
+        assert all(0 <= policy.backoff_delay(6) <= 5 for _ in range(50))
+
+    def test_async_retry_stops_on_cancel(self):
+        """协程版重试：退避等待中收到取消信号立即结束，不再发起下一次尝试"""
+        import asyncio
+        import threading
+        import time
+        from services.retry_policy import RetryPolicy
+        from services.task_manager import TaskCancelledError, _run_page_with_retry_async
+        policy = RetryPolicy(max_attempts=3, base_delay=30, max_delay=30)
+        cancel_event = threading.Event()
+        calls = []
+
+        async def failing():
+            calls.append(1)
+            threading.Timer(0.1, cancel_event.set).start()
+            raise ServerError('503 UNAVAILABLE')
+
+        with patch.object(policy, 'backoff_delay', return_value=30):
+            started = time.monotonic()
+            with pytest.raises(TaskCancelledError):
+                asyncio.run(_run_page_with_retry_async(policy, MagicMock(), 'page-1', failing, cancel_event))
+
+        assert len(calls) == 1
+        assert time.monotonic() - started < 5
+
+
+class TestImagesTaskRetry:
+    """图片任务的单页重试测试"""
+
+    def test_page_retry_is_tracked_in_progress(self, client, app, make_project):
+        """页面遇到 503 后自动重试成功，尝试次数记录在 progress['pages']"""
+        from models import db, Page, Task
+        from services.task_manager import generate_images_task
+        project_id, page_ids, task_id = make_project(['DESCRIPTION_GENERATED'] * 2, 'DESCRIPTIONS_GENERATED',
+                                                     task_type='GENERATE_IMAGES', descriptions=True)
+
+        ai_service = MagicMock()
+        ai_service.flatten_outline.return_value = [{'title': '第1页'}, {'title': '第2页'}]
+        ai_service.extract_image_urls_from_markdown.return_value = []
+        ai_service.generate_image_prompt.side_effect = lambda outline, page_data, *a, **k: page_data['title']
+        flaky = {'第2页': [ServerError('503 UNAVAILABLE')]}
+
+        def generate_image(prompt, *args, **kwargs):
+            if flaky.get(prompt):
+                raise flaky[prompt].pop()
+            return 'image'
+
+        ai_service.generate_image.side_effect = generate_image
+        file_service = MagicMock()
+        file_service.save_generated_image.side_effect = lambda image, pid, page_id: f'{page_id}.png'
+
+        app.config['PAGE_RETRY_BASE_DELAY'] = 0
+        try:
+            generate_images_task(task_id, project_id, ai_service, file_service, [],
+                                 use_template=False, max_workers=1, app=app)
+        finally:
+            app.config['PAGE_RETRY_BASE_DELAY'] = 2.0
+
+        db.session.expire_all()
+        progress = Task.query.get(task_id).get_progress()
+        assert (progress['completed'], progress['failed']) == (2, 0)
+        assert progress['pages'][page_ids[0]]['attempts'] == 1
+        assert progress['pages'][page_ids[1]] == {
+            'status': 'completed', 'attempts': 2, 'error': None, 'retry_in': 0.0
+        }
+        assert Page.query.get(page_ids[1]).status == 'COMPLETED'
+
+
+class TestRetryFailedOnly:
+    """retry_failed_only 模式测试"""
+
+    def test_images_only_failed_pages_are_enqueued(self, client, make_project):
+        """只重新生成 FAILED 页面，任务总数与参数只包含这些页面"""
+        from models import Task
+        project_id, page_ids, _ = make_project(['COMPLETED', 'FAILED', 'COMPLETED'], 'DESCRIPTIONS_GENERATED',
+                                               descriptions=True)
+
+        with patch('controllers.project_controller.task_manager.submit_task') as submit:
+            response = client.post(f'/api/projects/{project_id}/generate/images',
+                                   json={'use_template': False, 'retry_failed_only': True})
+
+        assert response.status_code == 202
+        data = response.get_json()['data']
+        assert data['total_pages'] == 1
+        task = Task.query.get(data['task_id'])
+        assert task.get_payload()['page_ids'] == [page_ids[1]]
+        assert submit.call_args.kwargs['page_ids'] == [page_ids[1]]
+
+    def test_nothing_to_retry(self, client, make_project):
+        """没有失败页面时返回 400"""
+        project_id, _, _ = make_project(['COMPLETED'], 'DESCRIPTIONS_GENERATED', descriptions=True)
+
+        response = client.post(f'/api/projects/{project_id}/generate/images',
+                               json={'use_template': False, 'retry_failed_only': True})
+
+        assert response.status_code == 400
+
+    def test_descriptions_retry_after_partial_failure(self, client, make_project):
+        """描述部分失败后（项目停留在 GENERATING_DESCRIPTIONS）仍可只重试失败页"""
+        from models import db, Project, Page
+        project_id, page_ids, _ = make_project(['DESCRIPTION_GENERATED', 'FAILED'], 'DESCRIPTIONS_GENERATED',
+                                               descriptions=True)
+        Project.query.get(project_id).status = 'GENERATING_DESCRIPTIONS'
+        Page.query.get(page_ids[1]).description_content = None
+        db.session.commit()
+
+        with patch('controllers.project_controller.task_manager.submit_task') as submit:
+            response = client.post(f'/api/projects/{project_id}/generate/descriptions',
+                                   json={'retry_failed_only': True})
+
+        assert response.status_code == 202
+        assert response.get_json()['data']['total_pages'] == 1
+        assert submit.call_args.kwargs['page_ids'] == [page_ids[1]]
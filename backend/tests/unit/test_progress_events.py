@@ -0,0 +1,103 @@
+"""
+项目进度事件推送（SSE）单元测试
+"""
+
+import json
+
+
+def _create_project_with_page():
+    from models import db, Project, Page
+    project = Project(creation_type='idea', idea_prompt='测试', status='DRAFT')
+    db.session.add(project)
+    db.session.flush()
+    page = Page(project_id=project.id, order_index=0, status='DRAFT')
+    db.session.add(page)
+    db.session.commit()
+    return project.id, page.id
+
+
+class TestProgressBroker:
+    """事件分发测试"""
+
+    def test_publish_reaches_all_subscribers(self):
+        """同一项目的所有订阅者都能收到事件，其他项目收不到"""
+        from services.progress_events import ProgressBroker
+        broker = ProgressBroker()
+
+        with broker.subscribe('p1') as a, broker.subscribe('p1') as b, broker.subscribe('p2') as c:
+            broker.publish('p1', 'task', {'status': 'PROCESSING'})
+            assert a.get_nowait()['data'] == {'status': 'PROCESSING'}
+            assert b.get_nowait()['event'] == 'task'
+            assert c.empty()
+
+        assert broker.subscriber_count() == 0
+
+
+class TestSessionEvents:
+    """提交后自动发布 Task / Page 变化"""
+
+    def test_commit_publishes_page_and_task_deltas(self, client):
+        """提交页面状态和任务进度后，订阅者收到对应增量事件"""
+        from models import db, Page, Task
+        from services.progress_events import progress_broker
+        project_id, page_id = _create_project_with_page()
+
+        with progress_broker.subscribe(project_id) as events:
+            page = Page.query.get(page_id)
+            page.status = 'COMPLETED'
+            page.generated_image_path = f'{project_id}/pages/{page_id}.png'
+            task = Task(project_id=project_id, task_type='GENERATE_IMAGES', status='PROCESSING')
+            task.set_progress({'total': 1, 'completed': 1, 'failed': 0})
+            db.session.add(task)
+            db.session.commit()
+
+            received = {}
+            while not events.empty():
+                message = events.get_nowait()
+                received[message['event']] = message['data']
+
+        assert received['page']['status'] == 'COMPLETED'
+        assert received['page']['generated_image_url'].endswith(f'{page_id}.png')
+        assert received['task']['progress']['completed'] == 1
+
+    def test_rollback_publishes_nothing(self, client):
+        """回滚的事务不会发布事件"""
+        from models import db, Page
+        from services.progress_events import progress_broker
+        project_id, page_id = _create_project_with_page()
+
+        with progress_broker.subscribe(project_id) as events:
+            Page.query.get(page_id).status = 'FAILED'
+            db.session.flush()
+            db.session.rollback()
+            assert events.empty()
+
+
+class TestEventsEndpoint:
+    """SSE 端点测试"""
+
+    def test_stream_pushes_task_event(self, client):
+        """SSE 流推送任务进度事件"""
+        from models import db, Task
+        project_id, _ = _create_project_with_page()
+
+        response = client.get(f'/api/projects/{project_id}/events')
+        assert response.status_code == 200
+        assert response.mimetype == 'text/event-stream'
+
+        stream = response.response
+        assert next(stream).startswith(b'retry:')
+
+        db.session.add(Task(project_id=project_id, task_type='GENERATE_IMAGES', status='PENDING'))
+        db.session.commit()
+
+        chunk = next(stream).decode()
+        assert chunk.startswith('event: task')
+        data = json.loads(chunk.split('data: ', 1)[1])
+        assert data['status'] == 'PENDING'
+        response.close()
+
+    def test_stream_unknown_project(self, client):
+        """不存在的项目返回 404"""
+        response = client.get('/api/projects/not-exist/events')
+        assert response.status_code == 404
@@ -0,0 +1,88 @@
+"""
+进度批量写入（write-behind）单元测试
+"""
+
+
+class TestProgressWriter:
+    """ProgressWriter 测试"""
+
+    def test_updates_are_buffered_until_flush(self, client, make_project):
+        """flush 之前数据库中的页面状态不变，flush 后一次性写入"""
+        from models import db, Page, Task
+        from services.progress_writer import ProgressWriter
+        _, page_ids, task_id = make_project(['DRAFT'] * 3, task_type='GENERATE_IMAGES', task_status='PROCESSING')
+        writer = ProgressWriter(task_id, flush_interval=60)
+
+        for page_id in page_ids:
+            writer.update_page(page_id, status='COMPLETED', generated_image_path=f'{page_id}.png')
+        writer.update_progress(completed=3, failed=0)
+
+        assert writer.maybe_flush() is False
+        db.session.expire_all()
+        assert Page.query.get(page_ids[0]).status == 'DRAFT'
+
+        writer.flush()
+        db.session.expire_all()
+        assert all(Page.query.get(pid).status == 'COMPLETED' for pid in page_ids)
+        assert Task.query.get(task_id).get_progress()['completed'] == 3
+        assert writer.commit_count == 1
+
+    def test_later_updates_override_earlier(self, client, make_project):
+        """同一页面的多次更新合并，以最后一次为准"""
+        from models import Page
+        from services.progress_writer import ProgressWriter
+        _, page_ids, task_id = make_project(['DRAFT'], task_type='GENERATE_IMAGES', task_status='PROCESSING')
+        writer = ProgressWriter(task_id, flush_interval=0)
+
+        writer.update_page(page_ids[0], status='GENERATING')
+        writer.update_page(page_ids[0], status='COMPLETED')
+        writer.update_page(page_ids[0], description_content={'text': '描述'})
+        assert writer.maybe_flush() is True
+
+        page = Page.query.get(page_ids[0])
+        assert page.status == 'COMPLETED'
+        assert page.get_description_content() == {'text': '描述'}
+
+    def test_images_task_commits_are_coalesced(self, client, app):
+        """图片任务的页面/进度写入被合并，提交次数远少于页面数"""
+        from unittest.mock import MagicMock
+        from sqlalchemy import event
+        from sqlalchemy.orm import Session
+        from models import db, Project, Page, Task
+        from services.task_manager import generate_images_task
+
+        project = Project(creation_type='idea', idea_prompt='测试', status='DESCRIPTIONS_GENERATED')
+        db.session.add(project)
+        db.session.flush()
+        for i in range(10):
+            page = Page(project_id=project.id, order_index=i, status='DESCRIPTION_GENERATED')
+            page.set_description_content({'text': f'描述{i}'})
+            db.session.add(page)
+        task = Task(project_id=project.id, task_type='GENERATE_IMAGES', status='PENDING')
+        db.session.add(task)
+        db.session.commit()
+        task_id, project_id = task.id, project.id
+
+        ai_service = MagicMock()
+        ai_service.flatten_outline.return_value = [{'title': f'第{i}页'} for i in range(10)]
+        ai_service.extract_image_urls_from_markdown.return_value = []
+        ai_service.generate_image_prompt.return_value = 'prompt'
+        file_service = MagicMock()
+        file_service.save_generated_image.side_effect = lambda image, pid, page_id: f'{page_id}.png'
+
+        commits = []
+        listener = lambda session: commits.append(1)
+        event.listen(Session, 'after_commit', listener)
+        app.config['PROGRESS_FLUSH_INTERVAL'] = 60
+        try:
+            generate_images_task(task_id, project_id, ai_service, file_service, [],
+                                 use_template=False, app=app)
+        finally:
+            event.remove(Session, 'after_commit', listener)
+            app.config['PROGRESS_FLUSH_INTERVAL'] = 1.0
+
+        db.session.expire_all()
+        assert Task.query.get(task_id).get_progress()['completed'] == 10
+        assert Page.query.filter_by(project_id=project_id, status='COMPLETED').count() == 10
+        # 旧实现：每页 3 次提交（GENERATING + 页面结果 + 任务进度）
+        assert len(commits) < 10
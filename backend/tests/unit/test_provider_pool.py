@@ -0,0 +1,83 @@
+"""
+共享 provider 客户端池单元测试
+"""
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+
+@pytest.fixture
+def saved_credentials(app):
+    """测试结束后恢复 app.config 中的凭据（app 为 session 级 fixture）"""
+    keys = ('AI_PROVIDER_FORMAT', 'GOOGLE_API_BASE', 'OPENAI_API_BASE', 'GOOGLE_API_KEY', 'OPENAI_API_KEY')
+    saved = {key: app.config[key] for key in keys if key in app.config}
+    yield
+    for key in keys:
+        app.config.pop(key, None)
+    app.config.update(saved)
+
+
+class TestProviderPool:
+    """ProviderPool 测试"""
+
+    def test_same_credentials_share_one_provider(self, app):
+        """相同凭据与模型复用同一个 provider 实例"""
+        from services.ai_providers import get_text_provider, provider_pool
+        with app.app_context():
+            first = get_text_provider(model='pool-test-model')
+            second = get_text_provider(model='pool-test-model')
+            other = get_text_provider(model='pool-test-other-model')
+
+        assert first is second
+        assert other is not first
+        assert provider_pool.stats()['reused'] >= 1
+
+    def test_key_does_not_contain_api_key(self):
+        """注册表键只保存 API Key 的摘要"""
+        from services.ai_providers import ProviderPool
+        key = ProviderPool.make_key('text', 'gemini', None, 'secret-key', 'model')
+        assert 'secret-key' not in key
+
+    def test_factory_runs_once_per_key(self):
+        """同一个键只创建一次"""
+        from services.ai_providers import ProviderPool
+        pool = ProviderPool()
+        factory = MagicMock(side_effect=lambda: object())
+        key = ProviderPool.make_key('image', 'gemini', None, 'key', 'model')
+
+        assert pool.get_or_create(key, factory) is pool.get_or_create(key, factory)
+        assert factory.call_count == 1
+
+    def test_credential_change_invalidates_pool(self, client, app, saved_credentials):
+        """设置中修改 API Key 后丢弃旧客户端，之后使用新凭据创建"""
+        from services.ai_providers import get_text_provider, provider_pool
+        with app.app_context():
+            old = get_text_provider(model='pool-test-model')
+        invalidations = provider_pool.invalidations
+
+        response = client.put('/api/settings', json={'api_key': 'rotated-key'})
+
+        assert response.status_code == 200
+        assert provider_pool.invalidations == invalidations + 1
+        with app.app_context():
+            assert get_text_provider(model='pool-test-model') is not old
+
+    def test_unrelated_setting_keeps_pool(self, client, saved_credentials):
+        """修改与凭据无关的设置不会清空连接池"""
+        from services.ai_providers import provider_pool
+        client.put('/api/settings', json={'api_key': 'stable-key'})
+        invalidations = provider_pool.invalidations
+
+        client.put('/api/settings', json={'image_resolution': '2K'})
+
+        assert provider_pool.invalidations == invalidations
+
+    def test_warm_up_pre_connects_default_providers(self, app):
+        """预热为默认文本/图片模型各调用一次 warm_up"""
+        from services.ai_providers import ProviderPool
+        provider = MagicMock()
+        with patch('services.ai_providers.get_text_provider', return_value=provider), \
+                patch('services.ai_providers.get_image_provider', return_value=provider):
+            ProviderPool().warm_up(app).join(timeout=5)
+
+        assert provider.warm_up.call_count == 2
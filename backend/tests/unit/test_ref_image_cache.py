@@ -0,0 +1,215 @@
+"""
+参考图片解码缓存单元测试
+"""
+import os
+import threading
+from unittest.mock import MagicMock, patch
+
+from PIL import Image
+
+
+def _save_png(path, color='red', size=(16, 9)):
+    Image.new('RGB', size, color).save(path)
+    return str(path)
+
+
+class TestRefImageCache:
+    """RefImageCache 测试"""
+
+    def test_same_file_is_decoded_once_and_closed(self, tmp_path):
+        """同一文件只解码一次，返回同一个图片对象，文件句柄已关闭"""
+        from services.ref_image_cache import RefImageCache
+        path = _save_png(tmp_path / 'template.png')
+        cache = RefImageCache()
+
+        first = cache.load(path)
+        second = cache.load(path)
+
+        assert first is second
+        assert getattr(first, 'fp', None) is None
+        assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+    def test_changed_file_is_reloaded(self, tmp_path):
+        """文件被替换（mtime/大小变化）后重新解码"""
+        from services.ref_image_cache import RefImageCache
+        path = _save_png(tmp_path / 'template.png', 'red')
+        cache = RefImageCache()
+        cache.load(path)
+
+        _save_png(tmp_path / 'template.png', 'blue', size=(32, 18))
+        os.utime(path, ns=(1, 1))
+
+        assert cache.load(path).getpixel((0, 0)) == (0, 0, 255)
+
+    def test_entries_are_bounded(self, tmp_path):
+        """超过条数上限时淘汰最久未使用的图片"""
+        from services.ref_image_cache import RefImageCache
+        cache = RefImageCache(max_entries=2)
+        for name in ('a', 'b', 'c'):
+            cache.load(_save_png(tmp_path / f'{name}.png'))
+
+        assert cache.stats()['entries'] == 2
+
+    def test_concurrent_loads_decode_once(self, tmp_path):
+        """多个页面线程同时请求同一模板时只解码一次"""
+        from services.ref_image_cache import RefImageCache
+        path = _save_png(tmp_path / 'template.png')
+        cache = RefImageCache()
+        results = []
+
+        threads = [threading.Thread(target=lambda: results.append(cache.load(path))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert cache.stats()['misses'] == 1
+        assert all(image is results[0] for image in results)
+
+
+class TestImageMemo:
+    """按图片对象记忆派生数据测试"""
+
+    def test_encoding_is_memoized(self):
+        """同一图片对象的 JPEG 编码只做一次"""
+        from services.ref_image_cache import encode_image
+        image = Image.new('RGBA', (8, 8), (255, 0, 0, 128))
+
+        with patch.object(Image.Image, 'save', autospec=True, side_effect=Image.Image.save) as save:
+            first = encode_image(image)
+            second = encode_image(image)
+
+        assert first is second
+        assert save.call_count == 1
+
+    def test_downscaled_copy(self):
+        """缩小副本保持宽高比，原图不变"""
+        from services.ref_image_cache import downscaled
+        image = Image.new('RGB', (2000, 1000))
+
+        small = downscaled(image, 500)
+
+        assert small.size == (500, 250) and image.size == (2000, 1000)
+        assert downscaled(image, 500) is small
+        assert downscaled(image, 4000) is image
+
+
+class TestAIServiceRefImages:
+    """AIService 参考图片复用测试"""
+
+    def test_template_shared_across_pages(self, app, tmp_path):
+        """同一 AIService 生成多页时，模板只解码一次"""
+        from services.ai_service import AIService
+        path = _save_png(tmp_path / 'template.png')
+        image_provider = MagicMock()
+        with app.app_context():
+            ai_service = AIService(text_provider=MagicMock(), image_provider=image_provider)
+
+        for i in range(3):
+            ai_service.generate_image(f'第{i + 1}页', path)
+
+        refs = [call.kwargs['ref_images'][0] for call in image_provider.generate_image.call_args_list]
+        assert refs[0] is refs[1] is refs[2]
+        assert ai_service.ref_image_cache.stats()['misses'] == 1
+
+
+class TestPayloadBudget:
+    """参考图片上传预算测试"""
+
+    def _noisy_image(self, size):
+        import random
+        rng = random.Random(0)
+        return Image.frombytes('RGB', size, bytes(rng.getrandbits(8) for _ in range(size[0] * size[1] * 3)))
+
+    def test_large_image_is_downscaled_and_encoded_once(self):
+        """超过最长边的图片缩小后编码，同一图片与预算只处理一次"""
+        from services.ref_image_cache import PayloadBudget, fit_to_budget, payload_bytes
+        image = Image.new('RGBA', (4000, 2000), (255, 0, 0, 255))
+        budget = PayloadBudget(max_edge=1000, max_bytes=0)
+
+        prepared = fit_to_budget(image, budget)
+
+        assert prepared.size == (1000, 500)
+        assert fit_to_budget(image, budget) is prepared
+        mime_type, data = payload_bytes(prepared)
+        assert mime_type == 'image/jpeg' and data[:2] == b'\xff\xd8'
+
+    def test_byte_limit_lowers_quality_then_size(self):
+        """超过字节上限时逐步降低质量和尺寸，直到满足上限"""
+        from services.ref_image_cache import PayloadBudget, fit_to_budget, payload_bytes
+        image = self._noisy_image((800, 800))
+        budget = PayloadBudget(max_edge=0, max_bytes=120000)
+
+        _, data = payload_bytes(fit_to_budget(image, budget))
+
+        assert len(data) <= 120000
+
+    def test_disabled_budget_keeps_image(self):
+        """预算为 0 时原样返回，不附带上传字节"""
+        from services.ref_image_cache import PayloadBudget, fit_to_budget, payload_bytes
+        image = Image.new('RGB', (100, 100))
+
+        assert fit_to_budget(image, PayloadBudget(max_edge=0, max_bytes=0)) is image
+        assert payload_bytes(image) is None
+
+    def test_per_provider_override(self):
+        """按 provider 格式覆盖预算配置"""
+        from services.ref_image_cache import PayloadBudget
+        config = {'REF_IMAGE_MAX_EDGE': 2048, 'REF_IMAGE_MAX_EDGE_OPENAI': 1024, 'REF_IMAGE_FORMAT': 'webp'}
+
+        assert PayloadBudget.for_provider(config, 'openai').max_edge == 1024
+        assert PayloadBudget.for_provider(config, 'gemini').max_edge == 2048
+        assert PayloadBudget.for_provider(config, 'gemini').mime_type == 'image/webp'
+
+    def test_transparent_image_keeps_alpha(self):
+        """含透明像素的图片不编码成 JPEG，改用 PNG 保留透明通道；WebP 直接保留"""
+        import io
+        from services.ref_image_cache import PayloadBudget, fit_to_budget, payload_bytes
+        image = Image.new('RGBA', (400, 200), (255, 0, 0, 0))
+
+        mime_type, data = payload_bytes(fit_to_budget(image, PayloadBudget(max_edge=100, max_bytes=0)))
+        assert mime_type == 'image/png'
+        assert Image.open(io.BytesIO(data)).getchannel('A').getextrema()[0] == 0
+
+        mime_type, data = payload_bytes(fit_to_budget(image, PayloadBudget(max_edge=100, format='WEBP')))
+        assert mime_type == 'image/webp'
+        assert Image.open(io.BytesIO(data)).mode == 'RGBA'
+
+    def test_provider_default_format(self):
+        """未配置格式时 Gemini 默认 WebP，OpenAI 默认 JPEG"""
+        from services.ref_image_cache import PayloadBudget
+        config = {'REF_IMAGE_FORMAT': ''}
+
+        assert PayloadBudget.for_provider(config, 'gemini').format == 'WEBP'
+        assert PayloadBudget.for_provider(config, 'openai').format == 'JPEG'
+
+    def test_savings_are_reported(self, client, tmp_path):
+        """统计接口报告原始字节（加载时的文件大小，不重新编码原图）与实际上传字节"""
+        from unittest.mock import patch
+        from services import ref_image_cache
+        from services.ref_image_cache import PayloadBudget, RefImageCache, fit_to_budget
+        path = tmp_path / 'noisy.png'
+        self._noisy_image((1600, 900)).save(path)
+        image = RefImageCache().load(str(path))
+
+        with patch.object(ref_image_cache, 'encode_image') as encode:
+            fit_to_budget(image, PayloadBudget(max_edge=400, max_bytes=0))
+        encode.assert_not_called()
+
+        data = client.get('/api/settings/ref-images').get_json()['data']
+
+        assert data['images'] >= 1 and data['downscaled'] >= 1
+        assert data['saved_bytes'] > 0
+
+    def test_openai_provider_uploads_budgeted_bytes(self):
+        """OpenAI 格式上传预算压缩后的字节"""
+        from services.ai_providers.image.openai_provider import OpenAIImageProvider
+        from services.ref_image_cache import PayloadBudget, fit_to_budget
+        provider = OpenAIImageProvider.__new__(OpenAIImageProvider)
+        provider.model = 'image-model'
+        prepared = fit_to_budget(Image.new('RGB', (3000, 1500)), PayloadBudget(max_edge=600, format='WEBP'))
+
+        request = provider._build_request('prompt', [prepared], '16:9', '2K')
+
+        url = request['messages'][1]['content'][0]['image_url']['url']
+        assert url.startswith('data:image/webp;base64,')
@@ -0,0 +1,129 @@
+"""
+参考文件分块索引与按页检索单元测试
+"""
+from unittest.mock import patch
+
+import pytest
+
+
+SECTIONS = {
+    '气候变化': '全球气温持续上升，极端天气事件频发，冰川融化导致海平面上升。',
+    '碳排放': '化石燃料燃烧是二氧化碳排放的主要来源，工业与交通占比最高。',
+    '可再生能源': '太阳能和风能发电成本快速下降，储能技术是大规模应用的关键。',
+    'Market Outlook': 'Solar module prices fell sharply while battery storage demand doubled.',
+}
+
+
+def _markdown(repeat=20):
+    return '\n\n'.join(f'# {title}\n\n' + '\n\n'.join([body] * repeat) for title, body in SECTIONS.items())
+
+
+@pytest.fixture
+def retrieval_config(app):
+    """小预算配置，测试结束后恢复"""
+    keys = ('REFERENCE_RETRIEVAL_ENABLED', 'REFERENCE_CHUNK_TOKENS', 'REFERENCE_TOP_K', 'REFERENCE_TOKEN_BUDGET')
+    saved = {key: app.config.get(key) for key in keys}
+    app.config.update(REFERENCE_RETRIEVAL_ENABLED=True, REFERENCE_CHUNK_TOKENS=120,
+                      REFERENCE_TOP_K=3, REFERENCE_TOKEN_BUDGET=400)
+    yield app.config
+    app.config.update(saved)
+
+
+class TestChunking:
+    """分块与分词测试"""
+
+    def test_tokenize_mixes_words_and_cjk_bigrams(self):
+        """英文按单词（去停用词），中文按相邻两字"""
+        from services.reference_index import tokenize
+        assert tokenize('The Solar 太阳能') == ['solar', '太阳', '阳能']
+
+    def test_chunks_respect_size_and_keep_heading(self):
+        """每块不超过目标大小，并记录所属标题"""
+        from services.reference_index import build_index
+        index = build_index(_markdown(), chunk_tokens=120)
+
+        assert len(index['chunks']) > len(SECTIONS)
+        assert all(chunk['tokens'] <= 120 for chunk in index['chunks'])
+        assert {chunk['heading'] for chunk in index['chunks']} == set(SECTIONS)
+
+
+class TestReferenceIndex:
+    """BM25 检索测试"""
+
+    def test_search_ranks_matching_section_first(self):
+        """与页面要点相关的章节得分最高"""
+        from services.reference_index import ReferenceIndex
+        index = ReferenceIndex([{'filename': 'report.pdf', 'content': _markdown()}], chunk_tokens=120)
+
+        results = index.search('可再生能源：太阳能与储能', top_k=3)
+
+        assert results and all(chunk['heading'] == '可再生能源' for _, _, _, chunk in results)
+
+    def test_select_stays_within_budget_in_document_order(self):
+        """选出的片段总量不超过预算，并按原文顺序排列"""
+        from services.reference_index import ReferenceIndex
+        index = ReferenceIndex([{'filename': 'a.md', 'content': _markdown()},
+                                {'filename': 'b.md', 'content': _markdown()}], chunk_tokens=120)
+
+        selected = index.select('battery storage solar prices', top_k=6, token_budget=250)
+
+        assert sum(chunk['tokens'] for _, _, chunk in selected) <= 250
+        assert selected == sorted(selected, key=lambda item: (item[0], item[1]))
+
+    def test_stored_index_is_used(self):
+        """已保存的索引直接使用，不重新分块"""
+        from services.reference_index import ReferenceIndex, build_index
+        stored = build_index(_markdown(), chunk_tokens=120)
+
+        with patch('services.reference_index.build_index') as rebuild:
+            index = ReferenceIndex([{'filename': 'report.pdf', 'content': _markdown(), 'chunk_index': stored}])
+
+        rebuild.assert_not_called()
+        assert len(index.chunks) == len(stored['chunks'])
+
+
+class TestPageDescriptionPrompt:
+    """页面描述 prompt 只附带相关片段"""
+
+    def _prompt(self, app, content, page_outline):
+        from services.ai_service import ProjectContext
+        from services.prompts import get_page_description_prompt
+        with app.app_context():
+            context = ProjectContext({'idea_prompt': '能源转型', 'creation_type': 'idea'},
+                                     [{'filename': 'report.pdf', 'content': content}])
+            return get_page_description_prompt(context, [page_outline], page_outline, 1)
+
+    def test_large_files_are_reduced_to_relevant_excerpts(self, app, retrieval_config):
+        """超过预算的参考文件只附带与本页相关的片段"""
+        content = _markdown()
+        prompt = self._prompt(app, content, {'title': '碳排放来源', 'points': ['化石燃料', '工业与交通']})
+
+        assert 'excerpts relevant to this page' in prompt
+        assert '化石燃料燃烧' in prompt
+        assert '冰川融化' not in prompt
+        assert len(prompt) < len(content)
+
+    def test_small_files_are_inlined_in_full(self, app, retrieval_config):
+        """参考文件总量在预算内时仍整体附带"""
+        content = _markdown(repeat=1)
+        prompt = self._prompt(app, content, {'title': '碳排放来源', 'points': []})
+
+        assert content in prompt
+
+    def test_parsing_builds_index(self, app):
+        """文件解析完成时保存分块索引"""
+        from models import db, ReferenceFile
+        from controllers.reference_file_controller import _parse_file_async
+        with app.app_context():
+            ref = ReferenceFile(filename='report.md', file_path='report.md', file_size=1, file_type='md')
+            db.session.add(ref)
+            db.session.commit()
+            file_id = ref.id
+
+        with patch('controllers.reference_file_controller.FileParserService') as parser:
+            parser.return_value.parse_file.return_value = ('batch', _markdown(), None, None, 0)
+            _parse_file_async(file_id, 'report.md', 'report.md', app)
+
+        with app.app_context():
+            index = ReferenceFile.query.get(file_id).get_chunk_index()
+        assert index and index['chunks']
@@ -0,0 +1,30 @@
+"""
+运行时统计接口单元测试
+"""
+
+
+class TestStatsEndpoints:
+    """GET /api/settings/<name> 统计接口测试"""
+
+    def test_every_component_is_served(self, client):
+        """统计表中的每个组件都注册了对应的 GET 接口"""
+        from controllers.settings_controller import _STATS_ENDPOINTS
+
+        for name in _STATS_ENDPOINTS:
+            response = client.get(f'/api/settings/{name}')
+            assert response.status_code == 200, name
+            assert isinstance(response.get_json()['data'], dict)
+
+    def test_stats_error_is_reported(self, client):
+        """统计函数出错时返回 500 与组件对应的错误码"""
+        from unittest.mock import patch
+        from controllers import settings_controller
+
+        def broken():
+            raise RuntimeError('boom')
+
+        with patch.dict(settings_controller._STATS_ENDPOINTS, {'llm-cache': (broken, 'LLM cache')}):
+            response = client.get('/api/settings/llm-cache')
+
+        assert response.status_code == 500
+        assert response.get_json()['error']['code'] == 'GET_LLM_CACHE_ERROR'
@@ -0,0 +1,67 @@
+"""
+相同生成请求去重（single-flight）单元测试
+"""
+from unittest.mock import patch
+
+
+class TestFingerprint:
+    """指纹计算测试"""
+
+    def test_fingerprint_is_order_independent(self):
+        """参数顺序不影响指纹，任一输入变化都会改变指纹"""
+        from services.single_flight import compute_fingerprint
+        a = compute_fingerprint(project_id='p', resolution='2K', pages=[1, 2])
+        b = compute_fingerprint(pages=[1, 2], resolution='2K', project_id='p')
+        c = compute_fingerprint(project_id='p', resolution='4K', pages=[1, 2])
+        assert a == b
+        assert a != c
+
+    def test_file_fingerprint_tracks_content(self, tmp_path):
+        """模板文件内容变化后指纹随之变化"""
+        import os
+        from services.single_flight import file_fingerprint
+        path = tmp_path / 'template.png'
+        path.write_bytes(b'first')
+        first = file_fingerprint(str(path))
+        path.write_bytes(b'second!')
+        os.utime(path, (1, 1))
+        assert file_fingerprint(str(path)) != first
+        assert file_fingerprint(str(tmp_path / 'missing.png')) is None
+
+
+class TestGenerateImagesSingleFlight:
+    """批量生成图片接口去重测试"""
+
+    def test_duplicate_request_attaches_to_inflight_task(self, client, make_project):
+        """进行中的相同请求直接返回已有 task_id，不再提交新任务"""
+        from models import Task
+        project_id, _, _ = make_project(['DESCRIPTION_GENERATED'], descriptions=True)
+
+        with patch('controllers.project_controller.task_manager.submit_task') as submit:
+            first = client.post(f'/api/projects/{project_id}/generate/images',
+                                json={'use_template': False})
+            second = client.post(f'/api/projects/{project_id}/generate/images',
+                                 json={'use_template': False})
+
+        assert first.status_code == 202
+        assert second.status_code == 202
+        assert second.get_json()['data']['task_id'] == first.get_json()['data']['task_id']
+        assert second.get_json()['data']['deduplicated'] is True
+        assert submit.call_count == 1
+        assert Task.query.filter_by(project_id=project_id).count() == 1
+
+    def test_finished_task_is_not_reused(self, client, make_project):
+        """已结束的任务不会被复用，相同请求会创建新任务"""
+        from models import db, Task
+        project_id, _, _ = make_project(['DESCRIPTION_GENERATED'], descriptions=True)
+
+        with patch('controllers.project_controller.task_manager.submit_task'):
+            first = client.post(f'/api/projects/{project_id}/generate/images',
+                                json={'use_template': False})
+            task = Task.query.get(first.get_json()['data']['task_id'])
+            task.status = 'COMPLETED'
+            db.session.commit()
+            second = client.post(f'/api/projects/{project_id}/generate/images',
+                                 json={'use_template': False})
+
+        assert second.get_json()['data']['task_id'] != task.id
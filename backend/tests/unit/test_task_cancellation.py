@@ -0,0 +1,89 @@
+"""
+任务取消单元测试
+"""
+
+import threading
+from unittest.mock import MagicMock, patch
+
+
+class TestCancelEndpoint:
+    """取消接口测试"""
+
+    def test_queued_task_is_cancelled_immediately(self, client, make_project):
+        """尚未被领取的任务直接变为 CANCELLED"""
+        from models import db, Task
+        from services.task_status_store import task_status_store
+        project_id, _, task_id = make_project(['DESCRIPTION_GENERATED'], 'DESCRIPTIONS_GENERATED',
+                                           task_type='GENERATE_IMAGES', descriptions=True)
+
+        response = client.post(f'/api/projects/{project_id}/tasks/{task_id}/cancel')
+
+        assert response.status_code == 202
+        assert response.get_json()['data']['status'] == 'CANCELLED'
+        db.session.expire_all()
+        assert Task.query.get(task_id).status == 'CANCELLED'
+        assert task_status_store.get(task_id) is None
+
+    def test_finished_task_cannot_be_cancelled(self, client, make_project):
+        """已结束的任务返回 409"""
+        project_id, _, task_id = make_project(['DESCRIPTION_GENERATED'], 'DESCRIPTIONS_GENERATED',
+                                           task_type='GENERATE_IMAGES', task_status='COMPLETED', descriptions=True)
+
+        response = client.post(f'/api/projects/{project_id}/tasks/{task_id}/cancel')
+
+        assert response.status_code == 409
+
+    def test_deleting_project_cancels_its_tasks(self, client, make_project):
+        """删除项目时自动取消项目中的活跃任务"""
+        project_id, _, task_id = make_project(['DESCRIPTION_GENERATED'], 'DESCRIPTIONS_GENERATED',
+                                           task_type='GENERATE_IMAGES', descriptions=True)
+
+        with patch('controllers.project_controller.task_manager.cancel_task') as cancel:
+            response = client.delete(f'/api/projects/{project_id}')
+
+        assert response.status_code == 200
+        cancel.assert_called_once_with(task_id)
+
+
+class TestCooperativeCancellation:
+    """执行中任务的协作式取消测试"""
+
+    def test_running_images_task_stops_and_drops_late_results(self, client, app, make_project):
+        """执行中的任务被取消：未开始的页面不再调用，迟到的结果不保存"""
+        from models import db, Page, Task
+        from services.task_manager import task_manager, generate_images_task
+        project_id, _, task_id = make_project(['DESCRIPTION_GENERATED'] * 4, 'DESCRIPTIONS_GENERATED',
+                                           task_type='GENERATE_IMAGES', descriptions=True)
+
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow_generate_image(*args, **kwargs):
+            started.set()
+            release.wait(5)
+            return MagicMock()
+
+        ai_service = MagicMock()
+        ai_service.flatten_outline.return_value = [{'title': f'第{i + 1}页'} for i in range(4)]
+        ai_service.extract_image_urls_from_markdown.return_value = []
+        ai_service.generate_image_prompt.return_value = 'prompt'
+        ai_service.generate_image.side_effect = slow_generate_image
+        file_service = MagicMock()
+
+        task_manager.submit_task(task_id, generate_images_task, project_id, ai_service, file_service, [],
+                                 use_template=False, max_workers=1, app=app)
+        future = task_manager.active_tasks[task_id]
+        assert started.wait(5)
+
+        response = client.post(f'/api/projects/{project_id}/tasks/{task_id}/cancel')
+        assert response.get_json()['data']['status'] == 'CANCELLING'
+
+        future.result(timeout=10)
+        release.set()
+
+        db.session.expire_all()
+        assert Task.query.get(task_id).status == 'CANCELLED'
+        assert ai_service.generate_image.call_count == 1
+        file_service.save_generated_image.assert_not_called()
+        pages = Page.query.filter_by(project_id=project_id).all()
+        assert all(p.status == 'DESCRIPTION_GENERATED' for p in pages)
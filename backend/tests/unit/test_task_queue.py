@@ -0,0 +1,155 @@
+"""
+持久化任务队列单元测试（租约领取 / 续租 / 崩溃恢复）
+"""
+
+from datetime import datetime, timedelta
+
+
+def _create_task(status='PENDING', **fields):
+    from models import db, Project, Task
+    project = Project(creation_type='idea', idea_prompt='测试', status='DRAFT')
+    db.session.add(project)
+    db.session.flush()
+    task = Task(project_id=project.id, task_type='GENERATE_IMAGES', status=status, **fields)
+    db.session.add(task)
+    db.session.commit()
+    return task.id
+
+
+class TestTaskLease:
+    """租约领取测试"""
+
+    def test_claim_is_exclusive(self, client):
+        """同一任务只能被一个 worker 领取"""
+        from services import task_queue
+        task_id = _create_task()
+
+        assert task_queue.claim_task(task_id, 'worker-a', 60) is True
+        assert task_queue.claim_task(task_id, 'worker-b', 60) is False
+
+    def test_claim_next_returns_oldest_pending(self, client):
+        """claim_next_task 领取最早的 PENDING 任务"""
+        from services import task_queue
+        first = _create_task()
+        _create_task()
+
+        assert task_queue.claim_next_task('worker-a', 60) == first
+
+    def test_claim_next_prefers_interactive_tasks(self, client):
+        """interactive 任务先于更早提交的 bulk 任务被领取"""
+        from models import db, Task
+        from services import task_queue
+        _create_task()
+        edit = _create_task()
+        Task.query.get(edit).task_type = 'EDIT_PAGE_IMAGE'
+        db.session.commit()
+
+        assert task_queue.queue_position(Task.query.get(edit)) == 1
+        assert task_queue.claim_next_task('worker-a', 60) == edit
+
+    def test_release_allows_reclaim(self, client):
+        """释放租约后任务可被再次领取"""
+        from services import task_queue
+        task_id = _create_task()
+
+        task_queue.claim_task(task_id, 'worker-a', 60)
+        task_queue.release_task(task_id, 'worker-a')
+        assert task_queue.claim_task(task_id, 'worker-b', 60) is True
+
+
+class TestTaskRecovery:
+    """崩溃恢复测试"""
+
+    def test_expired_lease_is_requeued(self, client):
+        """租约过期的 PROCESSING 任务重新进入 PENDING"""
+        from models import Task
+        from services import task_queue
+        task_id = _create_task(
+            status='PROCESSING', attempts=1, lease_owner='dead-worker',
+            lease_expires_at=datetime.utcnow() - timedelta(seconds=5)
+        )
+
+        requeued, failed = task_queue.recover_expired_tasks(max_attempts=3)
+
+        task = Task.query.get(task_id)
+        assert (requeued, failed) == (1, 0)
+        assert task.status == 'PENDING'
+        assert task.lease_owner is None
+
+    def test_exhausted_attempts_marked_failed(self, client):
+        """超过最大尝试次数的任务标记为 FAILED"""
+        from models import Task
+        from services import task_queue
+        task_id = _create_task(
+            status='PROCESSING', attempts=3, lease_owner='dead-worker',
+            lease_expires_at=datetime.utcnow() - timedelta(seconds=5)
+        )
+
+        task_queue.recover_expired_tasks(max_attempts=3)
+
+        assert Task.query.get(task_id).status == 'FAILED'
+
+    def test_periodic_recovery_skips_recent_and_local_tasks(self, client):
+        """周期性恢复不接手本进程已排队的任务，也不接手刚提交的任务"""
+        from unittest.mock import patch
+        from models import Task
+        from services import task_queue
+        from services.task_manager import TaskManager
+        stale = datetime.utcnow() - timedelta(minutes=10)
+        local = _create_task(created_at=stale)
+        recent = _create_task()
+        orphan = _create_task(created_at=stale)
+
+        manager = TaskManager(max_workers=1)
+        manager.app = client.application
+        manager.active_tasks[local] = object()
+        with patch.object(manager, '_start_task') as start:
+            assert manager.recover_tasks(min_age_seconds=120) == 1
+
+        assert start.call_args[0][0] == orphan
+        assert Task.query.get(local).lease_owner is None
+        assert Task.query.get(recent).lease_owner is None
+        assert task_queue.claim_task(orphan, 'worker-b', 60) is False
+
+
+class TestTaskUploads:
+    """任务上传文件的持久化与清理测试"""
+
+    def test_uploads_stored_relative_to_upload_folder(self, app):
+        """上传的参考图保存在共享上传目录下，返回相对路径"""
+        import io
+        import os
+        from werkzeug.datastructures import FileStorage
+        from services import FileService
+        file_service = FileService(app.config['UPLOAD_FOLDER'])
+        files = [FileStorage(io.BytesIO(b'a'), filename='ref.png'), FileStorage(io.BytesIO(b'b'), filename='ref.png')]
+
+        upload_dir, paths = file_service.save_task_uploads(files, 'project-1')
+
+        assert not os.path.isabs(upload_dir) and upload_dir.startswith('project-1/')
+        assert len(set(paths)) == 2 and all(file_service.file_exists(path) for path in paths)
+        assert file_service.delete_task_uploads(upload_dir)
+        assert not any(file_service.file_exists(path) for path in paths)
+
+    def test_uploads_removed_when_recovery_fails_task(self, client):
+        """恢复时因重试次数耗尽而失败的任务，其上传文件被清理；重新排队的任务保留上传文件"""
+        import io
+        from werkzeug.datastructures import FileStorage
+        from models import db, Task
+        from services import FileService, task_queue
+        file_service = FileService(client.application.config['UPLOAD_FOLDER'])
+        expired = datetime.utcnow() - timedelta(seconds=5)
+        dirs = {}
+        for attempts in (1, 3):
+            upload_dir, paths = file_service.save_task_uploads(
+                [FileStorage(io.BytesIO(b'a'), filename='ref.png')], None)
+            task_id = _create_task(status='PROCESSING', attempts=attempts, lease_owner='dead-worker',
+                                   lease_expires_at=expired)
+            Task.query.get(task_id).set_payload({'temp_dir': upload_dir})
+            dirs[attempts] = paths[0]
+        db.session.commit()
+
+        task_queue.recover_expired_tasks(max_attempts=3)
+
+        assert file_service.file_exists(dirs[1])
+        assert not file_service.file_exists(dirs[3])
@@ -0,0 +1,115 @@
+"""
+多优先级公平调度单元测试
+"""
+
+import threading
+
+
+def _create_task(task_type, status='PENDING', project_id=None):
+    from models import db, Project, Task
+    if project_id is None:
+        project = Project(creation_type='idea', idea_prompt='测试', status='DRAFT')
+        db.session.add(project)
+        db.session.flush()
+        project_id = project.id
+    task = Task(project_id=project_id, task_type=task_type, status=status)
+    task.set_progress({'total': 1, 'completed': 0, 'failed': 0})
+    db.session.add(task)
+    db.session.commit()
+    return project_id, task.id
+
+
+class TestFairScheduler:
+    """调度队列测试"""
+
+    def test_interactive_before_bulk(self):
+        """interactive 任务总是先于 bulk 任务派发"""
+        from services.task_scheduler import FairScheduler
+        scheduler = FairScheduler()
+        scheduler.push('bulk-1', 'p1', 'GENERATE_IMAGES')
+        scheduler.push('edit-1', 'p2', 'EDIT_PAGE_IMAGE')
+
+        assert scheduler.pop().task_id == 'edit-1'
+        assert scheduler.pop().task_id == 'bulk-1'
+        assert scheduler.pop() is None
+
+    def test_fair_share_across_projects(self):
+        """同一优先级内按项目轮流，而不是先到先得"""
+        from services.task_scheduler import FairScheduler
+        scheduler = FairScheduler()
+        for i in range(3):
+            scheduler.push(f'a-{i}', 'project-a', 'GENERATE_IMAGES')
+        scheduler.push('b-0', 'project-b', 'GENERATE_DESCRIPTIONS')
+
+        assert scheduler.position('b-0') == 2
+        order = [scheduler.pop().task_id for _ in range(4)]
+        assert order == ['a-0', 'b-0', 'a-1', 'a-2']
+
+    def test_larger_tasks_weigh_more(self):
+        """工作量大的任务推进本项目的虚拟时间更多"""
+        from services.task_scheduler import FairScheduler
+        scheduler = FairScheduler()
+        scheduler.push('big', 'project-a', 'GENERATE_IMAGES', cost=60)
+        scheduler.push('a-next', 'project-a', 'GENERATE_IMAGES', cost=1)
+        scheduler.push('small', 'project-b', 'GENERATE_IMAGES', cost=5)
+
+        assert [scheduler.pop().task_id for _ in range(3)] == ['small', 'big', 'a-next']
+
+    def test_removed_task_is_skipped(self):
+        """取消的排队任务不会被派发"""
+        from services.task_scheduler import FairScheduler
+        scheduler = FairScheduler()
+        scheduler.push('t-1', 'p1', 'GENERATE_IMAGES')
+        scheduler.push('t-2', 'p1', 'GENERATE_IMAGES')
+
+        assert scheduler.remove('t-1') is True
+        assert scheduler.position('t-2') == 1
+        assert scheduler.pop().task_id == 't-2'
+
+
+class TestTaskManagerScheduling:
+    """TaskManager 派发测试"""
+
+    def test_interactive_task_runs_while_bulk_waits(self, client, app):
+        """bulk 任务占满可用线程时，interactive 任务仍可使用预留线程立即执行"""
+        from services.task_manager import TaskManager
+        manager = TaskManager(max_workers=2)
+        manager.init_app(app)
+        manager.reserved_interactive_workers = 1
+
+        release = threading.Event()
+        interactive_ran = threading.Event()
+
+        def blocking_task(task_id):
+            release.wait(5)
+
+        def interactive_task(task_id):
+            interactive_ran.set()
+
+        _, bulk_1 = _create_task('GENERATE_IMAGES')
+        _, bulk_2 = _create_task('GENERATE_DESCRIPTIONS')
+        _, edit = _create_task('EDIT_PAGE_IMAGE')
+        try:
+            manager.submit_task(bulk_1, blocking_task)
+            manager.submit_task(bulk_2, blocking_task)
+            manager.submit_task(edit, interactive_task)
+
+            assert interactive_ran.wait(5)
+            assert manager.queue_position(bulk_2) == 1
+        finally:
+            release.set()
+            manager.shutdown()
+
+    def test_task_status_reports_queue_position(self, client):
+        """任务状态接口返回优先级和排队位置"""
+        from services.task_manager import task_manager
+        project_id, task_id = _create_task('GENERATE_IMAGES')
+        task_manager.scheduler.push(task_id, project_id, 'GENERATE_IMAGES')
+        try:
+            response = client.get(f'/api/projects/{project_id}/tasks/{task_id}')
+        finally:
+            task_manager.scheduler.remove(task_id)
+
+        data = response.get_json()['data']
+        assert data['priority_class'] == 'bulk'
+        assert data['queue_position'] == 1
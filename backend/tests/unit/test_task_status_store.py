@@ -0,0 +1,101 @@
+"""
+内存任务状态表与批量任务状态接口单元测试
+"""
+
+
+def _create_project():
+    from models import db, Project
+    project = Project(creation_type='idea', idea_prompt='测试', status='DRAFT')
+    db.session.add(project)
+    db.session.commit()
+    return project.id
+
+
+def _create_task(project_id, status='PENDING'):
+    from models import db, Task
+    task = Task(project_id=project_id, task_type='GENERATE_PAGE_IMAGE', status=status)
+    task.set_progress({'total': 1, 'completed': 0, 'failed': 0})
+    db.session.add(task)
+    db.session.commit()
+    return task.id
+
+
+class TestTaskStatusStore:
+    """状态表测试"""
+
+    def test_committed_transitions_sync_store(self, client):
+        """提交的任务状态切换会同步到内存，结束后移除"""
+        from models import db, Task
+        from services.task_status_store import task_status_store
+        project_id = _create_project()
+        task_id = _create_task(project_id)
+
+        assert task_status_store.get(task_id)['status'] == 'PENDING'
+
+        task = Task.query.get(task_id)
+        task.status = 'COMPLETED'
+        db.session.commit()
+
+        assert task_status_store.get(task_id) is None
+
+    def test_live_progress_is_memory_only(self, client):
+        """执行中的进度只更新内存，最终 flush 才写数据库"""
+        from models import db, Task
+        from services.progress_writer import ProgressWriter
+        from services.task_status_store import task_status_store
+        project_id = _create_project()
+        task_id = _create_task(project_id, status='PROCESSING')
+
+        writer = ProgressWriter(task_id, flush_interval=0, persist_progress=False)
+        writer.update_progress(completed=1)
+        writer.flush()
+
+        assert task_status_store.get_progress(task_id)['completed'] == 1
+        db.session.expire_all()
+        assert Task.query.get(task_id).get_progress()['completed'] == 0
+
+        writer.flush(final=True)
+        db.session.expire_all()
+        assert Task.query.get(task_id).get_progress()['completed'] == 1
+
+
+class TestTaskListEndpoint:
+    """批量任务状态接口测试"""
+
+    def test_active_tasks_served_from_memory(self, client):
+        """status=active 返回项目所有活跃任务，且不查询数据库"""
+        from unittest.mock import patch
+        project_id = _create_project()
+        first = _create_task(project_id)
+        second = _create_task(project_id, status='PROCESSING')
+        _create_task(project_id, status='COMPLETED')
+
+        with patch('controllers.project_controller.Task') as task_model:
+            response = client.get(f'/api/projects/{project_id}/tasks?status=active')
+            task_model.query.assert_not_called()
+
+        tasks = response.get_json()['data']['tasks']
+        assert [t['task_id'] for t in tasks] == [first, second]
+        assert 'project_id' not in tasks[0]
+
+    def test_list_all_tasks_from_database(self, client):
+        """不指定 status 时从数据库返回项目的所有任务"""
+        project_id = _create_project()
+        _create_task(project_id)
+        _create_task(project_id, status='COMPLETED')
+
+        response = client.get(f'/api/projects/{project_id}/tasks')
+
+        assert response.status_code == 200
+        assert len(response.get_json()['data']['tasks']) == 2
+
+    def test_task_status_prefers_live_progress(self, client):
+        """单任务查询返回内存中的实时进度"""
+        from services.task_status_store import task_status_store
+        project_id = _create_project()
+        task_id = _create_task(project_id, status='PROCESSING')
+        task_status_store.update_progress(task_id, {'total': 1, 'completed': 1, 'failed': 0})
+
+        response = client.get(f'/api/projects/{project_id}/tasks/{task_id}')
+
+        assert response.get_json()['data']['progress']['completed'] == 1
@@ -6,11 +6,13 @@ from .response import (
     not_found, 
     invalid_status,
     ai_service_error,
-    rate_limit_error
+    rate_limit_error,
+    queue_full_error
 )
 from .validators import validate_project_status, validate_page_status, allowed_file
 from .path_utils import convert_mineru_path_to_local, find_mineru_file_with_prefix, find_file_with_prefix
 from .pptx_builder import PPTXBuilder
+from .json_repair import parse_json_lenient, json_repair_stats
 
 __all__ = [
     'success_response',
@@ -20,12 +22,15 @@ __all__ = [
     'invalid_status',
     'ai_service_error',
     'rate_limit_error',
+    'queue_full_error',
     'validate_project_status',
     'validate_page_status',
     'allowed_file',
     'convert_mineru_path_to_local',
     'find_mineru_file_with_prefix',
     'find_file_with_prefix',
+    'parse_json_lenient',
+    'json_repair_stats',
     'PPTXBuilder'
 ]
 
@@ -0,0 +1,190 @@
+"""
+Tolerant JSON parsing for LLM responses
+
+模型返回的 JSON 常见的小问题（代码块标记、前后多余的说明文字、尾随逗号、注释、
+输出被截断）不值得为此重新生成一次。parse_json_lenient() 先严格解析，失败后依次尝试：
+- 截取第一个 { / [ 开始到与之匹配的括号结束的部分
+- 删除字符串之外的 // 与 /* */ 注释以及 } / ] 前的尾随逗号
+- 输出被截断时回退到最后一个完整的元素，再补齐未闭合的括号
+修复成功的次数即省下的重新生成次数，见 json_repair_stats
+"""
+import json
+import re
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+_FENCE_PATTERN = re.compile(r'^\s*```[a-zA-Z]*\s*\n?|\n?\s*```\s*$')
+_CLOSERS = {'{': '}', '[': ']'}
+
+
+def strip_code_fences(text: str) -> str:
+    """Remove a surrounding ```json ... ``` block"""
+    return _FENCE_PATTERN.sub('', text.strip()).strip()
+
+
+def _extract_json_span(text: str) -> Optional[str]:
+    """From the first { or [ to its matching bracket (or to the end if it is never closed)"""
+    starts = [i for i in (text.find('{'), text.find('[')) if i >= 0]
+    if not starts:
+        return None
+    start = min(starts)
+    stack: List[str] = []
+    in_string = escaped = False
+    for i in range(start, len(text)):
+        char = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in _CLOSERS:
+            stack.append(_CLOSERS[char])
+        elif char in '}]' and stack:
+            stack.pop()
+            if not stack:
+                return text[start:i + 1]
+    return text[start:]
+
+
+def _clean(text: str) -> str:
+    """Drop comments and trailing commas outside of strings"""
+    out: List[str] = []
+    i, length = 0, len(text)
+    in_string = escaped = False
+    while i < length:
+        char = text[i]
+        if in_string:
+            out.append(char)
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+            i += 1
+            continue
+        if char == '"':
+            in_string = True
+        elif text.startswith('//', i):
+            end = text.find('\n', i)
+            i = length if end < 0 else end
+            continue
+        elif text.startswith('/*', i):
+            end = text.find('*/', i + 2)
+            i = length if end < 0 else end + 2
+            continue
+        elif char in '}]':
+            # 去掉右括号前的尾随逗号
+            j = len(out) - 1
+            while j >= 0 and out[j].isspace():
+                j -= 1
+            if j >= 0 and out[j] == ',':
+                del out[j]
+        out.append(char)
+        i += 1
+    return ''.join(out)
+
+
+def _close_truncated(text: str) -> str:
+    """Cut a truncated document back to its last complete element and close the open brackets"""
+    stack: List[str] = []
+    in_string = escaped = False
+    safe_end, safe_stack = 0, []
+    for i, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+            continue
+        if char == '"':
+            in_string = True
+        elif char in _CLOSERS:
+            stack.append(_CLOSERS[char])
+            if len(stack) == 1:
+                safe_end, safe_stack = i + 1, list(stack)
+        elif char in '}]' and stack:
+            stack.pop()
+            safe_end, safe_stack = i + 1, list(stack)
+        elif char == ',' and stack:
+            # 逗号之前的元素是完整的
+            safe_end, safe_stack = i, list(stack)
+    if not stack and not in_string:
+        return text
+    return text[:safe_end] + ''.join(reversed(safe_stack))
+
+
+def parse_json_lenient(text: str) -> Tuple[Any, bool]:
+    """
+    Parse JSON from an LLM response, repairing common defects
+
+    Args:
+        text: Raw model output
+
+    Returns:
+        Tuple of (parsed value, repaired) - repaired is False when plain parsing
+        (after removing code fences) succeeded
+
+    Raises:
+        json.JSONDecodeError: The text could not be salvaged
+    """
+    stripped = strip_code_fences(text or '')
+    try:
+        return json.loads(stripped), False
+    except json.JSONDecodeError as error:
+        original_error = error
+
+    span = _extract_json_span(stripped)
+    if span is None:
+        raise original_error
+    cleaned = _clean(span)
+    for candidate in (cleaned, _clean(_close_truncated(cleaned))):
+        try:
+            return json.loads(candidate), True
+        except json.JSONDecodeError:
+            continue
+    raise original_error
+
+
+class JsonRepairStats:
+    """How generate_json responses were parsed: directly, after repair, or not at all (regenerated)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.parsed = 0
+            self.repaired = 0
+            self.failed = 0
+
+    def record(self, repaired: Optional[bool]):
+        """repaired=None records a response that could not be salvaged"""
+        with self._lock:
+            if repaired is None:
+                self.failed += 1
+            elif repaired:
+                self.repaired += 1
+            else:
+                self.parsed += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.parsed + self.repaired + self.failed
+            return {
+                'parsed': self.parsed,
+                'repaired': self.repaired,
+                'failed': self.failed,
+                'retries_avoided': self.repaired,
+                'failure_rate': round(self.failed / total, 3) if total else 0.0,
+            }
+
+
+json_repair_stats = JsonRepairStats()
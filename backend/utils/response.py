@@ -69,3 +69,10 @@ def ai_service_error(message: str = "AI service error"):
 def rate_limit_error(message: str = "Rate limit exceeded"):
     return error_response("RATE_LIMIT_EXCEEDED", message, 429)
 
+
+def queue_full_error(message: str, retry_after: int):
+    """429 for a saturated task queue, with a Retry-After header (seconds)"""
+    response, status_code = error_response("QUEUE_FULL", message, 429)
+    response.headers['Retry-After'] = str(int(retry_after))
+    return response, status_code
+
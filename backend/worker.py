@@ -0,0 +1,41 @@
+"""
+Standalone task worker
+
+Drains the durable task queue (tasks table) shared with the web process.
+Run the web process with TASK_QUEUE_MODE=worker so it only enqueues, then start
+as many workers as needed, on one or more machines sharing DATABASE_URL and the
+uploads folder:
+
+    python worker.py --concurrency 4
+"""
+import argparse
+import logging
+import signal
+
+from app import create_app
+from services.task_manager import task_manager
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Banana Slides background task worker')
+    parser.add_argument('--concurrency', type=int, default=4,
+                        help='Maximum number of tasks run concurrently by this worker')
+    parser.add_argument('--poll-interval', type=float, default=2.0,
+                        help='Seconds to wait between polls when the queue is empty')
+    args = parser.parse_args()
+
+    create_app(task_workers=args.concurrency)
+
+    def handle_stop(signum, frame):
+        logging.info(f"Received signal {signum}, stopping worker...")
+        task_manager.stop()
+
+    signal.signal(signal.SIGINT, handle_stop)
+    signal.signal(signal.SIGTERM, handle_stop)
+
+    task_manager.run_worker(poll_interval=args.poll_interval)
+    task_manager.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -4,6 +4,26 @@ import axios from 'axios';
 // 生产环境：通过 nginx proxy 转发
 const API_BASE_URL = '';
 
+// 生成幂等键：crypto.randomUUID 只在安全上下文（HTTPS / localhost）中可用，
+// 通过 HTTP 访问局域网或 docker 部署时退回到 getRandomValues（再不行用 Math.random）生成 v4 UUID
+const generateIdempotencyKey = (): string => {
+  if (typeof crypto !== 'undefined' && typeof crypto.randomUUID === 'function') {
+    return crypto.randomUUID();
+  }
+  const bytes = new Uint8Array(16);
+  if (typeof crypto !== 'undefined' && typeof crypto.getRandomValues === 'function') {
+    crypto.getRandomValues(bytes);
+  } else {
+    for (let i = 0; i < bytes.length; i++) {
+      bytes[i] = Math.floor(Math.random() * 256);
+    }
+  }
+  bytes[6] = (bytes[6] & 0x0f) | 0x40;
+  bytes[8] = (bytes[8] & 0x3f) | 0x80;
+  const hex = Array.from(bytes, (b) => b.toString(16).padStart(2, '0')).join('');
+  return `${hex.slice(0, 8)}-${hex.slice(8, 12)}-${hex.slice(12, 16)}-${hex.slice(16, 20)}-${hex.slice(20)}`;
+};
+
 // 创建 axios 实例
 export const apiClient = axios.create({
   baseURL: API_BASE_URL,
@@ -24,7 +44,13 @@ apiClient.interceptors.request.use(
       // 对于非 FormData 请求，默认设置为 JSON
       config.headers['Content-Type'] = 'application/json';
     }
-    
+
+    // 生成/导出请求带上幂等键：代理或网络层自动重试时后端直接重放第一次的响应
+    const isExport = config.method === 'get' && config.url?.includes('/export/');
+    if ((config.method === 'post' || isExport) && config.headers && !config.headers['Idempotency-Key']) {
+      config.headers['Idempotency-Key'] = generateIdempotencyKey();
+    }
+
     return config;
   },
   (error) => {
@@ -137,12 +137,17 @@ export const generateFromDescription = async (projectId: string, descriptionText
  * 批量生成描述
  * @param projectId 项目ID
  * @param language 输出语言（可选，默认从 sessionStorage 获取）
+ * @param retryFailedOnly 只重新生成描述生成失败的页面
  */
-export const generateDescriptions = async (projectId: string, language?: OutputLanguage): Promise<ApiResponse> => {
+export const generateDescriptions = async (
+  projectId: string,
+  language?: OutputLanguage,
+  retryFailedOnly = false
+): Promise<ApiResponse> => {
   const lang = language || await getStoredOutputLanguage();
   const response = await apiClient.post<ApiResponse>(
     `/api/projects/${projectId}/generate/descriptions`,
-    { language: lang }
+    { language: lang, retry_failed_only: retryFailedOnly }
   );
   return response.data;
 };
@@ -164,6 +169,54 @@ export const generatePageDescription = async (
   return response.data;
 };
 
+/**
+ * 流式生成单页描述（SSE）：生成过程中每收到一段文本调用 onDelta，完成后返回已保存的页面
+ */
+export const streamPageDescription = async (
+  projectId: string,
+  pageId: string,
+  onDelta: (text: string) => void,
+  forceRegenerate: boolean = false,
+  language?: OutputLanguage
+): Promise<Page> => {
+  const lang = language || await getStoredOutputLanguage();
+  const response = await fetch(
+    `/api/projects/${projectId}/pages/${pageId}/generate/description/stream`,
+    {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ force_regenerate: forceRegenerate, language: lang }),
+    }
+  );
+  if (!response.ok || !response.body) {
+    const body = await response.json().catch(() => null);
+    throw new Error(body?.error?.message || `生成描述失败 (${response.status})`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  for (;;) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    // 每个事件以空行结束
+    let boundary;
+    while ((boundary = buffer.indexOf('\n\n')) >= 0) {
+      const block = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      const type = block.match(/^event: (.*)$/m)?.[1];
+      const data = block.match(/^data: (.*)$/m)?.[1];
+      if (!type || data === undefined) continue;
+      const payload = JSON.parse(data);
+      if (type === 'delta') onDelta(payload.text);
+      else if (type === 'done') return payload.page;
+      else if (type === 'error') throw new Error(payload.message);
+    }
+  }
+  throw new Error('生成描述失败：连接已中断');
+};
+
 /**
  * 根据用户要求修改大纲
  * @param projectId 项目ID
@@ -220,11 +273,32 @@ export const refineDescriptions = async (
  * 批量生成图片
  * @param projectId 项目ID
  * @param language 输出语言（可选，默认从 sessionStorage 获取）
+ * @param retryFailedOnly 只重新生成失败的页面
+ * @param force 忽略页面指纹，重新生成所有页面（默认跳过图片已是最新的页面）
  */
-export const generateImages = async (projectId: string, language?: OutputLanguage): Promise<ApiResponse> => {
+export const generateImages = async (
+  projectId: string,
+  language?: OutputLanguage,
+  retryFailedOnly = false,
+  force = false
+): Promise<ApiResponse> => {
   const lang = language || await getStoredOutputLanguage();
   const response = await apiClient.post<ApiResponse>(
     `/api/projects/${projectId}/generate/images`,
+    { language: lang, retry_failed_only: retryFailedOnly, force }
+  );
+  return response.data;
+};
+
+/**
+ * 流水线式生成整套幻灯片（描述生成完成的页面立即开始生成图片）
+ * @param projectId 项目ID
+ * @param language 输出语言（可选，默认从 sessionStorage 获取）
+ */
+export const generateDeck = async (projectId: string, language?: OutputLanguage): Promise<ApiResponse> => {
+  const lang = language || await getStoredOutputLanguage();
+  const response = await apiClient.post<ApiResponse>(
+    `/api/projects/${projectId}/generate/deck`,
     { language: lang }
   );
   return response.data;
@@ -403,6 +477,47 @@ export const getTaskStatus = async (projectId: string, taskId: string): Promise<
   return response.data;
 };
 
+/**
+ * 取消任务：排队中的任务直接取消，执行中的任务先变为 CANCELLING，停止后变为 CANCELLED
+ */
+export const cancelTask = async (
+  projectId: string,
+  taskId: string
+): Promise<ApiResponse<{ task_id: string; status: string }>> => {
+  const response = await apiClient.post<ApiResponse<{ task_id: string; status: string }>>(
+    `/api/projects/${projectId}/tasks/${taskId}/cancel`
+  );
+  return response.data;
+};
+
+/**
+ * 获取项目所有活跃任务（PENDING/PROCESSING/CANCELLING），一次请求返回
+ */
+export const getActiveTasks = async (projectId: string): Promise<ApiResponse<{ tasks: Task[] }>> => {
+  const response = await apiClient.get<ApiResponse<{ tasks: Task[] }>>(
+    `/api/projects/${projectId}/tasks`,
+    { params: { status: 'active' } }
+  );
+  return response.data;
+};
+
+/**
+ * 订阅项目进度事件（SSE），返回取消订阅函数
+ * 事件类型：task（任务进度）、page（页面状态/图片变化）、page_deleted
+ */
+export const subscribeProjectEvents = (
+  projectId: string,
+  onEvent: (type: 'task' | 'page' | 'page_deleted', data: any) => void
+): (() => void) => {
+  const source = new EventSource(`/api/projects/${projectId}/events`);
+  (['task', 'page', 'page_deleted'] as const).forEach((type) => {
+    source.addEventListener(type, (event) => {
+      onEvent(type, JSON.parse((event as MessageEvent).data));
+    });
+  });
+  return () => source.close();
+};
+
 // ===== 导出 =====
 
 /**
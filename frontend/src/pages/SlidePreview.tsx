@@ -176,18 +176,22 @@ export const SlidePreview: React.FC = () => {
       (p) => p.generated_image_path
     );
     
-    const executeGenerate = async () => {
-      await generateImages();
+    const executeGenerate = async (force: boolean) => {
+      const { upToDate, skippedPages } = await generateImages(force);
+      if (upToDate) {
+        show({ message: `所有 ${skippedPages} 页的图片均已是最新，无需重新生成`, type: 'info' });
+      }
     };
     
     if (hasImages) {
+      // 用户确认覆盖后强制重新生成全部页面（否则输入未变化的页面会被跳过）
       confirm(
         '部分页面已有图片，重新生成将覆盖，确定继续吗？',
-        executeGenerate,
+        () => executeGenerate(true),
         { title: '确认重新生成', variant: 'warning' }
       );
     } else {
-      await executeGenerate();
+      await executeGenerate(false);
     }
   };
 
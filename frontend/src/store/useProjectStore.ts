@@ -40,7 +40,8 @@ interface ProjectState {
   generateFromDescription: () => Promise<void>;
   generateDescriptions: () => Promise<void>;
   generatePageDescription: (pageId: string) => Promise<void>;
-  generateImages: () => Promise<void>;
+  // force=true 时重新生成所有页面（包括输入未变化的页面）；返回被跳过的最新页面数
+  generateImages: (force?: boolean) => Promise<{ upToDate: boolean; skippedPages: number }>;
   generatePageImage: (pageId: string, forceRegenerate?: boolean) => Promise<void>;
   editPageImage: (
     pageId: string,
@@ -398,8 +399,16 @@ const debouncedUpdatePage = debounce(
             taskProgress: null,
             isGlobalLoading: false
           });
-        } else if (task.status === 'PENDING' || task.status === 'PROCESSING') {
-          // 继续轮询（PENDING 或 PROCESSING）
+        } else if (task.status === 'CANCELLED') {
+          console.log(`[轮询] Task ${taskId} 已取消，刷新项目数据`);
+          set({ 
+            activeTaskId: null, 
+            taskProgress: null, 
+            isGlobalLoading: false 
+          });
+          await get().syncProject();
+        } else if (task.status === 'PENDING' || task.status === 'PROCESSING' || task.status === 'CANCELLING') {
+          // 继续轮询（PENDING / PROCESSING / CANCELLING：取消中的任务要等到 CANCELLED 才结束）
           console.log(`[轮询] Task ${taskId} 处理中，2秒后继续轮询...`);
           setTimeout(poll, 2000);
         } else {
@@ -561,8 +570,16 @@ const debouncedUpdatePage = debounce(
                 activeTaskId: null,
                 error: normalizeErrorMessage(task.error_message || task.error || '生成描述失败')
               });
-            } else if (task.status === 'PENDING' || task.status === 'PROCESSING') {
-              // 继续轮询
+            } else if (task.status === 'CANCELLED') {
+              // 任务已取消：清除生成状态，已生成的描述保留
+              set({ 
+                pageDescriptionGeneratingTasks: {},
+                taskProgress: null,
+                activeTaskId: null
+              });
+              await get().syncProject();
+            } else if (task.status === 'PENDING' || task.status === 'PROCESSING' || task.status === 'CANCELLING') {
+              // 继续轮询（CANCELLING 时等待任务真正停止）
               setTimeout(pollAndSync, 2000);
             }
           }
@@ -612,8 +629,21 @@ const debouncedUpdatePage = debounce(
       // 立即同步一次项目数据，以更新页面状态
       await get().syncProject();
       
-      // 传递 force_regenerate=true 以允许重新生成已有描述
-      await api.generatePageDescription(currentProject.id, pageId, true);
+      // 流式生成：文本到达时立即显示在编辑器中；传递 force_regenerate=true 以允许重新生成已有描述
+      let streamedText = '';
+      await api.streamPageDescription(currentProject.id, pageId, (text) => {
+        streamedText += text;
+        const project = get().currentProject;
+        if (!project) return;
+        set({
+          currentProject: {
+            ...project,
+            pages: project.pages.map((page) =>
+              page.id === pageId ? { ...page, description_content: { text: streamedText } } : page
+            ),
+          },
+        });
+      }, true);
       
       // 刷新项目数据
       await get().syncProject();
@@ -630,11 +660,21 @@ const debouncedUpdatePage = debounce(
   },
 
   // 生成图片
-  generateImages: async () => {
+  generateImages: async (force = false) => {
     const { currentProject, startAsyncTask } = get();
-    if (!currentProject) return;
+    if (!currentProject) return { upToDate: false, skippedPages: 0 };
 
-    await startAsyncTask(() => api.generateImages(currentProject.id));
+    let data: any = null;
+    await startAsyncTask(async () => {
+      const response = await api.generateImages(currentProject.id, undefined, false, force);
+      data = response.data;
+      return response;
+    });
+    // 增量生成：所有页面的图片都与当前输入一致时后端不创建任务（task_id 为 null）
+    return {
+      upToDate: !!data && !data.task_id,
+      skippedPages: data?.skipped_pages || 0,
+    };
   },
 
   // 生成单页图片（异步）
@@ -720,8 +760,15 @@ const debouncedUpdatePage = debounce(
           });
           // 刷新项目数据以更新页面状态
           await get().syncProject();
-        } else if (task.status === 'PENDING' || task.status === 'PROCESSING') {
-          // 继续轮询，同时同步项目数据以更新页面状态
+        } else if (task.status === 'CANCELLED') {
+          console.log(`[轮询] Page ${pageId} 任务已取消，刷新项目数据`);
+          const { pageGeneratingTasks } = get();
+          const newTasks = { ...pageGeneratingTasks };
+          delete newTasks[pageId];
+          set({ pageGeneratingTasks: newTasks });
+          await get().syncProject();
+        } else if (task.status === 'PENDING' || task.status === 'PROCESSING' || task.status === 'CANCELLING') {
+          // 继续轮询，同时同步项目数据以更新页面状态（CANCELLING 时等待任务真正停止）
           console.log(`[轮询] Page ${pageId} 处理中，同步项目数据...`);
           await get().syncProject();
           console.log(`[轮询] Page ${pageId} 处理中，2秒后继续轮询...`);
@@ -68,7 +68,7 @@ export interface Project {
 }
 
 // 任务状态
-export type TaskStatus = 'PENDING' | 'RUNNING' | 'COMPLETED' | 'FAILED';
+export type TaskStatus = 'PENDING' | 'RUNNING' | 'PROCESSING' | 'COMPLETED' | 'FAILED' | 'CANCELLING' | 'CANCELLED';
 
 // 任务信息
 export interface Task {
@@ -83,6 +83,8 @@ export interface Task {
     [key: string]: any; // 允许额外的字段，如material_id, image_url等
   };
   error_message?: string;
+  priority_class?: 'interactive' | 'bulk';
+  queue_position?: number | null; // PENDING 任务在队列中的位置（从 1 开始）
   result?: any;
   error?: string; // 别名
   created_at?: string;